@@ -4,9 +4,11 @@ Entity Resolver Agent - Xác định entity (sản phẩm) từ query
 from typing import Dict, Any, Optional, List
 import logging
 import re
-from functools import lru_cache
 from app.agents.base_agent import BaseAgent
+from app.core.cache import get_cache
 from app.core.settings import Settings
+from app.core.tracing import span
+from app.infrastructure.database import Database
 
 logger = logging.getLogger(__name__)
 
@@ -16,8 +18,14 @@ class EntityResolverAgent(BaseAgent):
     Entity Resolver Agents
     """
     
-    def __init__(self):
+    def __init__(self, database: Optional[Database] = None):
+        """
+        Args:
+            database: Database dùng để validate entity (deps.get_database() inject khi dựng agent graph);
+                      None = chưa cấu hình database, bỏ qua bước validate
+        """
         super().__init__("EntityResolverAgent")
+        self.database = database
         
         # 🔥 Synonym map cho các sản phẩm phổ biến
         self.synonym_map = {
@@ -30,13 +38,13 @@ class EntityResolverAgent(BaseAgent):
             "khoai tây": ["khoai tây", "potato", "khoai"],
         }
         
-        # 🔥 PERFORMANCE: Cache for entity extraction and normalization
-        if Settings.ENABLE_AGENT_CACHE:
-            self._extract_entity_cached = lru_cache(maxsize=Settings.AGENT_CACHE_SIZE)(self._extract_entity_impl)
-            self._normalize_entity_cached = lru_cache(maxsize=Settings.AGENT_CACHE_SIZE)(self._normalize_entity_impl)
-        else:
-            self._extract_entity_cached = self._extract_entity_impl
-            self._normalize_entity_cached = self._normalize_entity_impl
+        # 🔥 PERFORMANCE: Cache for entity extraction and normalization (registry dùng chung, sống qua các request)
+        self._extract_entity_cached = get_cache("entity_extract").memoize(self._extract_entity_impl)
+        self._normalize_entity_cached = get_cache("entity_normalize").memoize(self._normalize_entity_impl)
+        self._validation_cache = get_cache(
+            "entity_validation",
+            ttl_seconds=Settings.ENTITY_VALIDATION_CACHE_TTL_SECONDS
+        )
     
     async def process(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -58,7 +66,13 @@ class EntityResolverAgent(BaseAgent):
         normalized_entity = self._normalize_entity_cached(entity)
         
         # Validate entity có tồn tại trong DB không (optional - có thể skip nếu SQL fail)
-        entity_validated = await self._validate_entity_in_db(normalized_entity)
+        # None = SQL lỗi: không cache (lỗi tạm thời không đánh dấu entity hợp lệ tới hết TTL), assume valid
+        entity_validated = await self._validation_cache.get_or_compute(
+            normalized_entity,
+            lambda: self._validate_entity_in_db(normalized_entity)
+        )
+        if entity_validated is None:
+            entity_validated = True
         
         state.update({
             "resolved_entity": entity,
@@ -135,52 +149,50 @@ class EntityResolverAgent(BaseAgent):
         
         return entity
     
-    async def _validate_entity_in_db(self, entity: str) -> bool:
+    async def _validate_entity_in_db(self, entity: str) -> Optional[bool]:
         """
         Validate entity có tồn tại trong DB không (optional check)
-        Nếu SQL connection fail → return True (assume valid để tiếp tục)
+        Nếu SQL connection fail → return None (caller assume valid để tiếp tục, không cache)
         """
         if not entity:
             return False
         
         try:
-            connection_string = Settings.DATABASE_CONNECTION_STRING
-            if not connection_string:
-                # Không có connection string → assume valid
+            database = self.database
+            if database is None:
+                # Chưa cấu hình database → assume valid
                 return True
+            dialect = database.dialect
             
-            import pyodbc
             import asyncio
             
             def check_in_db():
-                conn = None
                 try:
-                    conn = pyodbc.connect(connection_string)
-                    cursor = conn.cursor()
-                    
-                    # Quick check: có sản phẩm nào match không
-                    like_pattern = f"%{entity}%"
-                    query = """
-                        SELECT TOP 1 MaSanPham
-                        FROM SanPham
-                        WHERE (IsDeleted = 0 OR IsDeleted IS NULL)
-                          AND TenSanPham LIKE ?
-                    """
-                    cursor.execute(query, like_pattern)
-                    row = cursor.fetchone()
-                    cursor.close()
-                    return row is not None
+                    with database.connect() as conn:
+                        cursor = conn.cursor()
+                        
+                        # Quick check: có sản phẩm nào match không
+                        like_pattern = f"%{entity}%"
+                        query = f"""
+                            SELECT {dialect.top(1)} MaSanPham
+                            FROM SanPham
+                            WHERE (IsDeleted = 0 OR IsDeleted IS NULL)
+                              AND TenSanPham LIKE ?
+                            {dialect.limit(1)}
+                        """
+                        cursor.execute(query, like_pattern)
+                        row = cursor.fetchone()
+                        cursor.close()
+                        return row is not None
                 except Exception as e:
                     logger.warning(f"Error validating entity in DB: {str(e)}")
-                    return True  # Assume valid nếu SQL fail
-                finally:
-                    if conn:
-                        conn.close()
+                    return None  # Không xác định được nếu SQL fail
             
-            result = await asyncio.to_thread(check_in_db)
+            with span("sql.entity_validation"):
+                result = await asyncio.to_thread(check_in_db)
             return result
             
         except Exception as e:
             logger.warning(f"Error in entity validation: {str(e)}")
-            return True  # Assume valid để tiếp tục
+            return None  # Không xác định được
 
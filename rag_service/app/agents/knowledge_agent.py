@@ -1,15 +1,18 @@
 """
 Knowledge Agent - RAG search từ vector store
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import asyncio
 import logging
 from app.agents.base_agent import BaseAgent
 from app.api.deps import get_image_vector_store, get_image_embedding_service, get_embedding_service
+from app.infrastructure.database import Database
 from app.infrastructure.vector_store.image_vector_store import ImageVectorStore
 from app.services.image import ImageEmbeddingService
 from app.services.embedding import EmbeddingService
+from app.core.cache import get_cache
 from app.core.settings import Settings
+from app.core.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -26,12 +29,145 @@ class KnowledgeAgent(BaseAgent):
         self,
         vector_store: Optional[ImageVectorStore] = None,
         image_embedding_service: Optional[ImageEmbeddingService] = None,
-        text_embedding_service: Optional[EmbeddingService] = None
+        text_embedding_service: Optional[EmbeddingService] = None,
+        database: Optional[Database] = None
     ):
+        """
+        Args:
+            database: Database cho SQL exact/fuzzy search (deps.get_database() inject khi dựng agent graph);
+                      None = chưa cấu hình database, chỉ dùng vector search
+        """
         super().__init__("KnowledgeAgent")
+        self.database = database
         self.vector_store = vector_store
         self.image_embedding_service = image_embedding_service
         self.text_embedding_service = text_embedding_service
+        
+        # 🔥 PERFORMANCE: Caches dùng chung qua cache registry
+        self._normalize_query_cached = get_cache("knowledge_query_normalize").memoize(self._normalize_product_query_for_search)
+        self._extract_product_name_cached = get_cache("knowledge_product_name").memoize(
+            self._extract_product_name_from_query, cache_none=True  # None = query không chứa tên sản phẩm (tất định)
+        )
+        # Kết quả search (SQL exact/fuzzy, vector) - copy khi đọc vì results bị merge/filter sau đó
+        self._search_cache = get_cache(
+            "knowledge_search",
+            ttl_seconds=Settings.KNOWLEDGE_CACHE_TTL_SECONDS,
+            copy_on_read=True
+        )
+        # CLIP text embedding theo query
+        self._text_embedding_cache = get_cache("clip_text_embedding", max_bytes=16 * 1024 * 1024)
+    
+    async def _cached_search(self, kind: str, search_fn, query: str, category_id: Optional[str], top_k: int) -> List[Dict[str, Any]]:
+        """
+        Chạy search qua knowledge_search cache (key: loại search, query, category, top_k)
+        Kết quả rỗng không được lưu: search functions trả [] cả khi DB/vector store lỗi
+        """
+        return await self._search_cache.get_or_compute(
+            (kind, query, category_id, top_k),
+            lambda: search_fn(query, category_id, top_k),
+            should_cache=bool
+        )
+    
+    def _ensure_services(self) -> None:
+        """Lazy load services if not provided"""
+        if not self.vector_store:
+            self.vector_store = get_image_vector_store()
+        if not self.image_embedding_service:
+            self.image_embedding_service = get_image_embedding_service()
+        if not self.text_embedding_service:
+            self.text_embedding_service = get_embedding_service()
+    
+    async def prefetch_text_searches(
+        self,
+        searches: List[Tuple[str, Optional[str], int]],
+        max_concurrent: int = 8
+    ) -> Dict[Tuple[str, str, Optional[str], int], List[Dict[str, Any]]]:
+        """
+        Chạy trước text search cho cả batch theo đúng thứ tự fallback của process()
+        (dùng bởi MultiAgentOrchestrator.process_batch):
+        
+        1. SQL exact cho mọi query
+        2. SQL fuzzy chỉ cho query SQL exact không tìm thấy
+        3. Vector search chỉ cho query cả hai bước SQL đều không tìm thấy: CLIP text embeddings
+           chưa có trong cache encode một lần, mỗi cặp (category_id, top_k) một lần multi-vector search
+        
+        Args:
+            searches: [(search_text, category_id, top_k)] - search_text chưa normalize
+            max_concurrent: Số SQL searches chạy đồng thời
+        
+        Returns:
+            {(loại search, query đã normalize, category_id, top_k): results} - đặt vào
+            state["_knowledge_prefetch"] để process() dùng trực tiếp (không phụ thuộc cache có bật hay không)
+        """
+        self._ensure_services()
+        keys = list(dict.fromkeys(
+            (self._normalize_query_cached(search_text), category_id, top_k)
+            for search_text, category_id, top_k in searches
+            if search_text
+        ))
+        prefetched: Dict[Tuple[str, str, Optional[str], int], List[Dict[str, Any]]] = {}
+        semaphore = asyncio.Semaphore(max(1, max_concurrent))
+        
+        async def run_sql(kind: str, search_fn, stage_keys: List[Tuple[str, Optional[str], int]]):
+            async def run_one(key):
+                async with semaphore:
+                    return await self._cached_search(kind, search_fn, *key)
+            
+            results = await asyncio.gather(*(run_one(key) for key in stage_keys), return_exceptions=True)
+            misses = []
+            for key, result in zip(stage_keys, results):
+                if isinstance(result, Exception):
+                    continue  # Không prefetch được: process() tự search lại query này
+                prefetched[(kind,) + key] = result
+                if not result:
+                    misses.append(key)
+            return misses
+        
+        misses = await run_sql("sql_exact", self._search_by_sql_exact_match, keys)
+        misses = await run_sql("sql_fuzzy", self._search_by_sql_fuzzy_match, misses)
+        
+        pending = []
+        for key in misses:
+            cached = self._search_cache.get(("vector_text",) + key)
+            if cached is not None:
+                prefetched[("vector_text",) + key] = cached
+            else:
+                pending.append(key)
+        
+        queries = list(dict.fromkeys(query for query, _, _ in pending))
+        embeddings = {query: self._text_embedding_cache.get(query) for query in queries}
+        missing = [query for query, embedding in embeddings.items() if embedding is None]
+        if missing:
+            for query, embedding in zip(missing, await self.image_embedding_service.create_text_embeddings(missing)):
+                if embedding is not None:
+                    self._text_embedding_cache.set(query, embedding)
+                    embeddings[query] = embedding
+        
+        groups: Dict[Tuple[Optional[str], int], List[str]] = {}
+        for query, category_id, top_k in pending:
+            if embeddings.get(query) is not None:
+                groups.setdefault((category_id, top_k), []).append(query)
+        
+        vector_searches = 0
+        for (category_id, top_k), group_queries in groups.items():
+            try:
+                results = await self.vector_store.query_products_batch(
+                    [embeddings[query] for query in group_queries], top_k, category_id=category_id
+                )
+            except Exception as e:
+                self.log(f"Error in batch text search: {str(e)}", level="error")
+                continue
+            for query, result in zip(group_queries, results):
+                parsed = self._parse_product_results(result, "text_search")
+                prefetched[("vector_text", query, category_id, top_k)] = parsed
+                if parsed:
+                    self._search_cache.set(("vector_text", query, category_id, top_k), parsed)
+                vector_searches += 1
+        self.log(
+            f"⚡ Prefetched {len(keys)} text searches: {len(keys) - len(misses)} SQL hits, "
+            f"{vector_searches} vector searches ({len(missing)} CLIP embeddings, {len(groups)} multi-vector queries)"
+        )
+        return prefetched
     
     async def process(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -43,14 +179,16 @@ class KnowledgeAgent(BaseAgent):
         image_data = state.get("image_data")
         category_id = state.get("category_id")
         top_k = state.get("top_k", 5)
+        prefetched = state.get("_knowledge_prefetch") or {}
         
-        # Lazy load services if not provided
-        if not self.vector_store:
-            self.vector_store = get_image_vector_store()
-        if not self.image_embedding_service:
-            self.image_embedding_service = get_image_embedding_service()
-        if not self.text_embedding_service:
-            self.text_embedding_service = get_embedding_service()
+        self._ensure_services()
+        
+        async def search(kind: str, search_fn, search_query: str) -> List[Dict[str, Any]]:
+            """Kết quả đã prefetch cho batch (nếu có), ngược lại search qua cache"""
+            key = (kind, search_query, category_id, top_k)
+            if key in prefetched:
+                return [dict(result) for result in prefetched[key]]
+            return await self._cached_search(kind, search_fn, search_query, category_id, top_k)
         
         knowledge_results = []
         knowledge_context = ""
@@ -72,12 +210,12 @@ class KnowledgeAgent(BaseAgent):
                 search_text = query or user_description
                 if search_text:
                     # 🔥 GIẢI PHÁP 2: Normalize query - loại bỏ từ khóa không liên quan đến product
-                    normalized_query = self._normalize_product_query_for_search(search_text)
+                    normalized_query = self._normalize_query_cached(search_text)
                     self.log(f"🔍 Performing text search: '{normalized_query}' (original: '{search_text}')...")
                     
                     # 🔥 FIX 2: Progressive fallback strategy
                     # Priority: SQL exact > SQL fuzzy > Vector search
-                    sql_exact_results = await self._search_by_sql_exact_match(normalized_query, category_id, top_k)
+                    sql_exact_results = await search("sql_exact", self._search_by_sql_exact_match, normalized_query)
                     text_results = []  # Initialize to avoid undefined error
                     
                     if sql_exact_results:
@@ -86,7 +224,7 @@ class KnowledgeAgent(BaseAgent):
                     else:
                         # Try fuzzy SQL search
                         self.log(f"⚠️ SQL exact match found 0 results. Trying fuzzy SQL search...")
-                        sql_fuzzy_results = await self._search_by_sql_fuzzy_match(normalized_query, category_id, top_k)
+                        sql_fuzzy_results = await search("sql_fuzzy", self._search_by_sql_fuzzy_match, normalized_query)
                         
                         if sql_fuzzy_results:
                             self.log(f"✅ SQL fuzzy match found: {len(sql_fuzzy_results)} products. Using fuzzy SQL results.")
@@ -94,24 +232,16 @@ class KnowledgeAgent(BaseAgent):
                         else:
                             # Last resort: vector search
                             self.log(f"⚠️ SQL fuzzy match found 0 results. Falling back to vector search...")
-                            text_results = await self._search_by_text(
-                                query=normalized_query,
-                                category_id=category_id,
-                                top_k=top_k
-                            )
+                            text_results = await search("vector_text", self._search_by_text, normalized_query)
                             knowledge_results.extend(text_results)
 
                     
                     # 🔥 GIẢI PHÁP 4: Fallback retry nếu không tìm được (chỉ khi không có SQL results)
                     if not sql_exact_results and not text_results and search_text:
-                        extracted_product = self._extract_product_name_from_query(search_text)
+                        extracted_product = self._extract_product_name_cached(search_text)
                         if extracted_product and extracted_product != normalized_query:
                             self.log(f"🔍 Retrying search with extracted product name: '{extracted_product}'...")
-                            retry_results = await self._search_by_text(
-                                query=extracted_product,
-                                category_id=category_id,
-                                top_k=top_k
-                            )
+                            retry_results = await search("vector_text", self._search_by_text, extracted_product)
                             knowledge_results.extend(retry_results)
                             if retry_results:
                                 self.log(f"✅ Found {len(retry_results)} results with extracted product name")
@@ -167,7 +297,6 @@ class KnowledgeAgent(BaseAgent):
                             keyword_lower = keyword.lower()
                             
                             # 1. Whole-word exact match (quan trọng nhất)
-                            import re
                             # Match whole word, không match substring
                             word_pattern = r'\b' + re.escape(keyword_lower) + r'\b'
                             if re.search(word_pattern, product_name):
@@ -249,39 +378,10 @@ class KnowledgeAgent(BaseAgent):
             if query_embedding is None:
                 return []
             
-            # Build where clause
-            where_clause = {"content_type": "product"}
-            if category_id:
-                where_clause["category_id"] = category_id
-            
-            # Vector search
-            results = await asyncio.to_thread(
-                self.vector_store.collection.query,
-                query_embeddings=[query_embedding.tolist()],
-                n_results=top_k,
-                where=where_clause
-            )
-            
-            # Parse results
-            products = []
-            if results.get('ids') and len(results['ids'][0]) > 0:
-                for i in range(len(results['ids'][0])):
-                    metadata = results['metadatas'][0][i]
-                    distance = results['distances'][0][i] if 'distances' in results and results['distances'] else 1.0
-                    similarity = 1 - distance
-                    
-                    product = {
-                        "product_id": metadata.get('file_id', '') or metadata.get('product_id', ''),
-                        "product_name": metadata.get('product_name', ''),
-                        "category_id": metadata.get('category_id', ''),
-                        "category_name": metadata.get('category_name', ''),
-                        "similarity": float(similarity),
-                        "price": float(metadata.get('price', 0)) if metadata.get('price') else None,
-                        "source": "image_search"
-                    }
-                    products.append(product)
-            
-            return products
+            # Vector search (chỉ partition của category nếu có)
+            results = await self.vector_store.query_products(query_embedding, top_k, category_id=category_id)
+            
+            return self._parse_product_results(results, "image_search")
             
         except Exception as e:
             self.log(f"Error in image search: {str(e)}", level="error")
@@ -296,49 +396,46 @@ class KnowledgeAgent(BaseAgent):
         """Search products by text"""
         try:
             # Tạo text embedding (dùng CLIP text encoder để tương thích với image embeddings)
-            query_embedding = self.image_embedding_service.create_text_embedding(query)
+            query_embedding = self._text_embedding_cache.get(query)
+            if query_embedding is None:
+                query_embedding = await self.image_embedding_service.create_text_embedding_async(query)
+                if query_embedding is not None:
+                    self._text_embedding_cache.set(query, query_embedding)
             
             if query_embedding is None:
                 return []
             
-            # Build where clause
-            where_clause = {"content_type": "product"}
-            if category_id:
-                where_clause["category_id"] = category_id
-            
-            # Vector search
-            results = await asyncio.to_thread(
-                self.vector_store.collection.query,
-                query_embeddings=[query_embedding.tolist()],
-                n_results=top_k,
-                where=where_clause
-            )
-            
-            # Parse results
-            products = []
-            if results.get('ids') and len(results['ids'][0]) > 0:
-                for i in range(len(results['ids'][0])):
-                    metadata = results['metadatas'][0][i]
-                    distance = results['distances'][0][i] if 'distances' in results and results['distances'] else 1.0
-                    similarity = 1 - distance
-                    
-                    product = {
-                        "product_id": metadata.get('file_id', '') or metadata.get('product_id', ''),
-                        "product_name": metadata.get('product_name', ''),
-                        "category_id": metadata.get('category_id', ''),
-                        "category_name": metadata.get('category_name', ''),
-                        "similarity": float(similarity),
-                        "price": float(metadata.get('price', 0)) if metadata.get('price') else None,
-                        "source": "text_search"
-                    }
-                    products.append(product)
-            
-            return products
+            # Vector search (chỉ partition của category nếu có)
+            results = await self.vector_store.query_products(query_embedding, top_k, category_id=category_id)
+            
+            return self._parse_product_results(results, "text_search")
             
         except Exception as e:
             self.log(f"Error in text search: {str(e)}", level="error")
             return []
     
+    @staticmethod
+    def _parse_product_results(results: Dict, source: str) -> List[Dict[str, Any]]:
+        """Chuyển kết quả query_products thành danh sách products"""
+        products = []
+        if results.get('ids') and len(results['ids'][0]) > 0:
+            for i in range(len(results['ids'][0])):
+                metadata = results['metadatas'][0][i]
+                distance = results['distances'][0][i] if 'distances' in results and results['distances'] else 1.0
+                similarity = 1 - distance
+                
+                product = {
+                    "product_id": metadata.get('file_id', '') or metadata.get('product_id', ''),
+                    "product_name": metadata.get('product_name', ''),
+                    "category_id": metadata.get('category_id', ''),
+                    "category_name": metadata.get('category_name', ''),
+                    "similarity": float(similarity),
+                    "price": float(metadata.get('price', 0)) if metadata.get('price') else None,
+                    "source": source
+                }
+                products.append(product)
+        return products
+    
     def _merge_results(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Merge và deduplicate results từ nhiều sources"""
         seen = {}
@@ -501,26 +598,14 @@ class KnowledgeAgent(BaseAgent):
         Tìm sản phẩm bằng SQL LIKE để đảm bảo entity match chính xác
         """
         try:
-            connection_string = Settings.DATABASE_CONNECTION_STRING
-            if not connection_string:
-                self.log("⚠️ DATABASE_CONNECTION_STRING not found. Skipping SQL exact match.")
+            database = self.database
+            if database is None:
+                self.log("⚠️ Database not configured. Skipping SQL exact match.")
                 return []
+            dialect = database.dialect
             
-            import pyodbc
             import asyncio
             
-            # 🔥 FIX: Kiểm tra driver có sẵn không
-            try:
-                # Test connection trước
-                test_conn = pyodbc.connect(connection_string, timeout=2)
-                test_conn.close()
-            except pyodbc.Error as e:
-                error_code = str(e)
-                if "IM002" in error_code or "driver" in error_code.lower():
-                    self.log(f"⚠️ ODBC Driver not found or connection failed: {error_code}. Skipping SQL exact match.")
-                    return []
-                raise
-            
             # Extract keywords từ query để search
             keywords = query.split()
             if not keywords:
@@ -532,119 +617,117 @@ class KnowledgeAgent(BaseAgent):
             # 🔥 FIX: Chuyển thành sync function để dùng với asyncio.to_thread
             def search_in_db():
                 """Sync function để chạy trong thread pool"""
-                conn = None
                 try:
-                    conn = pyodbc.connect(connection_string)
-                    cursor = conn.cursor()
-                    
-                    # Search với keyword đầu tiên (dài nhất)
-                    keyword = keywords_sorted[0]
-                    like_pattern = f"%{keyword}%"
-                    
-                    db_query = f"""
-                        SELECT TOP {top_k}
-                            s.MaSanPham,
-                            s.TenSanPham,
-                            s.MoTa,
-                            s.Anh,
-                            s.GiaBan,
-                            s.DonViTinh,
-                            s.MaDanhMuc,
-                            dm.TenDanhMuc
-                        FROM SanPham s
-                        LEFT JOIN DanhMuc dm ON s.MaDanhMuc = dm.MaDanhMuc
-                        WHERE (s.IsDeleted = 0 OR s.IsDeleted IS NULL)
-                          AND s.TenSanPham LIKE ?
-                        ORDER BY
-                            CASE WHEN s.TenSanPham LIKE ? THEN 0 ELSE 1 END,
-                            s.TenSanPham
-                    """
-                    
-                    cursor.execute(db_query, like_pattern, like_pattern)
-                    rows = cursor.fetchall()
-                    
-                    products = []
-                    for row in rows:
-                        product_id, product_name, description, image_filename, price, don_vi_tinh, cat_id, cat_name = row
+                    with database.connect() as conn:
+                        cursor = conn.cursor()
                         
-                        # 🔥 BONUS: Guardrail chống nhầm sản phẩm với synonym + fuzzy match
-                        product_name_lower = product_name.lower()
+                        # Search với keyword đầu tiên (dài nhất)
+                        keyword = keywords_sorted[0]
+                        like_pattern = f"%{keyword}%"
                         
-                        # Synonym map cho các sản phẩm phổ biến
-                        synonym_map = {
-                            "cá hồi": ["cá hồi", "salmon", "cá hồi na uy", "cá hồi tươi"],
-                            "thịt bò": ["thịt bò", "beef", "thịt bò tươi"],
-                            "thịt heo": ["thịt heo", "pork", "thịt lợn"],
-                            "gà": ["gà", "chicken", "gà ta", "gà công nghiệp"],
-                            "tôm": ["tôm", "shrimp", "tôm sú", "tôm hùm"],
-                        }
+                        db_query = f"""
+                            SELECT {dialect.top(top_k)}
+                                s.MaSanPham,
+                                s.TenSanPham,
+                                s.MoTa,
+                                s.Anh,
+                                s.GiaBan,
+                                s.DonViTinh,
+                                s.MaDanhMuc,
+                                dm.TenDanhMuc
+                            FROM SanPham s
+                            LEFT JOIN DanhMuc dm ON s.MaDanhMuc = dm.MaDanhMuc
+                            WHERE (s.IsDeleted = 0 OR s.IsDeleted IS NULL)
+                              AND s.TenSanPham LIKE ?
+                            ORDER BY
+                                CASE WHEN s.TenSanPham LIKE ? THEN 0 ELSE 1 END,
+                                s.TenSanPham
+                            {dialect.limit(top_k)}
+                        """
                         
-                        # Kiểm tra match với synonym
-                        matched = False
-                        for keyword in keywords_sorted[:2]:
-                            keyword_lower = keyword.lower()
+                        cursor.execute(db_query, like_pattern, like_pattern)
+                        rows = cursor.fetchall()
+                        
+                        products = []
+                        for row in rows:
+                            product_id, product_name, description, image_filename, price, don_vi_tinh, cat_id, cat_name = row
                             
-                            # Exact match
-                            if keyword_lower in product_name_lower:
-                                matched = True
-                                break
+                            # 🔥 BONUS: Guardrail chống nhầm sản phẩm với synonym + fuzzy match
+                            product_name_lower = product_name.lower()
                             
-                            # Synonym match
-                            for main_term, synonyms in synonym_map.items():
-                                if keyword_lower in main_term or main_term in keyword_lower:
-                                    if any(syn in product_name_lower for syn in synonyms):
-                                        matched = True
+                            # Synonym map cho các sản phẩm phổ biến
+                            synonym_map = {
+                                "cá hồi": ["cá hồi", "salmon", "cá hồi na uy", "cá hồi tươi"],
+                                "thịt bò": ["thịt bò", "beef", "thịt bò tươi"],
+                                "thịt heo": ["thịt heo", "pork", "thịt lợn"],
+                                "gà": ["gà", "chicken", "gà ta", "gà công nghiệp"],
+                                "tôm": ["tôm", "shrimp", "tôm sú", "tôm hùm"],
+                            }
+                            
+                            # Kiểm tra match với synonym
+                            matched = False
+                            for keyword in keywords_sorted[:2]:
+                                keyword_lower = keyword.lower()
+                                
+                                # Exact match
+                                if keyword_lower in product_name_lower:
+                                    matched = True
+                                    break
+                                
+                                # Synonym match
+                                for main_term, synonyms in synonym_map.items():
+                                    if keyword_lower in main_term or main_term in keyword_lower:
+                                        if any(syn in product_name_lower for syn in synonyms):
+                                            matched = True
+                                            break
+                                    if matched:
                                         break
+                                
                                 if matched:
                                     break
+                                
+                                # Fuzzy match (nếu không có exact/synonym match)
+                                if not matched:
+                                    try:
+                                        from difflib import SequenceMatcher
+                                        product_words = product_name_lower.split()
+                                        for word in product_words:
+                                            if len(word) >= 3 and len(keyword_lower) >= 3:
+                                                similarity = SequenceMatcher(None, keyword_lower, word).ratio()
+                                                if similarity > 0.7:  # 70% similarity
+                                                    matched = True
+                                                    break
+                                        if matched:
+                                            break
+                                    except:
+                                        pass
                             
                             if matched:
-                                break
-                            
-                            # Fuzzy match (nếu không có exact/synonym match)
-                            if not matched:
-                                try:
-                                    from difflib import SequenceMatcher
-                                    product_words = product_name_lower.split()
-                                    for word in product_words:
-                                        if len(word) >= 3 and len(keyword_lower) >= 3:
-                                            similarity = SequenceMatcher(None, keyword_lower, word).ratio()
-                                            if similarity > 0.7:  # 70% similarity
-                                                matched = True
-                                                break
-                                    if matched:
-                                        break
-                                except:
-                                    pass
+                                products.append({
+                                    "product_id": str(product_id),
+                                    "product_name": str(product_name),
+                                    "category_id": str(cat_id) if cat_id else "",
+                                    "category_name": str(cat_name) if cat_name else "",
+                                    "price": float(price) if price is not None else None,
+                                    "unit": str(don_vi_tinh) if don_vi_tinh else "",
+                                    "description": str(description) if description else "",
+                                    "similarity": 1.0,  # SQL exact match => max relevance
+                                    "source": "sql_exact_match"
+                                })
+                            else:
+                                # Log warning nếu entity không match
+                                self.log(f"⚠️ Entity mismatch: '{product_name}' does not match keywords {keywords_sorted[:2]}")
+                        
+                        cursor.close()
+                        return products
                         
-                        if matched:
-                            products.append({
-                                "product_id": str(product_id),
-                                "product_name": str(product_name),
-                                "category_id": str(cat_id) if cat_id else "",
-                                "category_name": str(cat_name) if cat_name else "",
-                                "price": float(price) if price is not None else None,
-                                "unit": str(don_vi_tinh) if don_vi_tinh else "",
-                                "description": str(description) if description else "",
-                                "similarity": 1.0,  # SQL exact match => max relevance
-                                "source": "sql_exact_match"
-                            })
-                        else:
-                            # Log warning nếu entity không match
-                            self.log(f"⚠️ Entity mismatch: '{product_name}' does not match keywords {keywords_sorted[:2]}")
-                    
-                    cursor.close()
-                    return products
-                    
                 except Exception as e:
                     self.log(f"Error in SQL exact match: {str(e)}", level="error")
                     return []
-                finally:
-                    if conn:
-                        conn.close()
             
             # 🔥 FIX: Chạy sync function trong thread pool (pyodbc là blocking I/O)
-            results = await asyncio.to_thread(search_in_db)
+            with span("sql.knowledge_exact_match"):
+                results = await asyncio.to_thread(search_in_db)
             return results
             
         except Exception as e:
@@ -662,25 +745,14 @@ class KnowledgeAgent(BaseAgent):
         Uses partial matching, description search, and relevance scoring
         """
         try:
-            connection_string = Settings.DATABASE_CONNECTION_STRING
-            if not connection_string:
-                self.log("⚠️ DATABASE_CONNECTION_STRING not found. Skipping fuzzy SQL search.")
+            database = self.database
+            if database is None:
+                self.log("⚠️ Database not configured. Skipping fuzzy SQL search.")
                 return []
+            dialect = database.dialect
             
-            import pyodbc
             import asyncio
             
-            # Check driver availability
-            try:
-                test_conn = pyodbc.connect(connection_string, timeout=2)
-                test_conn.close()
-            except pyodbc.Error as e:
-                error_code = str(e)
-                if "IM002" in error_code or "driver" in error_code.lower():
-                    self.log(f"⚠️ ODBC Driver not available: {error_code}. Skipping fuzzy SQL search.")
-                    return []
-                raise
-            
             # Extract keywords
             keywords = query.split()
             if not keywords:
@@ -690,133 +762,131 @@ class KnowledgeAgent(BaseAgent):
             
             def search_in_db():
                 """Fuzzy search with relevance scoring"""
-                conn = None
                 try:
-                    conn = pyodbc.connect(connection_string)
-                    cursor = conn.cursor()
-                    
-                    # Build search patterns
-                    keyword = keywords_sorted[0]
-                    exact_pattern = f"%{keyword}%"
-                    
-                    # Fuzzy patterns (remove last char for typo tolerance)
-                    fuzzy_pattern = f"%{keyword[:-1]}%" if len(keyword) > 2 else exact_pattern
-                    
-                    # Search in both name and description
-                    db_query = f"""
-                        SELECT TOP {top_k}
-                            s.MaSanPham,
-                            s.TenSanPham,
-                            s.MoTa,
-                            s.Anh,
-                            s.GiaBan,
-                            s.DonViTinh,
-                            s.MaDanhMuc,
-                            dm.TenDanhMuc,
-                            -- Relevance score
-                            CASE 
-                                WHEN s.TenSanPham LIKE ? THEN 100
-                                WHEN s.TenSanPham LIKE ? THEN 80
-                                WHEN s.MoTa LIKE ? THEN 60
-                                ELSE 40
-                            END AS relevance_score
-                        FROM SanPham s
-                        LEFT JOIN DanhMuc dm ON s.MaDanhMuc = dm.MaDanhMuc
-                        WHERE (s.IsDeleted = 0 OR s.IsDeleted IS NULL)
-                          AND (
-                              s.TenSanPham LIKE ?
-                              OR s.TenSanPham LIKE ?
-                              OR s.MoTa LIKE ?
-                          )
-                        ORDER BY relevance_score DESC, s.TenSanPham
-                    """
-                    
-                    cursor.execute(
-                        db_query, 
-                        exact_pattern, fuzzy_pattern, exact_pattern,  # For CASE scoring
-                        exact_pattern, fuzzy_pattern, exact_pattern   # For WHERE clause
-                    )
-                    rows = cursor.fetchall()
-                    
-                    products = []
-                    for row in rows:
-                        product_id, product_name, description, image_filename, price, don_vi_tinh, cat_id, cat_name, relevance = row
+                    with database.connect() as conn:
+                        cursor = conn.cursor()
                         
-                        # Validate with synonym matching
-                        product_name_lower = product_name.lower()
+                        # Build search patterns
+                        keyword = keywords_sorted[0]
+                        exact_pattern = f"%{keyword}%"
                         
-                        synonym_map = {
-                            "cá hồi": ["cá hồi", "salmon", "cá hồi na uy", "cá hồi tươi", "ca hoi"],
-                            "thịt bò": ["thịt bò", "beef", "thịt bò tươi", "thit bo"],
-                            "thịt heo": ["thịt heo", "pork", "thịt lợn", "thit heo"],
-                            "gà": ["gà", "chicken", "gà ta", "ga"],
-                            "tôm": ["tôm", "shrimp", "tôm sú", "tom"],
-                        }
+                        # Fuzzy patterns (remove last char for typo tolerance)
+                        fuzzy_pattern = f"%{keyword[:-1]}%" if len(keyword) > 2 else exact_pattern
                         
-                        # Check if product matches query intent
-                        matched = False
-                        for keyword in keywords_sorted[:2]:
-                            keyword_lower = keyword.lower()
+                        # Search in both name and description
+                        db_query = f"""
+                            SELECT {dialect.top(top_k)}
+                                s.MaSanPham,
+                                s.TenSanPham,
+                                s.MoTa,
+                                s.Anh,
+                                s.GiaBan,
+                                s.DonViTinh,
+                                s.MaDanhMuc,
+                                dm.TenDanhMuc,
+                                -- Relevance score
+                                CASE 
+                                    WHEN s.TenSanPham LIKE ? THEN 100
+                                    WHEN s.TenSanPham LIKE ? THEN 80
+                                    WHEN s.MoTa LIKE ? THEN 60
+                                    ELSE 40
+                                END AS relevance_score
+                            FROM SanPham s
+                            LEFT JOIN DanhMuc dm ON s.MaDanhMuc = dm.MaDanhMuc
+                            WHERE (s.IsDeleted = 0 OR s.IsDeleted IS NULL)
+                              AND (
+                                  s.TenSanPham LIKE ?
+                                  OR s.TenSanPham LIKE ?
+                                  OR s.MoTa LIKE ?
+                              )
+                            ORDER BY relevance_score DESC, s.TenSanPham
+                            {dialect.limit(top_k)}
+                        """
+                        
+                        cursor.execute(
+                            db_query, 
+                            exact_pattern, fuzzy_pattern, exact_pattern,  # For CASE scoring
+                            exact_pattern, fuzzy_pattern, exact_pattern   # For WHERE clause
+                        )
+                        rows = cursor.fetchall()
+                        
+                        products = []
+                        for row in rows:
+                            product_id, product_name, description, image_filename, price, don_vi_tinh, cat_id, cat_name, relevance = row
                             
-                            # Exact match
-                            if keyword_lower in product_name_lower:
-                                matched = True
-                                break
+                            # Validate with synonym matching
+                            product_name_lower = product_name.lower()
                             
-                            # Synonym match
-                            for main_term, synonyms in synonym_map.items():
-                                if keyword_lower in main_term or main_term in keyword_lower:
-                                    if any(syn in product_name_lower for syn in synonyms):
-                                        matched = True
+                            synonym_map = {
+                                "cá hồi": ["cá hồi", "salmon", "cá hồi na uy", "cá hồi tươi", "ca hoi"],
+                                "thịt bò": ["thịt bò", "beef", "thịt bò tươi", "thit bo"],
+                                "thịt heo": ["thịt heo", "pork", "thịt lợn", "thit heo"],
+                                "gà": ["gà", "chicken", "gà ta", "ga"],
+                                "tôm": ["tôm", "shrimp", "tôm sú", "tom"],
+                            }
+                            
+                            # Check if product matches query intent
+                            matched = False
+                            for keyword in keywords_sorted[:2]:
+                                keyword_lower = keyword.lower()
+                                
+                                # Exact match
+                                if keyword_lower in product_name_lower:
+                                    matched = True
+                                    break
+                                
+                                # Synonym match
+                                for main_term, synonyms in synonym_map.items():
+                                    if keyword_lower in main_term or main_term in keyword_lower:
+                                        if any(syn in product_name_lower for syn in synonyms):
+                                            matched = True
+                                            break
+                                    if matched:
                                         break
+                                
                                 if matched:
                                     break
+                                
+                                # Fuzzy match (Levenshtein-like)
+                                if not matched and len(keyword_lower) >= 3:
+                                    try:
+                                        from difflib import SequenceMatcher
+                                        product_words = product_name_lower.split()
+                                        for word in product_words:
+                                            if len(word) >= 3:
+                                                similarity = SequenceMatcher(None, keyword_lower, word).ratio()
+                                                if similarity > 0.7:  # 70% similarity
+                                                    matched = True
+                                                    break
+                                        if matched:
+                                            break
+                                    except:
+                                        pass
                             
                             if matched:
-                                break
-                            
-                            # Fuzzy match (Levenshtein-like)
-                            if not matched and len(keyword_lower) >= 3:
-                                try:
-                                    from difflib import SequenceMatcher
-                                    product_words = product_name_lower.split()
-                                    for word in product_words:
-                                        if len(word) >= 3:
-                                            similarity = SequenceMatcher(None, keyword_lower, word).ratio()
-                                            if similarity > 0.7:  # 70% similarity
-                                                matched = True
-                                                break
-                                    if matched:
-                                        break
-                                except:
-                                    pass
+                                products.append({
+                                    "product_id": str(product_id),
+                                    "product_name": str(product_name),
+                                    "category_id": str(cat_id) if cat_id else "",
+                                    "category_name": str(cat_name) if cat_name else "",
+                                    "price": float(price) if price is not None else None,
+                                    "unit": str(don_vi_tinh) if don_vi_tinh else "",
+                                    "description": str(description) if description else "",
+                                    "similarity": relevance / 100.0,
+                                    "source": "sql_fuzzy_match"
+                                })
+                            else:
+                                self.log(f"⚠️ Fuzzy match rejected: '{product_name}' - no keyword match with {keywords_sorted[:2]}")
+                        
+                        cursor.close()
+                        return products
                         
-                        if matched:
-                            products.append({
-                                "product_id": str(product_id),
-                                "product_name": str(product_name),
-                                "category_id": str(cat_id) if cat_id else "",
-                                "category_name": str(cat_name) if cat_name else "",
-                                "price": float(price) if price is not None else None,
-                                "unit": str(don_vi_tinh) if don_vi_tinh else "",
-                                "description": str(description) if description else "",
-                                "similarity": relevance / 100.0,
-                                "source": "sql_fuzzy_match"
-                            })
-                        else:
-                            self.log(f"⚠️ Fuzzy match rejected: '{product_name}' - no keyword match with {keywords_sorted[:2]}")
-                    
-                    cursor.close()
-                    return products
-                    
                 except Exception as e:
                     self.log(f"Error in fuzzy SQL search: {str(e)}", level="error")
                     return []
-                finally:
-                    if conn:
-                        conn.close()
             
-            results = await asyncio.to_thread(search_in_db)
+            with span("sql.knowledge_fuzzy_match"):
+                results = await asyncio.to_thread(search_in_db)
             return results
             
         except Exception as e:
@@ -10,6 +10,7 @@ from app.agents.synthesis_agent import SynthesisAgent
 from app.agents.reasoning_synthesis_agent import ReasoningSynthesisAgent
 from app.agents.critic_agent import CriticAgent
 from app.core.settings import Settings
+from app.core.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -63,12 +64,43 @@ class MultiAgentOrchestrator:
         """
         Xử lý query qua Multi-Agent pipeline
         """
+        state = self._init_state(query, image_data, user_description, category_id, top_k, enable_critic)
+        
+        self.logger.info(f"🚀 Starting Multi-Agent pipeline for query: {query[:50]}...")
+        
+        try:
+            state = await self._run_routing(state)
+            state = await self._run_knowledge(state)
+            state = await self._run_downstream(state)
+        except Exception as e:
+            self.logger.error(f"❌ Error in Multi-Agent pipeline: {str(e)}", exc_info=True)
+            # Fallback answer
+            state["final_answer"] = "Xin lỗi, đã xảy ra lỗi khi xử lý câu hỏi của bạn. Vui lòng thử lại sau."
+            state["error"] = str(e)
+        
+        return state
+    
+    @staticmethod
+    async def _run_agent(agent, state: Dict[str, Any]) -> Dict[str, Any]:
+        """agent.process(state) trong span "agent.<AgentName>" (histogram + trace của request)"""
+        with span(f"agent.{agent.name}"):
+            return await agent.process(state)
+    
+    def _init_state(
+        self,
+        query: str,
+        image_data: Optional[bytes],
+        user_description: Optional[str],
+        category_id: Optional[str],
+        top_k: int,
+        enable_critic: Optional[bool]
+    ) -> Dict[str, Any]:
+        """Khởi tạo state cho một query"""
         # PERFORMANCE: Determine if Critic should run (confidence-based or env var)
         if enable_critic is None:
             enable_critic = Settings.ENABLE_CRITIC_AGENT
         
-        # Khởi tạo state
-        state = {
+        return {
             "query": query,
             "image_data": image_data,
             "user_description": user_description,
@@ -76,99 +108,107 @@ class MultiAgentOrchestrator:
             "top_k": top_k,
             "enable_critic": enable_critic
         }
+    
+    @staticmethod
+    def _knowledge_product_query(state: Dict[str, Any]) -> Optional[str]:
+        """Query dùng cho product search: entity từ Entity Resolver (đã normalize) hoặc sub-query"""
+        entity_query = state.get("entity_query")
+        sub_queries = state.get("sub_queries", {})
+        return entity_query or sub_queries.get("product_search") or sub_queries.get("product_info")
+    
+    async def _run_routing(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Router Agent + Entity Resolver Agent"""
+        #  Router Agent
+        self.logger.info("📍 Step 1: Router Agent")
+        state = await self._run_agent(self.router_agent, state)
         
-        self.logger.info(f"🚀 Starting Multi-Agent pipeline for query: {query[:50]}...")
+        #  BƯỚC 1: Entity Resolver Agent (nếu cần product search)
+        if state.get("needs_knowledge_agent", True):
+            self.logger.info("🔍 Step 1.5: Entity Resolver Agent")
+            state = await self._run_agent(self.entity_resolver_agent, state)
+            resolved_entity = state.get("entity_normalized")
+            if resolved_entity:
+                self.logger.info(f"✅ Resolved entity: '{resolved_entity}'")
+                # Override sub-query với normalized entity
+                if "sub_queries" in state:
+                    state["sub_queries"]["product_search"] = resolved_entity
+            else:
+                self.logger.warning(f"⚠️ Could not resolve entity from query: {state.get('query', '')[:50]}")
         
-        try:
-            #  Router Agent
-            self.logger.info("📍 Step 1: Router Agent")
-            state = await self.router_agent.process(state)
+        return state
+    
+    async def _run_knowledge(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Knowledge Agent (retry với tên sản phẩm trích từ query, hard guard khi không tìm thấy)"""
+        #  Knowledge Agent (nếu cần)
+        if state.get("needs_knowledge_agent", True):
+            self.logger.info("📚 Step 2: Knowledge Agent")
             
-            #  BƯỚC 1: Entity Resolver Agent (nếu cần product search)
-            if state.get("needs_knowledge_agent", True):
-                self.logger.info("🔍 Step 1.5: Entity Resolver Agent")
-                state = await self.entity_resolver_agent.process(state)
-                resolved_entity = state.get("entity_normalized")
-                if resolved_entity:
-                    self.logger.info(f"✅ Resolved entity: '{resolved_entity}'")
-                    # Override sub-query với normalized entity
-                    if "sub_queries" in state:
-                        state["sub_queries"]["product_search"] = resolved_entity
-                else:
-                    self.logger.warning(f"⚠️ Could not resolve entity from query: {state.get('query', '')[:50]}")
+            #  Sử dụng entity từ Entity Resolver hoặc sub-query
+            product_query = self._knowledge_product_query(state)
             
-            #  Knowledge Agent (nếu cần)
-            if state.get("needs_knowledge_agent", True):
-                self.logger.info("📚 Step 2: Knowledge Agent")
-                
-                #  Sử dụng entity từ Entity Resolver hoặc sub-query
-                entity_query = state.get("entity_query")  # Từ Entity Resolver (đã normalize)
-                sub_queries = state.get("sub_queries", {})
-                product_query = entity_query or sub_queries.get("product_search") or sub_queries.get("product_info")
-                
-                if product_query:
-                    self.logger.info(f"📚 Using sub-query for product search: '{product_query}' (original: '{state.get('query', '')[:50]}')")
-                    # Tạm thời override query với sub-query
-                    original_query = state.get("query", "")
-                    state["query"] = product_query
-                    state["_original_query"] = original_query  # Backup để restore sau
-                
-                # Error handling để không crash silent
-                knowledge_error = None
+            if product_query:
+                self.logger.info(f"📚 Using sub-query for product search: '{product_query}' (original: '{state.get('query', '')[:50]}')")
+                # Tạm thời override query với sub-query
+                original_query = state.get("query", "")
+                state["query"] = product_query
+                state["_original_query"] = original_query  # Backup để restore sau
+            
+            # Error handling để không crash silent
+            knowledge_error = None
+            try:
+                state = await self._run_agent(self.knowledge_agent, state)
+                knowledge_results_count = len(state.get('knowledge_results', []))
+            except Exception as e:
+                self.logger.exception("❌ KnowledgeAgent crashed")
+                knowledge_error = str(e)
+                state["knowledge_error"] = knowledge_error
+                state["knowledge_results"] = []
+                state["knowledge_context"] = ""
+                knowledge_results_count = 0
+            
+            #  Fallback retry nếu không tìm được (và không có error)
+            if knowledge_results_count == 0 and product_query and not knowledge_error:
+                self.logger.warning(f"⚠️ Knowledge Agent returned 0 results. Retrying with extracted keywords...")
+                # Extract keywords từ original query
                 try:
-                    state = await self.knowledge_agent.process(state)
-                    knowledge_results_count = len(state.get('knowledge_results', []))
-                except Exception as e:
-                    self.logger.exception("❌ KnowledgeAgent crashed")
-                    knowledge_error = str(e)
-                    state["knowledge_error"] = knowledge_error
-                    state["knowledge_results"] = []
-                    state["knowledge_context"] = ""
-                    knowledge_results_count = 0
-                
-                #  Fallback retry nếu không tìm được (và không có error)
-                if knowledge_results_count == 0 and product_query and not knowledge_error:
-                    self.logger.warning(f"⚠️ Knowledge Agent returned 0 results. Retrying with extracted keywords...")
-                    # Extract keywords từ original query
-                    try:
-                        extracted_product = self.knowledge_agent._extract_product_name_from_query(state.get("_original_query", product_query))
-                        if extracted_product and extracted_product != product_query:
-                            self.logger.info(f"🔄 Retrying with extracted product name: '{extracted_product}'")
-                            state["query"] = extracted_product
-                            retry_state = await self.knowledge_agent.process(state)
-                            if len(retry_state.get('knowledge_results', [])) > 0:
-                                state["knowledge_results"] = retry_state.get("knowledge_results", [])
-                                state["knowledge_context"] = retry_state.get("knowledge_context", "")
-                                knowledge_results_count = len(state.get('knowledge_results', []))
-                                self.logger.info(f"✅ Retry successful: {knowledge_results_count} products found")
-                    except Exception as retry_error:
-                        self.logger.warning(f"⚠️ Retry also failed: {str(retry_error)}")
-                
-                # Restore original query
-                if "_original_query" in state:
-                    state["query"] = state.pop("_original_query")
-                
-                self.logger.info(f"📚 Knowledge Agent results: {knowledge_results_count} products found")
-                
-                # Đảm bảo knowledge_results không bị mất
-                if knowledge_results_count > 0:
-                    product_names = [r.get("product_name", "N/A") for r in state.get('knowledge_results', [])[:3]]
-                    self.logger.info(f"📚 Products found: {', '.join(product_names)}")
+                    extracted_product = self.knowledge_agent._extract_product_name_from_query(state.get("_original_query", product_query))
+                    if extracted_product and extracted_product != product_query:
+                        self.logger.info(f"🔄 Retrying with extracted product name: '{extracted_product}'")
+                        state["query"] = extracted_product
+                        retry_state = await self._run_agent(self.knowledge_agent, state)
+                        if len(retry_state.get('knowledge_results', [])) > 0:
+                            state["knowledge_results"] = retry_state.get("knowledge_results", [])
+                            state["knowledge_context"] = retry_state.get("knowledge_context", "")
+                            knowledge_results_count = len(state.get('knowledge_results', []))
+                            self.logger.info(f"✅ Retry successful: {knowledge_results_count} products found")
+                except Exception as retry_error:
+                    self.logger.warning(f"⚠️ Retry also failed: {str(retry_error)}")
+            
+            # Restore original query
+            if "_original_query" in state:
+                state["query"] = state.pop("_original_query")
+            
+            self.logger.info(f"📚 Knowledge Agent results: {knowledge_results_count} products found")
+            
+            # Đảm bảo knowledge_results không bị mất
+            if knowledge_results_count > 0:
+                product_names = [r.get("product_name", "N/A") for r in state.get('knowledge_results', [])[:3]]
+                self.logger.info(f"📚 Products found: {', '.join(product_names)}")
+            else:
+                if knowledge_error:
+                    self.logger.error(f"❌ Knowledge Agent error: {knowledge_error}")
                 else:
-                    if knowledge_error:
-                        self.logger.error(f"❌ Knowledge Agent error: {knowledge_error}")
-                    else:
-                        self.logger.warning(f"⚠️ Knowledge Agent returned 0 results for query: {state.get('query', '')[:50]}")
-                    
-                    #  Nếu user hỏi về sản phẩm cụ thể nhưng không tìm được → return early
-                    original_query = state.get("_original_query") or state.get("query", "")
-                    resolved_entity = state.get("entity_normalized")
-                    if resolved_entity:
-                        # User hỏi về sản phẩm cụ thể nhưng không tìm được
-                        self.logger.warning(f"🛡️ Hard guard: No products found for entity '{resolved_entity}'. Setting early return flag.")
-                        state["entity_not_found"] = True
-                        state["early_return"] = True
-                        state["early_return_message"] = f"""Xin lỗi, hiện tại chúng tôi không tìm thấy sản phẩm **\"{resolved_entity}\"** trong hệ thống.
+                    self.logger.warning(f"⚠️ Knowledge Agent returned 0 results for query: {state.get('query', '')[:50]}")
+                
+                #  Nếu user hỏi về sản phẩm cụ thể nhưng không tìm được → return early
+                original_query = state.get("_original_query") or state.get("query", "")
+                resolved_entity = state.get("entity_normalized")
+                if resolved_entity:
+                    # User hỏi về sản phẩm cụ thể nhưng không tìm được
+                    self.logger.warning(f"🛡️ Hard guard: No products found for entity '{resolved_entity}'. Setting early return flag.")
+                    state["entity_not_found"] = True
+                    state["early_return"] = True
+                    state["early_return_message"] = f"""Xin lỗi, hiện tại chúng tôi không tìm thấy sản phẩm **\"{resolved_entity}\"** trong hệ thống.
 
 Bạn có thể thử:
 • Kiểm tra lại chính tả (ví dụ: \"cá hồi\", \"salmon\", \"thịt bò\")
@@ -178,31 +218,35 @@ Bạn có thể thử:
 Hoặc bạn muốn:
 1️⃣ Xem danh sách sản phẩm tương tự?
 2️⃣ Xem doanh thu tổng theo tháng của toàn cửa hàng?"""
-            else:
-                self.logger.info("⏭️  Skipping Knowledge Agent")
-            
-            # 🔥 PERFORMANCE: Parallel execution của Tool Agent và Reasoning Agent (nếu có thể)
-            needs_tool = state.get("needs_tool_agent", False)
-            needs_reasoning = state.get("needs_reasoning", False)
-            is_multi_intent = state.get("routing_decision", {}).get("is_multi_intent", False)
-            
-            # 🔥 FIX 3: Validate entity match trước khi Tool Agent chạy
-            knowledge_results = state.get("knowledge_results", [])
-            original_query = state.get("_original_query") or state.get("query", "")
-            
-            if knowledge_results and original_query:
-                validated_results = self._validate_product_entity(original_query, knowledge_results)
-                if len(validated_results) < len(knowledge_results):
-                    self.logger.warning(f"⚠️ Entity validation rejected {len(knowledge_results) - len(validated_results)} products due to entity mismatch")
-                    state["knowledge_results"] = validated_results
-                    if not validated_results:
-                        self.logger.error(f"❌ All products rejected by entity validation. Query: '{original_query[:50]}'")
-                        # 🔥 HARD GUARD: Set early return flag
-                        resolved_entity = state.get("entity_normalized")
-                        if resolved_entity:
-                            state["entity_not_found"] = True
-                            state["early_return"] = True
-                            state["early_return_message"] = f"""Xin lỗi, hiện tại chúng tôi không tìm thấy sản phẩm **\"{resolved_entity}\"** trong hệ thống.
+        else:
+            self.logger.info("⏭️  Skipping Knowledge Agent")
+        
+        return state
+    
+    async def _run_downstream(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Tool/Reasoning Agent, Synthesis (LLM) và Critic Agent"""
+        # 🔥 PERFORMANCE: Parallel execution của Tool Agent và Reasoning Agent (nếu có thể)
+        needs_tool = state.get("needs_tool_agent", False)
+        needs_reasoning = state.get("needs_reasoning", False)
+        is_multi_intent = state.get("routing_decision", {}).get("is_multi_intent", False)
+        
+        # 🔥 FIX 3: Validate entity match trước khi Tool Agent chạy
+        knowledge_results = state.get("knowledge_results", [])
+        original_query = state.get("_original_query") or state.get("query", "")
+        
+        if knowledge_results and original_query:
+            validated_results = self._validate_product_entity(original_query, knowledge_results)
+            if len(validated_results) < len(knowledge_results):
+                self.logger.warning(f"⚠️ Entity validation rejected {len(knowledge_results) - len(validated_results)} products due to entity mismatch")
+                state["knowledge_results"] = validated_results
+                if not validated_results:
+                    self.logger.error(f"❌ All products rejected by entity validation. Query: '{original_query[:50]}'")
+                    # 🔥 HARD GUARD: Set early return flag
+                    resolved_entity = state.get("entity_normalized")
+                    if resolved_entity:
+                        state["entity_not_found"] = True
+                        state["early_return"] = True
+                        state["early_return_message"] = f"""Xin lỗi, hiện tại chúng tôi không tìm thấy sản phẩm **\"{resolved_entity}\"** trong hệ thống.
 
 Bạn có thể thử:
 • Kiểm tra lại chính tả (ví dụ: \"cá hồi\", \"salmon\", \"thịt bò\")
@@ -212,150 +256,144 @@ Bạn có thể thử:
 Hoặc bạn muốn:
 1️⃣ Xem danh sách sản phẩm tương tự?
 2️⃣ Xem doanh thu tổng theo tháng của toàn cửa hàng?"""
-                        else:
-                            state["entity_not_found"] = True
-                            state["entity_query"] = original_query
-            
-            #  BACKUP knowledge_results trước khi Tool Agent chạy
-            knowledge_results_backup = state.get("knowledge_results", [])
-            
-            # PERFORMANCE: Parallel execution nếu Tool và Reasoning không phụ thuộc chặt
-            if needs_tool and needs_reasoning and Settings.ENABLE_PARALLEL_AGENTS and not is_multi_intent:
-                # Tool Agent và Reasoning Agent có thể chạy song song (nếu không phải multi-intent)
-                self.logger.info("⚡ Running Tool Agent and Reasoning Agent in parallel...")
-                tool_state = state.copy()
-                reasoning_state = state.copy()
-                
-                tool_task = self.tool_agent.process(tool_state)
-                reasoning_task = self.reasoning_agent.process(reasoning_state) if self.reasoning_agent else None
-                
-                if reasoning_task:
-                    tool_result, reasoning_result = await asyncio.gather(tool_task, reasoning_task)
-                    # Merge results
-                    state.update(tool_result)
-                    state.update(reasoning_result)
-                    self.logger.info(f"✅ Parallel execution completed: Tool ({len(state.get('tool_results', []))} functions), Reasoning")
-                else:
-                    state = await tool_task
-            else:
-                # Sequential execution (default hoặc multi-intent)
-                if needs_tool:
-                    self.logger.info("🔧 Step 3: Tool Agent")
-                    if is_multi_intent:
-                        self.logger.info(f"🔧 Multi-intent detected. Knowledge results available: {len(state.get('knowledge_results', []))}")
-                    
-                    state = await self.tool_agent.process(state)
-                    self.logger.info(f"🔧 Tool Agent executed. Results: {len(state.get('tool_results', []))} functions called")
-                    
-                    #  VALIDATION: Nếu có tool_results với product_id nhưng knowledge_results bị mất → restore
-                    tool_results = state.get("tool_results", [])
-                    if tool_results and len(knowledge_results_backup) > 0:
-                        for tool_result in tool_results:
-                            func_args = tool_result.get("arguments", {})
-                            product_id = func_args.get("productId") or func_args.get("product_id")
-                            if product_id:
-                                if len(state.get("knowledge_results", [])) == 0:
-                                    self.logger.warning(f"⚠️ Knowledge results lost but product_id {product_id} found in tool_results. Restoring...")
-                                    state["knowledge_results"] = knowledge_results_backup
-                                    self.logger.info(f"✅ Restored {len(knowledge_results_backup)} knowledge results")
-                                break
-                else:
-                    self.logger.info("⏭️  Skipping Tool Agent")
-                
-                # Reasoning Agent (nếu cần và chưa chạy parallel)
-                if needs_reasoning and not (needs_tool and Settings.ENABLE_PARALLEL_AGENTS and not is_multi_intent):
-                    self.logger.info("🧠 Step 4: Reasoning Agent")
-                    if self.reasoning_agent:
-                        state = await self.reasoning_agent.process(state)
                     else:
-                        self.logger.info("⏭️  Using merged ReasoningSynthesisAgent (will run later)")
-                else:
-                    self.logger.info("⏭️  Skipping Reasoning Agent")
-            
-            #  HARD GUARD: Nếu có early return flag → skip synthesis và return ngay
-            if state.get("early_return", False):
-                self.logger.info("🛡️ Hard guard triggered: Skipping synthesis due to missing entity data")
-                state["final_answer"] = state.get("early_return_message", "Xin lỗi, không tìm thấy thông tin phù hợp.")
-                state["answer_confidence"] = 0.0
-                self.logger.info("✅ Multi-Agent pipeline completed (early return)")
-                return state
-            
-            #  PERFORMANCE: Sử dụng merged ReasoningSynthesisAgent hoặc separate agents
-            #  LOG STATE TRƯỚC KHI SYNTHESIS (debug mâu thuẫn)
-            import json
-            knowledge_results_before = state.get("knowledge_results", [])
-            state_before_synthesis = {
-                "knowledge_results_count": len(knowledge_results_before),
-                "knowledge_results": [
-                    {
-                        "product_id": r.get("product_id"),
-                        "product_name": r.get("product_name"),
-                        "similarity": r.get("similarity")
-                    } 
-                    for r in knowledge_results_before[:3]
-                ],
-                "has_knowledge_context": bool(state.get("knowledge_context")),
-                "has_tool_context": bool(state.get("tool_context")),
-                "has_reasoning_context": bool(state.get("reasoning_context")),
-                "tool_results_count": len(state.get("tool_results", []))
-            }
-            self.logger.info(f"📊 STATE BEFORE SYNTHESIS: {json.dumps(state_before_synthesis, ensure_ascii=False, indent=2)}")
+                        state["entity_not_found"] = True
+                        state["entity_query"] = original_query
+        
+        #  BACKUP knowledge_results trước khi Tool Agent chạy
+        knowledge_results_backup = state.get("knowledge_results", [])
+        
+        # PERFORMANCE: Parallel execution nếu Tool và Reasoning không phụ thuộc chặt
+        if needs_tool and needs_reasoning and Settings.ENABLE_PARALLEL_AGENTS and not is_multi_intent:
+            # Tool Agent và Reasoning Agent có thể chạy song song (nếu không phải multi-intent)
+            self.logger.info("⚡ Running Tool Agent and Reasoning Agent in parallel...")
+            tool_state = state.copy()
+            reasoning_state = state.copy()
             
-            #  VALIDATION: Đảm bảo knowledge_results không bị mất trước khi synthesis
-            if len(knowledge_results_before) > 0:
-                self.logger.info(f"✅ Knowledge results available: {len(knowledge_results_before)} products")
-                product_names = [r.get("product_name", "N/A") for r in knowledge_results_before[:3]]
-                self.logger.info(f"✅ Product names: {', '.join(product_names)}")
-            else:
-                self.logger.warning(f"⚠️ No knowledge results before synthesis for query: {state.get('query', '')[:50]}")
+            tool_task = self._run_agent(self.tool_agent, tool_state)
+            reasoning_task = self._run_agent(self.reasoning_agent, reasoning_state) if self.reasoning_agent else None
             
-            #  PERFORMANCE: Sử dụng merged agent nếu có
-            if self.reasoning_synthesis_agent:
-                self.logger.info("🧠📝 Step 4-5: ReasoningSynthesisAgent (merged - 1 LLM call)")
-                state = await self.reasoning_synthesis_agent.process(state)
+            if reasoning_task:
+                tool_result, reasoning_result = await asyncio.gather(tool_task, reasoning_task)
+                # Merge results
+                state.update(tool_result)
+                state.update(reasoning_result)
+                self.logger.info(f"✅ Parallel execution completed: Tool ({len(state.get('tool_results', []))} functions), Reasoning")
             else:
-                # Fallback: Separate agents (nếu không dùng merged)
-                if needs_reasoning and self.reasoning_agent:
-                    self.logger.info("🧠 Step 4: Reasoning Agent")
-                    state = await self.reasoning_agent.process(state)
+                state = await tool_task
+        else:
+            # Sequential execution (default hoặc multi-intent)
+            if needs_tool:
+                self.logger.info("🔧 Step 3: Tool Agent")
+                if is_multi_intent:
+                    self.logger.info(f"🔧 Multi-intent detected. Knowledge results available: {len(state.get('knowledge_results', []))}")
                 
-                self.logger.info("📝 Step 5: Synthesis Agent")
-                state = await self.synthesis_agent.process(state)
-            
-            #  VALIDATION: Kiểm tra knowledge_results sau synthesis
-            knowledge_results_after = state.get("knowledge_results", [])
-            if len(knowledge_results_before) > 0 and len(knowledge_results_after) == 0:
-                self.logger.error(f"❌ CRITICAL: knowledge_results bị mất sau synthesis! Trước: {len(knowledge_results_before)}, Sau: {len(knowledge_results_after)}")
-                # Khôi phục knowledge_results
-                state["knowledge_results"] = knowledge_results_before
-                self.logger.info(f"✅ Restored {len(knowledge_results_before)} knowledge results")
-            
-            #  PERFORMANCE: Critic Agent chỉ chạy nếu enable và confidence thấp
-            answer_confidence = state.get("answer_confidence", 1.0)
-            should_run_critic = enable_critic and (
-                answer_confidence < Settings.CRITIC_CONFIDENCE_THRESHOLD or
-                state.get("entity_not_found", False) or
-                len(knowledge_results_before) == 0
-            )
-            
-            if should_run_critic:
-                self.logger.info(f"🔍 Step 6: Critic Agent (confidence: {answer_confidence:.2f} < {Settings.CRITIC_CONFIDENCE_THRESHOLD})")
-                state = await self.critic_agent.process(state)
+                state = await self._run_agent(self.tool_agent, state)
+                self.logger.info(f"🔧 Tool Agent executed. Results: {len(state.get('tool_results', []))} functions called")
                 
-                # Nếu có hallucination, có thể re-synthesize
-                if state.get("has_hallucination", False):
-                    self.logger.warning("⚠️  Hallucination detected, using verified answer")
-                    state["final_answer"] = state.get("final_answer_verified", state.get("final_answer", ""))
+                #  VALIDATION: Nếu có tool_results với product_id nhưng knowledge_results bị mất → restore
+                tool_results = state.get("tool_results", [])
+                if tool_results and len(knowledge_results_backup) > 0:
+                    for tool_result in tool_results:
+                        func_args = tool_result.get("arguments", {})
+                        product_id = func_args.get("productId") or func_args.get("product_id")
+                        if product_id:
+                            if len(state.get("knowledge_results", [])) == 0:
+                                self.logger.warning(f"⚠️ Knowledge results lost but product_id {product_id} found in tool_results. Restoring...")
+                                state["knowledge_results"] = knowledge_results_backup
+                                self.logger.info(f"✅ Restored {len(knowledge_results_backup)} knowledge results")
+                            break
+            else:
+                self.logger.info("⏭️  Skipping Tool Agent")
+            
+            # Reasoning Agent (nếu cần và chưa chạy parallel)
+            if needs_reasoning and not (needs_tool and Settings.ENABLE_PARALLEL_AGENTS and not is_multi_intent):
+                self.logger.info("🧠 Step 4: Reasoning Agent")
+                if self.reasoning_agent:
+                    state = await self._run_agent(self.reasoning_agent, state)
+                else:
+                    self.logger.info("⏭️  Using merged ReasoningSynthesisAgent (will run later)")
             else:
-                self.logger.info(f"⏭️  Skipping Critic Agent (confidence: {answer_confidence:.2f} >= {Settings.CRITIC_CONFIDENCE_THRESHOLD})")
+                self.logger.info("⏭️  Skipping Reasoning Agent")
+        
+        #  HARD GUARD: Nếu có early return flag → skip synthesis và return ngay
+        if state.get("early_return", False):
+            self.logger.info("🛡️ Hard guard triggered: Skipping synthesis due to missing entity data")
+            state["final_answer"] = state.get("early_return_message", "Xin lỗi, không tìm thấy thông tin phù hợp.")
+            state["answer_confidence"] = 0.0
+            self.logger.info("✅ Multi-Agent pipeline completed (early return)")
+            return state
+        
+        #  PERFORMANCE: Sử dụng merged ReasoningSynthesisAgent hoặc separate agents
+        #  LOG STATE TRƯỚC KHI SYNTHESIS (debug mâu thuẫn)
+        import json
+        knowledge_results_before = state.get("knowledge_results", [])
+        state_before_synthesis = {
+            "knowledge_results_count": len(knowledge_results_before),
+            "knowledge_results": [
+                {
+                    "product_id": r.get("product_id"),
+                    "product_name": r.get("product_name"),
+                    "similarity": r.get("similarity")
+                } 
+                for r in knowledge_results_before[:3]
+            ],
+            "has_knowledge_context": bool(state.get("knowledge_context")),
+            "has_tool_context": bool(state.get("tool_context")),
+            "has_reasoning_context": bool(state.get("reasoning_context")),
+            "tool_results_count": len(state.get("tool_results", []))
+        }
+        self.logger.info(f"📊 STATE BEFORE SYNTHESIS: {json.dumps(state_before_synthesis, ensure_ascii=False, indent=2)}")
+        
+        #  VALIDATION: Đảm bảo knowledge_results không bị mất trước khi synthesis
+        if len(knowledge_results_before) > 0:
+            self.logger.info(f"✅ Knowledge results available: {len(knowledge_results_before)} products")
+            product_names = [r.get("product_name", "N/A") for r in knowledge_results_before[:3]]
+            self.logger.info(f"✅ Product names: {', '.join(product_names)}")
+        else:
+            self.logger.warning(f"⚠️ No knowledge results before synthesis for query: {state.get('query', '')[:50]}")
+        
+        #  PERFORMANCE: Sử dụng merged agent nếu có
+        if self.reasoning_synthesis_agent:
+            self.logger.info("🧠📝 Step 4-5: ReasoningSynthesisAgent (merged - 1 LLM call)")
+            state = await self._run_agent(self.reasoning_synthesis_agent, state)
+        else:
+            # Fallback: Separate agents (nếu không dùng merged)
+            if needs_reasoning and self.reasoning_agent:
+                self.logger.info("🧠 Step 4: Reasoning Agent")
+                state = await self._run_agent(self.reasoning_agent, state)
             
-            self.logger.info("✅ Multi-Agent pipeline completed")
+            self.logger.info("📝 Step 5: Synthesis Agent")
+            state = await self._run_agent(self.synthesis_agent, state)
+        
+        #  VALIDATION: Kiểm tra knowledge_results sau synthesis
+        knowledge_results_after = state.get("knowledge_results", [])
+        if len(knowledge_results_before) > 0 and len(knowledge_results_after) == 0:
+            self.logger.error(f"❌ CRITICAL: knowledge_results bị mất sau synthesis! Trước: {len(knowledge_results_before)}, Sau: {len(knowledge_results_after)}")
+            # Khôi phục knowledge_results
+            state["knowledge_results"] = knowledge_results_before
+            self.logger.info(f"✅ Restored {len(knowledge_results_before)} knowledge results")
+        
+        #  PERFORMANCE: Critic Agent chỉ chạy nếu enable và confidence thấp
+        answer_confidence = state.get("answer_confidence", 1.0)
+        should_run_critic = state.get("enable_critic", False) and (
+            answer_confidence < Settings.CRITIC_CONFIDENCE_THRESHOLD or
+            state.get("entity_not_found", False) or
+            len(knowledge_results_before) == 0
+        )
+        
+        if should_run_critic:
+            self.logger.info(f"🔍 Step 6: Critic Agent (confidence: {answer_confidence:.2f} < {Settings.CRITIC_CONFIDENCE_THRESHOLD})")
+            state = await self._run_agent(self.critic_agent, state)
             
-        except Exception as e:
-            self.logger.error(f"❌ Error in Multi-Agent pipeline: {str(e)}", exc_info=True)
-            # Fallback answer
-            state["final_answer"] = "Xin lỗi, đã xảy ra lỗi khi xử lý câu hỏi của bạn. Vui lòng thử lại sau."
-            state["error"] = str(e)
+            # Nếu có hallucination, có thể re-synthesize
+            if state.get("has_hallucination", False):
+                self.logger.warning("⚠️  Hallucination detected, using verified answer")
+                state["final_answer"] = state.get("final_answer_verified", state.get("final_answer", ""))
+        else:
+            self.logger.info(f"⏭️  Skipping Critic Agent (confidence: {answer_confidence:.2f} >= {Settings.CRITIC_CONFIDENCE_THRESHOLD})")
+        
+        self.logger.info("✅ Multi-Agent pipeline completed")
         
         return state
     
@@ -365,31 +403,108 @@ Hoặc bạn muốn:
         max_concurrent: int = 3
     ) -> List[Dict[str, Any]]:
         """
-        Xử lý batch queries
+        Xử lý batch queries theo từng stage - cả batch đi hết một stage rồi mới sang stage tiếp:
+        1. Router + Entity Resolver cho mọi query
+        2. Prefetch text search: SQL exact/fuzzy cho cả batch, chỉ query SQL không tìm thấy mới đi tiếp
+           vector search (CLIP text embeddings một lần, multi-vector search theo (category, top_k))
+        3. Knowledge Agent (dùng thẳng kết quả đã prefetch)
+        4. Tool/Reasoning/Synthesis/Critic - chỉ bước này gọi LLM, giới hạn max_concurrent
+        Tool calls giống nhau (cùng function + arguments) trong batch chỉ thực thi một lần.
+        
+        Args:
+            queries: Danh sách kwargs của process() (query, image_data, category_id, top_k, ...)
+            max_concurrent: Số query chạy stage LLM đồng thời
+        
         Returns:
-            List of final states
+            List of final states (cùng thứ tự với queries)
         """
-        semaphore = asyncio.Semaphore(max_concurrent)
+        if not queries:
+            return []
+        import time
+        batch_start = time.time()
+        
+        states: List[Dict[str, Any]] = []
+        failed: Dict[int, Exception] = {}
+        tool_call_memo: Dict[str, Any] = {}
+        for i, query_dict in enumerate(queries):
+            try:
+                state = self._init_state(
+                    query_dict.get("query", ""),
+                    query_dict.get("image_data"),
+                    query_dict.get("user_description"),
+                    query_dict.get("category_id"),
+                    query_dict.get("top_k", 5),
+                    query_dict.get("enable_critic")
+                )
+            except Exception as e:
+                state = {}
+                failed[i] = e
+            state["_tool_call_memo"] = tool_call_memo
+            states.append(state)
+        
+        async def run_stage(name: str, stage, limit: int) -> None:
+            """Chạy một stage cho mọi query còn lại; query lỗi bị loại khỏi các stage sau"""
+            semaphore = asyncio.Semaphore(limit)
+            active = [i for i in range(len(states)) if i not in failed]
+            
+            async def run_one(i: int):
+                async with semaphore:
+                    return await stage(states[i])
+            
+            stage_start = time.time()
+            with span(f"batch.{name}", queries=len(active)):
+                results = await asyncio.gather(*(run_one(i) for i in active), return_exceptions=True)
+            for i, result in zip(active, results):
+                if isinstance(result, Exception):
+                    self.logger.error(f"Error processing query {i} ({name}): {str(result)}")
+                    failed[i] = result
+                else:
+                    states[i] = result
+            self.logger.info(f"⚡ Batch stage '{name}': {len(active)} queries in {time.time() - stage_start:.2f}s")
+        
+        stage_limit = max(max_concurrent, Settings.ORCHESTRATOR_BATCH_STAGE_CONCURRENCY)
+        await run_stage("routing", self._run_routing, stage_limit)
+        
+        # SQL cho cả batch, rồi một lần encode + multi-vector search cho các query SQL không tìm thấy
+        searches = []
+        search_states = []
+        for i, state in enumerate(states):
+            if i in failed or not state.get("needs_knowledge_agent", True):
+                continue
+            if state.get("query_type", "text") in ("text", "hybrid"):
+                search_text = self._knowledge_product_query(state) or state.get("query", "").strip() or state.get("user_description", "")
+                searches.append((search_text, state.get("category_id"), state.get("top_k", 5)))
+                search_states.append(state)
+        if searches:
+            try:
+                prefetched = await self.knowledge_agent.prefetch_text_searches(searches, max_concurrent=stage_limit)
+                for state in search_states:
+                    state["_knowledge_prefetch"] = prefetched
+            except Exception as e:
+                # Prefetch chỉ để tăng tốc: Knowledge Agent vẫn tự search từng query
+                self.logger.warning(f"⚠️ Batch text search prefetch failed: {str(e)}")
         
-        async def process_with_semaphore(query_dict):
-            async with semaphore:
-                return await self.process(**query_dict)
+        await run_stage("knowledge", self._run_knowledge, stage_limit)
         
-        tasks = [process_with_semaphore(q) for q in queries]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        await run_stage("synthesis", self._run_downstream, max_concurrent)
         
-        # Xử lý exceptions
         final_results = []
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                self.logger.error(f"Error processing query {i}: {str(result)}")
+        for i, state in enumerate(states):
+            state.pop("_tool_call_memo", None)
+            state.pop("_knowledge_prefetch", None)
+            if i in failed:
                 final_results.append({
+                    **state,
                     "final_answer": "Xin lỗi, đã xảy ra lỗi khi xử lý câu hỏi.",
-                    "error": str(result)
+                    "error": str(failed[i])
                 })
             else:
-                final_results.append(result)
+                final_results.append(state)
         
+        self.logger.info(
+            f"✅ Batch completed: {len(queries)} queries in {time.time() - batch_start:.2f}s "
+            f"({len(failed)} errors, {len(tool_call_memo)} distinct tool calls)"
+        )
         return final_results
     
     def _validate_product_entity(self, user_query: str, knowledge_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -1,9 +1,17 @@
 """
 Router Agent - Phân loại câu hỏi và quyết định luồng xử lý
 """
-import re
 from typing import Dict, Any, Optional
 from app.agents.base_agent import BaseAgent
+from app.agents.router_engine import (
+    RouterEngine,
+    get_router_engine,
+    STATS_WORD_REGEX,
+    STATS_STOPWORDS_REGEX,
+    PRODUCT_NAME_REGEX,
+    WHITESPACE_REGEX,
+)
+from app.core.settings import Settings
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,8 +25,10 @@ class RouterAgent(BaseAgent):
     - Độ ưu tiên của từng agent
     """
     
-    def __init__(self):
+    def __init__(self, engine: Optional[RouterEngine] = None):
         super().__init__("RouterAgent")
+        # Engine dùng chung: patterns compile một lần, memoize theo query
+        self.engine = engine or get_router_engine()
     
     async def process(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -46,6 +56,12 @@ class RouterAgent(BaseAgent):
         original_query = query or user_description
         intent = self._analyze_intent(original_query)
         
+        # Fallback nearest-centroid khi regex không nhận ra intent
+        if intent.get("type") == "unknown" and original_query and Settings.ROUTER_EMBEDDING_FALLBACK:
+            centroid_intent = await self.engine.classify_by_centroid(original_query)
+            if centroid_intent:
+                intent = centroid_intent
+        
         # Decompose query thành sub-queries theo intent
         sub_queries = self._decompose_query(original_query, intent)
         
@@ -78,102 +94,8 @@ class RouterAgent(BaseAgent):
         return state
     
     def _analyze_intent(self, text: str) -> Dict[str, Any]:
-        """Phân tích intent từ text query - HỖ TRỢ MULTI-INTENT"""
-        if not text:
-            return {"type": "unknown", "confidence": 0.0, "intents": []}
-        
-        text_lower = text.lower()
-        
-        # Intent patterns
-        intents = {
-            "product_search": {
-                "patterns": [
-                    r"\b(tìm|tìm kiếm|search|mua|bán|sản phẩm|món|rau|củ|trái cây|thịt|cá)\b",
-                    r"\b(có gì|bán gì|món nào|sản phẩm nào)\b",
-                    r"\b(giá|price|cost)\b.*\b(của|về)\b",
-                    r"\b(lấy|hiển thị|show|display)\b.*\b(ảnh|hình|image|picture)\b",
-                    r"\b(lấy ra|lấy)\b.*\b(hình ảnh|ảnh|hình)\b",  # "lấy ra hình ảnh"
-                    r"\b(hình ảnh|ảnh|image)\b",
-                ],
-                "confidence": 0.9
-            },
-            "product_info": {
-                "patterns": [
-                    r"\b(thông tin|info|chi tiết|mô tả)\b.*\b(sản phẩm|món)\b",
-                    r"\b(nguồn gốc|xuất xứ|origin)\b",
-                    r"\b(hết hạn|expiry|ngày sản xuất)\b",
-                ],
-                "confidence": 0.8
-            },
-            "order_status": {
-                "patterns": [
-                    r"\b(đơn hàng|order|trạng thái|status)\b",
-                    r"\b(khi nào|bao giờ|lúc nào)\b.*\b(giao|nhận)\b",
-                    r"\b(mã đơn|order id)\b",
-                ],
-                "confidence": 0.9
-            },
-            "price_question": {
-                "patterns": [
-                    r"\b(giá|price|cost|tiền|phí)\b",
-                    r"\b(bao nhiêu|nhiều tiền|chi phí)\b",
-                ],
-                "confidence": 0.8
-            },
-            "delivery_question": {
-                "patterns": [
-                    r"\b(giao hàng|delivery|ship|vận chuyển)\b",
-                    r"\b(phí ship|phí giao|shipping fee)\b",
-                ],
-                "confidence": 0.8
-            },
-            "sales_statistics": {
-                "patterns": [
-                    r"\b(doanh số|doanh thu|revenue|sales)\b",
-                    r"\b(thống kê|statistics|báo cáo|report)\b",
-                    r"\b(doanh thu|doanh số)\b.*\b(theo tháng|monthly|theo năm|yearly)\b",  # "doanh thu theo tháng"
-                    r"\b(theo tháng|monthly|theo năm|yearly)\b.*\b(của nó|của|nó)\b",  # "theo tháng của nó"
-                    r"\b(tổng doanh thu|total revenue)\b",
-                ],
-                "confidence": 0.9
-            },
-            "general_chat": {
-                "patterns": [
-                    r"\b(chào|hello|hi|xin chào)\b",
-                    r"\b(cảm ơn|thank|thanks)\b",
-                    r"\b(tạm biệt|goodbye|bye)\b",
-                ],
-                "confidence": 0.7
-            }
-        }
-        
-        # PHÁT HIỆN MULTI-INTENT (có thể có nhiều intent trong 1 query)
-        detected_intents = []
-        
-        for intent_name, intent_data in intents.items():
-            for pattern in intent_data["patterns"]:
-                if re.search(pattern, text_lower):
-                    detected_intents.append({
-                        "type": intent_name,
-                        "confidence": intent_data["confidence"]
-                    })
-                    break  # Mỗi intent chỉ cần match 1 pattern
-        
-        # Nếu có nhiều intent → multi-intent
-        if len(detected_intents) > 1:
-            # Sắp xếp theo confidence
-            detected_intents.sort(key=lambda x: x["confidence"], reverse=True)
-            return {
-                "type": "multi_intent",
-                "confidence": max([i["confidence"] for i in detected_intents]),
-                "intents": detected_intents,
-                "primary_intent": detected_intents[0]["type"],
-                "secondary_intents": [i["type"] for i in detected_intents[1:]]
-            }
-        elif len(detected_intents) == 1:
-            return detected_intents[0]
-        else:
-            return {"type": "unknown", "confidence": 0.0, "intents": []}
+        """Phân tích intent từ text query - HỖ TRỢ MULTI-INTENT (qua RouterEngine)"""
+        return self.engine.classify(text)
     
     def _decompose_query(self, query: str, intent: Dict[str, Any]) -> Dict[str, str]:
         """
@@ -195,27 +117,6 @@ class RouterAgent(BaseAgent):
         sub_queries = {}
         query_lower = query.lower()
         
-        # Extract product query 
-        product_keywords = []
-        stats_keywords = []
-        
-        # Từ khóa liên quan đến product search
-        product_patterns = [
-            r"\b(hình\s*ảnh|ảnh|hình|image|picture)\b",
-            r"\b(lấy|hiển thị|show|display|tìm|tìm kiếm)\b",
-            r"\b(sản phẩm|món|rau|củ|trái cây|thịt|cá|gà|tôm)\b",
-        ]
-        
-        # Từ khóa liên quan đến sales statistics
-        stats_patterns = [
-            r"\b(doanh\s*thu|doanh\s*số|revenue|sales)\b",
-            r"\b(theo\s*tháng|monthly|thống\s*kê|statistics)\b",
-            r"\b(năm|year)\s*\d{4}\b",
-        ]
-        
-        # Tách query thành 2 phần
-        import re
-        
         # Tìm phần product query (trước "và" hoặc "của")
         product_part = query
         if " và " in query_lower:
@@ -234,7 +135,7 @@ class RouterAgent(BaseAgent):
             
             for word in words:
                 word_lower = word.lower()
-                is_stats = any(re.search(pattern, word_lower) for pattern in stats_patterns)
+                is_stats = STATS_WORD_REGEX.search(word_lower) is not None
                 if is_stats:
                     stats_words.append(word)
                 else:
@@ -267,45 +168,22 @@ class RouterAgent(BaseAgent):
     
     def _normalize_product_query(self, query: str) -> str:
         """Normalize product query - loại bỏ từ khóa không liên quan đến product"""
-        import re
-        
         # Loại bỏ từ khóa liên quan đến stats
-        stats_stopwords = [
-            r"\bdoanh\s*thu\b", r"\bdoanh\s*số\b", r"\btheo\s*tháng\b",
-            r"\bthống\s*kê\b", r"\bnăm\s*\d{4}\b", r"\brevenue\b", r"\bsales\b"
-        ]
-        
-        normalized = query
-        for pattern in stats_stopwords:
-            normalized = re.sub(pattern, "", normalized, flags=re.IGNORECASE)
+        normalized = STATS_STOPWORDS_REGEX.sub("", query)
         
         # Clean up multiple spaces
-        normalized = re.sub(r'\s+', ' ', normalized).strip()
+        normalized = WHITESPACE_REGEX.sub(' ', normalized).strip()
         
         return normalized if normalized else query
     
     def _normalize_stats_query(self, query: str) -> str:
         """Normalize stats query - giữ lại từ khóa liên quan đến stats"""
-        import re
-        
         # Extract keywords liên quan đến stats
-        stats_keywords = []
-        words = query.split()
-        
-        stats_patterns = [
-            r"\b(doanh\s*thu|doanh\s*số|revenue|sales)\b",
-            r"\b(theo\s*tháng|monthly|thống\s*kê|statistics)\b",
-            r"\b(năm|year)\s*\d{4}\b",
-        ]
-        
-        for word in words:
-            word_lower = word.lower()
-            if any(re.search(pattern, word_lower) for pattern in stats_patterns):
-                stats_keywords.append(word)
+        stats_keywords = [word for word in query.split() if STATS_WORD_REGEX.search(word.lower())]
         
         # Thêm product name nếu có (để tool agent biết query cho sản phẩm nào)
         # Extract product name từ query gốc
-        product_name_match = re.search(r'\b(cá\s*hồi|thịt\s*bò|rau\s*cải|gà|tôm)\b', query, re.IGNORECASE)
+        product_name_match = PRODUCT_NAME_REGEX.search(query)
         if product_name_match:
             stats_keywords.append(product_name_match.group(0))
         
@@ -0,0 +1,280 @@
+"""
+Router Engine - Engine phân loại intent đã compile sẵn cho Router Agent
+
+- Patterns của mỗi intent được compile MỘT lần khi import thành một alternation duy nhất
+  (7 lần search thay vì tối đa ~25 lần re.search với patterns dựng lại mỗi lần gọi)
+- Kết quả được memoize theo query đã normalize
+- Fallback tùy chọn: nearest-centroid trên text embeddings (CLIP) khi regex không nhận ra intent
+"""
+import logging
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.cache import get_cache
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# ========== Intent patterns ==========
+# Thứ tự intents giữ nguyên như trước (ảnh hưởng thứ tự khi confidence bằng nhau)
+INTENT_PATTERNS: Dict[str, Dict[str, Any]] = {
+    "product_search": {
+        "patterns": [
+            r"\b(tìm|tìm kiếm|search|mua|bán|sản phẩm|món|rau|củ|trái cây|thịt|cá)\b",
+            r"\b(có gì|bán gì|món nào|sản phẩm nào)\b",
+            r"\b(giá|price|cost)\b.*\b(của|về)\b",
+            r"\b(lấy|hiển thị|show|display)\b.*\b(ảnh|hình|image|picture)\b",
+            r"\b(lấy ra|lấy)\b.*\b(hình ảnh|ảnh|hình)\b",  # "lấy ra hình ảnh"
+            r"\b(hình ảnh|ảnh|image)\b",
+        ],
+        "confidence": 0.9
+    },
+    "product_info": {
+        "patterns": [
+            r"\b(thông tin|info|chi tiết|mô tả)\b.*\b(sản phẩm|món)\b",
+            r"\b(nguồn gốc|xuất xứ|origin)\b",
+            r"\b(hết hạn|expiry|ngày sản xuất)\b",
+        ],
+        "confidence": 0.8
+    },
+    "order_status": {
+        "patterns": [
+            r"\b(đơn hàng|order|trạng thái|status)\b",
+            r"\b(khi nào|bao giờ|lúc nào)\b.*\b(giao|nhận)\b",
+            r"\b(mã đơn|order id)\b",
+        ],
+        "confidence": 0.9
+    },
+    "price_question": {
+        "patterns": [
+            r"\b(giá|price|cost|tiền|phí)\b",
+            r"\b(bao nhiêu|nhiều tiền|chi phí)\b",
+        ],
+        "confidence": 0.8
+    },
+    "delivery_question": {
+        "patterns": [
+            r"\b(giao hàng|delivery|ship|vận chuyển)\b",
+            r"\b(phí ship|phí giao|shipping fee)\b",
+        ],
+        "confidence": 0.8
+    },
+    "sales_statistics": {
+        "patterns": [
+            r"\b(doanh số|doanh thu|revenue|sales)\b",
+            r"\b(thống kê|statistics|báo cáo|report)\b",
+            r"\b(doanh thu|doanh số)\b.*\b(theo tháng|monthly|theo năm|yearly)\b",  # "doanh thu theo tháng"
+            r"\b(theo tháng|monthly|theo năm|yearly)\b.*\b(của nó|của|nó)\b",  # "theo tháng của nó"
+            r"\b(tổng doanh thu|total revenue)\b",
+        ],
+        "confidence": 0.9
+    },
+    "general_chat": {
+        "patterns": [
+            r"\b(chào|hello|hi|xin chào)\b",
+            r"\b(cảm ơn|thank|thanks)\b",
+            r"\b(tạm biệt|goodbye|bye)\b",
+        ],
+        "confidence": 0.7
+    }
+}
+
+# Câu mẫu cho nearest-centroid fallback
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "product_search": ["tìm sản phẩm cá hồi", "cửa hàng có bán rau sạch không", "cho tôi xem ảnh thịt bò"],
+    "product_info": ["thông tin chi tiết sản phẩm", "sản phẩm này có nguồn gốc từ đâu", "ngày hết hạn của sản phẩm"],
+    "order_status": ["đơn hàng của tôi đang ở đâu", "kiểm tra trạng thái đơn hàng", "khi nào tôi nhận được hàng"],
+    "price_question": ["giá bao nhiêu", "sản phẩm này bao nhiêu tiền", "chi phí là bao nhiêu"],
+    "delivery_question": ["phí giao hàng là bao nhiêu", "có giao hàng tận nơi không", "thời gian vận chuyển"],
+    "sales_statistics": ["doanh thu theo tháng", "thống kê doanh số năm nay", "báo cáo tổng doanh thu"],
+    "general_chat": ["xin chào", "cảm ơn bạn", "tạm biệt"],
+}
+
+
+def _build_intent_regexes(intent_patterns: Dict[str, Dict[str, Any]]) -> Dict[str, "re.Pattern"]:
+    """
+    Gộp patterns của từng intent thành một alternation đã compile.
+    Không gộp tất cả intents vào một regex: các intents có thể match chồng lên nhau
+    (vd "giá ... của"), và lookahead cho từng intent chậm hơn search riêng trên CPython.
+    """
+    return {
+        intent_name: re.compile("|".join(f"(?:{pattern})" for pattern in intent_data["patterns"]))
+        for intent_name, intent_data in intent_patterns.items()
+    }
+
+
+INTENT_REGEXES = _build_intent_regexes(INTENT_PATTERNS)
+
+# ========== Patterns cho decompose/normalize (compile một lần) ==========
+STATS_WORD_REGEX = re.compile(
+    r"\b(doanh\s*thu|doanh\s*số|revenue|sales)\b"
+    r"|\b(theo\s*tháng|monthly|thống\s*kê|statistics)\b"
+    r"|\b(năm|year)\s*\d{4}\b"
+)
+STATS_STOPWORDS_REGEX = re.compile(
+    r"\bdoanh\s*thu\b|\bdoanh\s*số\b|\btheo\s*tháng\b|\bthống\s*kê\b|\bnăm\s*\d{4}\b|\brevenue\b|\bsales\b",
+    re.IGNORECASE
+)
+PRODUCT_NAME_REGEX = re.compile(r"\b(cá\s*hồi|thịt\s*bò|rau\s*cải|gà|tôm)\b", re.IGNORECASE)
+WHITESPACE_REGEX = re.compile(r"\s+")
+# Khoảng trắng trừ xuống dòng: ".*" trong patterns không vượt qua dòng, gộp "\n" sẽ đổi kết quả match
+HORIZONTAL_WHITESPACE_REGEX = re.compile(r"[^\S\n]+")
+
+
+class RouterEngine:
+    """
+    Engine phân loại intent:
+    - classify(): search trên các alternation đã compile + memoize theo query đã normalize
+    - classify_by_centroid(): fallback nearest-centroid (vectorized) trên text embeddings
+    """
+
+    def __init__(self, embed_fn: Optional[Callable[[str], Optional[np.ndarray]]] = None):
+        """
+        Args:
+            embed_fn: Hàm tạo text embedding cho centroid fallback
+                      (mặc định: CLIP text encoder của ImageEmbeddingService)
+        """
+        self._embed_fn = embed_fn
+        self._centroids: Optional[np.ndarray] = None
+        self._centroid_labels: List[str] = []
+        self._centroid_lock = threading.Lock()
+
+        # Memoize qua cache registry (dùng chung cho process, có stats)
+        self._classify_cached = get_cache("router_intent").memoize(self._classify_impl)
+        self._centroid_cached = get_cache("router_centroid").memoize(self._centroid_lookup)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize query làm key memoize (lowercase, gộp khoảng trắng trong từng dòng, giữ xuống dòng)"""
+        lines = (HORIZONTAL_WHITESPACE_REGEX.sub(" ", line).strip() for line in text.lower().split("\n"))
+        return "\n".join(line for line in lines if line)
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        """Phân tích intent từ text query - HỖ TRỢ MULTI-INTENT"""
+        if not text:
+            return {"type": "unknown", "confidence": 0.0, "intents": []}
+        result = self._classify_cached(self.normalize(text))
+        # Trả bản copy để caller có thể sửa intent mà không làm bẩn cache
+        copied = dict(result)
+        if "intents" in copied:
+            copied["intents"] = [dict(i) for i in copied["intents"]]
+        if "secondary_intents" in copied:
+            copied["secondary_intents"] = list(copied["secondary_intents"])
+        return copied
+
+    def _classify_impl(self, text_lower: str) -> Dict[str, Any]:
+        detected_intents = [
+            {"type": intent_name, "confidence": INTENT_PATTERNS[intent_name]["confidence"]}
+            for intent_name, regex in INTENT_REGEXES.items()
+            if regex.search(text_lower)
+        ]
+
+        # Nếu có nhiều intent → multi-intent
+        if len(detected_intents) > 1:
+            # Sắp xếp theo confidence
+            detected_intents.sort(key=lambda x: x["confidence"], reverse=True)
+            return {
+                "type": "multi_intent",
+                "confidence": max(i["confidence"] for i in detected_intents),
+                "intents": detected_intents,
+                "primary_intent": detected_intents[0]["type"],
+                "secondary_intents": [i["type"] for i in detected_intents[1:]]
+            }
+        elif len(detected_intents) == 1:
+            return detected_intents[0]
+        return {"type": "unknown", "confidence": 0.0, "intents": []}
+
+    # ========== Nearest-centroid fallback ==========
+
+    def _default_embed(self, text: str) -> Optional[np.ndarray]:
+        from app.api.deps import get_image_embedding_service
+        return get_image_embedding_service().create_text_embedding(text)
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        embed_fn = self._embed_fn or self._default_embed
+        embedding = embed_fn(text)
+        if embedding is None:
+            return None
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else None
+
+    def _ensure_centroids(self) -> bool:
+        if self._centroids is not None:
+            return True
+        # Các request đầu tiên chạy song song trên inference pool: chỉ một thread tính centroids
+        with self._centroid_lock:
+            if self._centroids is not None:
+                return True
+            return self._build_centroids()
+
+    def _build_centroids(self) -> bool:
+        labels, rows = [], []
+        for intent_name, examples in INTENT_EXAMPLES.items():
+            vectors = [v for v in (self._embed(example) for example in examples) if v is not None]
+            if not vectors:
+                continue
+            centroid = np.mean(vectors, axis=0)
+            centroid /= (np.linalg.norm(centroid) or 1.0)
+            labels.append(intent_name)
+            rows.append(centroid)
+        if not rows:
+            return False
+        self._centroid_labels = labels
+        self._centroids = np.vstack(rows).astype(np.float32)
+        logger.info(f"✅ Router centroids built for {len(labels)} intents")
+        return True
+
+    def _centroid_lookup(self, text_lower: str) -> Optional[tuple]:
+        if not self._ensure_centroids():
+            return None
+        query_vec = self._embed(text_lower)
+        if query_vec is None:
+            return None
+        # Một phép nhân ma trận cho tất cả centroids
+        similarities = self._centroids @ query_vec
+        best = int(np.argmax(similarities))
+        return self._centroid_labels[best], float(similarities[best])
+
+    async def classify_by_centroid(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Phân loại intent bằng nearest-centroid khi regex không nhận ra intent.
+        Trả về None nếu similarity dưới ROUTER_CENTROID_THRESHOLD hoặc lỗi embedding.
+        """
+        if not text:
+            return None
+        from app.services.inference import MODEL_CLIP, run_inference
+        try:
+            result = await run_inference(MODEL_CLIP, self._centroid_cached, self.normalize(text))
+        except Exception as e:
+            logger.warning(f"⚠️ Router centroid fallback failed: {str(e)}")
+            return None
+        if not result:
+            return None
+        intent_name, similarity = result
+        if similarity < Settings.ROUTER_CENTROID_THRESHOLD:
+            return None
+        return {
+            "type": intent_name,
+            "confidence": round(min(similarity, INTENT_PATTERNS[intent_name]["confidence"]), 3),
+            "source": "centroid"
+        }
+
+
+_router_engine: Optional[RouterEngine] = None
+
+
+def get_router_engine() -> RouterEngine:
+    """
+    Lấy instance của RouterEngine (singleton) để memoize dùng chung giữa các RouterAgent
+
+    Returns:
+        RouterEngine instance
+    """
+    global _router_engine
+    if _router_engine is None:
+        _router_engine = RouterEngine()
+    return _router_engine
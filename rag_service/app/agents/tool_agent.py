@@ -2,6 +2,8 @@
 Tool Agent - Function calling để query database và các tools khác
 """
 from typing import Dict, Any, List, Optional
+import asyncio
+import json
 import logging
 from app.agents.base_agent import BaseAgent
 from app.services.function.function_handler import FunctionHandler
@@ -19,17 +21,15 @@ class ToolAgent(BaseAgent):
     """
     
     def __init__(self, function_handler: Optional[FunctionHandler] = None):
+        """
+        Args:
+            function_handler: FunctionHandler dùng chung (deps.get_function_handler() inject khi dựng agent graph);
+                              None = chưa cấu hình database
+        """
         super().__init__("ToolAgent")
-        if function_handler is None:
-            # Lấy connection string từ Settings
-            connection_string = Settings.DATABASE_CONNECTION_STRING
-            if not connection_string:
-                logger.warning("DATABASE_CONNECTION_STRING not found in settings. Tool Agent will not be able to query database.")
-                self.function_handler = None
-            else:
-                self.function_handler = FunctionHandler(connection_string)
-        else:
-            self.function_handler = function_handler
+        self.function_handler = function_handler
+        if self.function_handler is None:
+            logger.warning("Database not configured (DATABASE_BACKEND / DATABASE_CONNECTION_STRING). Tool Agent will not be able to query database.")
     
     async def process(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -56,20 +56,15 @@ class ToolAgent(BaseAgent):
             # Quyết định functions cần gọi dựa trên intent
             functions_to_call = self._determine_functions(intent_type, query, knowledge_results)
             
-            # Gọi functions
-            for func_name, func_args in functions_to_call:
-                self.log(f"🔧 Calling function: {func_name} with args: {func_args}")
-                
-                try:
-                    result = await self._call_function(func_name, func_args)
-                    if result:
-                        tool_results.append({
-                            "function": func_name,
-                            "arguments": func_args,
-                            "result": result
-                        })
-                except Exception as e:
-                    self.log(f"❌ Error calling function {func_name}: {str(e)}", level="error")
+            # Gọi functions song song (giới hạn concurrency, có deadline cho từng call)
+            results = await self._call_functions(functions_to_call, state.get("_tool_call_memo"))
+            for (func_name, func_args), result in zip(functions_to_call, results):
+                if result:
+                    tool_results.append({
+                        "function": func_name,
+                        "arguments": func_args,
+                        "result": result
+                    })
             
             # Format context
             tool_context = self._format_context(tool_results)
@@ -201,6 +196,67 @@ class ToolAgent(BaseAgent):
             return match.group(1)
         return None
     
+    async def _call_functions(
+        self,
+        functions_to_call: List[tuple],
+        memo: Optional[Dict[str, "asyncio.Future"]] = None
+    ) -> List[Optional[Any]]:
+        """
+        Gọi các functions độc lập song song
+        
+        - Tối đa TOOL_AGENT_MAX_CONCURRENCY calls cùng lúc cho mỗi request
+        - Calls giống nhau (cùng function + arguments) chỉ thực thi một lần
+        - Call vượt quá TOOL_CALL_TIMEOUT_SECONDS bị bỏ qua (None), không giữ chân các call khác
+        
+        Returns:
+            Kết quả theo thứ tự functions_to_call (None nếu lỗi/timeout)
+        """
+        if not functions_to_call:
+            return []
+        if memo is None:
+            memo = {}
+        semaphore = asyncio.Semaphore(max(1, Settings.TOOL_AGENT_MAX_CONCURRENCY))
+        timeout = Settings.TOOL_CALL_TIMEOUT_SECONDS
+        
+        async def call(func_name: str, func_args: Dict[str, Any]) -> Optional[Any]:
+            async with semaphore:
+                self.log(f"🔧 Calling function: {func_name} with args: {func_args}")
+                try:
+                    return await asyncio.wait_for(
+                        self._call_function_shared(func_name, func_args, memo),
+                        timeout=timeout if timeout > 0 else None
+                    )
+                except asyncio.TimeoutError:
+                    self.log(f"⏱️ Function {func_name} exceeded {timeout:.1f}s deadline, skipping", level="warning")
+                except Exception as e:
+                    self.log(f"❌ Error calling function {func_name}: {str(e)}", level="error")
+                return None
+        
+        return list(await asyncio.gather(*(call(func_name, func_args) for func_name, func_args in functions_to_call)))
+    
+    async def _call_function_shared(
+        self,
+        func_name: str,
+        func_args: Dict[str, Any],
+        memo: Optional[Dict[str, "asyncio.Future"]]
+    ) -> Optional[Any]:
+        """
+        Gọi function, dùng chung kết quả giữa các queries trong cùng batch
+        
+        memo: của request, hoặc của cả batch (MultiAgentOrchestrator.process_batch đặt vào
+        state["_tool_call_memo"]) - cùng function + arguments chỉ thực thi một lần, các call sau chờ kết quả đó
+        """
+        if memo is None:
+            return await self._call_function(func_name, func_args)
+        key = f"{func_name}:{json.dumps(func_args, sort_keys=True, ensure_ascii=False, default=str)}"
+        task = memo.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call_function(func_name, func_args))
+            memo[key] = task
+        else:
+            self.log(f"♻️ Reusing batch result for {func_name}")
+        return await asyncio.shield(task)
+    
     async def _call_function(self, func_name: str, func_args: Dict[str, Any]) -> Optional[Any]:
         """Gọi function thông qua FunctionHandler"""
         try:
@@ -216,6 +272,10 @@ class ToolAgent(BaseAgent):
                 "get_product_price": "_get_product_price",
             }
             
+            # Chạy trong thread pool của FunctionHandler để các SQL calls song song thật sự
+            if hasattr(self.function_handler, "execute_function_threaded"):
+                return await self.function_handler.execute_function_threaded(func_name, func_args)
+            
             # Sử dụng execute_function nếu có
             if hasattr(self.function_handler, "execute_function"):
                 return await self.function_handler.execute_function(func_name, func_args)
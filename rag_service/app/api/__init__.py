@@ -1,6 +1,6 @@
 # API package
 from fastapi import APIRouter
-from app.api.routes import document, query, function, health, image, product, multi_agent
+from app.api.routes import document, query, function, health, image, product, multi_agent, events, admin
 
 router = APIRouter()
 
@@ -12,4 +12,6 @@ router.include_router(health.router, prefix="/health", tags=["Health"])
 router.include_router(image.router, prefix="/images", tags=["Images"])
 router.include_router(product.router, prefix="/products", tags=["Products"])
 router.include_router(multi_agent.router, prefix="/multi-agent", tags=["Multi-Agent RAG"])
+router.include_router(events.router, prefix="/events", tags=["Events"])
+router.include_router(admin.router, prefix="/admin", tags=["Admin"])
 
@@ -3,10 +3,13 @@ Dependency Injection - Khởi tạo và cung cấp dependencies
 Quản lý các singleton instances và dependency injection cho toàn bộ ứng dụng
 """
 import logging
+import threading
+from typing import Optional
 from app.core.settings import Settings
 from app.services.document import DocumentProcessor
 from app.services.embedding import EmbeddingService
 from app.services.image import ImageEmbeddingService
+from app.services.image.deduplicator import ImageDeduplicator
 from app.services.product import ProductEmbeddingService
 from app.services.reranker import RerankerService
 from app.infrastructure.vector_store.chroma import ChromaVectorStore
@@ -16,8 +19,12 @@ from app.core.rag_pipeline import RAGPipeline
 from app.core.ingest_pipeline import IngestPipeline
 from app.core.image_ingest_pipeline import ImageIngestPipeline
 from app.core.product_ingest_pipeline import ProductIngestPipeline
+from app.core.catalog_sync_pipeline import CatalogSyncPipeline, HttpImageSource
+from app.core.events import EventBus, ReembedQueue, invalidate_search_cache, register_default_subscribers
 from app.core.prompt_builder import PromptBuilder
 from app.infrastructure.llm.openai import OpenAILLM, LLMProvider
+from app.services.function import FunctionHandler
+from app.infrastructure.database import Database, create_database
 
 logger = logging.getLogger(__name__)
 
@@ -34,7 +41,20 @@ _rag_pipeline: RAGPipeline = None
 _ingest_pipeline: IngestPipeline = None
 _image_ingest_pipeline: ImageIngestPipeline = None
 _product_ingest_pipeline: ProductIngestPipeline = None
+_catalog_sync_pipeline: CatalogSyncPipeline = None
+_image_deduplicator = None  # ImageDeduplicator (None nếu IMAGE_DEDUP_ENABLED = false)
 _llm_provider: LLMProvider = None
+_database: Database = None
+_function_handler: FunctionHandler = None
+_orchestrator = None  # MultiAgentOrchestrator (import lazy để tránh circular import với app.agents)
+_event_bus: EventBus = None
+_reembed_queue: Optional[ReembedQueue] = None  # None nếu EVENTS_REEMBED_ENABLED = false hoặc chưa cấu hình database
+
+# Warm-up khởi tạo các thành phần nặng song song trong nhiều threads → khóa riêng cho từng singleton
+_vector_store_lock = threading.Lock()
+_image_vector_store_lock = threading.Lock()
+_image_embedding_service_lock = threading.Lock()
+_database_lock = threading.Lock()  # SQLite: create_synthetic_database chỉ chạy một lần
 
 
 def get_document_processor() -> DocumentProcessor:
@@ -53,13 +73,23 @@ def get_document_processor() -> DocumentProcessor:
 def get_embedding_service() -> EmbeddingService:
     """
     Lấy instance của EmbeddingService (singleton)
+    Dùng Sentence Transformer trên model server nếu MODEL_SERVER_ENABLED và không dùng OpenAI embeddings
+    Dùng vector băm tất định nếu FAKE_EMBEDDINGS
     
     Returns:
         EmbeddingService instance
     """
     global _embedding_service
     if _embedding_service is None:
-        _embedding_service = EmbeddingService()
+        use_openai = Settings.USE_OPENAI_EMBEDDINGS and Settings.OPENAI_API_KEY
+        if Settings.FAKE_EMBEDDINGS:
+            from app.infrastructure.fake.embedding import FakeEmbeddingService
+            _embedding_service = FakeEmbeddingService()
+        elif Settings.MODEL_SERVER_ENABLED and "text" in Settings.MODEL_SERVER_MODELS and not use_openai:
+            from app.infrastructure.model_server.remote_services import RemoteEmbeddingService
+            _embedding_service = RemoteEmbeddingService()
+        else:
+            _embedding_service = EmbeddingService()
     return _embedding_service
 
 
@@ -73,8 +103,10 @@ def get_vector_store() -> VectorStore:
     """
     global _vector_store
     if _vector_store is None:
-        # Sử dụng Chroma làm mặc định
-        _vector_store = ChromaVectorStore()
+        with _vector_store_lock:
+            if _vector_store is None:
+                # Sử dụng Chroma làm mặc định
+                _vector_store = ChromaVectorStore()
     return _vector_store
 
 
@@ -130,13 +162,24 @@ def get_ingest_pipeline() -> IngestPipeline:
 def get_image_embedding_service() -> ImageEmbeddingService:
     """
     Lấy instance của ImageEmbeddingService (singleton)
+    Dùng CLIP trên model server nếu MODEL_SERVER_ENABLED (không load CLIP trong worker)
+    Dùng vector CLIP giả nếu FAKE_EMBEDDINGS
     
     Returns:
         ImageEmbeddingService instance
     """
     global _image_embedding_service
     if _image_embedding_service is None:
-        _image_embedding_service = ImageEmbeddingService()
+        with _image_embedding_service_lock:
+            if _image_embedding_service is None:
+                if Settings.FAKE_EMBEDDINGS:
+                    from app.infrastructure.fake.embedding import FakeImageEmbeddingService
+                    _image_embedding_service = FakeImageEmbeddingService()
+                elif Settings.MODEL_SERVER_ENABLED and "clip" in Settings.MODEL_SERVER_MODELS:
+                    from app.infrastructure.model_server.remote_services import RemoteImageEmbeddingService
+                    _image_embedding_service = RemoteImageEmbeddingService()
+                else:
+                    _image_embedding_service = ImageEmbeddingService()
     return _image_embedding_service
 
 
@@ -150,10 +193,29 @@ def get_image_vector_store() -> VectorStore:
     """
     global _image_vector_store
     if _image_vector_store is None:
-        _image_vector_store = ImageVectorStore()
+        with _image_vector_store_lock:
+            if _image_vector_store is None:
+                _image_vector_store = ImageVectorStore()
     return _image_vector_store
 
 
+def get_image_deduplicator() -> Optional[ImageDeduplicator]:
+    """
+    Lấy instance của ImageDeduplicator (singleton)
+    Dùng perceptual hash index của ImageVectorStore để bỏ qua CLIP cho ảnh gần trùng
+    
+    Returns:
+        ImageDeduplicator instance, hoặc None nếu IMAGE_DEDUP_ENABLED = false
+    """
+    global _image_deduplicator
+    if _image_deduplicator is None and Settings.IMAGE_DEDUP_ENABLED:
+        _image_deduplicator = ImageDeduplicator(
+            image_embedding_service=get_image_embedding_service(),
+            hash_index=get_image_vector_store().hash_index
+        )
+    return _image_deduplicator
+
+
 def get_image_ingest_pipeline() -> ImageIngestPipeline:
     """
     Lấy instance của ImageIngestPipeline (singleton)
@@ -166,7 +228,8 @@ def get_image_ingest_pipeline() -> ImageIngestPipeline:
     if _image_ingest_pipeline is None:
         _image_ingest_pipeline = ImageIngestPipeline(
             image_embedding_service=get_image_embedding_service(),
-            vector_store=get_image_vector_store()  # Dùng image vector store riêng
+            vector_store=get_image_vector_store(),  # Dùng image vector store riêng
+            deduplicator=get_image_deduplicator()
         )
     return _image_ingest_pipeline
 
@@ -199,11 +262,30 @@ def get_product_ingest_pipeline() -> ProductIngestPipeline:
     if _product_ingest_pipeline is None:
         _product_ingest_pipeline = ProductIngestPipeline(
             product_embedding_service=get_product_embedding_service(),
-            vector_store=get_image_vector_store()
+            vector_store=get_image_vector_store(),
+            deduplicator=get_image_deduplicator()
         )
     return _product_ingest_pipeline
 
 
+def get_catalog_sync_pipeline() -> CatalogSyncPipeline:
+    """
+    Lấy instance của CatalogSyncPipeline (singleton)
+    
+    Returns:
+        CatalogSyncPipeline instance
+    """
+    global _catalog_sync_pipeline
+    if _catalog_sync_pipeline is None:
+        _catalog_sync_pipeline = CatalogSyncPipeline(
+            product_ingest_pipeline=get_product_ingest_pipeline(),
+            image_embedding_service=get_image_embedding_service(),
+            vector_store=get_image_vector_store(),
+            deduplicator=get_image_deduplicator()
+        )
+    return _catalog_sync_pipeline
+
+
 def get_prompt_builder() -> PromptBuilder:
     """
     Lấy instance của PromptBuilder
@@ -218,13 +300,109 @@ def get_prompt_builder() -> PromptBuilder:
 def get_llm_provider() -> LLMProvider:
     """
     Lấy instance của LLMProvider (singleton)
-    Mặc định sử dụng OpenAI với fallback Ollama
+    Mặc định sử dụng OpenAI với fallback Ollama, LLM trả lời soạn sẵn nếu FAKE_LLM
     
     Returns:
         LLMProvider instance
     """
     global _llm_provider
     if _llm_provider is None:
-        _llm_provider = OpenAILLM()
+        if Settings.FAKE_LLM:
+            from app.infrastructure.fake.llm import FakeLLM
+            _llm_provider = FakeLLM()
+        else:
+            _llm_provider = OpenAILLM()
     return _llm_provider
 
+
+
+def get_database() -> Optional[Database]:
+    """
+    Lấy instance của Database (singleton) theo DATABASE_BACKEND
+    - sqlserver: DATABASE_CONNECTION_STRING
+    - sqlite: SQLITE_DATABASE_PATH (sinh dữ liệu giả SQLITE_SYNTHETIC_SCALE nếu file chưa tồn tại)
+    
+    Returns:
+        Database instance, hoặc None nếu chưa cấu hình
+    """
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _database = create_database()
+                if _database is not None:
+                    logger.info(f"🗄️ Database backend: {_database.describe()}")
+    return _database
+
+
+def get_function_handler() -> Optional[FunctionHandler]:
+    """
+    Lấy instance của FunctionHandler (singleton)
+    Dùng chung giữa /api/functions và Tool Agent
+    
+    Returns:
+        FunctionHandler instance, hoặc None nếu chưa cấu hình database
+    """
+    global _function_handler
+    if _function_handler is None:
+        database = get_database()
+        if database is not None:
+            _function_handler = FunctionHandler(database=database)
+    return _function_handler
+
+
+def get_reembed_queue() -> Optional[ReembedQueue]:
+    """
+    Lấy instance của ReembedQueue (singleton)
+    Products được đọc lại từ database, ảnh tải từ backend, rồi đồng bộ qua CatalogSyncPipeline
+    
+    Returns:
+        ReembedQueue instance, hoặc None nếu tắt / chưa cấu hình database
+    """
+    global _reembed_queue
+    if _reembed_queue is None and Settings.EVENTS_REEMBED_ENABLED and get_database() is not None:
+        from app.indexer.sources import find_deleted_product_ids, load_from_database_by_ids
+        _reembed_queue = ReembedQueue(
+            catalog_sync_pipeline_factory=get_catalog_sync_pipeline,
+            load_records=lambda product_ids: load_from_database_by_ids(product_ids, get_database()),
+            image_source_factory=HttpImageSource,
+            on_flushed=invalidate_search_cache,
+            confirm_deleted=lambda product_ids: find_deleted_product_ids(product_ids, get_database())
+        )
+    return _reembed_queue
+
+
+def get_event_bus() -> EventBus:
+    """
+    Lấy instance của EventBus (singleton) với các subscribers mặc định
+    
+    Returns:
+        EventBus instance
+    """
+    global _event_bus
+    if _event_bus is None:
+        _event_bus = EventBus(dedupe_size=Settings.EVENTS_DEDUPE_SIZE)
+        register_default_subscribers(_event_bus, get_function_handler, get_reembed_queue())
+    return _event_bus
+
+
+def get_orchestrator():
+    """
+    Lấy instance của MultiAgentOrchestrator (singleton)
+    Agent graph được dựng một lần cho mỗi worker (warm-up lúc start), mọi request dùng chung
+    
+    Returns:
+        MultiAgentOrchestrator instance
+    """
+    global _orchestrator
+    if _orchestrator is None:
+        from app.agents.entity_resolver_agent import EntityResolverAgent
+        from app.agents.knowledge_agent import KnowledgeAgent
+        from app.agents.orchestrator import MultiAgentOrchestrator
+        from app.agents.tool_agent import ToolAgent
+        _orchestrator = MultiAgentOrchestrator(
+            entity_resolver_agent=EntityResolverAgent(database=get_database()),
+            knowledge_agent=KnowledgeAgent(database=get_database()),
+            tool_agent=ToolAgent(function_handler=get_function_handler())
+        )
+    return _orchestrator
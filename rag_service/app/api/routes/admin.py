@@ -0,0 +1,203 @@
+"""
+Admin API routes - Chẩn đoán worker đang chạy: sampling profile, cProfile theo request, tracemalloc;
+thao tác bảo trì dữ liệu (chuyển image vector store sang partitions)
+
+Mọi endpoint yêu cầu header X-Admin-Token = ADMIN_TOKEN (để trống = tắt, trả 503)
+Profile/snapshots nằm trong bộ nhớ của worker nhận request (mỗi worker uvicorn một bản)
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+
+from app.api.security import verify_admin
+from app.core.profiling import get_allocation_tracker, get_request_profiler, sample_for
+from app.core.profiling.allocations import KEY_TYPES
+from app.core.profiling.request_profiler import SORT_KEYS
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(dependencies=[Depends(verify_admin)])
+
+
+# ========== Image vector store ==========
+
+@router.post("/image-store/migrate-partitions")
+async def migrate_image_store_partitions():
+    """
+    Chuyển products còn nằm trong collection ảnh chung sang partitions theo category
+    (IMAGE_STORE_PARTITIONING=category). Mỗi trang chỉ bị xóa khỏi collection chung sau khi copy đã được xác nhận.
+    Full path: /api/admin/image-store/migrate-partitions
+    """
+    from app.api.deps import get_image_vector_store
+
+    vector_store = await asyncio.to_thread(get_image_vector_store)
+    try:
+        return await asyncio.to_thread(vector_store.migrate_products_to_partitions)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+# ========== Sampling profile ==========
+
+@router.get("/profile/cpu")
+async def cpu_profile(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000),
+    include_idle: bool = Query(False, description="Giữ cả mẫu của thread đang chờ (lock/queue/select)"),
+    match: Optional[str] = Query(None, description="Chỉ giữ stacks chứa chuỗi này, vd. knowledge_agent, function_handler, preprocessing"),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+    limit: int = Query(30, ge=1, le=500)
+):
+    """
+    Sampling profile toàn worker trong `seconds` giây
+    - format=collapsed: file collapsed stacks (flamegraph.pl, speedscope.app, inferno)
+    - format=json: số mẫu theo thread + top hàm theo self/total
+    Full path: /api/admin/profile/cpu
+    """
+    if seconds > Settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds tối đa {Settings.PROFILER_MAX_SECONDS}")
+    interval = (interval_ms or Settings.PROFILER_DEFAULT_INTERVAL_MS) / 1000
+    try:
+        sampler = await asyncio.to_thread(sample_for, seconds, interval, include_idle, match)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "json":
+        return sampler.summary(limit)
+    file_name = f"profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed"
+    return PlainTextResponse(
+        sampler.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'}
+    )
+
+
+# ========== cProfile theo request ==========
+
+@router.get("/profile/requests")
+async def list_request_profiles():
+    """
+    Các request đã được profile gần đây (gửi kèm X-Profile: 1 và X-Admin-Token)
+    Full path: /api/admin/profile/requests
+    """
+    return {"profiles": get_request_profiler().recent()}
+
+
+@router.get("/profile/requests/{profile_id}")
+async def get_request_profile(
+    profile_id: str,
+    format: str = Query("text", pattern="^(text|pstats)$"),
+    sort: str = Query("cumulative"),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """
+    cProfile của một request
+    - format=text: bảng pstats sắp theo `sort`
+    - format=pstats: file .prof (python -m pstats, snakeviz, gprof2dot)
+    Full path: /api/admin/profile/requests/{profile_id}
+    """
+    profile = get_request_profiler().get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found")
+    if format == "pstats":
+        return Response(
+            profile.dump(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="request-{profile_id}.prof"'}
+        )
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort phải là một trong {list(SORT_KEYS)}")
+    return PlainTextResponse(profile.render_text(sort, limit))
+
+
+# ========== tracemalloc ==========
+
+@router.get("/tracemalloc")
+async def tracemalloc_status():
+    """
+    Trạng thái tracemalloc: bộ nhớ đang được trace, overhead, danh sách snapshots
+    Full path: /api/admin/tracemalloc
+    """
+    return get_allocation_tracker().status()
+
+
+@router.post("/tracemalloc/start")
+async def tracemalloc_start(frames: Optional[int] = Query(None, ge=1, le=100)):
+    """
+    Bật tracemalloc (chỉ allocations sau thời điểm này được ghi)
+    Full path: /api/admin/tracemalloc/start
+    """
+    return get_allocation_tracker().start(frames)
+
+
+@router.post("/tracemalloc/stop")
+async def tracemalloc_stop():
+    """
+    Tắt tracemalloc (snapshots đã chụp vẫn giữ)
+    Full path: /api/admin/tracemalloc/stop
+    """
+    return get_allocation_tracker().stop()
+
+
+@router.post("/tracemalloc/snapshots")
+async def tracemalloc_snapshot(
+    label: Optional[str] = Query(None),
+    key_type: str = Query("lineno"),
+    limit: int = Query(20, ge=0, le=500)
+):
+    """
+    Chụp snapshot, trả về id + các vị trí cấp phát nhiều nhất
+    Full path: /api/admin/tracemalloc/snapshots
+    """
+    if key_type not in KEY_TYPES:
+        raise HTTPException(status_code=400, detail=f"key_type phải là một trong {list(KEY_TYPES)}")
+    tracker = get_allocation_tracker()
+    try:
+        meta = await asyncio.to_thread(tracker.take_snapshot, label)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {**meta, "top": await asyncio.to_thread(tracker.top, meta["snapshot_id"], key_type, limit)}
+
+
+@router.get("/tracemalloc/snapshots/{snapshot_id}")
+async def tracemalloc_snapshot_top(
+    snapshot_id: str,
+    key_type: str = Query("lineno"),
+    limit: int = Query(30, ge=1, le=500)
+):
+    """
+    Các vị trí cấp phát nhiều nhất của một snapshot
+    Full path: /api/admin/tracemalloc/snapshots/{snapshot_id}
+    """
+    if key_type not in KEY_TYPES:
+        raise HTTPException(status_code=400, detail=f"key_type phải là một trong {list(KEY_TYPES)}")
+    try:
+        top = await asyncio.to_thread(get_allocation_tracker().top, snapshot_id, key_type, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Snapshot '{snapshot_id}' not found")
+    return {"snapshot_id": snapshot_id, "top": top}
+
+
+@router.get("/tracemalloc/diff")
+async def tracemalloc_diff(
+    base: str = Query(..., description="snapshot_id gốc"),
+    target: Optional[str] = Query(None, description="snapshot_id so sánh (bỏ trống = heap hiện tại)"),
+    key_type: str = Query("lineno"),
+    limit: int = Query(30, ge=1, le=500)
+):
+    """
+    Chênh lệch cấp phát giữa hai snapshots (hoặc snapshot và hiện tại), tăng nhiều nhất trước
+    Full path: /api/admin/tracemalloc/diff
+    """
+    if key_type not in KEY_TYPES:
+        raise HTTPException(status_code=400, detail=f"key_type phải là một trong {list(KEY_TYPES)}")
+    try:
+        return await asyncio.to_thread(get_allocation_tracker().diff, base, target, key_type, limit)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Snapshot {e} not found")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -1,9 +1,9 @@
 """
 Document API routes - Upload, delete, list documents
 """
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from pathlib import Path
 import logging
 
@@ -27,6 +27,8 @@ class DocumentInfo(BaseModel):
     file_type: str
     total_chunks: int
     upload_date: str
+    byte_size: int = 0
+    content_hash: str = ""
 
 @router.post("/upload", response_model=ProcessDocumentResponse)
 async def upload_document(
@@ -95,13 +97,17 @@ async def upload_document(
         )
 
 @router.get("", response_model=List[DocumentInfo])
-async def get_documents():
+async def get_documents(
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000)
+):
     """
-    Lấy danh sách tất cả documents đã upload
+    Lấy danh sách documents đã upload (phân trang qua offset/limit)
+    Đọc từ document registry, không quét collection Chroma
     """
     try:
         vector_store = get_vector_store()
-        documents = await vector_store.get_all_documents()
+        documents = await vector_store.get_all_documents(offset=offset, limit=limit)
         
         logger.info(f"API get_documents: Returning {len(documents)} documents")
         
@@ -111,27 +117,24 @@ async def get_documents():
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/debug")
-async def debug_documents():
+async def debug_documents(limit: int = Query(20, ge=1, le=200)):
     """
     Debug endpoint để kiểm tra vector store và documents
+    Chỉ dùng count() và get(limit=...) nên chi phí không phụ thuộc kích thước collection
     """
     try:
         vector_store = get_vector_store()
         
-        # Lấy tất cả documents
-        all_docs = await vector_store.get_all_documents()
-        
         debug_info = {
-            "total_documents": len(all_docs),
-            "documents": all_docs,
+            "total_documents": await vector_store.count_documents(),
+            "documents": await vector_store.get_all_documents(limit=limit),
             "vector_store_type": vector_store.store_type if hasattr(vector_store, 'store_type') else "unknown"
         }
         
         # Nếu là Chroma, lấy thêm thông tin chi tiết
         if hasattr(vector_store, 'collection') and vector_store.collection:
             try:
-                all_data = vector_store.collection.get()
-                total_chunks = len(all_data.get('ids', [])) if all_data else 0
+                total_chunks = vector_store.collection.count()
                 
                 debug_info.update({
                     "total_chunks": total_chunks,
@@ -141,8 +144,8 @@ async def debug_documents():
                 
                 # Lấy sample metadata để kiểm tra
                 if total_chunks > 0:
-                    sample_metadatas = all_data.get('metadatas', [])[:3]
-                    debug_info["sample_metadatas"] = sample_metadatas
+                    sample = vector_store.collection.get(limit=3, include=["metadatas"])
+                    debug_info["sample_metadatas"] = sample.get('metadatas', [])
                     
             except Exception as e:
                 debug_info["error"] = str(e)
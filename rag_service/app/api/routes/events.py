@@ -0,0 +1,99 @@
+"""
+Change Events API route - Backend báo sản phẩm/giá/đơn hàng/khuyến mãi thay đổi
+
+Xác thực bằng HMAC-SHA256 (EVENTS_WEBHOOK_SECRET), xem app.api.security.verify_event_signature
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field, ValidationError
+
+from app.api.deps import get_event_bus, get_reembed_queue
+from app.api.security import verify_admin, verify_event_signature
+from app.core.settings import Settings
+from app.domain.event import ChangeEvent
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+class ChangeEventItem(BaseModel):
+    type: str = Field(..., description="product.upserted | product.deleted | product.price_changed | order.status_changed | promotion.changed")
+    event_id: Optional[str] = Field(None, description="Id duy nhất, dùng để bỏ event gửi lại")
+    product_id: Optional[str] = None
+    order_id: Optional[str] = None
+    category_id: Optional[str] = None
+    data: Dict[str, Any] = {}
+
+
+class EventBatchRequest(BaseModel):
+    events: List[ChangeEventItem]
+
+
+class EventBatchResponse(BaseModel):
+    received: int
+    accepted: int
+    duplicates: int
+    rejected: List[Dict[str, Any]]
+    subscribers: Dict[str, Dict[str, Any]]
+    elapsed_ms: float
+
+
+@router.post("", response_model=EventBatchResponse)
+async def ingest_events(request: Request):
+    """
+    Nhận batch change events từ backend và phân phối tới caches/indexes/re-embed queue
+    Full path: /api/events
+    """
+    start = time.perf_counter()
+    body = await request.body()
+    verify_event_signature(request, body)
+
+    try:
+        batch = EventBatchRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=jsonable_encoder(e.errors(include_input=False)))
+    if len(batch.events) > Settings.EVENTS_MAX_BATCH:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Tối đa {Settings.EVENTS_MAX_BATCH} events mỗi request (nhận {len(batch.events)})"
+        )
+
+    events: List[ChangeEvent] = []
+    rejected: List[Dict[str, Any]] = []
+    for index, item in enumerate(batch.events):
+        try:
+            events.append(ChangeEvent(**item.model_dump()))
+        except ValueError as e:
+            rejected.append({"index": index, "event_id": item.event_id, "error": str(e)})
+
+    try:
+        result = await get_event_bus().publish(events)
+    except Exception as e:
+        logger.error(f"❌ Lỗi khi xử lý change events: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error processing events: {str(e)}")
+
+    return EventBatchResponse(
+        received=len(batch.events),
+        accepted=result["accepted"],
+        duplicates=result["duplicates"],
+        rejected=rejected,
+        subscribers=result["subscribers"],
+        elapsed_ms=round((time.perf_counter() - start) * 1000, 2)
+    )
+
+
+@router.get("/stats", dependencies=[Depends(verify_admin)])
+async def event_stats():
+    """
+    Thống kê change events: số events theo loại, thời gian/lỗi từng subscriber, re-embed queue
+    Full path: /api/events/stats - yêu cầu header X-Admin-Token
+    """
+    reembed_queue = get_reembed_queue()
+    return {
+        "bus": get_event_bus().stats(),
+        "reembed_queue": reembed_queue.stats() if reembed_queue is not None else None
+    }
@@ -1,28 +1,18 @@
 """
 Function API routes - Execute function calls from AI
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
 import logging
 import json
 
-from app.services.function import FunctionHandler
-from app.core.settings import Settings
+from app.api.deps import get_function_handler
+from app.api.security import verify_event_request
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# Initialize function handler
-_function_handler: FunctionHandler = None
-
-def get_function_handler() -> FunctionHandler:
-    """Get function handler instance"""
-    global _function_handler
-    if _function_handler is None:
-        _function_handler = FunctionHandler(Settings.DATABASE_CONNECTION_STRING)
-    return _function_handler
-
 # Models
 class FunctionExecuteRequest(BaseModel):
     function_name: str
@@ -42,6 +32,8 @@ async def execute_function(request: FunctionExecuteRequest):
         logger.info(f"Executing function: {request.function_name} with arguments: {request.arguments}")
         
         function_handler = get_function_handler()
+        if function_handler is None:
+            raise ValueError("Database chưa được cấu hình (DATABASE_BACKEND / DATABASE_CONNECTION_STRING)")
         result = await function_handler.execute_function(
             request.function_name,
             request.arguments
@@ -78,6 +70,37 @@ async def execute_function(request: FunctionExecuteRequest):
             detail=f"Lỗi khi thực thi function: {str(ex)}"
         )
 
+@router.post("/invalidate", dependencies=[Depends(verify_event_request)])
+async def invalidate_catalog_indexes():
+    """
+    Bỏ các index trong bộ nhớ (hạn sử dụng, phân tích đơn hàng) sau khi sản phẩm/tồn kho thay đổi
+    Full path: /api/functions/invalidate - ký HMAC như /api/events (X-Event-Timestamp, X-Event-Signature)
+    """
+    function_handler = get_function_handler()
+    if function_handler is None:
+        raise HTTPException(status_code=503, detail="Database chưa được cấu hình (DATABASE_BACKEND / DATABASE_CONNECTION_STRING)")
+    function_handler.invalidate_catalog()
+    return {
+        "invalidated": True,
+        "expiry_index": function_handler.expiry_index.stats() if function_handler.expiry_index else None,
+        "order_analytics": function_handler.analytics.stats() if function_handler.analytics else None
+    }
+
+@router.get("/query-stats")
+async def query_stats():
+    """
+    Thời gian các query SQL của function calls (theo tên) và tập trạng thái đơn hàng đang dùng
+    """
+    function_handler = get_function_handler()
+    if function_handler is None:
+        raise HTTPException(status_code=503, detail="Database chưa được cấu hình (DATABASE_BACKEND / DATABASE_CONNECTION_STRING)")
+    return {
+        "database": function_handler.database.describe(),
+        "slow_query_ms": function_handler.query_stats.slow_query_ms,
+        "queries": function_handler.query_stats.stats(),
+        "order_statuses": function_handler.order_statuses.stats()
+    }
+
 @router.get("/list")
 async def list_functions():
     """
@@ -87,6 +110,7 @@ async def list_functions():
         "functions": [
             "getProductExpiry",
             "getProductsExpiringSoon",
+            "getExpiredProducts",
             "getMonthlyRevenue",
             "getRevenueStatistics",
             "getBestSellingProductImage",
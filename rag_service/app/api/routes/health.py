@@ -1,7 +1,14 @@
 """
 Health check API route
 """
-from fastapi import APIRouter
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+
+from app.api.security import verify_admin
+from app.core.cache import get_cache_registry
+from app.core.warmup import get_readiness
+from app.services.inference import get_inference_executor
 
 router = APIRouter()
 
@@ -10,3 +17,41 @@ async def health():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@router.get("/ready")
+async def readiness():
+    """
+    Readiness check: trạng thái load và thời gian warm-up của từng thành phần
+    Trả về 503 khi warm-up chưa xong hoặc thành phần bắt buộc chưa sẵn sàng
+    Full path: /api/health/ready
+    """
+    status = get_readiness()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@router.get("/inference")
+async def inference_stats():
+    """
+    Thống kê inference pool: queue depth, thời gian chờ/chạy theo model và event-loop lag
+    Full path: /api/health/inference
+    """
+    return get_inference_executor().stats()
+
+@router.get("/caches")
+async def cache_stats():
+    """
+    Thống kê các cache trong registry: hit rate, size, bytes, evictions, expirations
+    Full path: /api/health/caches
+    """
+    return {"caches": get_cache_registry().stats()}
+
+@router.delete("/caches", dependencies=[Depends(verify_admin)])
+async def clear_caches(name: Optional[str] = Query(None)):
+    """
+    Xóa một cache theo tên (hoặc tất cả nếu không truyền name) - yêu cầu X-Admin-Token
+    Full path: /api/health/caches
+    """
+    registry = get_cache_registry()
+    if name and name not in registry:
+        raise HTTPException(status_code=404, detail=f"Cache '{name}' not found")
+    cleared = registry.clear(name)
+    return {"message": f"Cleared {cleared} cache(s)"}
@@ -8,7 +8,14 @@ from typing import List, Optional
 from pathlib import Path
 import logging
 
-from app.api.deps import get_image_ingest_pipeline, get_image_vector_store, get_image_embedding_service
+from app.api.deps import (
+    get_image_ingest_pipeline,
+    get_image_vector_store,
+    get_image_embedding_service,
+    get_image_deduplicator
+)
+from app.api.security import verify_admin
+from app.core.settings import Settings
 from app.core.image_ingest_pipeline import ImageIngestPipeline
 from app.infrastructure.vector_store.base import VectorStore
 from app.services.image import ImageEmbeddingService
@@ -22,6 +29,7 @@ class ProcessImageResponse(BaseModel):
     image_name: str
     message: str
     embedding_dimension: Optional[int] = None
+    duplicate_of: Optional[str] = None  # Ảnh không được lưu vì gần trùng ảnh này (IMAGE_DEDUP_SKIP_DUPLICATES)
 
 class ImageInfo(BaseModel):
     image_id: str
@@ -37,6 +45,24 @@ class ImageSearchResponse(BaseModel):
     results: List[dict]
     query_image_id: Optional[str] = None
 
+class DuplicateClusterMember(BaseModel):
+    file_id: str
+    file_name: str
+    content_type: str
+    distance: int  # Khoảng cách pHash tới ảnh đầu nhóm
+
+class DuplicateCluster(BaseModel):
+    size: int
+    members: List[DuplicateClusterMember]
+
+class DuplicateReportResponse(BaseModel):
+    indexed_images: int
+    phash_threshold: int
+    dhash_threshold: int
+    duplicate_images: int  # Số ảnh thừa (tổng size - 1 của các nhóm)
+    clusters: List[DuplicateCluster]
+    dedup_stats: Optional[dict] = None
+
 @router.post("/upload", response_model=ProcessImageResponse)
 async def upload_image(
     file: UploadFile = File(...),
@@ -83,7 +109,7 @@ async def upload_image(
         
         # Xử lý ảnh: Image → Embedding Vector → Vector Database
         logger.info(f"🔄 Bắt đầu xử lý ảnh: {file.filename}")
-        image_id = await image_ingest_pipeline.process_and_store(
+        image_id, duplicate_of = await image_ingest_pipeline.process_and_store(
             contents, 
             file.filename,
             metadata=metadata_dict
@@ -97,11 +123,16 @@ async def upload_image(
         elapsed_time = time.time() - start_time
         logger.info(f"✅ Hoàn thành upload ảnh {file.filename} trong {elapsed_time:.2f} giây")
         
+        if duplicate_of:
+            message = f"Image is a near-duplicate of {duplicate_of}, not stored again ({elapsed_time:.2f}s)"
+        else:
+            message = f"Image processed and stored successfully in {elapsed_time:.2f}s"
         return ProcessImageResponse(
             image_id=image_id,
             image_name=file.filename,
-            message=f"Image processed and stored successfully in {elapsed_time:.2f}s",
-            embedding_dimension=embedding_dim
+            message=message,
+            embedding_dimension=embedding_dim,
+            duplicate_of=duplicate_of
         )
     
     except HTTPException:
@@ -156,7 +187,7 @@ async def upload_images_batch(
         
         # Xử lý batch
         logger.info(f"🔄 Bắt đầu xử lý batch {len(images)} ảnh")
-        image_ids = await image_ingest_pipeline.process_and_store_batch(
+        results = await image_ingest_pipeline.process_and_store_batch(
             images,
             image_names
         )
@@ -168,9 +199,11 @@ async def upload_images_batch(
             ProcessImageResponse(
                 image_id=img_id,
                 image_name=img_name,
-                message=f"Image processed successfully"
+                message=f"Image is a near-duplicate of {duplicate_of}, not stored again" if duplicate_of
+                else "Image processed successfully",
+                duplicate_of=duplicate_of
             )
-            for img_id, img_name in zip(image_ids, image_names)
+            for img_id, img_name, duplicate_of in results
         ]
     
     except HTTPException:
@@ -265,6 +298,59 @@ async def get_images():
         logger.error(f"Error in get_images: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/duplicates", response_model=DuplicateReportResponse, dependencies=[Depends(verify_admin)])
+async def get_duplicate_clusters(
+    phash_threshold: Optional[int] = Query(None, ge=0, le=64, description="Mặc định IMAGE_DEDUP_PHASH_THRESHOLD"),
+    dhash_threshold: Optional[int] = Query(None, ge=0, le=64, description="Mặc định IMAGE_DEDUP_DHASH_THRESHOLD"),
+    limit: int = Query(100, ge=1, le=1000, description="Số nhóm tối đa trả về")
+):
+    """
+    Báo cáo admin: các nhóm ảnh/products gần trùng theo perceptual hash (pHash + dHash)
+    Yêu cầu header X-Admin-Token.
+    """
+    import asyncio
+    
+    try:
+        vector_store = get_image_vector_store()
+        phash_threshold = Settings.IMAGE_DEDUP_PHASH_THRESHOLD if phash_threshold is None else phash_threshold
+        dhash_threshold = Settings.IMAGE_DEDUP_DHASH_THRESHOLD if dhash_threshold is None else dhash_threshold
+        clusters = await asyncio.to_thread(vector_store.hash_index.clusters, phash_threshold, dhash_threshold)
+        
+        def _file_names() -> dict:
+            return {
+                member["file_id"]: (vector_store.registry.get(member["file_id"]) or {}).get("file_name", "")
+                for members in clusters[:limit] for member in members
+            }
+        
+        file_names = await asyncio.to_thread(_file_names)
+        report_clusters = []
+        for members in clusters[:limit]:
+            report_clusters.append(DuplicateCluster(
+                size=len(members),
+                members=[
+                    DuplicateClusterMember(
+                        file_id=member["file_id"],
+                        file_name=file_names[member["file_id"]],
+                        content_type=member["content_type"],
+                        distance=member["distance"]
+                    )
+                    for member in members
+                ]
+            ))
+        
+        deduplicator = get_image_deduplicator()
+        return DuplicateReportResponse(
+            indexed_images=len(vector_store.hash_index),
+            phash_threshold=phash_threshold,
+            dhash_threshold=dhash_threshold,
+            duplicate_images=sum(len(members) - 1 for members in clusters),
+            clusters=report_clusters,
+            dedup_stats=deduplicator.stats() if deduplicator is not None else None
+        )
+    except Exception as e:
+        logger.error(f"Error building duplicate report: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/{image_id}", response_model=ImageInfo)
 async def get_image_info(image_id: str):
     """
@@ -5,7 +5,8 @@ from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Body
 from pydantic import BaseModel
 from typing import Optional, List
 import logging
-from app.agents.orchestrator import MultiAgentOrchestrator
+from app.api.deps import get_orchestrator
+from app.core.tracing import trace_summary
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -33,6 +34,15 @@ class MultiAgentQueryResponse(BaseModel):
     metadata: dict = {}
 
 
+def _response_metadata(orchestrator, state: dict) -> dict:
+    """State summary + trace summary theo stage (khi request gửi X-Trace: 1 hoặc bật TRACE_RESPONSE_METADATA)"""
+    metadata = orchestrator.get_state_summary(state)
+    trace = trace_summary()
+    if trace is not None:
+        metadata["trace"] = trace
+    return metadata
+
+
 @router.post("/query", response_model=MultiAgentQueryResponse)
 async def multi_agent_query(
     request: MultiAgentQueryRequest = Body(...)
@@ -42,7 +52,7 @@ async def multi_agent_query(
     Full path: /api/multi-agent/query
     """
     try:
-        orchestrator = MultiAgentOrchestrator()
+        orchestrator = get_orchestrator()
         
         state = await orchestrator.process(
             query=request.query,
@@ -61,7 +71,7 @@ async def multi_agent_query(
             answer_confidence=state.get("answer_confidence", 0.0),
             critic_score=state.get("critic_score"),
             has_hallucination=state.get("has_hallucination", False),
-            metadata=orchestrator.get_state_summary(state)
+            metadata=_response_metadata(orchestrator, state)
         )
         
     except Exception as e:
@@ -86,7 +96,7 @@ async def multi_agent_query_image(
         # Đọc image data
         image_data = await image.read()
         
-        orchestrator = MultiAgentOrchestrator()
+        orchestrator = get_orchestrator()
         
         state = await orchestrator.process(
             query=query or "",
@@ -106,7 +116,7 @@ async def multi_agent_query_image(
             answer_confidence=state.get("answer_confidence", 0.0),
             critic_score=state.get("critic_score"),
             has_hallucination=state.get("has_hallucination", False),
-            metadata=orchestrator.get_state_summary(state)
+            metadata=_response_metadata(orchestrator, state)
         )
         
     except Exception as e:
@@ -124,7 +134,7 @@ async def multi_agent_query_batch(
     Full path: /api/multi-agent/query-batch
     """
     try:
-        orchestrator = MultiAgentOrchestrator()
+        orchestrator = get_orchestrator()
         
         query_dicts = [
             {
@@ -139,7 +149,7 @@ async def multi_agent_query_batch(
         
         results = await orchestrator.process_batch(query_dicts, max_concurrent=max_concurrent)
         
-        return {
+        response = {
             "results": [
                 {
                     "final_answer": r.get("final_answer", ""),
@@ -149,6 +159,11 @@ async def multi_agent_query_batch(
                 for r in results
             ]
         }
+        # Trace của cả batch (các stage chạy chung cho mọi query)
+        trace = trace_summary()
+        if trace is not None:
+            response["trace"] = trace
+        return response
         
     except Exception as e:
         logger.error(f"Error in batch multi-agent query: {str(e)}", exc_info=True)
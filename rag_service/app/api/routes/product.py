@@ -7,15 +7,27 @@ import json
 
 from app.api.deps import (
     get_product_ingest_pipeline,
+    get_catalog_sync_pipeline,
     get_image_vector_store,
     get_image_embedding_service,
     get_embedding_service,
+    get_database,
+    get_function_handler,
     get_llm_provider,
     get_prompt_builder
 )
+from app.api.security import verify_admin
 from app.core.product_ingest_pipeline import ProductIngestPipeline
+from app.core.catalog_sync_pipeline import (
+    CatalogSyncPipeline,
+    DirectoryImageSource,
+    ZipImageSource,
+    parse_ndjson_records,
+    resolve_sync_path
+)
 from app.core.prompt_builder import PromptBuilder
 from app.core.settings import Settings
+from app.core.tracing import span, traced
 from app.infrastructure.vector_store.image_vector_store import ImageVectorStore
 from app.infrastructure.llm.openai import LLMProvider
 from app.services.image import ImageEmbeddingService
@@ -24,6 +36,15 @@ from app.services.embedding import EmbeddingService
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+def _invalidate_catalog_indexes() -> None:
+    """Sản phẩm thay đổi → bỏ expiry index / order analytics snapshot của FunctionHandler"""
+    try:
+        function_handler = get_function_handler()
+        if function_handler is not None:
+            function_handler.invalidate_catalog()
+    except Exception as e:
+        logger.warning(f"⚠️ Không thể invalidate catalog indexes: {str(e)}")
+
 def _split_multi_entity(query: str) -> List[str]:
     if not query:
         return []
@@ -114,6 +135,25 @@ class ChatProductResponse(BaseModel):
     message: str
     has_images: bool
 
+class CatalogSyncDirectoryRequest(BaseModel):
+    records_path: str  # File NDJSON, tương đối với CATALOG_SYNC_ROOT
+    image_dir: Optional[str] = None  # Thư mục ảnh, tương đối với CATALOG_SYNC_ROOT
+    delete_missing: bool = False
+    dry_run: bool = False
+
+class CatalogSyncResponse(BaseModel):
+    total: int
+    invalid_records: int
+    unchanged: int
+    changed: int
+    embedded: int
+    failed: int
+    deleted: int
+    missing_images: int
+    dry_run: bool
+    errors: List[Dict]
+    timings_ms: Dict[str, float]
+
 @router.post("/embed", response_model=EmbedProductResponse)
 async def embed_product(
     product_id: Optional[str] = None,
@@ -185,6 +225,8 @@ async def embed_product(
             product_id=product_dict.get('product_id')
         )
         
+        _invalidate_catalog_indexes()
+        
         elapsed_time = time.time() - start_time
         logger.info(f"✅ Hoàn thành embed product trong {elapsed_time:.2f} giây")
         
@@ -205,6 +247,102 @@ async def embed_product(
             detail=f"Error embedding product: {str(e)}"
         )
 
+async def _run_catalog_sync(
+    catalog_sync_pipeline: CatalogSyncPipeline,
+    records: List[Dict],
+    parse_errors: List[Dict],
+    image_source,
+    delete_missing: bool,
+    dry_run: bool
+) -> CatalogSyncResponse:
+    try:
+        report = await catalog_sync_pipeline.sync(
+            records,
+            image_source=image_source,
+            delete_missing=delete_missing,
+            dry_run=dry_run
+        )
+    finally:
+        if image_source is not None:
+            image_source.close()
+    if not dry_run:
+        _invalidate_catalog_indexes()
+    report["invalid_records"] = len(parse_errors)
+    report["errors"] = parse_errors[:20] + report["errors"]
+    return CatalogSyncResponse(**report)
+
+@router.post("/sync", response_model=CatalogSyncResponse, dependencies=[Depends(verify_admin)])
+async def sync_catalog(
+    records: UploadFile = File(...),
+    images: Optional[UploadFile] = File(None),
+    delete_missing: bool = Query(False, description="Xóa products không có trong records"),
+    dry_run: bool = Query(False, description="Chỉ tính thay đổi, không embed/ghi"),
+    catalog_sync_pipeline: CatalogSyncPipeline = Depends(get_catalog_sync_pipeline)
+):
+    """
+    Đồng bộ hàng loạt catalog sản phẩm
+    - records: NDJSON, mỗi dòng một product (product_id, product_name, description, category_id, ...)
+    - images: zip ảnh (khớp theo tên file image_filename/anh, hoặc {product_id}.<ext>)
+    Chỉ products có fingerprint (thông tin + bytes ảnh) thay đổi mới được embed lại
+    Yêu cầu X-Admin-Token (delete_missing có thể xóa hàng loạt products)
+    """
+    import asyncio
+    import zipfile
+    
+    try:
+        parsed, parse_errors = await asyncio.to_thread(parse_ndjson_records, records.file)
+        image_source = None
+        if images is not None:
+            try:
+                image_source = await asyncio.to_thread(ZipImageSource, images.file)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail="images phải là file zip")
+        logger.info(f"📦 Nhận request sync catalog: {len(parsed)} products, {len(parse_errors)} records lỗi")
+        return await _run_catalog_sync(catalog_sync_pipeline, parsed, parse_errors, image_source, delete_missing, dry_run)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Lỗi khi sync catalog: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error syncing catalog: {str(e)}")
+
+@router.post("/sync/directory", response_model=CatalogSyncResponse, dependencies=[Depends(verify_admin)])
+async def sync_catalog_directory(
+    request: CatalogSyncDirectoryRequest,
+    catalog_sync_pipeline: CatalogSyncPipeline = Depends(get_catalog_sync_pipeline)
+):
+    """
+    Đồng bộ catalog từ file NDJSON + thư mục ảnh trên server (nằm trong CATALOG_SYNC_ROOT)
+    Yêu cầu X-Admin-Token
+    """
+    import asyncio
+    
+    try:
+        try:
+            records_path = resolve_sync_path(request.records_path)
+            image_dir = resolve_sync_path(request.image_dir) if request.image_dir else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not records_path.is_file():
+            raise HTTPException(status_code=404, detail=f"Không tìm thấy {request.records_path}")
+        if image_dir is not None and not image_dir.is_dir():
+            raise HTTPException(status_code=404, detail=f"Không tìm thấy thư mục {request.image_dir}")
+        
+        def _load():
+            with open(records_path, "rb") as f:
+                parsed, parse_errors = parse_ndjson_records(f)
+            return parsed, parse_errors, DirectoryImageSource(image_dir) if image_dir is not None else None
+        
+        parsed, parse_errors, image_source = await asyncio.to_thread(_load)
+        logger.info(f"📦 Sync catalog từ {records_path}: {len(parsed)} products, {len(parse_errors)} records lỗi")
+        return await _run_catalog_sync(
+            catalog_sync_pipeline, parsed, parse_errors, image_source, request.delete_missing, request.dry_run
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Lỗi khi sync catalog: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error syncing catalog: {str(e)}")
+
 @router.post("/search/image", response_model=ProductSearchResponse)
 async def search_products_by_image(
     image: UploadFile = File(...),
@@ -243,20 +381,9 @@ async def search_products_by_image(
         # Vector search CHỈ BẰNG IMAGE EMBEDDING
         logger.info(f"🔍 Đang tìm kiếm trong vector database (image embedding only)...")
         
-        # Build where clause
-        where_clause = {"content_type": "product"}
-        if category_id:
-            where_clause["category_id"] = category_id
-        
-        # Lấy nhiều candidates hơn để filter/rerank
-        import asyncio
+        # Lấy nhiều candidates hơn để filter/rerank (chỉ partition của category nếu có)
         search_top_k = max(top_k * 3, 30)  # Lấy 30-50 candidates để filter/rerank
-        results = await asyncio.to_thread(
-            vector_store.collection.query,
-            query_embeddings=[query_embedding.tolist()],
-            n_results=search_top_k,
-            where=where_clause
-        )
+        results = await vector_store.query_products(query_embedding, search_top_k, category_id=category_id)
         
         # Parse results và lấy best similarity
         all_candidates = []
@@ -357,26 +484,15 @@ async def search_products_by_text(
         image_embedding_service = get_image_embedding_service()
         
         logger.info(f"🔢 Đang tạo text embedding từ query (CLIP text encoder)...")
-        query_embedding = image_embedding_service.create_text_embedding(query)
+        query_embedding = await image_embedding_service.create_text_embedding_async(query)
         
         if query_embedding is None:
             raise HTTPException(status_code=500, detail="Không thể tạo embedding từ text query")
         
         logger.info(f"  📊 Query embedding dimension: {len(query_embedding)} (CLIP text encoder - 512 dim)")
         
-        # Build where clause
-        where_clause = {"content_type": "product"}
-        if request.category_id:
-            where_clause["category_id"] = request.category_id
-        
         # 🔥 Search với CLIP text embedding (512 dim) - không cần resize
-        import asyncio
-        results = await asyncio.to_thread(
-            vector_store.collection.query,
-            query_embeddings=[query_embedding.tolist()],
-            n_results=request.top_k,
-            where=where_clause
-        )
+        results = await vector_store.query_products(query_embedding, request.top_k, category_id=request.category_id)
         
         # Parse results
         products = []
@@ -474,6 +590,7 @@ async def search_products_for_chat(
         vector_store=vector_store
     )
 
+@traced("products.chat_search")
 async def _search_products_for_chat_single(
     query: str,
     category_id: Optional[str],
@@ -489,7 +606,6 @@ async def _search_products_for_chat_single(
     import time
     import numpy as np
     import httpx
-    from app.core.settings import Settings
     start_time = time.time()
     
     try:
@@ -508,57 +624,19 @@ async def _search_products_for_chat_single(
         # ============================================================
         sql_products: List[Dict] = []
         try:
-            import pyodbc
+            import asyncio
             import urllib.parse
             import base64
-            from app.core.settings import Settings
-
-            # Build ODBC connection string (reuse logic)
-            conn_str = Settings.DATABASE_CONNECTION_STRING
-            if "DRIVER=" not in conn_str.upper():
-                params = {}
-                parts = [p.strip() for p in conn_str.split(';') if p.strip()]
-                for part in parts:
-                    if '=' in part:
-                        key, value = part.split('=', 1)
-                        params[key.strip().lower()] = value.strip()
-
-                server = params.get('server', '')
-                database = params.get('database', '')
-                user_id = params.get('user id', params.get('uid', ''))
-                password = params.get('password', params.get('pwd', ''))
-                trust_cert = params.get('trustservercertificate', 'True').lower() == 'true'
-
-                driver = "ODBC Driver 18 for SQL Server"
-                odbc_conn_str = f"DRIVER={{{driver}}};SERVER={server};DATABASE={database};"
-                if user_id:
-                    odbc_conn_str += f"UID={user_id};PWD={password};"
-                if trust_cert:
-                    odbc_conn_str += "TrustServerCertificate=yes;"
-                conn_str = odbc_conn_str
-
-            conn = None
-            for driver_name in ["ODBC Driver 18 for SQL Server", "ODBC Driver 17 for SQL Server", "SQL Server Native Client 11.0"]:
-                try:
-                    test_conn_str = conn_str
-                    if driver_name not in test_conn_str:
-                        import re
-                        test_conn_str = re.sub(r'DRIVER=\{[^}]+\}', f'DRIVER={{{driver_name}}}', test_conn_str, count=1)
-                    conn = pyodbc.connect(test_conn_str)
-                    break
-                except Exception:
-                    continue
-
-            if conn:
-                cursor = conn.cursor()
 
+            database = get_database()
+            if database is not None:
                 # Nếu user gõ "lấy ra hình ảnh ..." thì query đã được C# extract còn lại keyword.
                 keyword = query.strip()
                 like = f"%{keyword}%"
 
                 # Ưu tiên TenSanPham match trước, sau đó MoTa
                 db_query = f"""
-                    SELECT TOP {top_k}
+                    SELECT {database.dialect.top(top_k)}
                         s.MaSanPham,
                         s.TenSanPham,
                         s.MoTa,
@@ -577,11 +655,19 @@ async def _search_products_for_chat_single(
                     ORDER BY
                         CASE WHEN s.TenSanPham LIKE ? THEN 0 ELSE 1 END,
                         s.TenSanPham
+                    {database.dialect.limit(top_k)}
                 """
-                cursor.execute(db_query, like, like, like)
-                rows = cursor.fetchall()
-                cursor.close()
-                conn.close()
+
+                def query_products():
+                    with database.connect() as conn:
+                        cursor = conn.cursor()
+                        cursor.execute(db_query, like, like, like)
+                        rows = cursor.fetchall()
+                        cursor.close()
+                    return rows
+
+                # pyodbc/sqlite3 là blocking I/O → chạy trong thread pool
+                rows = await asyncio.to_thread(query_products)
 
                 if rows:
                     logger.info(f"  🎯 SQL exact-ish match found: {len(rows)} products for '{keyword}'")
@@ -595,7 +681,8 @@ async def _search_products_for_chat_single(
                                 encoded_filename = urllib.parse.quote(str(image_filename), safe='')
                                 image_url = f"{base_url}/images/products/{encoded_filename}"
                                 try:
-                                    img_resp = await client.get(image_url, timeout=5.0)
+                                    with span("image.download"):
+                                        img_resp = await client.get(image_url, timeout=5.0)
                                     if img_resp.status_code == 200:
                                         image_data = base64.b64encode(img_resp.content).decode('utf-8')
                                         image_mime_type = img_resp.headers.get('content-type', 'image/jpeg')
@@ -663,7 +750,7 @@ async def _search_products_for_chat_single(
         # CLIP text encoder tương thích với image embedding (cùng 512 dim)
         image_embedding_service = get_image_embedding_service()
         
-        query_embedding = image_embedding_service.create_text_embedding(query)
+        query_embedding = await image_embedding_service.create_text_embedding_async(query)
         
         if query_embedding is None:
             raise HTTPException(status_code=500, detail="Không thể tạo embedding từ text query")
@@ -673,20 +760,9 @@ async def _search_products_for_chat_single(
         # CLIP text embedding đã có dimension 512, không cần resize
         query_embedding_resized = query_embedding
         
-        # Build where clause
-        where_clause = {"content_type": "product"}
-        if category_id:
-            where_clause["category_id"] = category_id
-        
         # 2) Vector search fallback
-        import asyncio
         search_top_k = max(top_k * 3, 10)
-        results = await asyncio.to_thread(
-            vector_store.collection.query,
-            query_embeddings=[query_embedding_resized.tolist()],
-            n_results=search_top_k,
-            where=where_clause
-        )
+        results = await vector_store.query_products(query_embedding_resized, search_top_k, category_id=category_id)
         
         # ✅ TOP K theo similarity (fallback), có threshold (min_similarity)
         if results.get('ids') and len(results['ids'][0]) > 0:
@@ -769,56 +845,18 @@ async def _search_products_for_chat_single(
                     if not image_url_for_download and product_id:
                         try:
                             # Query database trực tiếp (nhanh hơn và không cần HTTP)
-                            import pyodbc
-                            from app.core.settings import Settings
-                            
-                            conn_str = Settings.DATABASE_CONNECTION_STRING
-                            # Convert to ODBC format
-                            if "DRIVER=" not in conn_str.upper():
-                                params = {}
-                                parts = [p.strip() for p in conn_str.split(';') if p.strip()]
-                                for part in parts:
-                                    if '=' in part:
-                                        key, value = part.split('=', 1)
-                                        key = key.strip().lower()
-                                        value = value.strip()
-                                        params[key] = value
-                                
-                                server = params.get('server', '')
-                                database = params.get('database', '')
-                                user_id = params.get('user id', params.get('uid', ''))
-                                password = params.get('password', params.get('pwd', ''))
-                                trust_cert = params.get('trustservercertificate', 'True').lower() == 'true'
+                            database = get_database()
+                            if database is not None:
+                                def query_image(product_id=product_id):
+                                    with database.connect() as conn:
+                                        cursor = conn.cursor()
+                                        sql_query = "SELECT Anh, DonViTinh FROM SanPham WHERE MaSanPham = ? AND (IsDeleted = 0 OR IsDeleted IS NULL)"
+                                        cursor.execute(sql_query, product_id)
+                                        row = cursor.fetchone()
+                                        cursor.close()
+                                    return row
                                 
-                                driver = "ODBC Driver 18 for SQL Server"
-                                odbc_conn_str = f"DRIVER={{{driver}}};SERVER={server};DATABASE={database};"
-                                if user_id:
-                                    odbc_conn_str += f"UID={user_id};PWD={password};"
-                                if trust_cert:
-                                    odbc_conn_str += "TrustServerCertificate=yes;"
-                                conn_str = odbc_conn_str
-                            
-                            # Try to connect
-                            conn = None
-                            for driver_name in ["ODBC Driver 18 for SQL Server", "ODBC Driver 17 for SQL Server", "SQL Server Native Client 11.0"]:
-                                try:
-                                    test_conn_str = conn_str.replace("{ODBC Driver 18 for SQL Server}", f"{{{driver_name}}}")
-                                    test_conn_str = test_conn_str.replace("{ODBC Driver 17 for SQL Server}", f"{{{driver_name}}}")
-                                    if driver_name not in test_conn_str:
-                                        import re
-                                        test_conn_str = re.sub(r'DRIVER=\{[^}]+\}', f'DRIVER={{{driver_name}}}', test_conn_str, count=1)
-                                    conn = pyodbc.connect(test_conn_str)
-                                    break
-                                except:
-                                    continue
-                            
-                            if conn:
-                                cursor = conn.cursor()
-                                sql_query = "SELECT Anh, DonViTinh FROM SanPham WHERE MaSanPham = ? AND (IsDeleted = 0 OR IsDeleted IS NULL)"
-                                cursor.execute(sql_query, product_id)
-                                row = cursor.fetchone()
-                                cursor.close()
-                                conn.close()
+                                row = await asyncio.to_thread(query_image)
                                 
                                 if row:
                                     if row[0]:  # Anh
@@ -833,7 +871,7 @@ async def _search_products_for_chat_single(
                                 else:
                                     logger.warning(f"  ⚠️  Product {product_id} không có ảnh trong database")
                             else:
-                                logger.warning(f"  ⚠️  Không thể kết nối database để lấy image filename")
+                                logger.warning(f"  ⚠️  Chưa cấu hình database để lấy image filename")
                         except Exception as e:
                             logger.warning(f"  ⚠️  Lỗi khi query database cho product {product_id}: {str(e)}")
                     elif not product_id:
@@ -843,7 +881,8 @@ async def _search_products_for_chat_single(
                     if image_url_for_download:
                         try:
                             logger.info(f"  ⬇️  Đang download ảnh từ: {image_url_for_download}")
-                            image_response = await client.get(image_url_for_download, timeout=5.0)
+                            with span("image.download"):
+                                image_response = await client.get(image_url_for_download, timeout=5.0)
                             if image_response.status_code == 200:
                                 image_bytes = image_response.content
                                 import base64
@@ -950,15 +989,8 @@ async def get_products_by_category(
     Lấy danh sách products trong một category từ Vector Database
     """
     try:
-        # Lấy tất cả products trong category (Chroma get is synchronous)
-        import asyncio
-        results = await asyncio.to_thread(
-            vector_store.collection.get,
-            where={
-                "content_type": "product",
-                "category_id": category_id
-            }
-        )
+        # Lấy tất cả products trong category (partition riêng của category)
+        results = await vector_store.get_products(category_id)
         
         products = []
         if results.get('ids') and len(results['ids']) > 0:
@@ -990,7 +1022,6 @@ async def get_product_image_url(
     Returns:
         image_url: URL đầy đủ của ảnh sản phẩm
     """
-    from app.core.settings import Settings
     import httpx
     
     try:
@@ -7,6 +7,7 @@ from typing import List, Optional
 import logging
 
 from app.api.deps import get_rag_pipeline
+from app.core.settings import Settings
 from app.domain.query import Query
 from app.domain.answer import Answer, RetrievedChunk
 
@@ -24,6 +25,34 @@ class QueryResponse(BaseModel):
     chunks: List[dict]
     has_context: bool
 
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest]
+
+class BatchQueryResponse(BaseModel):
+    results: List[QueryResponse]
+    total: int
+    elapsed_ms: float
+
+
+def _to_query_response(answer: Answer) -> QueryResponse:
+    """Chuyển Answer sang response format"""
+    chunks_dict = [
+        {
+            'chunk_id': chunk.chunk_id,
+            'file_id': chunk.file_id,
+            'file_name': chunk.file_name,
+            'chunk_index': chunk.chunk_index,
+            'text': chunk.text,
+            'similarity': chunk.similarity
+        }
+        for chunk in answer.chunks
+    ]
+    return QueryResponse(
+        context=answer.context,
+        chunks=chunks_dict,
+        has_context=answer.has_context
+    )
+
 @router.post("/retrieve", response_model=QueryResponse)
 async def retrieve_context(request: QueryRequest):
     """
@@ -57,68 +86,92 @@ async def retrieve_context(request: QueryRequest):
         elapsed_time = time.time() - start_time
         logger.info(f"✅ Query completed in {elapsed_time:.2f}s (target: <2s)")
         
-        # Convert to response format
-        chunks_dict = [
-            {
-                'chunk_id': chunk.chunk_id,
-                'file_id': chunk.file_id,
-                'file_name': chunk.file_name,
-                'chunk_index': chunk.chunk_index,
-                'text': chunk.text,
-                'similarity': chunk.similarity
-            }
-            for chunk in answer.chunks
+        logger.info(f"Retrieved {len(answer.chunks)} chunks, has_context={answer.has_context}")
+        
+        return _to_query_response(answer)
+    
+    except Exception as e:
+        logger.error(f"Error in retrieve_context endpoint: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/retrieve-batch", response_model=BatchQueryResponse)
+async def retrieve_context_batch(request: BatchQueryRequest):
+    """
+    Retrieve context cho nhiều câu hỏi trong một request
+    
+    Embed tất cả câu hỏi một lần (batch), mỗi file_id một lần multi-vector search.
+    Dùng cho offline evaluation và tính trước câu trả lời FAQ hàng loạt.
+    Kết quả cùng thứ tự với queries.
+    """
+    import time
+    start_time = time.time()
+    
+    if len(request.queries) > Settings.RETRIEVE_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tối đa {Settings.RETRIEVE_BATCH_MAX_QUESTIONS} câu hỏi mỗi request"
+        )
+    
+    try:
+        queries = [
+            Query(question=item.question, file_id=item.file_id, top_k=min(item.top_k, 5))
+            for item in request.queries
         ]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        logger.info(f"📥 Received batch query: {len(queries)} câu hỏi")
+        answers = await get_rag_pipeline().retrieve_batch(queries)
         
-        logger.info(f"Retrieved {len(answer.chunks)} chunks, has_context={answer.has_context}")
+        elapsed_ms = (time.time() - start_time) * 1000
+        logger.info(f"✅ Batch query completed in {elapsed_ms:.0f}ms ({len(queries)} câu hỏi)")
         
-        return QueryResponse(
-            context=answer.context,
-            chunks=chunks_dict,
-            has_context=answer.has_context
+        return BatchQueryResponse(
+            results=[_to_query_response(answer) for answer in answers],
+            total=len(answers),
+            elapsed_ms=round(elapsed_ms, 1)
         )
     
     except Exception as e:
-        logger.error(f"Error in retrieve_context endpoint: {str(e)}", exc_info=True)
+        logger.error(f"Error in retrieve_context_batch endpoint: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/debug/vector-store")
 async def debug_vector_store():
     """
     Debug endpoint để kiểm tra vector store
+    Chỉ dùng count() và get(limit=...) nên chi phí không phụ thuộc kích thước collection
     """
     try:
         from app.api.deps import get_vector_store
         vector_store = get_vector_store()
         
-        # Lấy tất cả documents
-        all_docs = await vector_store.get_all_documents()
-        
         store_info = {
             "store_type": vector_store.store_type if hasattr(vector_store, 'store_type') else "chroma",
-            "total_documents": len(all_docs),
-            "documents": all_docs
+            "total_documents": await vector_store.count_documents(),
+            "documents": await vector_store.get_all_documents(limit=20)
         }
         
         # Nếu là Chroma, lấy thêm thông tin
         if hasattr(vector_store, 'collection') and vector_store.collection:
             try:
-                all_data = vector_store.collection.get()
-                total_chunks = len(all_data.get('ids', [])) if all_data else 0
+                total_chunks = vector_store.collection.count()
                 store_info["total_chunks"] = total_chunks
                 store_info["collection_name"] = vector_store.collection.name
                 
                 # Lấy sample chunks để kiểm tra
                 if total_chunks > 0:
-                    sample_ids = all_data.get('ids', [])[:5]
-                    sample_metadatas = all_data.get('metadatas', [])[:5]
+                    sample = vector_store.collection.get(limit=5, include=["metadatas"])
+                    sample_ids = sample.get('ids', [])
+                    sample_metadatas = sample.get('metadatas', [])
                     store_info["sample_chunks"] = [
                         {
-                            "chunk_id": sample_ids[i] if i < len(sample_ids) else None,
+                            "chunk_id": sample_ids[i],
                             "file_id": sample_metadatas[i].get('file_id') if i < len(sample_metadatas) else None,
                             "file_name": sample_metadatas[i].get('file_name') if i < len(sample_metadatas) else None,
                         }
-                        for i in range(min(5, total_chunks))
+                        for i in range(len(sample_ids))
                     ]
             except Exception as e:
                 store_info["error"] = str(e)
@@ -0,0 +1,60 @@
+"""
+API Security - Xác thực cho các endpoint quản trị và webhook của backend
+
+- Endpoint thay đổi/xóa dữ liệu hoặc cache, xem thống kê nội bộ, chẩn đoán worker
+  yêu cầu header X-Admin-Token = ADMIN_TOKEN (để trống = tắt các endpoint đó, trả 503)
+- Webhook backend gọi khi dữ liệu thay đổi (/api/events, /api/functions/invalidate) ký bằng
+  HMAC-SHA256 (EVENTS_WEBHOOK_SECRET, để trống = tắt, trả 503):
+      X-Event-Timestamp: unix seconds
+      X-Event-Signature: sha256=hex(HMAC(secret, "{timestamp}.{raw body}"))
+"""
+import hashlib
+import hmac
+import time
+
+from fastapi import HTTPException, Request
+
+from app.core.settings import Settings
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+EVENT_SIGNATURE_HEADER = "X-Event-Signature"
+EVENT_TIMESTAMP_HEADER = "X-Event-Timestamp"
+
+
+def is_admin_request(request: Request) -> bool:
+    """Header X-Admin-Token khớp ADMIN_TOKEN (luôn False khi chưa cấu hình token)"""
+    token = Settings.ADMIN_TOKEN
+    return bool(token) and hmac.compare_digest(request.headers.get(ADMIN_TOKEN_HEADER, ""), token)
+
+
+def verify_admin(request: Request) -> None:
+    """Dependency FastAPI: 503 nếu chưa cấu hình ADMIN_TOKEN, 401 nếu token sai"""
+    if not Settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="ADMIN_TOKEN chưa được cấu hình")
+    if not is_admin_request(request):
+        raise HTTPException(status_code=401, detail=f"{ADMIN_TOKEN_HEADER} không hợp lệ")
+
+
+def verify_event_signature(request: Request, body: bytes) -> None:
+    """Kiểm tra chữ ký HMAC của webhook: 503 nếu chưa cấu hình EVENTS_WEBHOOK_SECRET, 401 nếu sai/quá hạn"""
+    secret = Settings.EVENTS_WEBHOOK_SECRET
+    if not secret:
+        raise HTTPException(status_code=503, detail="EVENTS_WEBHOOK_SECRET chưa được cấu hình")
+
+    timestamp = request.headers.get(EVENT_TIMESTAMP_HEADER, "")
+    signature = request.headers.get(EVENT_SIGNATURE_HEADER, "")
+    try:
+        skew = abs(time.time() - int(timestamp))
+    except ValueError:
+        raise HTTPException(status_code=401, detail=f"Thiếu hoặc sai {EVENT_TIMESTAMP_HEADER}")
+    if skew > Settings.EVENTS_SIGNATURE_TOLERANCE_SECONDS:
+        raise HTTPException(status_code=401, detail=f"{EVENT_TIMESTAMP_HEADER} lệch quá {Settings.EVENTS_SIGNATURE_TOLERANCE_SECONDS}s")
+
+    expected = hmac.new(secret.encode("utf-8"), timestamp.encode("utf-8") + b"." + body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(signature.removeprefix("sha256="), expected):
+        raise HTTPException(status_code=401, detail=f"{EVENT_SIGNATURE_HEADER} không hợp lệ")
+
+
+async def verify_event_request(request: Request) -> None:
+    """Dependency FastAPI: verify_event_signature trên raw body (handler vẫn đọc lại được body)"""
+    verify_event_signature(request, await request.body())
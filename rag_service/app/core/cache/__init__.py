@@ -0,0 +1,7 @@
+"""
+Cache
+Registry các cache có tên, dùng chung giữa agents và services
+"""
+from app.core.cache.registry import CacheRegistry, NamedCache, get_cache, get_cache_registry
+
+__all__ = ["CacheRegistry", "NamedCache", "get_cache", "get_cache_registry"]
@@ -0,0 +1,317 @@
+"""
+Cache Registry - Quản lý tập trung các cache có tên cho toàn bộ process
+
+- Mỗi cache giới hạn theo số entries và (tùy chọn) dung lượng ước tính, eviction theo LRU
+- TTL riêng cho từng cache (và từng entry)
+- An toàn khi dùng từ event loop lẫn thread pool (threading.RLock);
+  get_or_compute() gộp các lần tính trùng key đang chạy đồng thời trên cùng event loop (single-flight)
+- Không lưu kết quả None (lookup lỗi) trừ khi yêu cầu; exceptions không bao giờ được cache
+- Thống kê hit rate, size, evictions cho từng cache (/api/health/caches)
+"""
+import asyncio
+import copy
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """Ước tính dung lượng (bytes) của value - đủ chính xác để giới hạn bộ nhớ cache"""
+    nbytes = getattr(value, "nbytes", None)  # numpy arrays
+    if isinstance(nbytes, int):
+        return nbytes + 112
+    size = sys.getsizeof(value)
+    if _depth >= 3:
+        return size
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(v, _depth + 1) for v in value)
+    return size
+
+
+class NamedCache:
+    """
+    Cache LRU có giới hạn entries/bytes và TTL
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        max_bytes: int = 0,
+        ttl_seconds: float = 0,
+        copy_on_read: bool = False,
+        enabled: bool = True
+    ):
+        """
+        Args:
+            name: Tên cache (hiển thị trong stats)
+            max_entries: Số entries tối đa
+            max_bytes: Dung lượng ước tính tối đa (0 = không giới hạn)
+            ttl_seconds: Thời gian sống mặc định của entry (0 = không hết hạn)
+            copy_on_read: Trả về deepcopy để caller sửa kết quả không làm bẩn cache
+            enabled: Tắt cache (mọi lần get đều miss, set bị bỏ qua)
+        """
+        self.name = name
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.copy_on_read = copy_on_read
+        self.enabled = enabled
+
+        # key -> (value, expires_at, size)
+        self._data: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        # (event loop, key) -> future: future gắn với loop tạo ra nó, loop khác không await được
+        self._inflight: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # ========== Core operations ==========
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Lấy value theo key (None/default nếu miss hoặc đã hết hạn)"""
+        value = self._get(key)
+        return default if value is _MISSING else value
+
+    def _get(self, key: Hashable) -> Any:
+        if not self.enabled:
+            self.misses += 1
+            return _MISSING
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            value, expires_at, _ = entry
+            if expires_at and expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value) if self.copy_on_read else value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Lưu value, evict LRU nếu vượt giới hạn"""
+        if not self.enabled:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl and ttl > 0 else 0.0
+        size = estimate_size(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return  # Entry lớn hơn cả cache → không lưu
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+                oldest_key = next(iter(self._data))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Xóa một key, trả về True nếu key tồn tại"""
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+                return True
+        return False
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Xóa các keys thỏa predicate, trả về số keys đã xóa"""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for k in keys:
+                self._remove(k)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    # ========== Helpers ==========
+
+    async def get_or_compute(
+        self,
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+        ttl_seconds: Optional[float] = None,
+        cache_none: bool = False,
+        should_cache: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        Lấy từ cache hoặc await factory() để tính. Các coroutine cùng key chạy đồng thời
+        trên cùng event loop sẽ chờ chung một lần tính (tránh thundering herd khi cache nguội).
+
+        Args:
+            cache_none: Lưu cả kết quả None
+            should_cache: Chỉ lưu khi should_cache(value) đúng (vd. bỏ qua kết quả rỗng/lỗi)
+        """
+        value = self._get(key)
+        if value is not _MISSING:
+            return value
+
+        loop = asyncio.get_running_loop()
+        inflight_key = (loop, key)
+        inflight = self._inflight.get(inflight_key)
+        if inflight is not None:
+            value = await asyncio.shield(inflight)
+            return copy.deepcopy(value) if self.copy_on_read else value
+
+        future = loop.create_future()
+        self._inflight[inflight_key] = future
+        try:
+            value = await factory()
+            if (value is not None or cache_none) and (should_cache is None or should_cache(value)):
+                self.set(key, value, ttl_seconds)
+            future.set_result(value)
+        except BaseException as e:
+            future.set_exception(e)
+            # Tránh warning "exception never retrieved" khi không có ai chờ
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(inflight_key, None)
+        return copy.deepcopy(value) if self.copy_on_read else value
+
+    def memoize(self, fn: Callable, cache_none: bool = False) -> Callable:
+        """
+        Decorator memoize cho hàm sync với positional args hashable
+        Kết quả None (thường là lookup lỗi) không được lưu trừ khi cache_none=True
+        """
+        @wraps(fn)
+        def wrapper(*args):
+            value = self._get(args)
+            if value is _MISSING:
+                value = fn(*args)
+                if value is not None or cache_none:
+                    self.set(args, value)
+            return value
+        wrapper.cache = self
+        return wrapper
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes if self.max_bytes else None,
+            "max_bytes": self.max_bytes or None,
+            "ttl_seconds": self.ttl_seconds or None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class CacheRegistry:
+    """Registry các NamedCache theo tên, dùng chung cho cả process"""
+
+    def __init__(self):
+        self._caches: Dict[str, NamedCache] = {}
+        self._lock = threading.Lock()
+
+    def get_cache(
+        self,
+        name: str,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        copy_on_read: Optional[bool] = None
+    ) -> NamedCache:
+        """
+        Lấy cache theo tên, tạo mới nếu chưa có.
+        Cấu hình chỉ áp dụng ở lần tạo đầu tiên (các giới hạn mặc định lấy từ Settings);
+        lần gọi sau truyền cấu hình khác với cache đã tạo sẽ bị log warning và bỏ qua.
+        """
+        cache = self._caches.get(name)
+        if cache is None:
+            with self._lock:
+                cache = self._caches.get(name)
+                if cache is None:
+                    cache = NamedCache(
+                        name=name,
+                        max_entries=max_entries if max_entries is not None else Settings.AGENT_CACHE_SIZE,
+                        max_bytes=max_bytes if max_bytes is not None else Settings.CACHE_DEFAULT_MAX_BYTES,
+                        ttl_seconds=ttl_seconds if ttl_seconds is not None else Settings.CACHE_DEFAULT_TTL_SECONDS,
+                        copy_on_read=bool(copy_on_read),
+                        enabled=Settings.ENABLE_AGENT_CACHE
+                    )
+                    self._caches[name] = cache
+                    return cache
+
+        requested = {
+            "max_entries": max_entries,
+            "max_bytes": max_bytes,
+            "ttl_seconds": ttl_seconds,
+            "copy_on_read": copy_on_read,
+        }
+        conflicts = {
+            option: (value, getattr(cache, option))
+            for option, value in requested.items()
+            if value is not None and value != getattr(cache, option)
+        }
+        if conflicts:
+            logger.warning(
+                f"⚠️ Cache '{name}' đã được tạo với cấu hình khác, bỏ qua: "
+                + ", ".join(f"{option}={value} (đang dùng {current})" for option, (value, current) in conflicts.items())
+            )
+        return cache
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: cache.stats() for name, cache in sorted(self._caches.items())}
+
+    def clear(self, name: Optional[str] = None) -> int:
+        """Xóa một cache (hoặc tất cả nếu name=None), trả về số cache đã xóa"""
+        caches = [self._caches[name]] if name else list(self._caches.values())
+        for cache in caches:
+            cache.clear()
+        return len(caches)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._caches
+
+
+_cache_registry = CacheRegistry()
+
+
+def get_cache_registry() -> CacheRegistry:
+    """Lấy CacheRegistry dùng chung của process"""
+    return _cache_registry
+
+
+def get_cache(
+    name: str,
+    max_entries: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    ttl_seconds: Optional[float] = None,
+    copy_on_read: Optional[bool] = None
+) -> NamedCache:
+    """Shortcut cho get_cache_registry().get_cache(...)"""
+    return _cache_registry.get_cache(name, max_entries, max_bytes, ttl_seconds, copy_on_read)
@@ -0,0 +1,443 @@
+"""
+Catalog Sync Pipeline - Đồng bộ hàng loạt catalog sản phẩm vào vector store
+Pipeline: NDJSON records (+ ảnh từ zip/thư mục) → Fingerprint → Chỉ embed products thay đổi
+          (CLIP text + image theo batch) → Ghi vector store theo batch lớn
+
+- Fingerprint = sha256(các field của product + sha256 bytes ảnh), so với content_hash trong registry
+- Products không đổi được bỏ qua hoàn toàn (không decode ảnh, không chạy CLIP)
+- Embedding giống process_and_store: 70% CLIP text (đã enrich) + 30% CLIP image
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import urllib.parse
+import zipfile
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from app.core.cache import NamedCache
+from app.core.product_ingest_pipeline import ProductIngestPipeline
+from app.core.settings import Settings
+from app.core.tracing import span
+from app.infrastructure.vector_store.image_vector_store import ImageVectorStore
+from app.services.image import ImageEmbeddingService
+from app.services.image.deduplicator import ImageDeduplicator
+
+logger = logging.getLogger(__name__)
+
+# Các field của product được đưa vào fingerprint (và vào chunk/metadata)
+PRODUCT_FIELDS = (
+    "product_name", "description", "category_id", "category_name",
+    "price", "unit", "origin", "image_filename",
+)
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"}
+# Số lỗi tối đa trả về trong report
+MAX_REPORTED_ERRORS = 100
+
+
+def normalize_product_record(raw: Dict) -> Dict:
+    """
+    Chuẩn hóa một product (NDJSON, CSV, database) về các field của PRODUCT_FIELDS
+
+    Raises:
+        ValueError: Nếu thiếu product_id hoặc product_name
+    """
+    product_id = str(raw.get("product_id") or "").strip()
+    product_name = str(raw.get("product_name") or "").strip()
+    if not product_id or not product_name:
+        raise ValueError("thiếu product_id hoặc product_name")
+
+    record = {"product_id": product_id}
+    for field in PRODUCT_FIELDS:
+        value = raw.get(field)
+        if field == "image_filename" and not value:
+            value = raw.get("anh")  # Tên cột ảnh trong database
+        record[field] = "" if value is None else value
+    record["product_name"] = product_name
+    return record
+
+
+def parse_ndjson_records(lines: Iterable[Union[str, bytes]]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Parse NDJSON (mỗi dòng một product)
+
+    Returns:
+        (records hợp lệ, errors [{"line": n, "error": ...}])
+        Trùng product_id: record sau ghi đè record trước
+    """
+    records: Dict[str, Dict] = {}
+    errors: List[Dict] = []
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8-sig" if line_number == 1 else "utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            raw = json.loads(line)
+            if not isinstance(raw, dict):
+                raise ValueError("record phải là JSON object")
+            record = normalize_product_record(raw)
+        except Exception as e:
+            errors.append({"line": line_number, "error": str(e)})
+            continue
+        records[record["product_id"]] = record
+    return list(records.values()), errors
+
+
+def compute_product_fingerprint(record: Dict, image_hash: str = "") -> str:
+    """sha256 của JSON chuẩn hóa (các field product + hash ảnh)"""
+    payload = {field: str(record.get(field, "")) for field in PRODUCT_FIELDS}
+    payload["product_id"] = record["product_id"]
+    payload["image_sha256"] = image_hash
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class _ImageSource(ABC):
+    """
+    Nguồn ảnh của catalog: tìm theo basename của image_filename, sau đó theo {product_id}.<ext>
+    Index tên file được dựng một lần, lookup O(1) cho mỗi product
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._by_name: Dict[str, str] = {}
+        self._by_stem: Dict[str, str] = {}
+        for name in names:
+            base = os.path.basename(name)
+            suffix = Path(base).suffix.lower()
+            if not base or suffix not in IMAGE_EXTENSIONS:
+                continue
+            self._by_name.setdefault(base.lower(), name)
+            self._by_stem.setdefault(Path(base).stem.lower(), name)
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def resolve(self, record: Dict) -> Optional[str]:
+        image_filename = str(record.get("image_filename") or "")
+        if image_filename:
+            name = self._by_name.get(os.path.basename(image_filename.replace("\\", "/")).lower())
+            if name:
+                return name
+        return self._by_stem.get(record["product_id"].lower())
+
+    @abstractmethod
+    def read(self, name: str) -> bytes:
+        """Đọc bytes ảnh theo tên trả về từ resolve()"""
+
+    def close(self) -> None:
+        pass
+
+
+class ZipImageSource(_ImageSource):
+    """Ảnh trong file zip upload kèm request"""
+
+    def __init__(self, fileobj):
+        self.archive = zipfile.ZipFile(fileobj)
+        super().__init__(info.filename for info in self.archive.infolist() if not info.is_dir())
+
+    def read(self, name: str) -> bytes:
+        return self.archive.read(name)
+
+    def close(self) -> None:
+        self.archive.close()
+
+
+class DirectoryImageSource(_ImageSource):
+    """Ảnh trong một thư mục trên server (quét một lần bằng scandir, không đệ quy)"""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        with os.scandir(directory) as entries:
+            super().__init__(entry.name for entry in entries if entry.is_file())
+
+    def read(self, name: str) -> bytes:
+        with open(self.directory / name, "rb") as f:
+            return f.read()
+
+
+class HttpImageSource(_ImageSource):
+    """
+    Ảnh sản phẩm tải từ backend ({APP_BASE_URL}/images/products/{Anh}), dùng khi re-embed theo change events
+    Ảnh đã tải được giữ trong LRU giới hạn CATALOG_SYNC_IMAGE_CACHE_BYTES để fingerprint và embed
+    không tải lại (batch lớn hơn giới hạn: ảnh bị evict sẽ được tải lại khi embed)
+    """
+
+    def __init__(self, base_url: Optional[str] = None, timeout: float = 10.0, max_cached_bytes: Optional[int] = None):
+        import httpx
+
+        super().__init__([])
+        base_url = base_url or Settings.APP_BASE_URL or "https://localhost:7240"
+        self.base_url = base_url.rstrip("/").removesuffix("/api")
+        self._client = httpx.Client(verify=False, timeout=timeout)
+        self._downloaded = NamedCache(
+            "http_image_source",
+            max_entries=100_000,
+            max_bytes=Settings.CATALOG_SYNC_IMAGE_CACHE_BYTES if max_cached_bytes is None else max_cached_bytes
+        )
+
+    def resolve(self, record: Dict) -> Optional[str]:
+        image_filename = str(record.get("image_filename") or "").strip()
+        if not image_filename:
+            return None
+        if image_filename.lower().startswith(("http://", "https://")):
+            return image_filename
+        file_name = os.path.basename(image_filename.replace("\\", "/"))
+        return f"{self.base_url}/images/products/{urllib.parse.quote(file_name, safe='')}"
+
+    def read(self, name: str) -> bytes:
+        content = self._downloaded.get(name)
+        if content is None:
+            with span("image.download"):
+                response = self._client.get(name)
+                response.raise_for_status()
+            content = response.content
+            self._downloaded.set(name, content)
+        return content
+
+    def close(self) -> None:
+        self._client.close()
+        self._downloaded.clear()
+
+
+def resolve_sync_path(path: str) -> Path:
+    """
+    Resolve đường dẫn do client gửi, chỉ cho phép nằm trong CATALOG_SYNC_ROOT
+
+    Raises:
+        ValueError: Nếu đường dẫn nằm ngoài CATALOG_SYNC_ROOT
+    """
+    root = Path(Settings.CATALOG_SYNC_ROOT).resolve()
+    resolved = (root / path).resolve()
+    if resolved != root and root not in resolved.parents:
+        raise ValueError(f"Đường dẫn {path} nằm ngoài CATALOG_SYNC_ROOT")
+    return resolved
+
+
+class CatalogSyncPipeline:
+    """
+    Đồng bộ toàn bộ catalog sản phẩm: chỉ embed lại products có fingerprint thay đổi
+    """
+
+    def __init__(
+        self,
+        product_ingest_pipeline: ProductIngestPipeline,
+        image_embedding_service: ImageEmbeddingService,
+        vector_store: ImageVectorStore,
+        deduplicator: Optional[ImageDeduplicator] = None
+    ):
+        """
+        Args:
+            product_ingest_pipeline: Dùng lại cách dựng text/chunk/metadata của product
+            image_embedding_service: CLIP (text + image) theo batch
+            vector_store: Vector store lưu products
+            deduplicator: Dùng lại image embedding của ảnh gần trùng (None = luôn chạy CLIP)
+        """
+        self.product_ingest_pipeline = product_ingest_pipeline
+        self.image_embedding_service = image_embedding_service
+        self.vector_store = vector_store
+        self.deduplicator = deduplicator
+
+    async def sync(
+        self,
+        records: List[Dict],
+        image_source: Optional[_ImageSource] = None,
+        delete_missing: bool = False,
+        dry_run: bool = False
+    ) -> Dict:
+        """
+        Đồng bộ records vào vector store
+
+        Args:
+            records: Products từ parse_ndjson_records
+            image_source: Nguồn ảnh (zip/thư mục), None = chỉ dùng text
+            delete_missing: Xóa products có trong vector store nhưng không có trong records
+            dry_run: Chỉ tính thay đổi, không embed/ghi
+
+        Returns:
+            Report: total, unchanged, embedded, failed, deleted, errors, timings_ms
+        """
+        timings: Dict[str, float] = {}
+        report = {
+            "total": len(records),
+            "unchanged": 0,
+            "changed": 0,
+            "embedded": 0,
+            "failed": 0,
+            "deleted": 0,
+            "missing_images": 0,
+            "dry_run": dry_run,
+            "errors": [],
+        }
+
+        # 1. Fingerprint (đọc + hash ảnh trong thread, không giữ bytes ảnh)
+        start = time.perf_counter()
+        fingerprints, image_names = await asyncio.to_thread(self._fingerprint_all, records, image_source)
+        existing_hashes = await asyncio.to_thread(self.vector_store.registry.get_content_hashes, content_type="product")
+        changed = [r for r in records if existing_hashes.get(r["product_id"]) != fingerprints[r["product_id"]]]
+        report["unchanged"] = len(records) - len(changed)
+        report["changed"] = len(changed)
+        report["missing_images"] = sum(
+            1 for r in records if r.get("image_filename") and r["product_id"] not in image_names
+        )
+        missing_ids = []
+        if delete_missing:
+            record_ids = {r["product_id"] for r in records}
+            missing_ids = [product_id for product_id in existing_hashes if product_id not in record_ids]
+        timings["fingerprint"] = (time.perf_counter() - start) * 1000
+        logger.info(
+            f"🔎 Catalog sync: {len(records)} products, {len(changed)} thay đổi, "
+            f"{report['unchanged']} không đổi, {len(missing_ids)} cần xóa"
+        )
+
+        if dry_run:
+            report["deleted"] = len(missing_ids)
+            report["timings_ms"] = {k: round(v, 2) for k, v in timings.items()}
+            return report
+
+        # 2. Embed theo batch + 3. ghi vector store theo batch lớn
+        timings["embed"] = 0.0
+        timings["write"] = 0.0
+        upload_date = datetime.now().isoformat()
+        pending = {"chunks": [], "embeddings": [], "metadata": [], "hashes": {}, "images": []}
+        embed_batch = max(1, Settings.CATALOG_SYNC_EMBED_BATCH)
+        write_batch = max(1, Settings.CATALOG_SYNC_WRITE_BATCH)
+
+        for offset in range(0, len(changed), embed_batch):
+            batch = changed[offset:offset + embed_batch]
+            start = time.perf_counter()
+            embeddings, dedup_results = await self._embed_batch(batch, image_source, image_names, report)
+            timings["embed"] += (time.perf_counter() - start) * 1000
+
+            for record, embedding, dedup in zip(batch, embeddings, dedup_results):
+                if embedding is None:
+                    continue
+                product_id = record["product_id"]
+                pending["chunks"].append(self.product_ingest_pipeline.build_product_chunk(product_id, record))
+                pending["embeddings"].append(embedding)
+                pending["metadata"].append(self.product_ingest_pipeline.build_product_metadata(product_id, record))
+                pending["hashes"][product_id] = fingerprints[product_id]
+                pending["images"].append((product_id, "product", dedup))
+
+            if len(pending["chunks"]) >= write_batch:
+                timings["write"] += await self._flush(pending, upload_date, report)
+
+        if pending["chunks"]:
+            timings["write"] += await self._flush(pending, upload_date, report)
+
+        if missing_ids:
+            start = time.perf_counter()
+            await self.vector_store.delete_documents(missing_ids)
+            report["deleted"] = len(missing_ids)
+            timings["delete"] = (time.perf_counter() - start) * 1000
+
+        report["timings_ms"] = {k: round(v, 2) for k, v in timings.items()}
+        logger.info(
+            f"✅ Catalog sync xong: {report['embedded']} embedded, {report['failed']} lỗi, "
+            f"{report['deleted']} đã xóa ({report['timings_ms']})"
+        )
+        return report
+
+    # ========== Helpers ==========
+
+    @staticmethod
+    def _fingerprint_all(
+        records: List[Dict],
+        image_source: Optional[_ImageSource]
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Returns: (product_id → fingerprint, product_id → tên ảnh trong nguồn)"""
+        fingerprints: Dict[str, str] = {}
+        image_names: Dict[str, str] = {}
+        for record in records:
+            product_id = record["product_id"]
+            image_hash = ""
+            name = image_source.resolve(record) if image_source is not None else None
+            if name:
+                try:
+                    image_hash = hashlib.sha256(image_source.read(name)).hexdigest()
+                    image_names[product_id] = name
+                except Exception as e:
+                    logger.warning(f"⚠️ Không đọc được ảnh {name} của product {product_id}: {str(e)}")
+            fingerprints[product_id] = compute_product_fingerprint(record, image_hash)
+        return fingerprints, image_names
+
+    async def _embed_batch(
+        self,
+        batch: List[Dict],
+        image_source: Optional[_ImageSource],
+        image_names: Dict[str, str],
+        report: Dict
+    ) -> Tuple[List, List[Optional[Dict]]]:
+        """
+        CLIP text (enriched) và CLIP image của cả batch chạy đồng thời
+
+        Returns:
+            (primary embedding từng product, kết quả dedup ảnh từng product - None nếu không có ảnh)
+        """
+        texts = [self.product_ingest_pipeline.build_product_text(record) for record in batch]
+        with_image = [i for i, record in enumerate(batch) if record["product_id"] in image_names]
+
+        def _read_images() -> List[bytes]:
+            return [image_source.read(image_names[batch[i]["product_id"]]) for i in with_image]
+
+        images = await asyncio.to_thread(_read_images) if with_image else []
+        if self.deduplicator is not None:
+            # Ảnh gần trùng ảnh đã biết hoặc ảnh khác trong batch: không chạy CLIP lại
+            text_embeddings, dedup_results = await asyncio.gather(
+                self.image_embedding_service.create_text_embeddings(texts),
+                self.deduplicator.embed(images)
+            )
+            image_embeddings = [result["embedding"] for result in dedup_results]
+        else:
+            text_embeddings, image_embeddings = await asyncio.gather(
+                self.image_embedding_service.create_text_embeddings(texts),
+                self.image_embedding_service.create_embeddings(images)
+            )
+            dedup_results = [None] * len(images)
+
+        image_by_index = dict(zip(with_image, image_embeddings))
+        dedup_by_index = dict(zip(with_image, dedup_results))
+        results = []
+        for i, record in enumerate(batch):
+            embedding = self.product_ingest_pipeline.combine_embeddings(text_embeddings[i], image_by_index.get(i))
+            if embedding is None:
+                self._add_error(report, record["product_id"], "Không thể tạo embedding cho product")
+            results.append(embedding)
+        return results, [dedup_by_index.get(i) for i in range(len(batch))]
+
+    async def _flush(self, pending: Dict, upload_date: str, report: Dict) -> float:
+        """Ghi các products đang chờ vào vector store (một transaction), trả thời gian (ms)"""
+        start = time.perf_counter()
+        count = len(pending["chunks"])
+        try:
+            await self.vector_store.save_chunks(
+                pending["chunks"],
+                pending["embeddings"],
+                file_type="product",
+                upload_date=upload_date,
+                extra_metadata=pending["metadata"],
+                content_hashes=pending["hashes"]
+            )
+            report["embedded"] += count
+            if self.deduplicator is not None:
+                await asyncio.to_thread(self.deduplicator.remember, pending["images"])
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi ghi {count} products vào vector store: {str(e)}", exc_info=True)
+            for chunk in pending["chunks"]:
+                self._add_error(report, chunk.file_id, f"Lỗi ghi vector store: {str(e)}")
+        for key in ("chunks", "embeddings", "metadata", "images"):
+            pending[key] = []
+        pending["hashes"] = {}
+        return (time.perf_counter() - start) * 1000
+
+    @staticmethod
+    def _add_error(report: Dict, product_id: str, error: str) -> None:
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"product_id": product_id, "error": error})
@@ -0,0 +1,9 @@
+"""
+Change Events
+Event bus nhận change events từ backend và invalidate caches/indexes, re-embed products
+"""
+from app.core.events.bus import EventBus
+from app.core.events.reembed_queue import ReembedQueue
+from app.core.events.subscribers import invalidate_search_cache, register_default_subscribers
+
+__all__ = ["EventBus", "ReembedQueue", "invalidate_search_cache", "register_default_subscribers"]
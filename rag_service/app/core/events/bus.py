@@ -0,0 +1,125 @@
+"""
+Event Bus - Phân phối change events từ backend tới các cache/index trong process
+
+Mỗi subscriber đăng ký theo loại event và nhận cả batch events cùng loại một lần
+(invalidate một lần cho cả batch thay vì từng event). Subscribers chạy đồng thời,
+lỗi của một subscriber không ảnh hưởng các subscriber khác.
+"""
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from app.domain.event import ChangeEvent
+
+logger = logging.getLogger(__name__)
+
+
+class EventBus:
+    """
+    Bus publish/subscribe trong process
+
+    - subscribe(): handler(events) sync hoặc async, nhận các events thuộc event_types
+    - publish(): bỏ events trùng event_id (backend gửi lại), fan-out tới subscribers
+    """
+
+    def __init__(self, dedupe_size: int = 10000):
+        """
+        Args:
+            dedupe_size: Số event_id gần nhất được nhớ để bỏ event gửi lại
+        """
+        self.dedupe_size = max(0, dedupe_size)
+        self._subscribers: List[Tuple[str, frozenset, Callable]] = []
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Any] = {"published": 0, "duplicates": 0, "by_type": {}, "subscribers": {}}
+
+    def subscribe(self, name: str, event_types: Iterable[str], handler: Callable) -> None:
+        """
+        Args:
+            name: Tên subscriber (stats/log)
+            event_types: Các loại event quan tâm
+            handler: handler(List[ChangeEvent]) - sync hoặc async
+        """
+        self._subscribers.append((name, frozenset(event_types), handler))
+        self._stats["subscribers"][name] = {"batches": 0, "events": 0, "errors": 0, "last_error": None, "total_ms": 0.0}
+
+    @property
+    def subscribers(self) -> List[str]:
+        return [name for name, _, _ in self._subscribers]
+
+    def _dedupe(self, events: List[ChangeEvent]) -> List[ChangeEvent]:
+        fresh = []
+        with self._lock:
+            for event in events:
+                if event.event_id:
+                    if event.event_id in self._seen:
+                        self._stats["duplicates"] += 1
+                        continue
+                    self._seen[event.event_id] = None
+                    if len(self._seen) > self.dedupe_size:
+                        self._seen.popitem(last=False)
+                fresh.append(event)
+        return fresh
+
+    async def _deliver(self, name: str, handler: Callable, events: List[ChangeEvent]) -> Dict[str, Any]:
+        stats = self._stats["subscribers"][name]
+        start = time.perf_counter()
+        try:
+            result = handler(events)
+            if inspect.isawaitable(result):
+                await result
+            return {"events": len(events), "ok": True}
+        except Exception as e:
+            stats["errors"] += 1
+            stats["last_error"] = str(e)
+            logger.error(f"❌ Event subscriber '{name}' lỗi: {str(e)}", exc_info=True)
+            return {"events": len(events), "ok": False, "error": str(e)}
+        finally:
+            stats["batches"] += 1
+            stats["events"] += len(events)
+            stats["total_ms"] += (time.perf_counter() - start) * 1000
+
+    async def publish(self, events: List[ChangeEvent]) -> Dict[str, Any]:
+        """
+        Publish batch events
+
+        Returns:
+            {"accepted", "duplicates", "subscribers": {name: {"events", "ok", "error"?}}}
+        """
+        fresh = self._dedupe(events)
+        with self._lock:
+            self._stats["published"] += len(fresh)
+            for event in fresh:
+                self._stats["by_type"][event.type] = self._stats["by_type"].get(event.type, 0) + 1
+
+        deliveries = []
+        for name, event_types, handler in self._subscribers:
+            matching = [event for event in fresh if event.type in event_types]
+            if matching:
+                deliveries.append((name, self._deliver(name, handler, matching)))
+        results = await asyncio.gather(*(delivery for _, delivery in deliveries))
+
+        if fresh:
+            logger.info(f"📣 Change events: {len(fresh)} events → {len(deliveries)} subscribers")
+        return {
+            "accepted": len(fresh),
+            "duplicates": len(events) - len(fresh),
+            "subscribers": {name: result for (name, _), result in zip(deliveries, results)},
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "published": self._stats["published"],
+                "duplicates": self._stats["duplicates"],
+                "by_type": dict(self._stats["by_type"]),
+            }
+        stats["subscribers"] = {
+            name: {**values, "total_ms": round(values["total_ms"], 2)}
+            for name, values in self._stats["subscribers"].items()
+        }
+        return stats
@@ -0,0 +1,163 @@
+"""
+Re-embed Queue - Đồng bộ lại products trong vector store theo change events
+
+Product ids từ events được gom lại trong EVENTS_REEMBED_DEBOUNCE_SECONDS rồi xử lý theo batch:
+- Đọc lại products từ database (nguồn chính xác, event chỉ cần mang product_id)
+- Products còn tồn tại → CatalogSyncPipeline.sync (fingerprint: chỉ embed lại khi nội dung/ảnh đổi)
+- product.deleted → xóa khỏi vector store
+- Product được upsert nhưng không đọc lại được: chỉ xóa khi confirm_deleted xác nhận đã xóa
+  (IsDeleted = 1 hoặc không còn dòng nào); dòng không hợp lệ / id khác định dạng được giữ nguyên
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class ReembedQueue:
+    """Hàng đợi product ids cần re-embed/xóa, flush ở background task"""
+
+    def __init__(
+        self,
+        catalog_sync_pipeline_factory: Callable,
+        load_records: Callable[[List[str]], List[Dict]],
+        image_source_factory: Optional[Callable] = None,
+        on_flushed: Optional[Callable[[Dict[str, Any]], None]] = None,
+        confirm_deleted: Optional[Callable[[List[str]], List[str]]] = None,
+        debounce_seconds: Optional[float] = None,
+        max_batch: Optional[int] = None
+    ):
+        """
+        Args:
+            catalog_sync_pipeline_factory: Hàm trả về CatalogSyncPipeline (lazy - tránh load CLIP khi import)
+            load_records: Đọc records theo product ids (sync, chạy trong thread)
+            image_source_factory: Hàm tạo nguồn ảnh cho mỗi batch (None = chỉ text)
+            on_flushed: Gọi sau mỗi batch (ví dụ xóa cache kết quả search)
+            confirm_deleted: Trong các ids upsert không đọc lại được, trả về các ids thực sự đã xóa
+                             (sync, chạy trong thread; None = không tự xóa, chỉ xóa theo product.deleted)
+            debounce_seconds: Thời gian gom events trước khi flush (mặc định EVENTS_REEMBED_DEBOUNCE_SECONDS)
+            max_batch: Số products tối đa mỗi batch (mặc định EVENTS_REEMBED_MAX_BATCH)
+        """
+        self.catalog_sync_pipeline_factory = catalog_sync_pipeline_factory
+        self.load_records = load_records
+        self.image_source_factory = image_source_factory
+        self.on_flushed = on_flushed
+        self.confirm_deleted = confirm_deleted
+        self.debounce_seconds = Settings.EVENTS_REEMBED_DEBOUNCE_SECONDS if debounce_seconds is None else debounce_seconds
+        self.max_batch = max(1, Settings.EVENTS_REEMBED_MAX_BATCH if max_batch is None else max_batch)
+
+        self._upserts: Set[str] = set()
+        self._deletes: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "enqueued": 0, "batches": 0, "embedded": 0, "unchanged": 0, "deleted": 0, "failed": 0, "not_found": 0
+        }
+        self._last_error: Optional[str] = None
+
+    def enqueue(self, product_ids: Iterable[str]) -> None:
+        """Products cần đồng bộ lại (upsert, đổi giá)"""
+        for product_id in product_ids:
+            self._deletes.discard(product_id)
+            self._upserts.add(product_id)
+            self._stats["enqueued"] += 1
+        self._schedule()
+
+    def enqueue_delete(self, product_ids: Iterable[str]) -> None:
+        """Products cần xóa khỏi vector store"""
+        for product_id in product_ids:
+            self._upserts.discard(product_id)
+            self._deletes.add(product_id)
+            self._stats["enqueued"] += 1
+        self._schedule()
+
+    @property
+    def pending(self) -> int:
+        return len(self._upserts) + len(self._deletes)
+
+    def _schedule(self) -> None:
+        if self.pending and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self.pending:
+            await asyncio.sleep(self.debounce_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                # Dừng vòng lặp: các ids còn chờ được thử lại khi có event tiếp theo
+                self._last_error = str(e)
+                logger.error(f"❌ Re-embed batch lỗi: {str(e)}", exc_info=True)
+                break
+
+    async def flush(self) -> Dict[str, Any]:
+        """Xử lý một batch đang chờ"""
+        upserts = sorted(self._upserts)[:self.max_batch]
+        deletes = sorted(self._deletes)[:self.max_batch]
+        self._upserts.difference_update(upserts)
+        self._deletes.difference_update(deletes)
+        if not upserts and not deletes:
+            return {}
+
+        start = time.perf_counter()
+        pipeline = self.catalog_sync_pipeline_factory()
+        report: Dict[str, Any] = {"upserts": len(upserts), "deletes": len(deletes)}
+        try:
+            records = await asyncio.to_thread(self.load_records, upserts) if upserts else []
+            found = {record["product_id"] for record in records}
+            missing = [product_id for product_id in upserts if product_id not in found]
+            if missing:
+                # Chỉ xóa khi database xác nhận đã xóa; còn lại (dòng bị bỏ qua khi normalize, id khác
+                # hoa thường/định dạng) giữ nguyên trong vector store
+                confirmed = await asyncio.to_thread(self.confirm_deleted, missing) if self.confirm_deleted else []
+                deletes = deletes + [product_id for product_id in confirmed if product_id not in deletes]
+                not_found = len(missing) - len(confirmed)
+                if not_found:
+                    report["not_found"] = not_found
+                    self._stats["not_found"] += not_found
+                    logger.warning(f"⚠️ Re-embed: {not_found} products không đọc lại được nhưng chưa bị xóa, giữ nguyên")
+
+            if records:
+                image_source = self.image_source_factory() if self.image_source_factory else None
+                try:
+                    sync_report = await pipeline.sync(records, image_source=image_source)
+                finally:
+                    if image_source is not None:
+                        image_source.close()
+                report.update(
+                    embedded=sync_report["embedded"],
+                    unchanged=sync_report["unchanged"],
+                    failed=sync_report["failed"],
+                    missing_images=sync_report["missing_images"]
+                )
+                self._stats["embedded"] += sync_report["embedded"]
+                self._stats["unchanged"] += sync_report["unchanged"]
+                self._stats["failed"] += sync_report["failed"]
+            if deletes:
+                await pipeline.vector_store.delete_documents(deletes)
+                report["deleted"] = len(deletes)
+                self._stats["deleted"] += len(deletes)
+        except Exception:
+            # Trả lại hàng đợi để thử lại ở lần flush sau (trừ khi đã có event mới hơn)
+            self._upserts.update(product_id for product_id in upserts if product_id not in self._deletes)
+            self._deletes.update(product_id for product_id in deletes if product_id not in self._upserts)
+            raise
+        finally:
+            self._stats["batches"] += 1
+
+        report["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        logger.info(f"🔁 Re-embed batch: {report}")
+        if self.on_flushed is not None:
+            self.on_flushed(report)
+        return report
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "pending": self.pending,
+            "running": self._task is not None and not self._task.done(),
+            "last_error": self._last_error,
+        }
@@ -0,0 +1,138 @@
+"""
+Default Subscribers - Cache/index nào bị ảnh hưởng bởi loại change event nào
+
+- function_results: kết quả function calls đã cache (theo function name)
+- catalog_indexes: expiry index + order analytics snapshot của FunctionHandler
+- knowledge_caches: kết quả search của Knowledge Agent, kiểm tra entity của Entity Resolver
+- reembed_queue: products cần đồng bộ lại trong vector store
+"""
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.cache import get_cache_registry
+from app.core.events.bus import EventBus
+from app.core.events.reembed_queue import ReembedQueue
+from app.domain.event import (
+    EVENT_ORDER_STATUS_CHANGED,
+    EVENT_PRICE_CHANGED,
+    EVENT_PRODUCT_DELETED,
+    EVENT_PRODUCT_UPSERTED,
+    EVENT_PROMOTION_CHANGED,
+    PRODUCT_EVENT_TYPES,
+    ChangeEvent,
+)
+
+logger = logging.getLogger(__name__)
+
+# Functions có kết quả phụ thuộc vào từng loại event
+_PRODUCT_FUNCTIONS = (
+    "getProductInfo", "getProductExpiry", "getProductsExpiringSoon", "getExpiredProducts",
+    "getInventoryStatus", "getCategoryProducts", "getTopProducts", "getBestSellingProductImage",
+)
+_ORDER_FUNCTIONS = (
+    "getOrderStatus", "getCustomerOrders", "getMonthlyRevenue", "getRevenueStatistics",
+    "getProductMonthlyRevenue", "getTopProducts", "getBestSellingProductImage",
+)
+FUNCTION_DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    EVENT_PRODUCT_UPSERTED: _PRODUCT_FUNCTIONS,
+    EVENT_PRODUCT_DELETED: _PRODUCT_FUNCTIONS,
+    EVENT_PRICE_CHANGED: _PRODUCT_FUNCTIONS + ("getActivePromotions",),
+    EVENT_ORDER_STATUS_CHANGED: _ORDER_FUNCTIONS,
+    EVENT_PROMOTION_CHANGED: ("getActivePromotions", "getProductInfo", "getCategoryProducts"),
+}
+
+# Cache của agents bị ảnh hưởng khi sản phẩm thay đổi
+KNOWLEDGE_SEARCH_CACHE = "knowledge_search"
+ENTITY_VALIDATION_CACHE = "entity_validation"
+
+
+def _invalidate_cache(name: str, predicate: Optional[Callable] = None) -> int:
+    """Xóa entries của cache (chỉ khi cache đã được tạo - không tạo cache với cấu hình mặc định)"""
+    registry = get_cache_registry()
+    if name not in registry:
+        return 0
+    cache = registry.get_cache(name)
+    if predicate is None:
+        removed = cache.stats()["size"]
+        cache.clear()
+        return removed
+    return cache.invalidate_where(predicate)
+
+
+def invalidate_knowledge_caches(events: List[ChangeEvent]) -> None:
+    """
+    Kết quả search key (kind, query, category_id, top_k): chỉ xóa các category bị ảnh hưởng
+    (và các search không lọc category) khi mọi event đều có category_id
+    """
+    categories = {event.category_id for event in events}
+    if None in categories:
+        removed = _invalidate_cache(KNOWLEDGE_SEARCH_CACHE)
+    else:
+        removed = _invalidate_cache(
+            KNOWLEDGE_SEARCH_CACHE,
+            lambda key: not isinstance(key, tuple) or len(key) < 3 or key[2] is None or key[2] in categories
+        )
+    if any(event.type != EVENT_PRICE_CHANGED for event in events):
+        # Sản phẩm thêm/xóa/đổi tên → kết quả kiểm tra entity tồn tại trong DB có thể sai
+        removed += _invalidate_cache(ENTITY_VALIDATION_CACHE)
+    logger.info(f"🧹 Knowledge caches: xóa {removed} entries ({len(events)} product events)")
+
+
+def invalidate_search_cache(report: Optional[Dict] = None) -> None:
+    """Sau mỗi batch re-embed: kết quả vector search đã cache không còn khớp vector store"""
+    if report is None or report.get("embedded") or report.get("deleted"):
+        _invalidate_cache(KNOWLEDGE_SEARCH_CACHE)
+
+
+def register_default_subscribers(
+    bus: EventBus,
+    function_handler_factory: Callable,
+    reembed_queue: Optional[ReembedQueue] = None
+) -> None:
+    """
+    Args:
+        bus: EventBus
+        function_handler_factory: Hàm trả về FunctionHandler (None nếu chưa cấu hình database)
+        reembed_queue: Hàng đợi re-embed (None = không đồng bộ vector store theo events)
+    """
+
+    def invalidate_function_results(events: List[ChangeEvent]) -> None:
+        function_handler = function_handler_factory()
+        if function_handler is None:
+            return
+        names = {name for event in events for name in FUNCTION_DEPENDENCIES.get(event.type, ())}
+        removed = function_handler.invalidate_function_results(names)
+        logger.info(f"🧹 Function results: xóa {removed} entries ({len(names)} functions)")
+
+    def invalidate_catalog_indexes(events: List[ChangeEvent]) -> None:
+        function_handler = function_handler_factory()
+        if function_handler is None:
+            return
+        # Trạng thái mới (chưa có trong DonHang lúc nạp) cần có trong predicates IN (...)
+        function_handler.order_statuses.observe(
+            event.data.get("status") for event in events if event.type == EVENT_ORDER_STATUS_CHANGED
+        )
+        if any(event.type in PRODUCT_EVENT_TYPES for event in events):
+            function_handler.invalidate_catalog()
+        elif function_handler.analytics is not None:
+            # Chỉ trạng thái đơn đổi: refresh tăng dần đọc lại các đơn trong status window
+            function_handler.analytics.invalidate()
+
+    bus.subscribe("function_results", FUNCTION_DEPENDENCIES.keys(), invalidate_function_results)
+    bus.subscribe(
+        "catalog_indexes",
+        PRODUCT_EVENT_TYPES + (EVENT_ORDER_STATUS_CHANGED,),
+        invalidate_catalog_indexes
+    )
+    bus.subscribe("knowledge_caches", PRODUCT_EVENT_TYPES, invalidate_knowledge_caches)
+
+    if reembed_queue is not None:
+        def enqueue_reembed(events: List[ChangeEvent]) -> None:
+            # Giữ event cuối cùng của mỗi product (thứ tự trong batch)
+            latest: Dict[str, str] = {}
+            for event in events:
+                latest[event.product_id] = event.type
+            reembed_queue.enqueue_delete(pid for pid, kind in latest.items() if kind == EVENT_PRODUCT_DELETED)
+            reembed_queue.enqueue(pid for pid, kind in latest.items() if kind != EVENT_PRODUCT_DELETED)
+
+        bus.subscribe("reembed_queue", PRODUCT_EVENT_TYPES, enqueue_reembed)
@@ -2,13 +2,17 @@
 Image Ingest Pipeline - Xử lý ảnh và lưu vào vector store
 Pipeline: Image → Image Encoder → Embedding Vector → Vector Database
 """
+import asyncio
+import hashlib
 import logging
 import uuid
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import numpy as np
 
+from app.core.settings import Settings
 from app.services.image import ImageEmbeddingService
+from app.services.image.deduplicator import ImageDeduplicator
 from app.infrastructure.vector_store.base import VectorStore
 from app.domain.document import DocumentChunk
 
@@ -23,13 +27,26 @@ class ImageIngestPipeline:
     def __init__(
         self,
         image_embedding_service: ImageEmbeddingService,
-        vector_store: VectorStore
+        vector_store: VectorStore,
+        deduplicator: Optional[ImageDeduplicator] = None
     ):
         """
         Khởi tạo Image Ingest Pipeline
+        deduplicator: Dùng lại embedding của ảnh gần trùng (None = luôn chạy CLIP)
         """
         self.image_embedding_service = image_embedding_service
         self.vector_store = vector_store
+        self.deduplicator = deduplicator
+    
+    @staticmethod
+    def _existing_duplicate(dedup: Optional[dict]) -> Optional[str]:
+        """image_id của ảnh (không phải product) đã lưu mà ảnh mới gần trùng, khi bật IMAGE_DEDUP_SKIP_DUPLICATES"""
+        if (
+            dedup and Settings.IMAGE_DEDUP_SKIP_DUPLICATES
+            and dedup.get("duplicate_of") and dedup.get("duplicate_content_type") == "image"
+        ):
+            return dedup["duplicate_of"]
+        return None
     
     async def process_and_store(
         self, 
@@ -37,7 +54,7 @@ class ImageIngestPipeline:
         image_name: str,
         image_id: Optional[str] = None,
         metadata: Optional[dict] = None
-    ) -> str:
+    ) -> Tuple[str, Optional[str]]:
         """
         Xử lý ảnh và lưu vào vector store
         
@@ -48,18 +65,29 @@ class ImageIngestPipeline:
             metadata: Metadata bổ sung (tùy chọn)
             
         Returns:
-            image_id của ảnh đã xử lý
+            (image_id, duplicate_of): duplicate_of khác None khi ảnh không được lưu vì gần trùng ảnh đã có
+            (IMAGE_DEDUP_SKIP_DUPLICATES), lúc đó image_id là id của ảnh đã có
         """
         # Tạo image_id nếu chưa có
+        id_provided = bool(image_id)
         if not image_id:
             image_id = f"IMG-{str(uuid.uuid4())[:8]}"
         
         try:
             logger.info(f"🖼️  Bắt đầu xử lý ảnh: {image_name} (ID: {image_id})")
             
-            # Bước 1: Tạo embedding vector từ ảnh
+            # Bước 1: Tạo embedding vector từ ảnh (ảnh gần trùng: dùng lại embedding đã có)
             logger.info(f"Đang tạo embedding vector từ ảnh...")
-            embedding = await self.image_embedding_service.create_embedding(image_bytes)
+            dedup = None
+            if self.deduplicator is not None:
+                dedup = (await self.deduplicator.embed([image_bytes]))[0]
+                existing_id = None if id_provided else self._existing_duplicate(dedup)
+                if existing_id:
+                    logger.info(f"♻️ Ảnh {image_name} gần trùng ảnh {existing_id} (distance {dedup['distance']}), không lưu thêm")
+                    return existing_id, existing_id
+                embedding = dedup["embedding"]
+            else:
+                embedding = await self.image_embedding_service.create_embedding(image_bytes)
             
             if embedding is None:
                 raise ValueError("Không thể tạo embedding từ ảnh")
@@ -97,12 +125,16 @@ class ImageIngestPipeline:
                 [chunk], 
                 [embedding], 
                 file_type, 
-                upload_date
+                upload_date,
+                byte_size=len(image_bytes),
+                content_hash=hashlib.sha256(image_bytes).hexdigest()
             )
+            if self.deduplicator is not None:
+                await asyncio.to_thread(self.deduplicator.remember, [(image_id, "image", dedup)])
             
             logger.info(f"✅ Đã xử lý và lưu thành công ảnh {image_name} với embedding vector")
             
-            return image_id
+            return image_id, None
             
         except Exception as e:
             logger.error(f"❌ Lỗi khi xử lý ảnh {image_name}: {str(e)}", exc_info=True)
@@ -114,11 +146,12 @@ class ImageIngestPipeline:
         image_names: List[str],
         image_ids: Optional[List[str]] = None,
         metadata_list: Optional[List[dict]] = None
-    ) -> List[str]:
+    ) -> List[Tuple[str, str, Optional[str]]]:
         """
         Xử lý nhiều ảnh cùng lúc (batch)  
         Returns:
-            Danh sách image_id đã xử lý
+            [(image_id, image_name, duplicate_of)] của các ảnh tạo được embedding
+            (duplicate_of: xem process_and_store)
         """
         if not images or not image_names:
             return []
@@ -127,26 +160,46 @@ class ImageIngestPipeline:
             raise ValueError("Số lượng ảnh và tên file phải bằng nhau")
         
         # Tạo image_ids nếu chưa có
+        ids_provided = bool(image_ids)
         if not image_ids:
             image_ids = [f"IMG-{str(uuid.uuid4())[:8]}" for _ in images]
         
         try:
             logger.info(f"🖼️  Bắt đầu xử lý batch {len(images)} ảnh...")
             
-            # Bước 1: Tạo embeddings cho tất cả ảnh
+            # Bước 1: Tạo embeddings cho tất cả ảnh (ảnh gần trùng: dùng lại embedding, không chạy CLIP)
             logger.info(f"🔢  Đang tạo embeddings cho {len(images)} ảnh...")
-            embeddings = await self.image_embedding_service.create_embeddings(images)
-            
-            # Filter valid embeddings
+            dedup_results = [None] * len(images)
+            if self.deduplicator is not None:
+                dedup_results = await self.deduplicator.embed(images)
+                embeddings = [result["embedding"] for result in dedup_results]
+            else:
+                embeddings = await self.image_embedding_service.create_embeddings(images)
+            
+            # Filter valid embeddings, ảnh gần trùng ảnh đã lưu / ảnh trước trong batch trỏ về image_id đó
             valid_data = []
+            result_ids = []
             for i, (img_bytes, img_name, img_id, emb) in enumerate(
                 zip(images, image_names, image_ids, embeddings)
             ):
-                if emb is not None:
-                    metadata = (metadata_list[i] if metadata_list and i < len(metadata_list) else {}) or {}
-                    valid_data.append((img_id, img_name, emb, metadata))
-            
-            if not valid_data:
+                if emb is None:
+                    continue
+                dedup = dedup_results[i]
+                if not ids_provided:
+                    existing_id = self._existing_duplicate(dedup)
+                    if (
+                        existing_id is None and Settings.IMAGE_DEDUP_SKIP_DUPLICATES
+                        and dedup and dedup["batch_duplicate_of"] is not None
+                    ):
+                        existing_id = image_ids[dedup["batch_duplicate_of"]]
+                    if existing_id:
+                        result_ids.append((existing_id, img_name, existing_id))
+                        continue
+                metadata = (metadata_list[i] if metadata_list and i < len(metadata_list) else {}) or {}
+                valid_data.append((img_id, img_name, emb, metadata))
+                result_ids.append((img_id, img_name, None))
+            
+            if not result_ids:
                 raise ValueError("Không thể tạo embeddings cho bất kỳ ảnh nào")
             
             logger.info(f"✅ Đã tạo {len(valid_data)}/{len(images)} embeddings thành công")
@@ -184,9 +237,15 @@ class ImageIngestPipeline:
                     upload_date
                 )
             
+            if self.deduplicator is not None:
+                stored = {img_id for img_id, _, _, _ in valid_data}
+                await asyncio.to_thread(self.deduplicator.remember, [
+                    (img_id, "image", dedup_results[i]) for i, img_id in enumerate(image_ids) if img_id in stored
+                ])
+            
             logger.info(f"✅ Đã xử lý và lưu thành công {len(valid_data)} ảnh")
             
-            return [img_id for img_id, _, _, _ in valid_data]
+            return result_ids
             
         except Exception as e:
             logger.error(f"❌ Lỗi khi xử lý batch ảnh: {str(e)}", exc_info=True)
@@ -2,6 +2,7 @@
 Ingest Pipeline - Logic nghiệp vụ chính cho quy trình: File → chunks → vector
 Pipeline xử lý tài liệu: Đọc file → Chia nhỏ thành chunks → Tạo embedding → Lưu vào vector store
 """
+import hashlib
 import logging
 import uuid
 from typing import List, Optional
@@ -108,7 +109,9 @@ class IngestPipeline:
                 valid_chunks, 
                 valid_embeddings, 
                 file_type, 
-                upload_date
+                upload_date,
+                byte_size=len(file_content),
+                content_hash=hashlib.sha256(file_content).hexdigest()
             )
             
             logger.info(f"✅ Đã xử lý và lưu thành công tài liệu {file_name} với {len(valid_chunks)} chunks")
@@ -2,6 +2,7 @@
 Product Ingest Pipeline - Xử lý product và lưu vào vector store theo category
 Pipeline: Product (Text + Image) → Embeddings → Vector Database (theo category)
 """
+import asyncio
 import logging
 import uuid
 from datetime import datetime
@@ -9,6 +10,7 @@ from typing import Optional, List, Dict
 import numpy as np
 
 from app.services.product import ProductEmbeddingService
+from app.services.image.deduplicator import ImageDeduplicator
 from app.infrastructure.vector_store.image_vector_store import ImageVectorStore
 from app.domain.document import DocumentChunk
 
@@ -23,7 +25,8 @@ class ProductIngestPipeline:
     def __init__(
         self,
         product_embedding_service: ProductEmbeddingService,
-        vector_store: ImageVectorStore
+        vector_store: ImageVectorStore,
+        deduplicator: Optional[ImageDeduplicator] = None
     ):
         """
         Khởi tạo Product Ingest Pipeline
@@ -31,9 +34,11 @@ class ProductIngestPipeline:
         Args:
             product_embedding_service: Service tạo embeddings cho product
             vector_store: Vector store để lưu embeddings
+            deduplicator: Dùng lại image embedding của ảnh gần trùng (None = luôn chạy CLIP)
         """
         self.product_embedding_service = product_embedding_service
         self.vector_store = vector_store
+        self.deduplicator = deduplicator
     
     async def process_and_store(
         self,
@@ -63,18 +68,21 @@ class ProductIngestPipeline:
             product_id = product_data.get('product_id') or f"PROD-{str(uuid.uuid4())[:8]}"
         
         category_id = product_data.get('category_id', '')
-        category_name = product_data.get('category_name', '')
         product_name = product_data.get('product_name', '')
         
         try:
             logger.info(f"🛍️  Bắt đầu xử lý product: {product_name} (ID: {product_id}, Category: {category_id})")
             
-            # Tạo embeddings cho product
+            # Image embedding (CLIP) - ảnh gần trùng ảnh đã biết (cùng ảnh cho nhiều biến thể, upload lại...)
+            # dùng lại embedding đã có thay vì chạy CLIP
             logger.info(f"🔢 Đang tạo embeddings cho product...")
-            embeddings = await self.product_embedding_service.create_product_embeddings(
-                product_data,
-                image_bytes
-            )
+            dedup = None
+            image_emb = None
+            if image_bytes and self.deduplicator is not None:
+                dedup = (await self.deduplicator.embed([image_bytes]))[0]
+                image_emb = dedup["embedding"]
+            elif image_bytes:
+                image_emb = await self.product_embedding_service.create_image_embedding(image_bytes)
             
             # Sử dụng combined embedding (text CLIP + image) để hỗ trợ cả text và image search
             primary_embedding = None
@@ -88,71 +96,23 @@ class ProductIngestPipeline:
             product_text = self._enrich_product_text(product_data, product_name)
             text_clip_embedding = None
             if product_text:
-                text_clip_embedding = image_embedding_service.create_text_embedding(product_text)
-            
-            image_emb = embeddings.get('image_embedding')
-            
-            # Tăng weight của text để text search tốt hơn
-            if text_clip_embedding is not None and image_emb is not None:
-                # Normalize cả 2
-                text_norm = text_clip_embedding / (np.linalg.norm(text_clip_embedding) + 1e-8)
-                img_norm = image_emb / (np.linalg.norm(image_emb) + 1e-8)
-                # Weighted average: 70% text, 30% image (tăng weight text để text search tốt hơn)
-                primary_embedding = 0.7 * text_norm + 0.3 * img_norm
-                logger.info(f"✅ Sử dụng combined embedding (70% text CLIP + 30% image, dimension: {len(primary_embedding)})")
-            elif text_clip_embedding is not None:
-                # Chỉ có text, dùng text CLIP embedding
-                primary_embedding = text_clip_embedding
-                logger.info(f"✅ Sử dụng text CLIP embedding (dimension: {len(primary_embedding)})")
-            elif image_emb is not None:
-                # Chỉ có image, dùng image embedding
-                primary_embedding = image_emb
-                logger.info(f"✅ Sử dụng image embedding (dimension: {len(primary_embedding)})")
-            else:
-                logger.warning("⚠️  Product không có text và image, không thể tạo embedding")
+                text_clip_embedding = await image_embedding_service.create_text_embedding_async(product_text)
             
+            # Tăng weight của text để text search tốt hơn (70% text CLIP + 30% image)
+            primary_embedding = self.combine_embeddings(text_clip_embedding, image_emb)
             if primary_embedding is None:
+                logger.warning("⚠️  Product không có text và image, không thể tạo embedding")
                 raise ValueError("Không thể tạo embedding cho product")
+            logger.info(f"✅ Primary embedding (text: {text_clip_embedding is not None}, image: {image_emb is not None}, dimension: {len(primary_embedding)})")
             
             # Tạo DocumentChunk từ product
-            chunk = DocumentChunk(
-                chunk_id=f"{product_id}-chunk-0",
-                file_id=product_id,
-                file_name=product_name or f"Product_{product_id}",
-                text=f"[Product: {product_name}] {product_data.get('description', '')}",
-                chunk_index=0,
-                start_index=0,
-                end_index=0
-            )
+            chunk = self.build_product_chunk(product_id, product_data)
             
             # Lưu vào vector store với metadata đầy đủ
             logger.info(f"💾 Đang lưu product vào vector store...")
             upload_date = datetime.now().isoformat()
             
-            # Lấy image filename từ product_data nếu có (từ database khi embed)
-            image_filename = product_data.get('image_filename') or product_data.get('anh')
-            
-            # Metadata cho product
-            # Convert price to float (ChromaDB doesn't accept Decimal)
-            price_value = product_data.get('price', '')
-            if price_value:
-                try:
-                    price_float = float(price_value)
-                except (ValueError, TypeError):
-                    price_float = 0.0
-            else:
-                price_float = 0.0
-            
-            extra_metadata = [{
-                "product_id": product_id,
-                "product_name": product_name,
-                "category_id": category_id,
-                "category_name": category_name,
-                "content_type": "product",
-                "price": price_float,  # Convert to float for ChromaDB
-                "description": product_data.get('description', '')[:200] if product_data.get('description') else '',  # Limit length
-                "image_filename": image_filename if image_filename else '',  # Lưu image filename để dùng sau
-            }]
+            extra_metadata = [self.build_product_metadata(product_id, product_data)]
             
             await self.vector_store.save_chunks(
                 [chunk],
@@ -161,6 +121,8 @@ class ProductIngestPipeline:
                 upload_date=upload_date,
                 extra_metadata=extra_metadata
             )
+            if self.deduplicator is not None:
+                await asyncio.to_thread(self.deduplicator.remember, [(product_id, "product", dedup)])
             
             logger.info(f"✅ Đã xử lý và lưu thành công product {product_name} (Category: {category_id})")
             
@@ -263,6 +225,70 @@ class ProductIngestPipeline:
             logger.error(f"❌ Lỗi khi xử lý batch products: {str(e)}", exc_info=True)
             raise
     
+    # ========== Helpers (dùng chung với CatalogSyncPipeline) ==========
+    
+    @staticmethod
+    def combine_embeddings(
+        text_clip_embedding: Optional[np.ndarray],
+        image_embedding: Optional[np.ndarray]
+    ) -> Optional[np.ndarray]:
+        """
+        Primary embedding của product: 70% text CLIP + 30% image (đã normalize từng phần),
+        hoặc embedding duy nhất có sẵn
+        """
+        if text_clip_embedding is not None and image_embedding is not None:
+            text_norm = text_clip_embedding / (np.linalg.norm(text_clip_embedding) + 1e-8)
+            img_norm = image_embedding / (np.linalg.norm(image_embedding) + 1e-8)
+            return 0.7 * text_norm + 0.3 * img_norm
+        if text_clip_embedding is not None:
+            return text_clip_embedding
+        return image_embedding
+    
+    @staticmethod
+    def build_product_chunk(product_id: str, product_data: Dict) -> DocumentChunk:
+        """DocumentChunk (1 chunk / product) lưu vào vector store"""
+        product_name = product_data.get('product_name', '')
+        return DocumentChunk(
+            chunk_id=f"{product_id}-chunk-0",
+            file_id=product_id,
+            file_name=product_name or f"Product_{product_id}",
+            text=f"[Product: {product_name}] {product_data.get('description', '')}",
+            chunk_index=0,
+            start_index=0,
+            end_index=0
+        )
+    
+    @staticmethod
+    def build_product_metadata(product_id: str, product_data: Dict) -> Dict:
+        """Metadata cho product trong vector store"""
+        # Lấy image filename từ product_data nếu có (từ database khi embed)
+        image_filename = product_data.get('image_filename') or product_data.get('anh')
+        
+        # Convert price to float (ChromaDB doesn't accept Decimal)
+        price_value = product_data.get('price', '')
+        if price_value:
+            try:
+                price_float = float(price_value)
+            except (ValueError, TypeError):
+                price_float = 0.0
+        else:
+            price_float = 0.0
+        
+        return {
+            "product_id": product_id,
+            "product_name": product_data.get('product_name', ''),
+            "category_id": product_data.get('category_id', ''),
+            "category_name": product_data.get('category_name', ''),
+            "content_type": "product",
+            "price": price_float,  # Convert to float for ChromaDB
+            "description": product_data.get('description', '')[:200] if product_data.get('description') else '',  # Limit length
+            "image_filename": image_filename if image_filename else '',  # Lưu image filename để dùng sau
+        }
+    
+    def build_product_text(self, product_data: Dict) -> str:
+        """Text (đã enrich) dùng cho CLIP text embedding của product"""
+        return self._enrich_product_text(product_data, product_data.get('product_name', ''))
+    
     def _enrich_product_text(self, product_data: Dict, product_name: str) -> str:
         """
         Enrich product text với semantic keywords để embedding chính xác
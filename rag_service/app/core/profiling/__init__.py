@@ -0,0 +1,17 @@
+"""
+Profiling
+Sampling profiler, cProfile theo request và tracemalloc snapshots cho worker đang chạy (/api/admin)
+"""
+from app.core.profiling.allocations import AllocationTracker, get_allocation_tracker
+from app.core.profiling.request_profiler import RequestProfile, RequestProfiler, get_request_profiler
+from app.core.profiling.sampler import StackSampler, sample_for
+
+__all__ = [
+    "AllocationTracker",
+    "RequestProfile",
+    "RequestProfiler",
+    "StackSampler",
+    "get_allocation_tracker",
+    "get_request_profiler",
+    "sample_for",
+]
@@ -0,0 +1,151 @@
+"""
+Allocations - tracemalloc snapshots và so sánh giữa hai thời điểm
+
+- start() bật tracemalloc (mỗi allocation tốn thêm bộ nhớ/CPU cho traceback TRACEMALLOC_FRAMES frames),
+  stop() tắt; snapshots đã chụp vẫn dùng được sau khi tắt
+- Giữ TRACEMALLOC_MAX_SNAPSHOTS snapshots gần nhất theo id; diff(base, target) dùng Snapshot.compare_to
+- Bỏ allocations của chính tracemalloc/importlib để kết quả chỉ còn code của service
+"""
+import logging
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.profiling.frames import short_path
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+KEY_TYPES = ("lineno", "filename", "traceback")
+
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def _format_traceback(traceback: tracemalloc.Traceback) -> List[str]:
+    return [f"{short_path(frame.filename)}:{frame.lineno}" for frame in traceback]
+
+
+def _format_stat(stat, key_type: str) -> Dict[str, Any]:
+    frames = _format_traceback(stat.traceback)
+    result = {
+        "location": frames[-1] if frames else "?",
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if key_type == "traceback":
+        result["traceback"] = frames
+    if isinstance(stat, tracemalloc.StatisticDiff):
+        result["size_diff_bytes"] = stat.size_diff
+        result["count_diff"] = stat.count_diff
+    return result
+
+
+class AllocationTracker:
+    """Bật/tắt tracemalloc và quản lý snapshots theo id"""
+
+    def __init__(self, max_snapshots: Optional[int] = None):
+        self.max_snapshots = Settings.TRACEMALLOC_MAX_SNAPSHOTS if max_snapshots is None else max_snapshots
+        self._snapshots: "OrderedDict[str, Tuple[Dict[str, Any], tracemalloc.Snapshot]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def start(self, frames: Optional[int] = None) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames or Settings.TRACEMALLOC_FRAMES)
+            logger.info(f"🧪 tracemalloc bật ({tracemalloc.get_traceback_limit()} frames)")
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("✅ tracemalloc tắt")
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+            "snapshots": [meta for meta, _ in self._snapshots.values()],
+        }
+
+    def take_snapshot(self, label: Optional[str] = None) -> Dict[str, Any]:
+        """Chụp snapshot (blocking, có thể mất vài giây với heap lớn - gọi qua asyncio.to_thread)"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc chưa bật (POST /api/admin/tracemalloc/start)")
+        start = time.perf_counter()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        stats = snapshot.statistics("filename")
+        with self._lock:
+            self._counter += 1
+            meta = {
+                "snapshot_id": str(self._counter),
+                "label": label,
+                "taken_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "total_bytes": sum(stat.size for stat in stats),
+                "blocks": sum(stat.count for stat in stats),
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+            self._snapshots[meta["snapshot_id"]] = (meta, snapshot)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return meta
+
+    def _get(self, snapshot_id: str) -> tracemalloc.Snapshot:
+        entry = self._snapshots.get(snapshot_id)
+        if entry is None:
+            raise KeyError(snapshot_id)
+        return entry[1]
+
+    def top(self, snapshot_id: str, key_type: str = "lineno", limit: int = 30) -> List[Dict[str, Any]]:
+        """Các vị trí cấp phát nhiều bộ nhớ nhất trong một snapshot"""
+        stats = self._get(snapshot_id).statistics(key_type)
+        return [_format_stat(stat, key_type) for stat in stats[:limit]]
+
+    def diff(
+        self,
+        base_id: str,
+        target_id: Optional[str] = None,
+        key_type: str = "lineno",
+        limit: int = 30
+    ) -> Dict[str, Any]:
+        """
+        So sánh target (hoặc heap hiện tại nếu không truyền) với base, sắp theo |size_diff| giảm dần
+        """
+        base = self._get(base_id)
+        if target_id is None:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc chưa bật - cần target_id khi đã tắt")
+            target = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        else:
+            target = self._get(target_id)
+        stats = target.compare_to(base, key_type)
+        return {
+            "base": base_id,
+            "target": target_id or "now",
+            "size_diff_bytes": sum(stat.size_diff for stat in stats),
+            "count_diff": sum(stat.count_diff for stat in stats),
+            "top": [_format_stat(stat, key_type) for stat in stats[:limit]],
+        }
+
+
+_allocation_tracker: Optional[AllocationTracker] = None
+
+
+def get_allocation_tracker() -> AllocationTracker:
+    """Lấy AllocationTracker dùng chung của process"""
+    global _allocation_tracker
+    if _allocation_tracker is None:
+        _allocation_tracker = AllocationTracker()
+    return _allocation_tracker
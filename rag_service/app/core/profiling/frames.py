@@ -0,0 +1,44 @@
+"""
+Frames - Tên ngắn gọn cho frame/file trong stacks và tracebacks của profiler
+"""
+import os
+import sysconfig
+from functools import lru_cache
+from pathlib import Path
+from types import CodeType
+
+# Thư mục rag_service (app/..., main.py)
+_PROJECT_ROOT = str(Path(__file__).resolve().parents[3]) + os.sep
+_STDLIB_ROOT = str(Path(sysconfig.get_paths()["stdlib"]).resolve()) + os.sep
+
+
+@lru_cache(maxsize=8192)
+def short_path(filename: str) -> str:
+    """app/agents/knowledge_agent.py, chromadb/api/models/Collection.py, asyncio/base_events.py, ..."""
+    if filename.startswith(_PROJECT_ROOT):
+        return filename[len(_PROJECT_ROOT):]
+    marker = f"site-packages{os.sep}"
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    if filename.startswith(_STDLIB_ROOT):
+        return filename[len(_STDLIB_ROOT):]
+    return filename
+
+
+_labels = {}
+_MAX_LABELS = 50000
+
+
+def frame_label(code: CodeType) -> str:
+    """
+    "func (file:firstlineno)" - gom theo hàm (không theo dòng) để flamegraph gọn
+    Không chứa ';' (ký tự phân tách của collapsed stacks)
+    """
+    label = _labels.get(code)
+    if label is None:
+        name = getattr(code, "co_qualname", code.co_name)
+        label = f"{name} ({short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+        if len(_labels) >= _MAX_LABELS:
+            _labels.clear()
+        _labels[code] = label
+    return label
@@ -0,0 +1,113 @@
+"""
+Request Profiler - cProfile cho từng request khi admin gửi header X-Profile: 1
+
+- Profile được giữ trong bộ nhớ (REQUEST_PROFILE_HISTORY bản gần nhất), lấy lại theo id ở header X-Profile-Id
+- Xuất text (pstats, sắp theo cumulative/tottime/...) hoặc file .prof (snakeviz, pstats, gprof2dot)
+- cProfile chỉ thấy thread của event loop: trong lúc request await, các request khác chạy trên loop cũng
+  bị tính vào; code chạy trong thread pool (SQL, CLIP) không có mặt → dùng sampling profile cho phần đó
+- Mỗi lúc chỉ một request được profile (Python chỉ cho một profiler hoạt động)
+"""
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+SORT_KEYS = ("cumulative", "tottime", "ncalls", "pcalls", "filename", "name")
+
+
+class RequestProfile:
+    """cProfile của một request"""
+
+    def __init__(self, method: str, path: str):
+        self.profile_id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.status_code: Optional[int] = None
+        self.profiler = cProfile.Profile()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "profile_id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "duration_ms": self.duration_ms,
+            "status_code": self.status_code,
+        }
+
+    def render_text(self, sort: str = "cumulative", limit: int = 50) -> str:
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stream)
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def dump(self) -> bytes:
+        """Nội dung file .prof (định dạng của cProfile.Profile.dump_stats)"""
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
+
+
+class RequestProfiler:
+    """Chạy cProfile quanh request và giữ các profile gần nhất"""
+
+    def __init__(self, history: Optional[int] = None):
+        self.history = Settings.REQUEST_PROFILE_HISTORY if history is None else history
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._active = False
+
+    def start(self, method: str, path: str) -> Optional[RequestProfile]:
+        """Bắt đầu profile; None nếu đang có request khác được profile"""
+        with self._lock:
+            if self._active:
+                return None
+            self._active = True
+        profile = RequestProfile(method, path)
+        try:
+            profile.profiler.enable()
+        except ValueError as e:
+            # Một profiler khác (vd. debugger) đang hoạt động
+            logger.warning(f"⚠️ Không bật được cProfile: {str(e)}")
+            self._active = False
+            return None
+        return profile
+
+    def finish(self, profile: RequestProfile, status_code: Optional[int]) -> None:
+        profile.profiler.disable()
+        profile.duration_ms = round((time.time() - profile.started_at) * 1000, 2)
+        profile.status_code = status_code
+        with self._lock:
+            self._active = False
+            self._profiles[profile.profile_id] = profile
+            while len(self._profiles) > self.history:
+                self._profiles.popitem(last=False)
+        logger.info(f"🧪 Request profile {profile.profile_id}: {profile.method} {profile.path} ({profile.duration_ms}ms)")
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        return self._profiles.get(profile_id)
+
+    def recent(self) -> List[Dict[str, Any]]:
+        return [profile.to_dict() for profile in reversed(self._profiles.values())]
+
+
+_request_profiler: Optional[RequestProfiler] = None
+
+
+def get_request_profiler() -> RequestProfiler:
+    """Lấy RequestProfiler dùng chung của process"""
+    global _request_profiler
+    if _request_profiler is None:
+        _request_profiler = RequestProfiler()
+    return _request_profiler
@@ -0,0 +1,169 @@
+"""
+Stack Sampler - Sampling profiler cho worker đang chạy (không cần restart, không cần tool ngoài)
+
+- Một thread lấy sys._current_frames() mỗi interval và đếm stack của mọi thread
+  (event loop, inference pool, function-call pool, image preprocessing, ...)
+- Kết quả dạng collapsed stacks "thread:<tên>;frame;...;frame <count>"
+  → flamegraph.pl, speedscope, inferno đọc trực tiếp
+- Mặc định bỏ các mẫu thread đang idle (chờ lock/queue/select) để chỉ còn CPU thật sự dùng
+- Overhead tỉ lệ với số threads × độ sâu stack / interval; interval 10ms thường < 2% CPU
+"""
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from app.core.profiling.frames import frame_label, short_path
+
+logger = logging.getLogger(__name__)
+
+# Frame trên cùng (Python) ở các file này = thread đang chờ, không dùng CPU
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+# (file, hàm): worker của ThreadPoolExecutor chờ work_queue.get() (C code nên _worker là frame trên cùng)
+_IDLE_FUNCTIONS = {("concurrent/futures/thread.py", "_worker")}
+
+_THREAD_INDEX = re.compile(r"[_-]\d+$")
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    filename = short_path(code.co_filename)
+    return filename.endswith(_IDLE_FILES) or (filename, code.co_name) in _IDLE_FUNCTIONS
+
+
+def _thread_group(name: str) -> str:
+    """ThreadPoolExecutor-0_3 → ThreadPoolExecutor-0, function-call_2 → function-call"""
+    return _THREAD_INDEX.sub("", name)
+
+
+class StackSampler:
+    """
+    Lấy mẫu stacks của mọi thread theo chu kỳ trong một thread riêng
+
+    Args:
+        interval: Chu kỳ lấy mẫu (giây)
+        include_idle: Giữ cả mẫu của thread đang chờ (lock/queue/select)
+        match: Chỉ giữ stacks chứa chuỗi này (vd. "knowledge_agent", "function_handler", "preprocessing")
+    """
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False, match: Optional[str] = None):
+        self.interval = max(interval, 0.001)
+        self.include_idle = include_idle
+        self.match = match or None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stopped_at = time.perf_counter()
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            try:
+                self._sample(own_ident)
+            except Exception as e:
+                logger.warning(f"⚠️ Stack sampler lỗi: {str(e)}")
+
+    def _sample(self, own_ident: int) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        self.samples += 1
+        for ident, frame in frames.items():
+            if ident == own_ident:
+                continue
+            if not self.include_idle and _is_idle(frame):
+                self.idle_samples += 1
+                continue
+            stack: List[str] = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(f"thread:{_thread_group(names.get(ident, str(ident)))}")
+            key = ";".join(reversed(stack))
+            if self.match and self.match not in key:
+                continue
+            self.stacks[key] += 1
+
+    @property
+    def duration(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.stopped_at or time.perf_counter()) - self.started_at
+
+    def collapsed(self) -> str:
+        """Collapsed stacks (mỗi dòng "frame;frame;... count"), nhiều mẫu nhất trước"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, limit: int = 30) -> Dict[str, Any]:
+        """Số mẫu theo thread, top hàm theo self (frame trên cùng) và total (có mặt trong stack)"""
+        threads: Counter = Counter()
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            threads[frames[0]] += count
+            self_counts[frames[-1]] += count
+            for frame in set(frames[1:]):
+                total_counts[frame] += count
+        sampled = sum(self.stacks.values())
+        return {
+            "duration_s": round(self.duration, 3),
+            "interval_ms": round(self.interval * 1000, 3),
+            "samples": self.samples,
+            "stack_samples": sampled,
+            "idle_samples": self.idle_samples,
+            "unique_stacks": len(self.stacks),
+            "threads": dict(threads.most_common()),
+            "top_self": [
+                {"frame": frame, "samples": count, "percent": round(count / sampled * 100, 2)}
+                for frame, count in self_counts.most_common(limit)
+            ] if sampled else [],
+            "top_total": [
+                {"frame": frame, "samples": count, "percent": round(count / sampled * 100, 2)}
+                for frame, count in total_counts.most_common(limit)
+            ] if sampled else [],
+        }
+
+
+_profile_lock = threading.Lock()
+
+
+def sample_for(
+    seconds: float,
+    interval: float = 0.01,
+    include_idle: bool = False,
+    match: Optional[str] = None
+) -> StackSampler:
+    """
+    Chạy StackSampler trong seconds giây (blocking - gọi qua asyncio.to_thread)
+    Mỗi lúc chỉ một profile; profile khác đang chạy → RuntimeError
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("Đang có một sampling profile khác chạy")
+    try:
+        sampler = StackSampler(interval, include_idle, match)
+        logger.info(f"🧪 Sampling profile {seconds:.1f}s (interval {interval * 1000:.1f}ms)")
+        sampler.start()
+        # Event.wait (threading.py) thay vì time.sleep để thread đang chờ này được tính là idle
+        threading.Event().wait(seconds)
+        sampler.stop()
+        logger.info(f"✅ Sampling profile xong: {sampler.samples} mẫu, {len(sampler.stacks)} stacks")
+        return sampler
+    finally:
+        _profile_lock.release()
@@ -3,8 +3,10 @@ RAG Pipeline - Logic nghiệp vụ chính cho quy trình: query → retrieve →
 Pipeline RAG: Xử lý câu hỏi → Tìm kiếm ngữ cảnh → Sắp xếp lại → Trả về kết quả
 """
 import logging
+import asyncio
 from typing import Tuple, List, Dict, Optional
 
+from app.core.tracing import traced
 from app.domain.query import Query
 from app.domain.answer import Answer, RetrievedChunk
 from app.services.embedding import EmbeddingService
@@ -43,6 +45,7 @@ class RAGPipeline:
         self.vector_store = vector_store
         self.reranker_service = reranker_service
     
+    @traced("rag.retrieve")
     async def retrieve(self, query: Query) -> Answer:
         """
         Tìm kiếm và trả về ngữ cảnh liên quan từ vector store dựa trên câu hỏi
@@ -70,11 +73,10 @@ class RAGPipeline:
                 return Answer(context="", chunks=[], has_context=False)
             
             # Bước 2: Tìm kiếm các chunks tương tự trong vector store
-            # Tối ưu: Chỉ lấy nhiều hơn nếu reranker được bật VÀ đã load xong
-            use_reranker = (self.reranker_service and 
-                          self.reranker_service.use_reranker and
-                          hasattr(self.reranker_service, '_model_loaded') and
-                          self.reranker_service._model_loaded)
+            # Tối ưu: Chỉ lấy nhiều hơn nếu reranker được bật VÀ đã load xong (load ở background)
+            use_reranker = bool(self.reranker_service and self.reranker_service.is_ready)
+            if self.reranker_service and not use_reranker:
+                self.reranker_service.start_background_load()
             
             # TỐI ƯU: Giảm initial_top_k nếu không dùng reranker để tăng tốc
             initial_top_k = query.top_k * 2 if use_reranker else query.top_k
@@ -92,48 +94,125 @@ class RAGPipeline:
                 logger.warning(f"Không tìm thấy chunks liên quan cho câu hỏi: '{query.question[:100]}...'")
                 return Answer(context="", chunks=[], has_context=False)
             
-            # Bước 3: Sắp xếp lại kết quả bằng reranker (chỉ khi model đã load)
-            if use_reranker and self.reranker_service.model:
-                rerank_start = time.time()
-                logger.info(f"Đang sắp xếp lại {len(chunk_dicts)} chunks bằng reranker")
-                chunk_dicts = await self.reranker_service.rerank(
-                    query.question,
-                    chunk_dicts,
-                    top_k=query.top_k
-                )
-                rerank_time = time.time() - rerank_start
-                logger.info(f"✅ Reranking completed in {rerank_time:.3f}s (kept {len(chunk_dicts)} chunks)")
-            
-            # Bước 4: Chuyển đổi từ dictionary sang domain objects
-            # Tối ưu: Sử dụng rerank_score nếu có, không cần sort lại
-            chunks = [
-                RetrievedChunk(
-                    chunk_id=chunk_dict['chunk_id'],
-                    file_id=chunk_dict['file_id'],
-                    file_name=chunk_dict['file_name'],
-                    chunk_index=chunk_dict['chunk_index'],
-                    text=chunk_dict['text'],
-                    similarity=chunk_dict.get('rerank_score', chunk_dict.get('similarity', 0))
-                )
-                for chunk_dict in chunk_dicts
-            ]
-            
-            # Bước 5: Xây dựng chuỗi context từ các chunks (đã được sắp xếp)
-            context_parts = ["Thông tin liên quan từ tài liệu:"]
-            # Chunks đã được sắp xếp bởi reranker hoặc similarity, không cần sort lại
-            for chunk in chunks:
-                context_parts.append(f"\n[File: {chunk.file_name}, Chunk {chunk.chunk_index}]")
-                context_parts.append(chunk.text)
-                context_parts.append("")
-            
-            context = "\n".join(context_parts)
+            # Bước 3-5: Rerank, chuyển sang domain objects và xây dựng context
+            answer = await self._build_answer(query, chunk_dicts, use_reranker)
             
             total_time = time.time() - total_start
-            logger.info(f"✅ Total retrieve time: {total_time:.3f}s - Found {len(chunks)} chunks, context length: {len(context)} chars")
+            logger.info(f"✅ Total retrieve time: {total_time:.3f}s - Found {answer.chunk_count} chunks, context length: {len(answer.context)} chars")
             
-            return Answer(context=context, chunks=chunks, has_context=True)
+            return answer
             
         except Exception as e:
             logger.error(f"Lỗi trong RAG pipeline retrieve: {str(e)}", exc_info=True)
             return Answer(context="", chunks=[], has_context=False)
-
+    
+    @traced("rag.retrieve_batch")
+    async def retrieve_batch(self, queries: List[Query]) -> List[Answer]:
+        """
+        Tìm kiếm ngữ cảnh cho nhiều câu hỏi cùng lúc
+        
+        - Embed tất cả câu hỏi bằng một lần gọi create_embeddings (batch)
+        - Mỗi giá trị file_id khác nhau chỉ tốn một lần multi-vector search
+        - Rerank từng câu hỏi song song (điểm rerank có cache theo cặp query/chunk)
+        
+        Args:
+            queries: Danh sách Query
+            
+        Returns:
+            Danh sách Answer cùng thứ tự với queries
+        """
+        import time
+        total_start = time.time()
+        empty = Answer(context="", chunks=[], has_context=False)
+        if not queries:
+            return []
+        
+        try:
+            embed_start = time.time()
+            query_embeddings = await self.embedding_service.create_embeddings([query.question for query in queries])
+            logger.info(f"✅ Batch embedding {len(queries)} câu hỏi in {time.time() - embed_start:.3f}s")
+            
+            use_reranker = bool(self.reranker_service and self.reranker_service.is_ready)
+            if self.reranker_service and not use_reranker:
+                self.reranker_service.start_background_load()
+            
+            # Gom câu hỏi theo filter file_id: mỗi nhóm một lần search với nhiều query vectors
+            groups: Dict[Optional[str], List[int]] = {}
+            for i, (query, embedding) in enumerate(zip(queries, query_embeddings)):
+                if embedding is not None:
+                    groups.setdefault(query.file_id, []).append(i)
+            
+            search_start = time.time()
+            chunk_dicts_by_query: Dict[int, List[Dict]] = {}
+            for file_id, indices in groups.items():
+                group_top_k = max(queries[i].top_k for i in indices)
+                initial_top_k = group_top_k * 2 if use_reranker else group_top_k
+                results = await self.vector_store.search_similar_batch(
+                    [query_embeddings[i] for i in indices],
+                    top_k=initial_top_k,
+                    file_id=file_id
+                )
+                for i, chunk_dicts in zip(indices, results):
+                    # Nhóm lấy theo top_k lớn nhất: cắt lại theo top_k của từng câu hỏi
+                    own_top_k = queries[i].top_k * 2 if use_reranker else queries[i].top_k
+                    chunk_dicts_by_query[i] = chunk_dicts[:own_top_k]
+            logger.info(f"✅ Batch vector search completed in {time.time() - search_start:.3f}s ({len(groups)} nhóm file_id)")
+            
+            async def build(i: int) -> Answer:
+                chunk_dicts = chunk_dicts_by_query.get(i)
+                if not chunk_dicts:
+                    return empty
+                try:
+                    return await self._build_answer(queries[i], chunk_dicts, use_reranker)
+                except Exception as e:
+                    logger.error(f"Lỗi khi xây dựng answer cho câu hỏi {i}: {str(e)}", exc_info=True)
+                    return empty
+            
+            answers = list(await asyncio.gather(*(build(i) for i in range(len(queries)))))
+            
+            total_time = time.time() - total_start
+            logger.info(f"✅ Total batch retrieve time: {total_time:.3f}s - {len(queries)} câu hỏi, {sum(1 for a in answers if a.has_context)} có context")
+            return answers
+        
+        except Exception as e:
+            logger.error(f"Lỗi trong RAG pipeline retrieve_batch: {str(e)}", exc_info=True)
+            return [empty for _ in queries]
+    
+    async def _build_answer(self, query: Query, chunk_dicts: List[Dict], use_reranker: bool) -> Answer:
+        """Rerank (nếu model đã load), chuyển chunks sang domain objects và xây dựng context"""
+        # Bước 3: Sắp xếp lại kết quả bằng reranker (chỉ khi model đã load)
+        if use_reranker:
+            import time
+            rerank_start = time.time()
+            logger.info(f"Đang sắp xếp lại {len(chunk_dicts)} chunks bằng reranker")
+            chunk_dicts = await self.reranker_service.rerank(
+                query.question,
+                chunk_dicts,
+                top_k=query.top_k
+            )
+            rerank_time = time.time() - rerank_start
+            logger.info(f"✅ Reranking completed in {rerank_time:.3f}s (kept {len(chunk_dicts)} chunks)")
+        
+        # Bước 4: Chuyển đổi từ dictionary sang domain objects
+        # Tối ưu: Sử dụng rerank_score nếu có, không cần sort lại
+        chunks = [
+            RetrievedChunk(
+                chunk_id=chunk_dict['chunk_id'],
+                file_id=chunk_dict['file_id'],
+                file_name=chunk_dict['file_name'],
+                chunk_index=chunk_dict['chunk_index'],
+                text=chunk_dict['text'],
+                similarity=chunk_dict.get('rerank_score', chunk_dict.get('similarity', 0))
+            )
+            for chunk_dict in chunk_dicts
+        ]
+        
+        # Bước 5: Xây dựng chuỗi context từ các chunks (đã được sắp xếp)
+        context_parts = ["Thông tin liên quan từ tài liệu:"]
+        # Chunks đã được sắp xếp bởi reranker hoặc similarity, không cần sort lại
+        for chunk in chunks:
+            context_parts.append(f"\n[File: {chunk.file_name}, Chunk {chunk.chunk_index}]")
+            context_parts.append(chunk.text)
+            context_parts.append("")
+        
+        return Answer(context="\n".join(context_parts), chunks=chunks, has_context=True)
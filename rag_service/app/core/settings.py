@@ -35,8 +35,16 @@ class Settings:
     CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "documents")
     # Tên collection trong Chroma cho images
     CHROMA_IMAGE_COLLECTION = os.getenv("CHROMA_IMAGE_COLLECTION", "images")
+    # Chia image vector store: "category" = products mỗi category một collection riêng (tách khỏi ảnh upload),
+    # "none" = một collection chung lọc bằng metadata như trước (mặc định).
+    # Bật "category" trên store đã có products: chạy POST /api/admin/image-store/migrate-partitions để chuyển chúng
+    IMAGE_STORE_PARTITIONING = os.getenv("IMAGE_STORE_PARTITIONING", "none").lower()
     # Thư mục lưu trữ dữ liệu Chroma
     CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", str(Path(__file__).parent.parent.parent / "data" / "vector_store" / "chroma_db"))
+    # File SQLite lưu manifest documents (file_id, số chunks, kích thước, hash) nằm cạnh chroma_db
+    DOCUMENT_REGISTRY_PATH = os.getenv("DOCUMENT_REGISTRY_PATH", str(Path(__file__).parent.parent.parent / "data" / "vector_store" / "document_registry.sqlite3"))
+    # Chu kỳ (giây) đối chiếu manifest với Chroma để sửa chênh lệch (0 = tắt)
+    DOCUMENT_REGISTRY_RECONCILE_SECONDS = int(os.getenv("DOCUMENT_REGISTRY_RECONCILE_SECONDS", "3600"))
     
     # ========== Embeddings (Tạo embedding vectors) ==========
     # Khuyến nghị: text-embedding-3-large
@@ -58,18 +66,104 @@ class Settings:
     # Model Ollama sử dụng
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
     
+    # ========== CLIP (Image + text embeddings cho sản phẩm) ==========
+    # Backend chạy CLIP: torch (PyTorch eager) hoặc onnx (ONNX Runtime trên CPU, export một lần)
+    CLIP_BACKEND = os.getenv("CLIP_BACKEND", "torch").lower()
+    # Quantize model ONNX sang int8 (dynamic quantization, chỉ áp dụng cho backend onnx)
+    CLIP_QUANTIZE = os.getenv("CLIP_QUANTIZE", "true").lower() == "true"
+    # Thư mục lưu model ONNX đã export/quantize
+    CLIP_ONNX_DIR = os.getenv("CLIP_ONNX_DIR", str(Path(__file__).parent.parent.parent / "data" / "models" / "clip_onnx"))
+    # Số threads cho ONNX Runtime (0 = dùng số torch threads của inference executor)
+    CLIP_ORT_THREADS = int(os.getenv("CLIP_ORT_THREADS", "0"))
+    # Số pixel tối đa giữ lại cho mỗi ảnh sau decode (JPEG draft mode trước, định dạng khác reduce() sau decode)
+    IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(40_000_000)))
+    # Số threads decode/resize ảnh song song khi tạo embeddings theo batch
+    IMAGE_PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", "4"))
+    # Phát hiện ảnh gần trùng bằng perceptual hash (pHash + dHash): dùng lại embedding thay vì chạy CLIP
+    IMAGE_DEDUP_ENABLED = os.getenv("IMAGE_DEDUP_ENABLED", "true").lower() == "true"
+    # Ngưỡng khoảng cách Hamming (trên 64 bits) để coi là gần trùng, phải thỏa cả pHash và dHash
+    IMAGE_DEDUP_PHASH_THRESHOLD = int(os.getenv("IMAGE_DEDUP_PHASH_THRESHOLD", "6"))
+    IMAGE_DEDUP_DHASH_THRESHOLD = int(os.getenv("IMAGE_DEDUP_DHASH_THRESHOLD", "10"))
+    # Upload ảnh (không phải product) gần trùng ảnh đã có: trả về image_id cũ (kèm duplicate_of), không lưu
+    # tên file/metadata mới. Mặc định tắt: ảnh gần trùng vẫn được lưu với image_id riêng (chỉ dùng lại embedding)
+    IMAGE_DEDUP_SKIP_DUPLICATES = os.getenv("IMAGE_DEDUP_SKIP_DUPLICATES", "false").lower() == "true"
+    
     # ========== Vision Model (GPT-4V) ==========
     # Có sử dụng Vision model để tạo caption từ ảnh không (mặc định: true)
     # Nếu tắt, sẽ chỉ dùng image embedding (CLIP) để tìm kiếm
     USE_VISION_CAPTION = os.getenv("USE_VISION_CAPTION", "true").lower() == "true"
     
     # ========== Reranker (Sắp xếp lại kết quả) ==========
-    # LƯU Ý: Reranker làm chậm phản hồi (cần tải model 1GB+)
-    # Khuyến nghị: Tắt reranker nếu dùng OpenAI embeddings (đã đủ tốt)
-    # Chỉ bật reranker nếu dùng Sentence Transformer và cần độ chính xác cao
-    USE_RERANKER = os.getenv("USE_RERANKER", "false").lower() == "true"  # Mặc định: TẮT để tăng tốc
+    # Model được tải ở background khi server start, request không phải chờ load model 1GB+
+    # Trong lúc model đang load, retrieve trả về kết quả theo similarity như khi tắt reranker
+    USE_RERANKER = os.getenv("USE_RERANKER", "false").lower() == "true"
     # Model reranker sử dụng (mặc định: BAAI/bge-reranker-base)
     RERANKER_MODEL = os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-base")
+    # Backend chạy reranker: torch (CrossEncoder) hoặc onnx (ONNX Runtime trên CPU)
+    RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch").lower()
+    # Quantize model ONNX sang int8 (dynamic quantization, chỉ áp dụng cho backend onnx)
+    RERANKER_QUANTIZE = os.getenv("RERANKER_QUANTIZE", "true").lower() == "true"
+    # Thư mục lưu model ONNX đã export/quantize
+    RERANKER_ONNX_DIR = os.getenv("RERANKER_ONNX_DIR", str(Path(__file__).parent.parent.parent / "data" / "models" / "reranker_onnx"))
+    # Số threads cho ONNX Runtime (0 = để ONNX Runtime tự chọn)
+    RERANKER_ORT_THREADS = int(os.getenv("RERANKER_ORT_THREADS", "0"))
+    # Số cặp (query, chunk) mỗi batch
+    RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "16"))
+    # Số token tối đa cho mỗi cặp (query, chunk)
+    RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+    # Số điểm (query, chunk_id) giữ trong LRU cache
+    RERANKER_CACHE_SIZE = int(os.getenv("RERANKER_CACHE_SIZE", "10000"))
+    
+    # ========== Model Server (CLIP + Sentence Transformer dùng chung giữa workers) ==========
+    # Workers gọi model server qua Unix socket thay vì tự load model (mặc định: false)
+    # Chạy server: python -m app.infrastructure.model_server
+    MODEL_SERVER_ENABLED = os.getenv("MODEL_SERVER_ENABLED", "false").lower() == "true"
+    # Đường dẫn Unix domain socket của model server
+    MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "/tmp/rag_model_server.sock")
+    # Các model do server giữ: clip, text (Sentence Transformer, chỉ dùng khi không có OpenAI embeddings)
+    MODEL_SERVER_MODELS = [
+        m.strip() for m in os.getenv("MODEL_SERVER_MODELS", "clip,text").split(",") if m.strip()
+    ]
+    # Timeout (giây) cho mỗi request / chờ server khởi động
+    MODEL_SERVER_TIMEOUT_SECONDS = float(os.getenv("MODEL_SERVER_TIMEOUT_SECONDS", "60"))
+    # Kích thước tối thiểu (bytes) vùng shared memory của mỗi kết nối
+    MODEL_SERVER_ARENA_BYTES = int(os.getenv("MODEL_SERVER_ARENA_BYTES", str(8 * 1024 * 1024)))
+    
+    # ========== Inference Executor (CLIP, Sentence Transformer, CrossEncoder) ==========
+    # Số threads của inference pool (mọi forward pass chạy ở đây, không chạy trên event loop)
+    INFERENCE_POOL_SIZE = int(os.getenv("INFERENCE_POOL_SIZE", "2"))
+    # Số torch intra-op threads (0 = số CPU cores / INFERENCE_POOL_SIZE)
+    INFERENCE_TORCH_THREADS = int(os.getenv("INFERENCE_TORCH_THREADS", "0"))
+    # Số request đồng thời tối đa cho từng model, dạng "model=n" phân tách bằng dấu phẩy
+    INFERENCE_MODEL_CONCURRENCY = {
+        name.strip(): int(limit)
+        for name, limit in (
+            item.split("=", 1) for item in os.getenv(
+                "INFERENCE_MODEL_CONCURRENCY", "clip=2,text_embedder=1,reranker=1"
+            ).split(",") if "=" in item
+        )
+    }
+    
+    # ========== Catalog Sync (Đồng bộ catalog sản phẩm hàng loạt) ==========
+    # Thư mục gốc cho POST /api/products/sync/directory (records_path, image_dir phải nằm trong thư mục này)
+    CATALOG_SYNC_ROOT = os.getenv("CATALOG_SYNC_ROOT", str(Path(__file__).parent.parent.parent / "data" / "catalog"))
+    # Số products mỗi batch CLIP (text + image)
+    CATALOG_SYNC_EMBED_BATCH = int(os.getenv("CATALOG_SYNC_EMBED_BATCH", "64"))
+    # Số products mỗi lần ghi vector store
+    CATALOG_SYNC_WRITE_BATCH = int(os.getenv("CATALOG_SYNC_WRITE_BATCH", "1000"))
+    # Dung lượng tối đa ảnh đã tải giữ trong bộ nhớ khi đồng bộ qua HTTP (re-embed theo change events)
+    CATALOG_SYNC_IMAGE_CACHE_BYTES = int(os.getenv("CATALOG_SYNC_IMAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+    # Thư mục ảnh sản phẩm của backend (indexer offline đọc thẳng từ đĩa thay vì tải qua HTTPS)
+    PRODUCT_IMAGE_DIR = os.getenv(
+        "PRODUCT_IMAGE_DIR",
+        str(Path(__file__).parent.parent.parent.parent / "fresher_food_backend" / "FressFood" / "wwwroot" / "images" / "products")
+    )
+    # Thư mục snapshot + checkpoints của indexer offline (python -m app.indexer)
+    CATALOG_INDEX_DIR = os.getenv("CATALOG_INDEX_DIR", str(Path(__file__).parent.parent.parent / "data" / "catalog_index"))
+    # Số worker processes của indexer (mỗi process một bản CLIP)
+    CATALOG_INDEX_WORKERS = int(os.getenv("CATALOG_INDEX_WORKERS", str(max(1, min(4, (os.cpu_count() or 1) // 2)))))
+    # Số products mỗi shard (checkpoint) / batch CLIP của indexer
+    CATALOG_INDEX_BATCH_SIZE = int(os.getenv("CATALOG_INDEX_BATCH_SIZE", "256"))
     
     # ========== Document Processing (Xử lý tài liệu) ==========
     # Kích thước mỗi chunk (số ký tự)
@@ -78,21 +172,127 @@ class Settings:
     CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))
     
     # ========== Database (Cơ sở dữ liệu) ==========
+    # Backend database: sqlserver (pyodbc + DATABASE_CONNECTION_STRING) hoặc sqlite (bản offline cùng schema)
+    DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "sqlserver").lower()
+    # File SQLite khi DATABASE_BACKEND=sqlite
+    SQLITE_DATABASE_PATH = os.getenv("SQLITE_DATABASE_PATH", str(Path(__file__).parent.parent.parent / "data" / "sqlite" / "fresher_food.sqlite3"))
+    # Scale factor dữ liệu giả sinh ra khi file SQLite chưa tồn tại (0 = không tự sinh)
+    SQLITE_SYNTHETIC_SCALE = float(os.getenv("SQLITE_SYNTHETIC_SCALE", "1"))
     # Connection string cho SQL Server (dùng cho function calling)
     DATABASE_CONNECTION_STRING = os.getenv(
         "DATABASE_CONNECTION_STRING",
         "Server=DOMINICNGUYEN\\SQLEXPRESS;Database=FressFood;User Id=sa;Password=123456;TrustServerCertificate=True;"
     )
+    # Engine phân tích đơn hàng trong bộ nhớ (NumPy) cho doanh thu/top sản phẩm/tồn kho (mặc định: true)
+    ORDER_ANALYTICS_ENABLED = os.getenv("ORDER_ANALYTICS_ENABLED", "true").lower() == "true"
+    # Tuổi tối đa (giây) của snapshot trước khi refresh tăng dần ở background
+    ORDER_ANALYTICS_REFRESH_SECONDS = float(os.getenv("ORDER_ANALYTICS_REFRESH_SECONDS", "60"))
+    # Số ngày trước đơn mới nhất được đọc lại mỗi lần refresh để cập nhật trạng thái đơn
+    ORDER_ANALYTICS_STATUS_WINDOW_DAYS = int(os.getenv("ORDER_ANALYTICS_STATUS_WINDOW_DAYS", "30"))
+    # Chu kỳ (giây) nạp lại toàn bộ đơn hàng
+    ORDER_ANALYTICS_FULL_RELOAD_SECONDS = float(os.getenv("ORDER_ANALYTICS_FULL_RELOAD_SECONDS", "3600"))
+    # Index hạn sử dụng sản phẩm trong bộ nhớ cho getProductExpiry/getProductsExpiringSoon (mặc định: true)
+    EXPIRY_INDEX_ENABLED = os.getenv("EXPIRY_INDEX_ENABLED", "true").lower() == "true"
+    # Tuổi tối đa (giây) của expiry index trước khi nạp lại ở background
+    EXPIRY_INDEX_REFRESH_SECONDS = float(os.getenv("EXPIRY_INDEX_REFRESH_SECONDS", "300"))
+    # Tuổi tối đa (giây) của tập trạng thái đơn hàng (SELECT DISTINCT TrangThai) dùng cho predicates IN (...)
+    ORDER_STATUS_REFRESH_SECONDS = float(os.getenv("ORDER_STATUS_REFRESH_SECONDS", "600"))
+    # Query SQL chạy lâu hơn ngưỡng này (ms) được log warning (0 = tắt)
+    SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "500"))
+    
+    # ========== Fake Providers (Benchmark / load test không cần model và OpenAI) ==========
+    # Dùng vector băm tất định thay cho Sentence Transformer/OpenAI/CLIP embeddings
+    FAKE_EMBEDDINGS = os.getenv("FAKE_EMBEDDINGS", "false").lower() == "true"
+    # Dùng LLM trả lời soạn sẵn thay cho OpenAI/Ollama
+    FAKE_LLM = os.getenv("FAKE_LLM", "false").lower() == "true"
+    # Số chiều vector text giả (384 = all-MiniLM-L6-v2)
+    FAKE_TEXT_EMBEDDING_DIM = int(os.getenv("FAKE_TEXT_EMBEDDING_DIM", "384"))
+    # Độ trễ mỗi lần encode: "", "fixed:ms", "uniform:a,b", "normal:mean,std", "lognormal:median,sigma"
+    FAKE_EMBEDDING_LATENCY = os.getenv("FAKE_EMBEDDING_LATENCY", "")
+    # Độ trễ cộng thêm (ms) cho mỗi text/ảnh trong batch
+    FAKE_EMBEDDING_LATENCY_PER_ITEM_MS = float(os.getenv("FAKE_EMBEDDING_LATENCY_PER_ITEM_MS", "0"))
+    # Độ trễ tới token đầu tiên của LLM giả (cùng cú pháp FAKE_EMBEDDING_LATENCY)
+    FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "")
+    # Độ trễ (ms) giữa các token khi stream
+    FAKE_LLM_TOKEN_LATENCY_MS = float(os.getenv("FAKE_LLM_TOKEN_LATENCY_MS", "0"))
+    # File JSON luật trả lời [{"contains": "...", "response": "..."}] của LLM giả
+    FAKE_LLM_RESPONSES_PATH = os.getenv("FAKE_LLM_RESPONSES_PATH", "")
+    # Seed cho phân phối độ trễ
+    FAKE_SEED = int(os.getenv("FAKE_SEED", "0"))
     
     # ========== App (Ứng dụng) ==========
     # Base URL của ứng dụng backend
     APP_BASE_URL = os.getenv("APP_BASE_URL", "https://localhost:7240")
     
+    # ========== Change Events (Webhook thay đổi dữ liệu từ backend) ==========
+    # Secret HMAC-SHA256 để xác thực POST /api/events (để trống = tắt endpoint)
+    EVENTS_WEBHOOK_SECRET = os.getenv("EVENTS_WEBHOOK_SECRET", "")
+    # Độ lệch tối đa (giây) giữa X-Event-Timestamp và giờ server (chống replay)
+    EVENTS_SIGNATURE_TOLERANCE_SECONDS = int(os.getenv("EVENTS_SIGNATURE_TOLERANCE_SECONDS", "300"))
+    # Số events tối đa mỗi request
+    EVENTS_MAX_BATCH = int(os.getenv("EVENTS_MAX_BATCH", "1000"))
+    # Số event_id gần nhất được nhớ để bỏ event backend gửi lại
+    EVENTS_DEDUPE_SIZE = int(os.getenv("EVENTS_DEDUPE_SIZE", "10000"))
+    # Re-embed products trong vector store theo product events (mặc định: true)
+    EVENTS_REEMBED_ENABLED = os.getenv("EVENTS_REEMBED_ENABLED", "true").lower() == "true"
+    # Thời gian (giây) gom product events trước khi re-embed một batch
+    EVENTS_REEMBED_DEBOUNCE_SECONDS = float(os.getenv("EVENTS_REEMBED_DEBOUNCE_SECONDS", "2"))
+    # Số products tối đa mỗi batch re-embed
+    EVENTS_REEMBED_MAX_BATCH = int(os.getenv("EVENTS_REEMBED_MAX_BATCH", "500"))
+    
+    # ========== Warm-up & Readiness ==========
+    # Chờ warm-up xong mới nhận request (mặc định: true) - request đầu tiên nhanh như các request sau
+    # Nếu false, warm-up chạy nền và /api/health/ready trả 503 cho tới khi xong
+    WARMUP_BLOCKING = os.getenv("WARMUP_BLOCKING", "true").lower() == "true"
+    # Thời gian tối đa (giây) warm-up mỗi thành phần
+    WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "300"))
+    # Các thành phần bắt buộc phải ready thì /api/health/ready mới trả 200 (phân tách bằng dấu phẩy)
+    READINESS_REQUIRED_COMPONENTS = [
+        c.strip() for c in os.getenv("READINESS_REQUIRED_COMPONENTS", "chroma,clip,text_embedder,reranker,agents").split(",") if c.strip()
+    ]
+    
+    # ========== Tracing & Metrics ==========
+    # Thu thập spans/histograms và mở endpoint GET /metrics (Prometheus text format)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # Luôn đính kèm trace summary vào metadata của response (nếu false, chỉ khi request gửi header X-Trace: 1)
+    TRACE_RESPONSE_METADATA = os.getenv("TRACE_RESPONSE_METADATA", "false").lower() == "true"
+    # Số spans tối đa giữ lại trong trace của một request (histograms vẫn ghi đủ)
+    TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "200"))
+    # Request chậm hơn ngưỡng này (ms) được log kèm các stage tốn thời gian nhất (0 = tắt)
+    TRACE_SLOW_REQUEST_MS = float(os.getenv("TRACE_SLOW_REQUEST_MS", "2000"))
+    
+    # ========== Profiling (Admin) ==========
+    # Token cho /api/admin/*, header X-Profile và các endpoint quản trị khác (vd. DELETE /api/health/caches),
+    # gửi qua header X-Admin-Token (để trống = tắt các endpoint đó)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+    # Thời gian tối đa (giây) của một lần sampling profile
+    PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+    # Chu kỳ lấy mẫu stacks mặc định (ms)
+    PROFILER_DEFAULT_INTERVAL_MS = float(os.getenv("PROFILER_DEFAULT_INTERVAL_MS", "10"))
+    # Số cProfile theo request (X-Profile: 1) được giữ lại để tải về
+    REQUEST_PROFILE_HISTORY = int(os.getenv("REQUEST_PROFILE_HISTORY", "20"))
+    # Số frames traceback tracemalloc ghi cho mỗi allocation
+    TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "25"))
+    # Số tracemalloc snapshots được giữ lại
+    TRACEMALLOC_MAX_SNAPSHOTS = int(os.getenv("TRACEMALLOC_MAX_SNAPSHOTS", "10"))
+    
     # ========== Performance Optimizations ==========
+    # Số câu hỏi tối đa mỗi request /api/query/retrieve-batch
+    RETRIEVE_BATCH_MAX_QUESTIONS = int(os.getenv("RETRIEVE_BATCH_MAX_QUESTIONS", "256"))
     # Enable caching cho Entity Resolver và Knowledge Agent (mặc định: true)
     ENABLE_AGENT_CACHE = os.getenv("ENABLE_AGENT_CACHE", "true").lower() == "true"
-    # Cache size cho LRU cache (mặc định: 1000)
+    # Cache size cho LRU cache (mặc định: 1000) - số entries mặc định của mỗi cache trong registry
     AGENT_CACHE_SIZE = int(os.getenv("AGENT_CACHE_SIZE", "1000"))
+    # Dung lượng tối đa mặc định (bytes) của mỗi cache (0 = không giới hạn)
+    CACHE_DEFAULT_MAX_BYTES = int(os.getenv("CACHE_DEFAULT_MAX_BYTES", str(32 * 1024 * 1024)))
+    # TTL mặc định (giây) của mỗi cache (0 = không hết hạn)
+    CACHE_DEFAULT_TTL_SECONDS = float(os.getenv("CACHE_DEFAULT_TTL_SECONDS", "0"))
+    # TTL (giây) cho kết quả search của Knowledge Agent (SQL + vector)
+    KNOWLEDGE_CACHE_TTL_SECONDS = float(os.getenv("KNOWLEDGE_CACHE_TTL_SECONDS", "60"))
+    # TTL (giây) cho kết quả function calls được cache (invalidate theo change events)
+    FUNCTION_CACHE_TTL_SECONDS = float(os.getenv("FUNCTION_CACHE_TTL_SECONDS", "300"))
+    # TTL (giây) cho kết quả kiểm tra entity trong DB của Entity Resolver
+    ENTITY_VALIDATION_CACHE_TTL_SECONDS = float(os.getenv("ENTITY_VALIDATION_CACHE_TTL_SECONDS", "300"))
     # Enable Critic Agent (mặc định: false để tăng tốc)
     ENABLE_CRITIC_AGENT = os.getenv("ENABLE_CRITIC_AGENT", "false").lower() == "true"
     # Confidence threshold để bật Critic Agent (0.0-1.0, mặc định: 0.7)
@@ -101,4 +301,16 @@ class Settings:
     USE_MERGED_REASONING_SYNTHESIS = os.getenv("USE_MERGED_REASONING_SYNTHESIS", "true").lower() == "true"
     # Enable parallel execution cho Tool Agent và Reasoning Agent (mặc định: true)
     ENABLE_PARALLEL_AGENTS = os.getenv("ENABLE_PARALLEL_AGENTS", "true").lower() == "true"
+    # Tool Agent: số function calls chạy song song trong một request
+    TOOL_AGENT_MAX_CONCURRENCY = int(os.getenv("TOOL_AGENT_MAX_CONCURRENCY", "4"))
+    # Deadline (giây) cho mỗi function call của Tool Agent (0 = không giới hạn)
+    TOOL_CALL_TIMEOUT_SECONDS = float(os.getenv("TOOL_CALL_TIMEOUT_SECONDS", "8"))
+    # Số threads thực thi function calls (SQL) của FunctionHandler
+    TOOL_EXECUTOR_WORKERS = int(os.getenv("TOOL_EXECUTOR_WORKERS", "8"))
+    # Số query chạy đồng thời ở các stage không gọi LLM (router, knowledge) của process_batch
+    ORCHESTRATOR_BATCH_STAGE_CONCURRENCY = int(os.getenv("ORCHESTRATOR_BATCH_STAGE_CONCURRENCY", "32"))
+    # Router: fallback nearest-centroid trên text embeddings khi regex không nhận ra intent (mặc định: false)
+    ROUTER_EMBEDDING_FALLBACK = os.getenv("ROUTER_EMBEDDING_FALLBACK", "false").lower() == "true"
+    # Cosine similarity tối thiểu để chấp nhận intent từ centroid fallback
+    ROUTER_CENTROID_THRESHOLD = float(os.getenv("ROUTER_CENTROID_THRESHOLD", "0.85"))
 
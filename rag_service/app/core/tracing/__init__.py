@@ -0,0 +1,37 @@
+"""
+Tracing
+Spans theo stage cho mỗi request và metrics xuất ra Prometheus (/metrics)
+"""
+from app.core.tracing.collectors import register_default_collectors
+from app.core.tracing.metrics import Counter, Gauge, Histogram, MetricsRegistry, get_metrics_registry
+from app.core.tracing.tracer import (
+    Trace,
+    current_trace,
+    end_trace,
+    log_slow_request,
+    record_http_request,
+    route_template,
+    span,
+    start_trace,
+    trace_summary,
+    traced,
+)
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsRegistry",
+    "Trace",
+    "current_trace",
+    "end_trace",
+    "get_metrics_registry",
+    "log_slow_request",
+    "record_http_request",
+    "register_default_collectors",
+    "route_template",
+    "span",
+    "start_trace",
+    "trace_summary",
+    "traced",
+]
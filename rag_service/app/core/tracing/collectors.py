@@ -0,0 +1,67 @@
+"""
+Collectors - Xuất các thống kê đang có sẵn (inference pool, caches, SQL queries) lúc scrape /metrics
+"""
+from typing import Iterable
+
+from app.core.tracing.metrics import CollectedMetric, get_metrics_registry
+
+
+def inference_collector() -> Iterable[CollectedMetric]:
+    """InferenceExecutor.stats(): queue depth, running, completed/failed theo model + event-loop lag"""
+    from app.services.inference import get_inference_executor
+
+    stats = get_inference_executor().stats()
+    models = stats["models"]
+    yield ("rag_inference_queued", "gauge", "Số inference đang chờ slot theo model",
+           [({"model": name}, model["queued"]) for name, model in models.items()])
+    yield ("rag_inference_running", "gauge", "Số inference đang chạy theo model",
+           [({"model": name}, model["running"]) for name, model in models.items()])
+    yield ("rag_inference_completed_total", "counter", "Số inference hoàn thành theo model",
+           [({"model": name}, model["completed"]) for name, model in models.items()])
+    yield ("rag_inference_failed_total", "counter", "Số inference lỗi theo model",
+           [({"model": name}, model["failed"]) for name, model in models.items()])
+    lag = stats["event_loop_lag"]
+    yield ("rag_event_loop_lag_seconds", "gauge", "Event-loop lag gần nhất",
+           [({}, lag["last_ms"] / 1000)])
+    yield ("rag_event_loop_lag_max_seconds", "gauge", "Event-loop lag lớn nhất từ khi khởi động",
+           [({}, lag["max_ms"] / 1000)])
+
+
+def cache_collector() -> Iterable[CollectedMetric]:
+    """CacheRegistry.stats(): hits/misses/evictions/expirations và size theo cache"""
+    from app.core.cache import get_cache_registry
+
+    caches = get_cache_registry().stats()
+    for field, type_name, help_text in (
+        ("hits", "counter", "Cache hits"),
+        ("misses", "counter", "Cache misses"),
+        ("evictions", "counter", "Số entries bị đẩy ra do vượt giới hạn"),
+        ("expirations", "counter", "Số entries hết TTL"),
+        ("size", "gauge", "Số entries hiện có"),
+    ):
+        suffix = "_total" if type_name == "counter" else "_entries"
+        yield (f"rag_cache_{field}{suffix}", type_name, help_text,
+               [({"cache": name}, cache[field]) for name, cache in caches.items()])
+    yield ("rag_cache_bytes", "gauge", "Dung lượng ước tính (bytes) của cache có giới hạn bytes",
+           [({"cache": name}, cache["bytes"]) for name, cache in caches.items() if cache["bytes"] is not None])
+
+
+def query_collector() -> Iterable[CollectedMetric]:
+    """
+    QueryStats.totals() của FunctionHandler: số lần chạy và tổng thời gian từng SQL query theo tên
+    (đơn điệu, không giảm khi reset query stats). Chưa khởi tạo FunctionHandler thì không tạo lúc scrape
+    """
+    from app.api import deps
+
+    handler = deps._function_handler
+    totals = handler.query_stats.totals() if handler is not None else {}
+    yield ("rag_sql_query_calls_total", "counter", "Số lần chạy SQL query theo tên",
+           [({"query": name}, query["count"]) for name, query in totals.items()])
+    yield ("rag_sql_query_seconds_total", "counter", "Tổng thời gian SQL query theo tên",
+           [({"query": name}, query["total_ms"] / 1000) for name, query in totals.items()])
+
+
+def register_default_collectors() -> None:
+    registry = get_metrics_registry()
+    for collector in (inference_collector, cache_collector, query_collector):
+        registry.register_collector(collector)
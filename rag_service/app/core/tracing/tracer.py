@@ -0,0 +1,234 @@
+"""
+Tracer - Spans theo stage cho mỗi request (agents, embedding, vector query, SQL, image download, LLM)
+
+- Trace của request nằm trong ContextVar: tasks tạo bằng asyncio.gather/create_task và asyncio.to_thread
+  kế thừa trace + span cha; run_in_executor thì phải tự copy context (contextvars.copy_context)
+- Mỗi span luôn ghi vào histogram rag_stage_duration_seconds{stage} (kể cả khi không có trace, vd. warm-up)
+- Tên stage phải có cardinality thấp: "agent.RouterAgent", "vector.search", "sql.getRevenueStatistics", ...
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.core.settings import Settings
+from app.core.tracing.metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+_registry = get_metrics_registry()
+STAGE_DURATION = _registry.histogram(
+    "rag_stage_duration_seconds", "Thời gian mỗi stage (agent, embedding, vector, sql, image, llm)", ("stage",)
+)
+STAGE_ERRORS = _registry.counter(
+    "rag_stage_errors_total", "Số lần stage kết thúc bằng exception", ("stage",)
+)
+HTTP_REQUESTS = _registry.counter(
+    "http_requests_total", "Số HTTP requests theo route template và status", ("method", "route", "status")
+)
+HTTP_DURATION = _registry.histogram(
+    "http_request_duration_seconds", "Thời gian xử lý HTTP request theo route template", ("method", "route")
+)
+HTTP_IN_FLIGHT = _registry.gauge("http_requests_in_flight", "Số HTTP requests đang xử lý")
+
+
+class Trace:
+    """Các spans của một request"""
+
+    def __init__(self, trace_id: Optional[str] = None, expose: bool = False, max_spans: Optional[int] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        # Đính kèm summary vào response metadata
+        self.expose = expose
+        self.max_spans = Settings.TRACE_MAX_SPANS if max_spans is None else max_spans
+        self.started_at = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped_spans = 0
+        # Tổng hợp theo stage (không bị giới hạn bởi max_spans)
+        self.stages: Dict[str, Dict[str, float]] = {}
+        # SQL function calls ghi span từ worker threads
+        self._lock = threading.Lock()
+
+    def open_span(self, stage: str, parent: Optional[int], attrs: Dict[str, Any]) -> Optional[int]:
+        record = {
+            "stage": stage,
+            "start_ms": round((time.perf_counter() - self.started_at) * 1000, 2),
+            "duration_ms": None,
+            "parent": parent,
+        }
+        if attrs:
+            record["attrs"] = attrs
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped_spans += 1
+                return None
+            self.spans.append(record)
+            return len(self.spans) - 1
+
+    def close_span(self, index: Optional[int], stage: str, seconds: float, error: Optional[str]) -> None:
+        duration_ms = seconds * 1000
+        with self._lock:
+            if index is not None:
+                record = self.spans[index]
+                record["duration_ms"] = round(duration_ms, 2)
+                if error:
+                    record["error"] = error
+            totals = self.stages.get(stage)
+            if totals is None:
+                totals = self.stages[stage] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0}
+            totals["count"] += 1
+            totals["total_ms"] += duration_ms
+            totals["max_ms"] = max(totals["max_ms"], duration_ms)
+            if error:
+                totals["errors"] += 1
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def slowest_stages(self, limit: int = 5) -> List[str]:
+        ranked = sorted(self.stages.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:limit]
+        return [f"{stage}={totals['total_ms']:.0f}ms×{totals['count']}" for stage, totals in ranked]
+
+    def summary(self, include_spans: bool = True) -> Dict[str, Any]:
+        """
+        Tóm tắt trace cho response metadata
+
+        total_ms của một stage có thể lớn hơn thời gian request khi các span chạy song song
+        """
+        result = {
+            "trace_id": self.trace_id,
+            "elapsed_ms": round(self.elapsed_ms, 2),
+            "stages": {
+                stage: {
+                    "count": int(totals["count"]),
+                    "total_ms": round(totals["total_ms"], 2),
+                    "max_ms": round(totals["max_ms"], 2),
+                    "errors": int(totals["errors"]),
+                }
+                for stage, totals in sorted(self.stages.items(), key=lambda item: -item[1]["total_ms"])
+            },
+        }
+        if include_spans:
+            result["spans"] = list(self.spans)
+            result["dropped_spans"] = self.dropped_spans
+        return result
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("rag_trace", default=None)
+_current_span: ContextVar[Optional[int]] = ContextVar("rag_span", default=None)
+
+
+def start_trace(trace_id: Optional[str] = None, expose: bool = False) -> Token:
+    """Bắt đầu trace cho request hiện tại; trả về token cho end_trace()"""
+    return _current_trace.set(Trace(trace_id, expose))
+
+
+def end_trace(token: Token) -> None:
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def trace_summary(include_spans: bool = True) -> Optional[Dict[str, Any]]:
+    """Summary của trace hiện tại nếu request yêu cầu đính kèm vào response (X-Trace hoặc TRACE_RESPONSE_METADATA)"""
+    trace = _current_trace.get()
+    if trace is None or not trace.expose:
+        return None
+    return trace.summary(include_spans)
+
+
+@contextmanager
+def span(stage: str, **attrs: Any) -> Iterator[None]:
+    """
+    Đo một stage: ghi histogram + span vào trace hiện tại (nếu có)
+
+    Args:
+        stage: Tên stage (cardinality thấp, dùng làm label Prometheus)
+        attrs: Thuộc tính nhỏ gắn vào span (không vào metrics)
+    """
+    if not Settings.METRICS_ENABLED:
+        yield
+        return
+
+    trace = _current_trace.get()
+    index = trace.open_span(stage, _current_span.get(), attrs) if trace is not None else None
+    token = _current_span.set(index) if index is not None else None
+    started_at = time.perf_counter()
+    error: Optional[str] = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - started_at
+        if token is not None:
+            _current_span.reset(token)
+        STAGE_DURATION.observe(seconds, stage=stage)
+        if error:
+            STAGE_ERRORS.inc(stage=stage)
+        if trace is not None:
+            trace.close_span(index, stage, seconds, error)
+
+
+def traced(stage: str) -> Callable:
+    """Decorator: bọc cả lời gọi hàm (sync hoặc async) trong span(stage)"""
+
+    def decorator(fn: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """
+    Route template của request (vd. /api/products/{product_id}/image-url) để label không tăng cardinality theo path
+
+    scope["route"].path có thể chỉ là phần path bên trong router con (router được include lồng nhau);
+    phần prefix lấy lại từ path thực tế theo số segments của template
+    """
+    template = getattr(scope.get("route"), "path", None)
+    if template is None:
+        return "unmatched"
+    path = scope.get("path", "").rstrip("/")
+    tail = [segment for segment in template.strip("/").split("/") if segment]
+    segments = path.split("/")
+    prefix = "/".join(segments[:len(segments) - len(tail)]) if tail else path
+    return prefix + template if template.startswith("/") or not template else f"{prefix}/{template}"
+
+
+def record_http_request(method: str, route: str, status_code: int, seconds: float) -> None:
+    """Ghi metrics của một HTTP request (route là template, vd. /api/products/{product_id})"""
+    if not Settings.METRICS_ENABLED:
+        return
+    HTTP_REQUESTS.inc(method=method, route=route, status=str(status_code))
+    HTTP_DURATION.observe(seconds, method=method, route=route)
+
+
+def log_slow_request(method: str, path: str, trace: Trace) -> None:
+    """Log các stage tốn thời gian nhất khi request vượt TRACE_SLOW_REQUEST_MS"""
+    threshold = Settings.TRACE_SLOW_REQUEST_MS
+    if threshold <= 0 or trace.elapsed_ms < threshold:
+        return
+    logger.warning(
+        f"⚠️ Slow request {method} {path} ({trace.elapsed_ms:.0f}ms, trace {trace.trace_id}): "
+        f"{', '.join(trace.slowest_stages()) or 'không có span'}"
+    )
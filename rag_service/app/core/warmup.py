@@ -0,0 +1,237 @@
+"""
+Warm-up & Readiness - Khởi động đồng thời các thành phần khi server start
+
+Mỗi thành phần (Chroma, CLIP, text embedder, reranker, database, LLM, agent graph)
+được warm-up song song; trạng thái và thời gian warm-up được lưu lại để
+/api/health/ready báo cáo.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Trạng thái thành phần
+STATE_PENDING = "pending"
+STATE_LOADING = "loading"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+STATE_DISABLED = "disabled"
+
+# ========== Readiness state (theo worker) ==========
+_components: Dict[str, Dict[str, Any]] = {}
+_warmup_started_at: Optional[float] = None
+_warmup_finished_at: Optional[float] = None
+
+
+class ComponentDisabled(Exception):
+    """Raise trong warm-up function khi thành phần bị tắt bằng cấu hình"""
+
+
+def _set_status(name: str, state: str, warmup_time: Optional[float] = None, detail: Optional[str] = None) -> None:
+    _components[name] = {
+        "state": state,
+        "warmup_time": round(warmup_time, 3) if warmup_time is not None else None,
+        "detail": detail,
+    }
+
+
+def get_readiness() -> Dict[str, Any]:
+    """
+    Trạng thái readiness của worker hiện tại
+
+    Returns:
+        Dict với ready (bool), thời gian warm-up và trạng thái từng thành phần
+    """
+    from app.core.settings import Settings
+
+    # Chỉ các thành phần bắt buộc quyết định ready; các thành phần khác (DB, LLM) chỉ báo cáo
+    ready = _warmup_finished_at is not None and all(
+        _components.get(name, {}).get("state") in (STATE_READY, STATE_DISABLED)
+        for name in Settings.READINESS_REQUIRED_COMPONENTS
+        if name in WARMUP_COMPONENTS
+    )
+    total_time = None
+    if _warmup_started_at is not None and _warmup_finished_at is not None:
+        total_time = round(_warmup_finished_at - _warmup_started_at, 3)
+    return {
+        "ready": ready,
+        "warmup_complete": _warmup_finished_at is not None,
+        "warmup_time": total_time,
+        "required_components": Settings.READINESS_REQUIRED_COMPONENTS,
+        "components": dict(_components),
+    }
+
+
+# ========== Warm-up functions ==========
+
+async def _warmup_chroma() -> str:
+    from app.api.deps import get_vector_store, get_image_vector_store
+
+    def _load():
+        # Khởi tạo client + collections, count() buộc Chroma load segment/HNSW index
+        text_store = get_vector_store()
+        image_store = get_image_vector_store()
+        return text_store.collection.count(), image_store.count_vectors()
+
+    text_count, image_count = await asyncio.to_thread(_load)
+    return f"documents={text_count} chunks, images={image_count} chunks"
+
+
+async def _warmup_clip() -> str:
+    from app.api.deps import get_image_embedding_service
+    image_embedding_service = get_image_embedding_service()
+    # Text embedding trigger CLIP load (nhanh hơn image)
+    embedding = await image_embedding_service.create_text_embedding_async("warmup")
+    if embedding is None:
+        raise RuntimeError("CLIP text embedding failed")
+    return f"ViT-B/32 ({image_embedding_service.clip_device})"
+
+
+async def _warmup_text_embedder() -> str:
+    from app.api.deps import get_embedding_service
+    # EmbeddingService load Sentence Transformer ngay trong constructor → chạy trong thread
+    embedding_service = await asyncio.to_thread(get_embedding_service)
+    await embedding_service.create_embedding("warmup")
+    if getattr(embedding_service, "is_fake", False):
+        return f"fake (dim={embedding_service.dimension})"
+    return "openai" if embedding_service.use_openai else "sentence-transformers"
+
+
+async def _warmup_reranker() -> str:
+    from app.api.deps import get_reranker_service
+    reranker_service = get_reranker_service()
+    if not reranker_service.use_reranker:
+        raise ComponentDisabled("USE_RERANKER=false")
+    reranker_service.start_background_load()
+    if reranker_service._load_thread is not None:
+        await asyncio.to_thread(reranker_service._load_thread.join)
+    if not reranker_service.is_ready:
+        raise RuntimeError(reranker_service.error or f"state={reranker_service.state}")
+    return reranker_service.backend
+
+
+async def _warmup_database() -> str:
+    from app.api.deps import get_function_handler
+    # Tạo database (SQLite: có thể sinh dữ liệu giả) ngoài event loop
+    function_handler = await asyncio.to_thread(get_function_handler)
+    if function_handler is None:
+        raise ComponentDisabled("Database not configured (DATABASE_BACKEND / DATABASE_CONNECTION_STRING)")
+    driver = await asyncio.to_thread(function_handler.ping)
+    return driver
+
+
+async def _warmup_order_analytics() -> str:
+    from app.api.deps import get_function_handler
+    function_handler = await asyncio.to_thread(get_function_handler)
+    analytics = getattr(function_handler, "analytics", None) if function_handler is not None else None
+    if analytics is None:
+        raise ComponentDisabled("ORDER_ANALYTICS_ENABLED=false")
+    snapshot = await asyncio.to_thread(analytics.snapshot)
+    if snapshot is None:
+        raise RuntimeError("Không nạp được snapshot đơn hàng")
+    counts = snapshot.counts
+    return f"{counts['orders']} orders, {counts['lines']} lines"
+
+
+async def _warmup_llm() -> str:
+    from app.api.deps import get_llm_provider
+    llm_provider = get_llm_provider()
+    if getattr(llm_provider, "is_fake", False):
+        return "fake"
+    client = getattr(llm_provider, "client", None)
+    if client is not None:
+        # Request nhẹ (không tốn token) để mở sẵn kết nối HTTP/TLS tới OpenAI
+        await asyncio.to_thread(client.models.retrieve, llm_provider.model)
+        return f"openai:{llm_provider.model}"
+    if getattr(llm_provider, "fallback_llm", None) is not None:
+        return "ollama fallback"
+    raise RuntimeError("Không có LLM client nào khả dụng")
+
+
+async def _warmup_agents() -> str:
+    from app.api.deps import get_orchestrator
+    # Dựng trên event loop (nhẹ) để không tranh khởi tạo singleton với các warm-up chạy trong thread
+    orchestrator = get_orchestrator()
+    return type(orchestrator).__name__
+
+
+WARMUP_COMPONENTS: Dict[str, Callable[[], Awaitable[str]]] = {
+    "chroma": _warmup_chroma,
+    "clip": _warmup_clip,
+    "text_embedder": _warmup_text_embedder,
+    "reranker": _warmup_reranker,
+    "database": _warmup_database,
+    "order_analytics": _warmup_order_analytics,
+    "llm": _warmup_llm,
+    "agents": _warmup_agents,
+}
+
+
+async def _run_component(name: str, warmup_fn: Callable[[], Awaitable[str]], timeout: float) -> None:
+    _set_status(name, STATE_LOADING)
+    start_time = time.time()
+    try:
+        detail = await asyncio.wait_for(warmup_fn(), timeout=timeout)
+        elapsed = time.time() - start_time
+        _set_status(name, STATE_READY, elapsed, detail)
+        logger.info(f"✅ Warm-up {name} in {elapsed:.2f}s ({detail})")
+    except ComponentDisabled as e:
+        _set_status(name, STATE_DISABLED, time.time() - start_time, str(e))
+        logger.info(f"ℹ️  Warm-up {name} skipped: {str(e)}")
+    except asyncio.TimeoutError:
+        _set_status(name, STATE_FAILED, time.time() - start_time, f"timeout after {timeout:.0f}s")
+        logger.warning(f"⚠️ Warm-up {name} timed out after {timeout:.0f}s")
+    except Exception as e:
+        _set_status(name, STATE_FAILED, time.time() - start_time, str(e))
+        logger.warning(f"⚠️ Warm-up {name} failed (non-critical): {str(e)}")
+
+
+async def warmup_components(timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Warm-up đồng thời tất cả thành phần
+
+    Args:
+        timeout: Thời gian tối đa (giây) cho mỗi thành phần
+
+    Returns:
+        Kết quả get_readiness() sau khi warm-up xong
+    """
+    global _warmup_started_at, _warmup_finished_at
+    from app.core.settings import Settings
+
+    timeout = timeout if timeout is not None else Settings.WARMUP_TIMEOUT_SECONDS
+    _warmup_started_at = time.time()
+    _warmup_finished_at = None
+    for name in WARMUP_COMPONENTS:
+        _set_status(name, STATE_PENDING)
+
+    await asyncio.gather(*(
+        _run_component(name, warmup_fn, timeout)
+        for name, warmup_fn in WARMUP_COMPONENTS.items()
+    ))
+
+    _warmup_finished_at = time.time()
+    readiness = get_readiness()
+    logger.info(f"✅ Warm-up completed in {readiness['warmup_time']:.2f}s (ready={readiness['ready']})")
+    return readiness
+
+
+async def reconcile_document_registries(interval: float) -> None:
+    """
+    Chạy nền: mỗi `interval` giây đối chiếu document registry của các vector stores với Chroma
+    (chỉ các stores đã được khởi tạo, không tự tạo store mới)
+    """
+    from app.api import deps
+
+    while True:
+        await asyncio.sleep(interval)
+        for store in (deps._vector_store, deps._image_vector_store):
+            reconcile = getattr(store, "reconcile_registry", None)
+            if reconcile is None:
+                continue
+            try:
+                await asyncio.to_thread(reconcile)
+            except Exception as e:
+                logger.warning(f"⚠️ Reconcile document registry lỗi: {str(e)}")
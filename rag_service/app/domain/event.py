@@ -0,0 +1,34 @@
+"""
+Domain entities - Change Event
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+EVENT_PRODUCT_UPSERTED = "product.upserted"
+EVENT_PRODUCT_DELETED = "product.deleted"
+EVENT_PRICE_CHANGED = "product.price_changed"
+EVENT_ORDER_STATUS_CHANGED = "order.status_changed"
+EVENT_PROMOTION_CHANGED = "promotion.changed"
+
+PRODUCT_EVENT_TYPES = (EVENT_PRODUCT_UPSERTED, EVENT_PRODUCT_DELETED, EVENT_PRICE_CHANGED)
+EVENT_TYPES = PRODUCT_EVENT_TYPES + (EVENT_ORDER_STATUS_CHANGED, EVENT_PROMOTION_CHANGED)
+
+
+@dataclass
+class ChangeEvent:
+    """Change event - dữ liệu ở backend (sản phẩm, giá, đơn hàng, khuyến mãi) đã thay đổi"""
+    type: str
+    event_id: Optional[str] = None
+    product_id: Optional[str] = None
+    order_id: Optional[str] = None
+    category_id: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        """Validate event"""
+        if self.type not in EVENT_TYPES:
+            raise ValueError(f"Unknown event type: {self.type}")
+        if self.type in PRODUCT_EVENT_TYPES and not self.product_id:
+            raise ValueError(f"{self.type} requires product_id")
+        if self.type == EVENT_ORDER_STATUS_CHANGED and not self.order_id:
+            raise ValueError(f"{self.type} requires order_id")
@@ -0,0 +1,8 @@
+"""
+Catalog Indexer
+Dựng product vector index offline (multiprocessing + checkpoint theo shard): python -m app.indexer
+"""
+from app.indexer.catalog_indexer import CatalogIndexer
+from app.indexer.sources import load_products
+
+__all__ = ["CatalogIndexer", "load_products"]
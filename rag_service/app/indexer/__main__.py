@@ -0,0 +1,3 @@
+from app.indexer.catalog_indexer import main
+
+main()
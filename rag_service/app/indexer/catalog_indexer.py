@@ -0,0 +1,476 @@
+"""
+Catalog Indexer - Dựng lại toàn bộ product index offline (initial load / disaster recovery)
+
+- Products đọc từ SQL Server hoặc file export (CSV/SQLite/NDJSON), ảnh đọc thẳng từ thư mục
+  images/products của backend (không tải lại qua HTTPS)
+- Catalog được chia thành shards cố định theo product_id (hash của product_id, số shards là lũy thừa
+  của 2 theo kích thước catalog): thêm/sửa một product chỉ làm đổi shard chứa nó. Số shards được giữ
+  giữa các lần build (manifest.json) tới khi catalog lớn/nhỏ hơn 4 lần; khi đó mọi product được chia lại
+  và toàn bộ catalog được encode lại
+- Mỗi shard encode bằng CLIP theo batch lớn trong một worker process riêng (multiprocessing,
+  mỗi process một bản CLIP); shard lỗi được báo cáo, không làm dừng các shard khác và bị xóa
+  khỏi snapshot (không nạp embeddings cũ vào store)
+- Mỗi shard xong được ghi ra <output-dir>/shards/*.npz (snapshot + checkpoint): chạy lại sẽ bỏ qua
+  các shard đã có và không đổi (key gồm thông tin products + đường dẫn, kích thước, mtime của ảnh)
+- --write-store nạp snapshot vào product vector store theo batch lớn, fingerprint giống
+  POST /api/products/sync nên lần sync sau chỉ embed các products thật sự thay đổi
+
+Chạy (từ thư mục rag_service):
+    python -m app.indexer --source sqlserver --workers 4 --write-store
+    python -m app.indexer --source exports/products.csv --image-dir path/to/images/products
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.core.catalog_sync_pipeline import DirectoryImageSource, compute_product_fingerprint
+from app.core.product_ingest_pipeline import ProductIngestPipeline
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+SHARD_PATTERN = "shard-{:06d}.npz"
+CLIP_DIMENSION = 512
+
+# State của mỗi worker process (CLIP load một lần trong initializer)
+_worker_state: Dict = {}
+
+
+def _init_worker(torch_threads: int) -> None:
+    """Initializer của worker: chia CPU giữa các process rồi load CLIP"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if torch_threads > 0:
+        import torch
+        torch.set_num_threads(torch_threads)
+        if not Settings.CLIP_ORT_THREADS:
+            Settings.CLIP_ORT_THREADS = torch_threads
+
+    from app.services.image import ImageEmbeddingService
+    _worker_state["clip"] = ImageEmbeddingService()
+    # Chỉ dùng phần dựng text (enrich) của pipeline, không cần embedding service/vector store
+    _worker_state["pipeline"] = ProductIngestPipeline(product_embedding_service=None, vector_store=None)
+
+
+def _encode_shard(task: Dict) -> Dict:
+    """
+    Encode một shard (chạy trong worker) và ghi file shard
+
+    Args:
+        task: {"index", "path", "key", "records", "image_paths"}
+
+    Returns:
+        Thống kê của shard: products, failed, images, seconds
+    """
+    start = time.perf_counter()
+    clip = _worker_state["clip"]
+    pipeline = _worker_state["pipeline"]
+    records = task["records"]
+
+    images: Dict[int, bytes] = {}
+    for i, path in enumerate(task["image_paths"]):
+        if path:
+            try:
+                with open(path, "rb") as f:
+                    images[i] = f.read()
+            except OSError as e:
+                logger.warning(f"⚠️ Không đọc được ảnh {path}: {str(e)}")
+
+    texts = [pipeline.build_product_text(record) for record in records]
+    text_embeddings = clip._create_clip_text_embeddings_batch(texts)
+    with_image = sorted(images)
+    image_embeddings = clip._create_clip_embeddings_batch([images[i] for i in with_image]) if with_image else []
+    image_by_index = dict(zip(with_image, image_embeddings))
+
+    product_ids, fingerprints, embeddings, kept_records, failed = [], [], [], [], []
+    for i, record in enumerate(records):
+        embedding = ProductIngestPipeline.combine_embeddings(text_embeddings[i], image_by_index.get(i))
+        if embedding is None:
+            failed.append(record["product_id"])
+            continue
+        image_hash = hashlib.sha256(images[i]).hexdigest() if i in images else ""
+        product_ids.append(record["product_id"])
+        fingerprints.append(compute_product_fingerprint(record, image_hash))
+        embeddings.append(np.asarray(embedding, dtype=np.float32))
+        kept_records.append(json.dumps(record, ensure_ascii=False, default=str))
+
+    _save_shard(Path(task["path"]), {
+        "key": np.array(task["key"]),
+        "product_ids": np.array(product_ids, dtype=str),
+        "fingerprints": np.array(fingerprints, dtype=str),
+        "embeddings": np.stack(embeddings) if embeddings else np.empty((0, CLIP_DIMENSION), dtype=np.float32),
+        "records": np.array(kept_records, dtype=str),
+        "failed": np.array(failed, dtype=str),
+    })
+    return {
+        "index": task["index"],
+        "products": len(product_ids),
+        "failed": len(failed),
+        "images": len(images),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def _encode_shard_safe(task: Dict) -> Dict:
+    """_encode_shard nhưng trả lỗi thay vì raise (một shard lỗi không làm hỏng cả pool run)"""
+    try:
+        return _encode_shard(task)
+    except Exception as e:
+        logger.error(f"❌ Shard {task['index']} lỗi: {str(e)}", exc_info=True)
+        return {
+            "index": task["index"],
+            "products": 0,
+            "failed": len(task["records"]),
+            "images": 0,
+            "seconds": 0.0,
+            "error": str(e),
+        }
+
+
+def _save_shard(path: Path, arrays: Dict[str, np.ndarray]) -> None:
+    """Ghi atomic (file tạm + rename): shard bị ngắt giữa chừng không được coi là checkpoint"""
+    tmp_path = path.with_name(f"{path.stem}.tmp.npz")
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _read_shard_key(path: Path) -> Optional[str]:
+    try:
+        with np.load(path) as data:
+            return str(data["key"])
+    except Exception:
+        return None
+
+
+def _shard_count(total: int, batch_size: int, previous: Optional[int] = None) -> int:
+    """
+    Số shards: lũy thừa của 2 nhỏ nhất để trung bình mỗi shard không quá batch_size products
+
+    Đổi số shards làm chia lại mọi product (encode lại toàn bộ) → giữ số shards của lần build trước
+    khi nó chênh không quá 4 lần so với số lý tưởng (trung bình mỗi shard trong khoảng batch_size/4..4×batch_size)
+    """
+    count = 1
+    while count * batch_size < total:
+        count *= 2
+    if previous and count // 4 <= previous <= count * 4:
+        return previous
+    return count
+
+
+def _shard_of(product_id: str, shard_count: int) -> int:
+    """Shard của một product: cố định theo product_id (không phụ thuộc vị trí trong catalog)"""
+    digest = hashlib.blake2b(product_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+def _image_signature(image_path: str) -> str:
+    """Kích thước + mtime của file ảnh: ảnh bị thay bằng file khác cùng tên sẽ đổi key của shard"""
+    if not image_path:
+        return ""
+    try:
+        stat = os.stat(image_path)
+    except OSError:
+        return "missing"
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _shard_key(records: List[Dict], image_paths: List[str]) -> str:
+    """Key của shard: đổi khi thông tin products, đường dẫn hoặc nội dung file ảnh thay đổi"""
+    digest = hashlib.sha256()
+    for record, image_path in zip(records, image_paths):
+        digest.update(compute_product_fingerprint(record).encode("ascii"))
+        digest.update(image_path.encode("utf-8"))
+        digest.update(_image_signature(image_path).encode("ascii"))
+    return digest.hexdigest()
+
+
+class CatalogIndexer:
+    """
+    Dựng snapshot embeddings của toàn bộ catalog (checkpoint theo shard) và nạp vào vector store
+    """
+
+    def __init__(
+        self,
+        output_dir: Optional[str] = None,
+        image_dir: Optional[str] = None,
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None
+    ):
+        """
+        Args:
+            output_dir: Thư mục snapshot (mặc định CATALOG_INDEX_DIR)
+            image_dir: Thư mục ảnh products (mặc định PRODUCT_IMAGE_DIR)
+            workers: Số worker processes (mặc định CATALOG_INDEX_WORKERS, <= 1 = chạy trong process hiện tại)
+            batch_size: Số products trung bình mỗi shard / batch CLIP (mặc định CATALOG_INDEX_BATCH_SIZE)
+        """
+        self.output_dir = Path(output_dir or Settings.CATALOG_INDEX_DIR)
+        self.shard_dir = self.output_dir / "shards"
+        self.image_dir = Path(image_dir or Settings.PRODUCT_IMAGE_DIR)
+        self.workers = max(1, workers if workers is not None else Settings.CATALOG_INDEX_WORKERS)
+        self.batch_size = max(1, batch_size or Settings.CATALOG_INDEX_BATCH_SIZE)
+
+    def reset(self) -> None:
+        """Xóa toàn bộ checkpoints (build lại từ đầu)"""
+        if self.shard_dir.exists():
+            shutil.rmtree(self.shard_dir)
+
+    def build(self, records: List[Dict]) -> Dict:
+        """
+        Encode toàn bộ catalog thành shards (bỏ qua shards đã có checkpoint hợp lệ)
+
+        Args:
+            records: Products đã sắp xếp theo product_id (sources.load_products)
+
+        Returns:
+            Throughput report
+        """
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        image_source = None
+        if self.image_dir.is_dir():
+            image_source = DirectoryImageSource(self.image_dir)
+            logger.info(f"🖼️ {len(image_source)} ảnh trong {self.image_dir}")
+        else:
+            logger.warning(f"⚠️ Không tìm thấy thư mục ảnh {self.image_dir}, chỉ dùng text embeddings")
+
+        shard_count = _shard_count(len(records), self.batch_size, self._previous_shard_count())
+        buckets: List[List[Dict]] = [[] for _ in range(shard_count)]
+        for record in records:
+            buckets[_shard_of(record["product_id"], shard_count)].append(record)
+
+        tasks = []
+        resumed = 0
+        for index, shard_records in enumerate(buckets):
+            path = self.shard_dir / SHARD_PATTERN.format(index)
+            if not shard_records:
+                if path.exists():
+                    path.unlink()
+                continue
+            image_paths = []
+            for record in shard_records:
+                name = image_source.resolve(record) if image_source is not None else None
+                image_paths.append(str(self.image_dir / name) if name else "")
+            key = _shard_key(shard_records, image_paths)
+            if path.exists() and _read_shard_key(path) == key:
+                resumed += len(shard_records)
+                continue
+            tasks.append({
+                "index": index,
+                "path": str(path),
+                "key": key,
+                "records": shard_records,
+                "image_paths": image_paths,
+            })
+
+        # Catalog nhỏ đi: xóa shards thừa từ lần build trước
+        for path in self.shard_dir.glob("shard-*.npz"):
+            stem = path.stem.replace(".tmp", "")
+            if ".tmp" in path.stem or int(stem.split("-")[1]) >= shard_count:
+                path.unlink()
+
+        logger.info(
+            f"🚀 Indexing {len(records)} products: {shard_count} shards, {len(tasks)} cần encode, "
+            f"{resumed} products từ checkpoint ({self.workers} workers, batch {self.batch_size})"
+        )
+
+        start = time.perf_counter()
+        stats = {"products": 0, "failed": 0, "images": 0}
+        failed_shards = []
+        tasks_by_index = {task["index"]: task for task in tasks}
+        for done, result in enumerate(self._run(tasks), start=1):
+            for key in stats:
+                stats[key] += result[key]
+            elapsed = time.perf_counter() - start
+            if "error" in result:
+                failed_shards.append({"index": result["index"], "error": result["error"]})
+                # Xóa checkpoint cũ (nếu có): embeddings của products đã đổi/bị xóa không được nạp vào store
+                Path(tasks_by_index[result["index"]]["path"]).unlink(missing_ok=True)
+                logger.warning(f"  ⚠️ Shard {result['index']} ({done}/{len(tasks)}) lỗi, sẽ encode lại ở lần chạy sau")
+                continue
+            logger.info(
+                f"  ✅ Shard {result['index']} ({done}/{len(tasks)}): {result['products']} products "
+                f"trong {result['seconds']:.1f}s - {stats['products'] / max(elapsed, 1e-9):.1f} products/s"
+            )
+        encode_seconds = time.perf_counter() - start
+
+        report = {
+            "products_total": len(records),
+            "shards": shard_count,
+            "products_encoded": stats["products"],
+            "products_resumed": resumed,
+            "products_failed": stats["failed"],
+            "shards_failed": failed_shards,
+            "images_encoded": stats["images"],
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+            "encode_seconds": round(encode_seconds, 2),
+            "products_per_second": round(stats["products"] / encode_seconds, 2) if encode_seconds > 0 else 0.0,
+            "images_per_second": round(stats["images"] / encode_seconds, 2) if encode_seconds > 0 else 0.0,
+        }
+        self._write_json("manifest.json", {
+            "created_at": datetime.now().isoformat(),
+            "clip_model": "ViT-B/32",
+            "clip_backend": Settings.CLIP_BACKEND,
+            "dimension": CLIP_DIMENSION,
+            "shards": shard_count,
+            "products": len(records),
+            "image_dir": str(self.image_dir),
+        })
+        return report
+
+    def _previous_shard_count(self) -> Optional[int]:
+        """Số shards của lần build trước (manifest.json), None nếu chưa có"""
+        try:
+            with open(self.output_dir / "manifest.json", encoding="utf-8") as f:
+                return int(json.load(f)["shards"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _run(self, tasks: List[Dict]) -> Iterator[Dict]:
+        """Encode shards: pool process (spawn, an toàn với torch) hoặc tuần tự trong process hiện tại"""
+        if not tasks:
+            return
+        workers = min(self.workers, len(tasks))
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        if workers <= 1:
+            if not _worker_state:
+                _init_worker(torch_threads)
+            for task in tasks:
+                yield _encode_shard_safe(task)
+            return
+
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=_init_worker, initargs=(torch_threads,)) as pool:
+            yield from pool.imap_unordered(_encode_shard_safe, tasks)
+
+    def iter_shards(self) -> Iterator[Dict[str, np.ndarray]]:
+        """Đọc lần lượt các shards của snapshot"""
+        for path in sorted(self.shard_dir.glob("shard-*.npz")):
+            if ".tmp" in path.stem:
+                continue
+            with np.load(path) as data:
+                yield {name: data[name] for name in data.files}
+
+    async def write_store(self, vector_store, replace: bool = False, write_batch: Optional[int] = None) -> Dict:
+        """
+        Nạp snapshot vào product vector store (bỏ qua products có fingerprint không đổi)
+
+        Args:
+            vector_store: ImageVectorStore
+            replace: Xóa products trong store không có trong snapshot (collection hoàn chỉnh = snapshot)
+            write_batch: Số products mỗi lần ghi (mặc định CATALOG_SYNC_WRITE_BATCH)
+
+        Returns:
+            {"written", "unchanged", "deleted", "write_seconds"}
+        """
+        write_batch = max(1, write_batch or Settings.CATALOG_SYNC_WRITE_BATCH)
+        start = time.perf_counter()
+        existing_hashes = await asyncio.to_thread(vector_store.registry.get_content_hashes, content_type="product")
+        upload_date = datetime.now().isoformat()
+        snapshot_ids = set()
+        result = {"written": 0, "unchanged": 0, "deleted": 0}
+        pending = {"chunks": [], "embeddings": [], "metadata": [], "hashes": {}}
+
+        async def flush():
+            await vector_store.save_chunks(
+                pending["chunks"],
+                pending["embeddings"],
+                file_type="product",
+                upload_date=upload_date,
+                extra_metadata=pending["metadata"],
+                content_hashes=pending["hashes"]
+            )
+            result["written"] += len(pending["chunks"])
+            logger.info(f"  💾 Đã ghi {result['written']} products vào vector store")
+            for key in ("chunks", "embeddings", "metadata"):
+                pending[key] = []
+            pending["hashes"] = {}
+
+        for shard in self.iter_shards():
+            snapshot_ids.update(str(product_id) for product_id in shard["failed"])
+            for product_id, fingerprint, embedding, raw in zip(
+                shard["product_ids"], shard["fingerprints"], shard["embeddings"], shard["records"]
+            ):
+                product_id, fingerprint = str(product_id), str(fingerprint)
+                snapshot_ids.add(product_id)
+                if existing_hashes.get(product_id) == fingerprint:
+                    result["unchanged"] += 1
+                    continue
+                record = json.loads(str(raw))
+                pending["chunks"].append(ProductIngestPipeline.build_product_chunk(product_id, record))
+                pending["embeddings"].append(embedding)
+                pending["metadata"].append(ProductIngestPipeline.build_product_metadata(product_id, record))
+                pending["hashes"][product_id] = fingerprint
+                if len(pending["chunks"]) >= write_batch:
+                    await flush()
+        if pending["chunks"]:
+            await flush()
+
+        if replace:
+            missing_ids = [product_id for product_id in existing_hashes if product_id not in snapshot_ids]
+            if missing_ids:
+                await vector_store.delete_documents(missing_ids)
+                result["deleted"] = len(missing_ids)
+
+        result["write_seconds"] = round(time.perf_counter() - start, 2)
+        return result
+
+    def _write_json(self, name: str, payload: Dict) -> None:
+        with open(self.output_dir / name, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+
+    def save_report(self, report: Dict) -> None:
+        self._write_json("report.json", report)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from app.indexer.sources import SOURCE_SQLSERVER, load_products
+
+    parser = argparse.ArgumentParser(description="Dựng product vector index offline từ database + thư mục ảnh")
+    parser.add_argument("--source", default=SOURCE_SQLSERVER,
+                        help="sqlserver (mặc định, database theo DATABASE_BACKEND) hoặc file .csv / .db / .sqlite / .ndjson")
+    parser.add_argument("--image-dir", default=None, help=f"Thư mục ảnh (mặc định: {Settings.PRODUCT_IMAGE_DIR})")
+    parser.add_argument("--output-dir", default=None, help=f"Thư mục snapshot (mặc định: {Settings.CATALOG_INDEX_DIR})")
+    parser.add_argument("--workers", type=int, default=None, help="Số worker processes")
+    parser.add_argument("--batch-size", type=int, default=None, help="Số products trung bình mỗi shard / batch CLIP")
+    parser.add_argument("--fresh", action="store_true", help="Bỏ checkpoints, encode lại toàn bộ")
+    parser.add_argument("--write-store", action="store_true", help="Nạp snapshot vào product vector store")
+    parser.add_argument("--replace", action="store_true",
+                        help="Cùng --write-store: xóa products trong store không có trong snapshot")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    indexer = CatalogIndexer(args.output_dir, args.image_dir, args.workers, args.batch_size)
+    if args.fresh:
+        indexer.reset()
+
+    start = time.perf_counter()
+    records = load_products(args.source)
+    load_seconds = time.perf_counter() - start
+
+    report = {"source": args.source, "load_seconds": round(load_seconds, 2)}
+    report.update(indexer.build(records))
+    if args.write_store:
+        from app.infrastructure.vector_store.image_vector_store import ImageVectorStore
+        replace = args.replace
+        if replace and report["shards_failed"]:
+            # Snapshot thiếu products của shards lỗi: không xóa chúng khỏi store
+            logger.warning(f"⚠️ {len(report['shards_failed'])} shards lỗi, bỏ qua --replace")
+            replace = False
+        report["store"] = asyncio.run(indexer.write_store(ImageVectorStore(), replace=replace))
+    report["total_seconds"] = round(time.perf_counter() - start, 2)
+    indexer.save_report(report)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Product Sources - Đọc danh sách sản phẩm cho indexer offline
+
+- sqlserver: bảng SanPham/DanhMuc của database đã cấu hình (DATABASE_BACKEND: SQL Server hoặc SQLite offline)
+- *.csv: file export (header theo tên cột database hoặc tên field của record)
+- *.db / *.sqlite / *.sqlite3: bản SQLite có cùng schema SanPham/DanhMuc
+- *.ndjson / *.jsonl: cùng định dạng với POST /api/products/sync
+"""
+import csv
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from app.core.catalog_sync_pipeline import normalize_product_record, parse_ndjson_records
+from app.infrastructure.database import Database, SqlServerDatabase, create_database
+
+logger = logging.getLogger(__name__)
+
+SOURCE_SQLSERVER = "sqlserver"
+
+# Số tham số tối đa cho mỗi query IN (...) - SQL Server giới hạn 2100
+_ID_BATCH = 500
+
+# Cột database → field của record
+COLUMN_MAP = {
+    "MaSanPham": "product_id",
+    "TenSanPham": "product_name",
+    "MoTa": "description",
+    "GiaBan": "price",
+    "DonViTinh": "unit",
+    "XuatXu": "origin",
+    "Anh": "image_filename",
+    "MaDanhMuc": "category_id",
+    "TenDanhMuc": "category_name",
+}
+
+PRODUCT_QUERY = """
+    SELECT
+        s.MaSanPham,
+        s.TenSanPham,
+        s.MoTa,
+        s.GiaBan,
+        s.DonViTinh,
+        s.XuatXu,
+        s.Anh,
+        s.MaDanhMuc,
+        dm.TenDanhMuc
+    FROM SanPham s
+    LEFT JOIN DanhMuc dm ON s.MaDanhMuc = dm.MaDanhMuc
+    WHERE (s.IsDeleted = 0 OR s.IsDeleted IS NULL)
+"""
+
+
+def _normalize_rows(rows: Iterable[Dict], source_name: str) -> List[Dict]:
+    """Map tên cột database → field, bỏ qua (và log) các dòng không hợp lệ, trùng product_id: dòng sau ghi đè"""
+    records: Dict[str, Dict] = {}
+    skipped = 0
+    for row in rows:
+        raw = {COLUMN_MAP.get(key, key): value for key, value in row.items()}
+        try:
+            record = normalize_product_record(raw)
+        except ValueError:
+            skipped += 1
+            continue
+        records[record["product_id"]] = record
+    if skipped:
+        logger.warning(f"⚠️ Bỏ qua {skipped} dòng không hợp lệ từ {source_name}")
+    return list(records.values())
+
+
+def _resolve_database(database: Optional[Database] = None, connection_string: str = "") -> Database:
+    """Database được truyền vào, SQL Server theo connection_string, hoặc database theo DATABASE_BACKEND"""
+    if database is not None:
+        return database
+    if connection_string:
+        return SqlServerDatabase(connection_string)
+    database = create_database()
+    if database is None:
+        raise ValueError("Chưa cấu hình database (DATABASE_BACKEND / DATABASE_CONNECTION_STRING)")
+    return database
+
+
+def load_from_database(connection_string: str = "", database: Optional[Database] = None) -> List[Dict]:
+    """Đọc products từ database (mặc định theo DATABASE_BACKEND; connection_string → SQL Server)"""
+    database = _resolve_database(database, connection_string)
+    with database.connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(PRODUCT_QUERY)
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        cursor.close()
+    return _normalize_rows(rows, database.name)
+
+
+def load_from_database_by_ids(product_ids: List[str], database: Optional[Database] = None) -> List[Dict]:
+    """Đọc một số products theo MaSanPham (products đã xóa/không tồn tại không có trong kết quả)"""
+    database = _resolve_database(database)
+    rows = []
+    with database.connect() as conn:
+        cursor = conn.cursor()
+        for offset in range(0, len(product_ids), _ID_BATCH):
+            batch = product_ids[offset:offset + _ID_BATCH]
+            placeholders = ", ".join("?" for _ in batch)
+            cursor.execute(PRODUCT_QUERY + f" AND {database.dialect.nocase('s.MaSanPham')} IN ({placeholders})", *batch)
+            columns = [column[0] for column in cursor.description]
+            rows.extend(dict(zip(columns, row)) for row in cursor.fetchall())
+        cursor.close()
+    return _normalize_rows(rows, database.name)
+
+
+def find_deleted_product_ids(product_ids: List[str], database: Optional[Database] = None) -> List[str]:
+    """
+    Trong product_ids, các ids chắc chắn đã bị xóa: không còn dòng nào trong SanPham hoặc IsDeleted = 1
+    (so khớp không phân biệt hoa thường như collation của SQL Server)
+    """
+    database = _resolve_database(database)
+    active = set()
+    with database.connect() as conn:
+        cursor = conn.cursor()
+        for offset in range(0, len(product_ids), _ID_BATCH):
+            batch = product_ids[offset:offset + _ID_BATCH]
+            placeholders = ", ".join("?" for _ in batch)
+            cursor.execute(
+                f"SELECT MaSanPham, IsDeleted FROM SanPham WHERE {database.dialect.nocase('MaSanPham')} IN ({placeholders})",
+                *batch
+            )
+            active.update(str(product_id).strip().casefold() for product_id, is_deleted in cursor.fetchall() if not is_deleted)
+        cursor.close()
+    return [product_id for product_id in product_ids if str(product_id).strip().casefold() not in active]
+
+
+def load_from_csv(path: Path) -> List[Dict]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return _normalize_rows(csv.DictReader(f), str(path))
+
+
+def load_from_sqlite(path: Path) -> List[Dict]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        try:
+            rows = conn.execute(PRODUCT_QUERY).fetchall()
+        except sqlite3.OperationalError as e:
+            # Bản export không có cột IsDeleted
+            logger.warning(f"⚠️ {str(e)} - đọc tất cả products")
+            rows = conn.execute(PRODUCT_QUERY.split("WHERE")[0]).fetchall()
+        return _normalize_rows((dict(row) for row in rows), str(path))
+    finally:
+        conn.close()
+
+
+def load_from_ndjson(path: Path) -> List[Dict]:
+    with open(path, "rb") as f:
+        records, errors = parse_ndjson_records(f)
+    if errors:
+        logger.warning(f"⚠️ Bỏ qua {len(errors)} dòng không hợp lệ từ {path} (dòng đầu: {errors[0]})")
+    return records
+
+
+def load_products(source: str) -> List[Dict]:
+    """
+    Đọc products từ nguồn, sắp xếp theo product_id (thứ tự ổn định để checkpoint theo shard)
+
+    Args:
+        source: "sqlserver" (database theo DATABASE_BACKEND) hoặc đường dẫn file .csv / .db / .sqlite / .sqlite3 / .ndjson / .jsonl
+    """
+    if source == SOURCE_SQLSERVER:
+        records = load_from_database()
+    else:
+        path = Path(source)
+        suffix = path.suffix.lower()
+        if suffix == ".csv":
+            records = load_from_csv(path)
+        elif suffix in (".db", ".sqlite", ".sqlite3"):
+            records = load_from_sqlite(path)
+        elif suffix in (".ndjson", ".jsonl"):
+            records = load_from_ndjson(path)
+        else:
+            raise ValueError(f"Không hỗ trợ nguồn products: {source}")
+    records.sort(key=lambda record: record["product_id"])
+    logger.info(f"📦 Đã đọc {len(records)} products từ {source}")
+    return records
@@ -0,0 +1,8 @@
+# Relational database backends (SQL Server, SQLite offline)
+from app.infrastructure.database.base import Database
+from app.infrastructure.database.dialect import SQLITE, SQLSERVER, SqlDialect
+from app.infrastructure.database.sqlite import SqliteDatabase
+from app.infrastructure.database.sqlserver import SqlServerDatabase
+from app.infrastructure.database.factory import create_database
+
+__all__ = ["Database", "SqlDialect", "SQLSERVER", "SQLITE", "SqlServerDatabase", "SqliteDatabase", "create_database"]
@@ -0,0 +1,3 @@
+from app.infrastructure.database.synthetic import main
+
+main()
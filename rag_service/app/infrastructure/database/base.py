@@ -0,0 +1,42 @@
+"""
+Base interface for relational database backends (SQL Server của backend, SQLite offline)
+"""
+from abc import ABC, abstractmethod
+from contextlib import AbstractContextManager
+from typing import Any, Dict, Optional
+
+from app.infrastructure.database.dialect import SqlDialect
+
+
+class Database(ABC):
+    """
+    Abstract base class cho database chứa schema SanPham/DanhMuc/DonHang/ChiTietDonHang/KhuyenMai/NguoiDung
+
+    connect() trả về context manager với DB-API connection mà cursor.execute nhận tham số
+    theo kiểu pyodbc: execute(query, a, b) hoặc execute(query, [a, b])
+    """
+
+    name: str = ""
+    dialect: SqlDialect
+
+    @abstractmethod
+    def connect(self, query_timeout: Optional[float] = None) -> AbstractContextManager:
+        """
+        Mở một connection (đóng khi ra khỏi with)
+
+        Args:
+            query_timeout: Số giây tối đa cho câu lệnh (SQL Server: mỗi câu lệnh, SQLite: tính từ lúc mở
+                           connection; None = không giới hạn). Quá hạn thì câu lệnh bị hủy và raise lỗi
+                           của driver, thread đang chạy query được giải phóng
+        """
+        pass
+
+    def ping(self) -> str:
+        """Mở một kết nối và chạy SELECT 1 (dùng cho warm-up/readiness)"""
+        with self.connect() as conn:
+            conn.cursor().execute("SELECT 1").fetchone()
+        return self.name
+
+    def describe(self) -> Dict[str, Any]:
+        """Thông tin backend (không chứa mật khẩu)"""
+        return {"backend": self.name, "dialect": self.dialect.name}
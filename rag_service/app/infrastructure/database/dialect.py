@@ -0,0 +1,39 @@
+"""
+SQL Dialects - Khác biệt cú pháp giữa SQL Server và SQLite mà các query của service cần
+"""
+
+
+class SqlDialect:
+    """Khác biệt cú pháp giữa các database được hỗ trợ"""
+
+    def __init__(self, name: str, month_template: str, top_template: str, limit_template: str, nocase_template: str):
+        self.name = name
+        self._month_template = month_template
+        self._top_template = top_template
+        self._limit_template = limit_template
+        self._nocase_template = nocase_template
+
+    def month(self, column: str) -> str:
+        """Biểu thức lấy tháng (1-12) của cột ngày - chỉ dùng trong SELECT/GROUP BY, không dùng để lọc"""
+        return self._month_template.format(column=column)
+
+    def top(self, n: int) -> str:
+        """Giới hạn số dòng đặt ngay sau SELECT ("TOP n" - rỗng nếu dialect dùng LIMIT)"""
+        return self._top_template.format(n=int(n))
+
+    def limit(self, n: int) -> str:
+        """Giới hạn số dòng đặt cuối query ("LIMIT n" - rỗng nếu dialect dùng TOP)"""
+        return self._limit_template.format(n=int(n))
+
+    def nocase(self, column: str) -> str:
+        """Cột so sánh =/IN không phân biệt hoa thường (SQL Server: collation *_CI_AS sẵn có)"""
+        return self._nocase_template.format(column=column)
+
+
+SQLSERVER = SqlDialect(
+    "sqlserver", "MONTH({column})", top_template="TOP {n}", limit_template="", nocase_template="{column}"
+)
+SQLITE = SqlDialect(
+    "sqlite", "CAST(strftime('%m', {column}) AS INTEGER)", top_template="", limit_template="LIMIT {n}",
+    nocase_template="{column} COLLATE NOCASE"
+)
@@ -0,0 +1,32 @@
+"""
+Database Factory - Tạo Database theo DATABASE_BACKEND (dùng chung cho service và indexer offline)
+"""
+import logging
+from typing import Optional
+
+from app.core.settings import Settings
+from app.infrastructure.database.base import Database
+from app.infrastructure.database.sqlite import SqliteDatabase
+from app.infrastructure.database.sqlserver import SqlServerDatabase
+
+logger = logging.getLogger(__name__)
+
+
+def create_database() -> Optional[Database]:
+    """
+    Tạo Database theo DATABASE_BACKEND
+    - sqlserver: DATABASE_CONNECTION_STRING
+    - sqlite: SQLITE_DATABASE_PATH (sinh dữ liệu giả SQLITE_SYNTHETIC_SCALE nếu file chưa tồn tại)
+
+    Returns:
+        Database instance, hoặc None nếu chưa cấu hình
+    """
+    if Settings.DATABASE_BACKEND == "sqlite":
+        database = SqliteDatabase(Settings.SQLITE_DATABASE_PATH)
+        if not database.exists and Settings.SQLITE_SYNTHETIC_SCALE > 0:
+            from app.infrastructure.database.synthetic import create_synthetic_database
+            create_synthetic_database(database.path, scale=Settings.SQLITE_SYNTHETIC_SCALE)
+        return database
+    if Settings.DATABASE_CONNECTION_STRING:
+        return SqlServerDatabase(Settings.DATABASE_CONNECTION_STRING)
+    return None
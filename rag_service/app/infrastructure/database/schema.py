@@ -0,0 +1,84 @@
+"""
+Schema SQLite tương ứng các bảng của backend mà service đọc
+
+Chỉ gồm các cột được query trong FunctionHandler, agents, indexer và order analytics;
+indexes giống các index cần có trên SQL Server (NgayDat, TrangThai, NgayHetHan, ...)
+"""
+import sqlite3
+
+TABLES = ("DanhMuc", "SanPham", "NguoiDung", "DonHang", "ChiTietDonHang", "KhuyenMai")
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS DanhMuc (
+    MaDanhMuc TEXT PRIMARY KEY,
+    TenDanhMuc TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS SanPham (
+    MaSanPham TEXT PRIMARY KEY,
+    TenSanPham TEXT NOT NULL,
+    MoTa TEXT,
+    GiaBan REAL,
+    SoLuongTon INTEGER,
+    DonViTinh TEXT,
+    XuatXu TEXT,
+    Anh TEXT,
+    NgaySanXuat DATETIME,
+    NgayHetHan DATETIME,
+    MaDanhMuc TEXT REFERENCES DanhMuc (MaDanhMuc),
+    IsDeleted INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS NguoiDung (
+    MaTaiKhoan TEXT PRIMARY KEY,
+    HoTen TEXT,
+    Email TEXT,
+    Sdt TEXT,
+    DiaChi TEXT
+);
+
+CREATE TABLE IF NOT EXISTS DonHang (
+    MaDonHang TEXT PRIMARY KEY,
+    MaTaiKhoan TEXT REFERENCES NguoiDung (MaTaiKhoan),
+    NgayDat DATETIME,
+    TrangThai TEXT,
+    TongTien REAL
+);
+
+CREATE TABLE IF NOT EXISTS ChiTietDonHang (
+    MaDonHang TEXT REFERENCES DonHang (MaDonHang),
+    MaSanPham TEXT REFERENCES SanPham (MaSanPham),
+    SoLuong INTEGER,
+    GiaBan REAL,
+    PRIMARY KEY (MaDonHang, MaSanPham)
+);
+
+CREATE TABLE IF NOT EXISTS KhuyenMai (
+    Id_sale TEXT PRIMARY KEY,
+    GiaTriKhuyenMai REAL,
+    LoaiGiaTri TEXT,
+    MoTaChuongTrinh TEXT,
+    NgayBatDau DATETIME,
+    NgayKetThuc DATETIME,
+    TrangThai TEXT,
+    MaSanPham TEXT
+);
+
+CREATE INDEX IF NOT EXISTS IX_SanPham_MaDanhMuc ON SanPham (MaDanhMuc);
+CREATE INDEX IF NOT EXISTS IX_SanPham_NgayHetHan ON SanPham (NgayHetHan);
+CREATE INDEX IF NOT EXISTS IX_SanPham_TenSanPham ON SanPham (TenSanPham);
+CREATE INDEX IF NOT EXISTS IX_NguoiDung_Email ON NguoiDung (Email);
+CREATE INDEX IF NOT EXISTS IX_DonHang_NgayDat ON DonHang (NgayDat);
+CREATE INDEX IF NOT EXISTS IX_DonHang_TrangThai ON DonHang (TrangThai);
+CREATE INDEX IF NOT EXISTS IX_DonHang_MaTaiKhoan ON DonHang (MaTaiKhoan);
+CREATE INDEX IF NOT EXISTS IX_ChiTietDonHang_MaSanPham ON ChiTietDonHang (MaSanPham);
+CREATE INDEX IF NOT EXISTS IX_KhuyenMai_NgayBatDau ON KhuyenMai (NgayBatDau);
+"""
+
+
+def create_schema(conn: sqlite3.Connection, drop_existing: bool = False) -> None:
+    """Tạo các bảng và indexes (drop_existing: xóa dữ liệu cũ trước)"""
+    if drop_existing:
+        for table in reversed(TABLES):
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.executescript(SCHEMA_SQL)
@@ -0,0 +1,130 @@
+"""
+SQLite Database - Bản offline cùng schema với database SQL Server của backend
+
+Dùng để chạy FunctionHandler/agents, benchmark và load test không cần SQL Server:
+- cursor.execute nhận tham số theo kiểu pyodbc (execute(query, a, b))
+- Cột DATETIME đọc ra datetime như pyodbc
+- LIKE không phân biệt hoa thường cả với chữ có dấu (như collation *_CI_AS của SQL Server);
+  LIKE 'abc%' vì vậy không dùng được index như trên SQL Server
+"""
+import logging
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.infrastructure.database.base import Database
+from app.infrastructure.database.dialect import SQLITE
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_datetime(value: bytes) -> datetime:
+    return datetime.fromisoformat(value.decode("utf-8"))
+
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter("DATETIME", _parse_datetime)
+
+
+@lru_cache(maxsize=1024)
+def _like_regex(pattern: str) -> "re.Pattern":
+    parts = []
+    for char in pattern:
+        if char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+
+def _like(pattern: Optional[str], value: Any) -> Optional[bool]:
+    """X LIKE Y của SQLite gọi like(Y, X)"""
+    if pattern is None or value is None:
+        return None
+    return _like_regex(pattern).fullmatch(str(value)) is not None
+
+
+class _Cursor:
+    """sqlite3.Cursor nhận tham số kiểu pyodbc"""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, query: str, *params) -> "_Cursor":
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = tuple(params[0])
+        self._cursor.execute(query, params)
+        return self
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class _Connection:
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def cursor(self) -> _Cursor:
+        return _Cursor(self._conn.cursor())
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+
+class SqliteDatabase(Database):
+    """SQLite file (tạo bằng app.infrastructure.database.synthetic hoặc export từ backend)"""
+
+    name = "sqlite"
+    dialect = SQLITE
+
+    def __init__(self, path: str):
+        if not path or path == ":memory:":
+            raise ValueError("SQLite database cần đường dẫn file (mỗi connection :memory: là một database rỗng)")
+        self.path = str(path)
+
+    @property
+    def exists(self) -> bool:
+        return Path(self.path).is_file()
+
+    def open(self) -> sqlite3.Connection:
+        """Connection sqlite3 gốc (dùng để tạo schema/ghi dữ liệu)"""
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(
+            self.path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            timeout=10
+        )
+        conn.create_function("like", 2, _like, deterministic=True)
+        return conn
+
+    @contextmanager
+    def connect(self, query_timeout: Optional[float] = None):
+        """Context manager để quản lý database connection"""
+        if not self.exists:
+            raise FileNotFoundError(f"SQLite database không tồn tại: {self.path}")
+        conn = self.open()
+        if query_timeout:
+            # Hết hạn: progress handler trả khác 0 → câu lệnh đang chạy bị interrupt (OperationalError)
+            deadline = time.monotonic() + query_timeout
+            conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 10_000)
+        try:
+            yield _Connection(conn)
+        finally:
+            conn.close()
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "path": self.path, "exists": self.exists}
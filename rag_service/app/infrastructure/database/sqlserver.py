@@ -0,0 +1,151 @@
+"""
+SQL Server Database - Database của backend qua pyodbc
+
+Connection string .NET (Server=...;Database=...;User Id=...) được chuyển sang ODBC,
+driver được dò theo thứ tự ưu tiên và driver đã kết nối thành công được thử trước ở các lần sau
+"""
+import logging
+import math
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from app.infrastructure.database.base import Database
+from app.infrastructure.database.dialect import SQLSERVER
+
+logger = logging.getLogger(__name__)
+
+# Thử các driver theo thứ tự ưu tiên
+ODBC_DRIVERS = [
+    "ODBC Driver 18 for SQL Server",
+    "ODBC Driver 17 for SQL Server",
+    "SQL Server Native Client 11.0",
+    "SQL Server"
+]
+
+
+def _parse_connection_string(conn_str: str) -> Dict[str, str]:
+    """Split theo dấu ; và parse từng phần key=value (key viết thường)"""
+    params = {}
+    parts = [p.strip() for p in conn_str.split(';') if p.strip()]
+    for part in parts:
+        if '=' in part:
+            key, value = part.split('=', 1)
+            params[key.strip().lower()] = value.strip()
+    return params
+
+
+def to_odbc_connection_string(conn_str: str) -> str:
+    """
+    Convert connection string từ .NET format sang ODBC format
+    """
+    if "DRIVER=" in conn_str.upper():
+        return conn_str
+
+    params = _parse_connection_string(conn_str)
+
+    # Map .NET parameters sang ODBC parameters
+    server = params.get('server', '')
+    database = params.get('database', '')
+    user_id = params.get('user id', params.get('uid', ''))
+    password = params.get('password', params.get('pwd', ''))
+    trust_cert = params.get('trustservercertificate', 'True').lower() == 'true'
+
+    # Tạo connection string với driver đầu tiên
+    # Nếu không kết nối được, sẽ thử các driver khác trong connect()
+    odbc_conn_str = f"DRIVER={{{ODBC_DRIVERS[0]}}};SERVER={server};DATABASE={database};"
+    if user_id:
+        odbc_conn_str += f"UID={user_id};PWD={password};"
+    if trust_cert:
+        odbc_conn_str += "TrustServerCertificate=yes;"
+
+    return odbc_conn_str
+
+
+class SqlServerDatabase(Database):
+    """SQL Server qua pyodbc (import khi kết nối - chạy được bản SQLite khi không cài pyodbc)"""
+
+    name = "sqlserver"
+    dialect = SQLSERVER
+
+    def __init__(self, connection_string: str):
+        if not connection_string:
+            raise ValueError("Connection string không được để trống")
+        self.connection_string = to_odbc_connection_string(connection_string)
+        # Driver đã kết nối thành công: thử trước ở các lần sau thay vì dò lại từ đầu
+        self._working_driver: Optional[str] = None
+
+    @contextmanager
+    def connect(self, query_timeout: Optional[float] = None):
+        """Context manager để quản lý database connection"""
+        import pyodbc
+
+        conn = None
+        params = _parse_connection_string(self.connection_string)
+        server = params.get('server', '')
+        database = params.get('database', '')
+        user_id = params.get('uid', '')
+        password = params.get('pwd', '')
+        trust_cert = params.get('trustservercertificate', 'yes')
+
+        drivers_to_try = list(ODBC_DRIVERS)
+        if self._working_driver:
+            drivers_to_try = [self._working_driver] + [d for d in drivers_to_try if d != self._working_driver]
+
+        # Thử kết nối với các driver khác nhau
+        last_error = None
+        for driver in drivers_to_try:
+            try:
+                # Tạo connection string với driver hiện tại
+                conn_str = f"DRIVER={{{driver}}};SERVER={server};DATABASE={database};"
+                if user_id:
+                    conn_str += f"UID={user_id};PWD={password};"
+                if trust_cert:
+                    conn_str += "TrustServerCertificate=yes;"
+
+                logger.info(f"Đang thử kết nối với driver: {driver}")
+                conn = pyodbc.connect(conn_str, timeout=10)
+                if driver != self._working_driver:
+                    logger.info(f"Kết nối thành công với driver: {driver}")
+                    self._working_driver = driver
+                break
+            except pyodbc.Error as e:
+                last_error = e
+                logger.warning(f"Không thể kết nối với driver {driver}: {str(e)}")
+                if conn:
+                    conn.close()
+                    conn = None
+                continue
+
+        if conn is None:
+            error_msg = f"Không thể kết nối database với bất kỳ driver nào. Lỗi cuối cùng: {str(last_error)}"
+            logger.error(error_msg)
+            raise pyodbc.Error(error_msg)
+        if query_timeout:
+            # Query timeout của pyodbc tính theo giây nguyên, 0 = không giới hạn
+            conn.timeout = max(1, math.ceil(query_timeout))
+
+        try:
+            yield conn
+        except pyodbc.Error as e:
+            logger.error(f"Database connection error: {str(e)}", exc_info=True)
+            raise
+        finally:
+            if conn:
+                conn.close()
+
+    def ping(self) -> str:
+        """
+        Returns:
+            Tên ODBC driver đã kết nối được
+        """
+        super().ping()
+        return self._working_driver or ""
+
+    def describe(self) -> Dict[str, Any]:
+        params = _parse_connection_string(self.connection_string)
+        return {
+            **super().describe(),
+            "server": params.get("server", ""),
+            "database": params.get("database", ""),
+            "driver": self._working_driver,
+        }
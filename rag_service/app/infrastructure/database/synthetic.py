@@ -0,0 +1,200 @@
+"""
+Synthetic Data - Sinh dữ liệu giả cho bản SQLite theo scale factor
+
+scale = 1 ≈ 500 sản phẩm, 1.000 khách hàng, 10.000 đơn hàng (~30.000 dòng chi tiết), 50 khuyến mãi;
+các bảng lớn tăng tuyến tính theo scale. Cùng seed + scale + now → cùng dữ liệu.
+
+Tên sản phẩm/danh mục tiếng Việt (cá hồi, thịt bò, ...) để các truy vấn LIKE của agents có kết quả;
+trạng thái đơn gồm các biến thể tiếng Việt/tiếng Anh như dữ liệu thật;
+hạn sử dụng trải quanh ngày hiện tại (đã hết hạn, sắp hết hạn, còn hạn)
+"""
+import argparse
+import json
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.infrastructure.database.schema import create_schema
+from app.infrastructure.database.sqlite import SqliteDatabase
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_PER_SCALE = 500
+CUSTOMERS_PER_SCALE = 1000
+ORDERS_PER_SCALE = 10000
+PROMOTIONS_PER_SCALE = 50
+ORDER_HISTORY_DAYS = 730
+
+# (MaDanhMuc, TenDanhMuc, tên sản phẩm gốc, đơn vị tính)
+CATEGORIES = [
+    ("DM01", "Thủy hải sản", ["Cá hồi", "Tôm sú", "Cá basa", "Mực ống", "Cua biển", "Nghêu", "Cá thu"], ["kg", "khay"]),
+    ("DM02", "Thịt tươi", ["Thịt bò", "Thịt heo", "Thịt gà", "Sườn non", "Ba chỉ", "Thịt vịt"], ["kg", "khay"]),
+    ("DM03", "Rau củ", ["Cải thảo", "Cà rốt", "Bông cải xanh", "Khoai tây", "Rau muống", "Cà chua"], ["kg", "bó"]),
+    ("DM04", "Trái cây", ["Táo", "Cam sành", "Xoài cát", "Nho xanh", "Dưa hấu", "Thanh long"], ["kg", "hộp"]),
+    ("DM05", "Sữa và trứng", ["Sữa tươi", "Trứng gà", "Sữa chua", "Phô mai", "Trứng vịt"], ["hộp", "vỉ", "chai"]),
+    ("DM06", "Đồ khô", ["Gạo ST25", "Nấm hương", "Đậu xanh", "Mì gói", "Hạt điều"], ["túi", "kg"]),
+    ("DM07", "Đồ uống", ["Nước cam", "Trà xanh", "Cà phê", "Nước dừa", "Nước suối"], ["chai", "lon", "thùng"]),
+    ("DM08", "Gia vị", ["Nước mắm", "Tiêu đen", "Muối hồng", "Dầu ăn", "Nước tương"], ["chai", "hũ"]),
+]
+VARIANTS = ["tươi", "nhập khẩu", "hữu cơ", "loại 1", "đông lạnh", "Đà Lạt", "Na Uy", "Úc", "sạch", "cao cấp"]
+ORIGINS = ["Việt Nam", "Na Uy", "Úc", "Mỹ", "Nhật Bản", "Hàn Quốc", "Thái Lan"]
+# (TrangThai, trọng số)
+ORDER_STATUSES = [
+    ("Hoàn thành", 45), ("Đã giao hàng", 15), ("completed", 5), ("Đang giao", 10),
+    ("Chờ xác nhận", 10), ("Đã hủy", 10), ("Cancelled", 5),
+]
+FAMILY_NAMES = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Võ", "Đặng", "Bùi"]
+GIVEN_NAMES = ["An", "Bình", "Chi", "Dũng", "Hà", "Hùng", "Lan", "Minh", "Nam", "Thảo", "Trang", "Vy"]
+DISTRICTS = ["Quận 1", "Quận 3", "Bình Thạnh", "Thủ Đức", "Cầu Giấy", "Hoàn Kiếm", "Hải Châu"]
+
+
+def _count(per_scale: int, scale: float) -> int:
+    return max(1, int(round(per_scale * scale)))
+
+
+def generate_synthetic_data(
+    conn,
+    scale: float = 1.0,
+    seed: int = 42,
+    now: Optional[datetime] = None
+) -> Dict[str, int]:
+    """
+    Ghi dữ liệu giả vào connection sqlite3 (tạo lại schema, xóa dữ liệu cũ)
+
+    Args:
+        conn: sqlite3.Connection
+        scale: Scale factor số dòng
+        seed: Seed random
+        now: Mốc thời gian cho ngày đặt/hạn sử dụng/khuyến mãi (mặc định: hiện tại)
+
+    Returns:
+        Số dòng mỗi bảng
+    """
+    if scale <= 0:
+        raise ValueError("scale phải > 0")
+    rng = random.Random(seed)
+    now = (now or datetime.now()).replace(microsecond=0)
+    create_schema(conn, drop_existing=True)
+
+    categories = [(category_id, name) for category_id, name, _, _ in CATEGORIES]
+
+    products: List[tuple] = []
+    prices: Dict[str, float] = {}
+    for index in range(_count(PRODUCTS_PER_SCALE, scale)):
+        category_id, category_name, bases, units = CATEGORIES[index % len(CATEGORIES)]
+        base = rng.choice(bases)
+        name = f"{base} {rng.choice(VARIANTS)}"
+        product_id = f"SP{index + 1:06d}"
+        price = float(rng.randrange(10, 800) * 1000)
+        prices[product_id] = price
+        manufactured = now - timedelta(days=rng.randint(1, 60))
+        expires = now + timedelta(days=rng.randint(-15, 90), hours=rng.randint(0, 23))
+        products.append((
+            product_id,
+            name,
+            f"{name} - {category_name.lower()} chất lượng, giao nhanh trong ngày",
+            price,
+            rng.randint(0, 300),
+            rng.choice(units),
+            rng.choice(ORIGINS),
+            f"{product_id.lower()}.jpg",
+            manufactured,
+            expires,
+            category_id,
+            1 if rng.random() < 0.03 else 0,
+        ))
+
+    customers = []
+    for index in range(_count(CUSTOMERS_PER_SCALE, scale)):
+        customer_id = f"TK{index + 1:06d}"
+        customers.append((
+            customer_id,
+            f"{rng.choice(FAMILY_NAMES)} {rng.choice(GIVEN_NAMES)}",
+            f"khachhang{index + 1}@example.com",
+            f"09{rng.randrange(10 ** 8):08d}",
+            f"{rng.randint(1, 300)} Đường số {rng.randint(1, 30)}, {rng.choice(DISTRICTS)}",
+        ))
+
+    statuses = [status for status, _ in ORDER_STATUSES]
+    weights = [weight for _, weight in ORDER_STATUSES]
+    product_ids = list(prices)
+    # Một số sản phẩm bán chạy hơn hẳn (phân phối lệch như dữ liệu thật)
+    product_weights = [1.0 / (rank + 1) ** 0.8 for rank in range(len(product_ids))]
+    rng.shuffle(product_weights)
+
+    orders, lines = [], []
+    for index in range(_count(ORDERS_PER_SCALE, scale)):
+        order_id = f"DH{index + 1:08d}"
+        ordered_at = now - timedelta(seconds=rng.randrange(ORDER_HISTORY_DAYS * 86400))
+        picked = set(rng.choices(product_ids, weights=product_weights, k=rng.randint(1, 5)))
+        total = 0.0
+        for product_id in sorted(picked):
+            quantity = rng.randint(1, 4)
+            total += prices[product_id] * quantity
+            lines.append((order_id, product_id, quantity, prices[product_id]))
+        orders.append((order_id, rng.choice(customers)[0], ordered_at, rng.choices(statuses, weights)[0], total))
+
+    promotions = []
+    for index in range(_count(PROMOTIONS_PER_SCALE, scale)):
+        starts = now + timedelta(days=rng.randint(-30, 10))
+        percent = rng.random() < 0.5
+        promotions.append((
+            f"KM{index + 1:05d}",
+            float(rng.choice([5, 10, 15, 20, 30])) if percent else float(rng.randrange(5, 50) * 1000),
+            "Percent" if percent else rng.choice(["Amount", None]),
+            f"Chương trình khuyến mãi {index + 1}",
+            starts,
+            starts + timedelta(days=rng.randint(3, 45)),
+            "Active" if rng.random() < 0.8 else "Inactive",
+            "ALL" if rng.random() < 0.2 else rng.choice(product_ids),
+        ))
+
+    with conn:
+        conn.executemany("INSERT INTO DanhMuc VALUES (?, ?)", categories)
+        conn.executemany("INSERT INTO SanPham VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", products)
+        conn.executemany("INSERT INTO NguoiDung VALUES (?, ?, ?, ?, ?)", customers)
+        conn.executemany("INSERT INTO DonHang VALUES (?, ?, ?, ?, ?)", orders)
+        conn.executemany("INSERT INTO ChiTietDonHang VALUES (?, ?, ?, ?)", lines)
+        conn.executemany("INSERT INTO KhuyenMai VALUES (?, ?, ?, ?, ?, ?, ?, ?)", promotions)
+    conn.execute("ANALYZE")
+
+    return {
+        "DanhMuc": len(categories),
+        "SanPham": len(products),
+        "NguoiDung": len(customers),
+        "DonHang": len(orders),
+        "ChiTietDonHang": len(lines),
+        "KhuyenMai": len(promotions),
+    }
+
+
+def create_synthetic_database(path: str, scale: float = 1.0, seed: int = 42) -> Dict[str, int]:
+    """Tạo (hoặc ghi đè) file SQLite với dữ liệu giả"""
+    start = time.perf_counter()
+    conn = SqliteDatabase(path).open()
+    try:
+        counts = generate_synthetic_data(conn, scale=scale, seed=seed)
+    finally:
+        conn.close()
+    logger.info(f"🧪 Synthetic database {path} (scale={scale}): {counts} - {time.perf_counter() - start:.1f}s")
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from app.core.settings import Settings
+
+    parser = argparse.ArgumentParser(description="Sinh database SQLite cùng schema backend với dữ liệu giả")
+    parser.add_argument("--output", default=None, help=f"File SQLite (mặc định: {Settings.SQLITE_DATABASE_PATH})")
+    parser.add_argument("--scale", type=float, default=1.0, help="Scale factor (1 ≈ 500 sản phẩm, 10.000 đơn hàng)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed random")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    counts = create_synthetic_database(args.output or Settings.SQLITE_DATABASE_PATH, scale=args.scale, seed=args.seed)
+    print(json.dumps(counts, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
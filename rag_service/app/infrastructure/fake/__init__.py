@@ -0,0 +1,6 @@
+# Fake providers (benchmark / load test không cần model và OpenAI)
+from app.infrastructure.fake.embedding import FakeEmbeddingService, FakeImageEmbeddingService
+from app.infrastructure.fake.latency import LatencyModel
+from app.infrastructure.fake.llm import FakeLLM
+
+__all__ = ["LatencyModel", "FakeEmbeddingService", "FakeImageEmbeddingService", "FakeLLM"]
@@ -0,0 +1,122 @@
+"""
+Fake Embedding Services - Cùng interface với EmbeddingService/ImageEmbeddingService
+nhưng trả về vector băm tất định thay vì gọi OpenAI/Sentence Transformer/CLIP
+
+- Text: tổng vector băm của từng từ (chuẩn hóa) → texts chung từ có cosine cao,
+  search/rerank trong benchmark vẫn có kết quả có nghĩa
+- Ảnh: vector băm của bytes ảnh (không decode ảnh)
+- Cùng input → cùng vector ở mọi lần chạy/mọi process
+- Độ trễ giả lập chạy trong inference pool như model thật (run_inference vẫn được đo)
+"""
+import hashlib
+import logging
+import re
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.settings import Settings
+from app.infrastructure.fake.latency import LatencyModel
+from app.services.embedding import EmbeddingService
+from app.services.image import ImageEmbeddingService
+
+logger = logging.getLogger(__name__)
+
+CLIP_DIMENSION = 512
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def hash_vector(key: bytes, dimension: int, namespace: str = "") -> np.ndarray:
+    """Vector đơn vị float32 seed từ blake2b(namespace, key)"""
+    digest = hashlib.blake2b(key, digest_size=8, person=namespace.encode("utf-8")[:16]).digest()
+    vector = np.random.default_rng(int.from_bytes(digest, "little")).standard_normal(dimension)
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+
+@lru_cache(maxsize=65536)
+def _token_vector(token: str, dimension: int, namespace: str) -> np.ndarray:
+    vector = hash_vector(token.encode("utf-8"), dimension, namespace)
+    vector.setflags(write=False)
+    return vector
+
+
+def text_vector(text: str, dimension: int, namespace: str = "text") -> np.ndarray:
+    """Vector của text = tổng vector các từ (casefold), chuẩn hóa; text không có từ nào → băm cả chuỗi"""
+    tokens = _TOKEN_PATTERN.findall(text.casefold())
+    if not tokens:
+        return hash_vector(text.encode("utf-8"), dimension, namespace)
+    vector = np.sum([_token_vector(token, dimension, namespace) for token in tokens], axis=0)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm > 0 else vector).astype(np.float32)
+
+
+class _FakeSentenceEncoder:
+    """Giả lập SentenceTransformer.encode() để EmbeddingService dùng lại nguyên logic"""
+
+    def __init__(self, dimension: int, latency: LatencyModel, per_item_ms: float):
+        self.dimension = dimension
+        self.latency = latency
+        self.per_item_ms = per_item_ms
+
+    def encode(self, sentences, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            self.latency.sleep(self.per_item_ms)
+            return text_vector(sentences, self.dimension)
+        sentences = list(sentences)
+        self.latency.sleep(self.per_item_ms * len(sentences))
+        if not sentences:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.stack([text_vector(sentence, self.dimension) for sentence in sentences])
+
+
+class FakeEmbeddingService(EmbeddingService):
+    """EmbeddingService với vector băm tất định (FAKE_EMBEDDINGS=true)"""
+
+    is_fake = True
+
+    def __init__(self, dimension: Optional[int] = None, latency: Optional[LatencyModel] = None):
+        # Không load model / tạo OpenAI client
+        self.dimension = dimension or Settings.FAKE_TEXT_EMBEDDING_DIM
+        self._init_state(embedding_model=_FakeSentenceEncoder(
+            self.dimension,
+            latency or LatencyModel(Settings.FAKE_EMBEDDING_LATENCY, seed=Settings.FAKE_SEED),
+            Settings.FAKE_EMBEDDING_LATENCY_PER_ITEM_MS
+        ))
+        logger.info(f"🧪 Fake text embeddings: dim={self.dimension}, latency={self.embedding_model.latency}")
+
+
+class FakeImageEmbeddingService(ImageEmbeddingService):
+    """
+    ImageEmbeddingService với vector CLIP giả (512 chiều)
+    create_embedding / create_embeddings / create_query_embedding giữ nguyên từ class cha
+    """
+
+    is_fake = True
+
+    def __init__(self, latency: Optional[LatencyModel] = None):
+        # Không load CLIP
+        self._init_state(embedding_model="ViT-B/32", clip_device="fake")
+        self.latency = latency or LatencyModel(Settings.FAKE_EMBEDDING_LATENCY, seed=Settings.FAKE_SEED)
+        self.per_item_ms = Settings.FAKE_EMBEDDING_LATENCY_PER_ITEM_MS
+        logger.info(f"🧪 Fake CLIP embeddings: dim={CLIP_DIMENSION}, latency={self.latency}")
+
+    def create_text_embedding(self, text: str) -> Optional[np.ndarray]:
+        if not text or not text.strip():
+            return None
+        self.latency.sleep(self.per_item_ms)
+        return text_vector(text, CLIP_DIMENSION, "clip-text")
+
+    def _create_clip_text_embeddings_batch(self, texts: List[str], batch_size: int = 256) -> List[Optional[np.ndarray]]:
+        valid = [text for text in texts if text and text.strip()]
+        self.latency.sleep(self.per_item_ms * len(valid))
+        return [text_vector(text, CLIP_DIMENSION, "clip-text") if text and text.strip() else None for text in texts]
+
+    def _create_clip_embedding(self, image_bytes: bytes) -> np.ndarray:
+        self.latency.sleep(self.per_item_ms)
+        return hash_vector(image_bytes, CLIP_DIMENSION, "clip-image")
+
+    def _create_clip_embeddings_batch(self, images: List[bytes]) -> List[Optional[np.ndarray]]:
+        self.latency.sleep(self.per_item_ms * sum(1 for image in images if image))
+        return [hash_vector(image, CLIP_DIMENSION, "clip-image") if image else None for image in images]
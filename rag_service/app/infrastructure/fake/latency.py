@@ -0,0 +1,76 @@
+"""
+Latency Model - Phân phối độ trễ giả lập cho fake providers
+
+Spec (đơn vị ms):
+- "" / "none": không trễ
+- "fixed:20"
+- "uniform:10,50"
+- "normal:40,10" (mean, std - cắt ở 0)
+- "lognormal:30,0.5" (median, sigma - đuôi dài như latency API thật)
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+
+class LatencyModel:
+    """Lấy mẫu độ trễ (ms) theo spec, RNG có seed để các lần chạy benchmark lặp lại được"""
+
+    def __init__(self, spec: str = "", seed: Optional[int] = None):
+        self.spec = (spec or "").strip().lower()
+        self.distribution = "none"
+        self.params = ()
+        if self.spec and self.spec != "none":
+            name, _, raw = self.spec.partition(":")
+            if name not in DISTRIBUTIONS:
+                raise ValueError(f"Phân phối độ trễ không hợp lệ: '{spec}' (hỗ trợ: {', '.join(DISTRIBUTIONS)})")
+            try:
+                params = tuple(float(value) for value in raw.split(",") if value.strip())
+            except ValueError:
+                raise ValueError(f"Tham số độ trễ không hợp lệ: '{spec}'")
+            expected = 1 if name == "fixed" else 2
+            if len(params) != expected or any(value < 0 for value in params):
+                raise ValueError(f"'{name}' cần {expected} tham số không âm: '{spec}'")
+            self.distribution, self.params = name, params
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.distribution != "none"
+
+    def sample_ms(self) -> float:
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            if self.distribution == "fixed":
+                value = self.params[0]
+            elif self.distribution == "uniform":
+                value = self._rng.uniform(*self.params)
+            elif self.distribution == "normal":
+                value = self._rng.gauss(*self.params)
+            else:
+                median, sigma = self.params
+                value = median * self._rng.lognormvariate(0.0, sigma)
+        return max(0.0, value)
+
+    def sleep(self, extra_ms: float = 0.0) -> float:
+        """Chờ (blocking - dùng trong thread như model chạy CPU/GPU), trả về số ms đã chờ"""
+        delay = self.sample_ms() + extra_ms
+        if delay > 0:
+            time.sleep(delay / 1000)
+        return delay
+
+    async def asleep(self, extra_ms: float = 0.0) -> float:
+        """Chờ không block event loop (như request mạng), trả về số ms đã chờ"""
+        delay = self.sample_ms() + extra_ms
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        return delay
+
+    def __repr__(self) -> str:
+        return f"LatencyModel({self.spec or 'none'!r})"
@@ -0,0 +1,111 @@
+"""
+Fake LLM - Câu trả lời soạn sẵn, stream từng token với độ trễ giả lập
+
+Luật trả lời (FAKE_LLM_RESPONSES_PATH, JSON list, luật đầu tiên khớp được dùng):
+    [{"contains": "doanh thu", "response": "Doanh thu của {query} ..."}]
+"contains" so khớp (không phân biệt hoa thường) với prompt + context; "{query}" được thay bằng câu hỏi.
+Không luật nào khớp → câu trả lời mặc định tất định theo câu hỏi.
+Prompt của Critic Agent luôn nhận format HALLUCINATION/ACCURACY/... hợp lệ để pipeline chạy hết các bước.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.core.settings import Settings
+from app.core.tracing import traced
+from app.infrastructure.fake.latency import LatencyModel
+from app.infrastructure.llm.openai import LLMProvider
+
+logger = logging.getLogger(__name__)
+
+CRITIC_RESPONSE = (
+    "HALLUCINATION: false\n"
+    "ACCURACY: 0.9\n"
+    "COMPLETENESS: 0.85\n"
+    "RELEVANCE: 0.9\n"
+    "FEEDBACK: Câu trả lời dựa trên context được cung cấp."
+)
+BUILTIN_RULES = [{"contains": "HALLUCINATION:", "response": CRITIC_RESPONSE}]
+
+_QUERY_PATTERN = re.compile(r"(?:Câu hỏi|Query|Question)\s*:\s*(.+)", re.IGNORECASE)
+_TOKEN_PATTERN = re.compile(r"\S+\s*")
+
+
+def _extract_query(prompt: str) -> str:
+    match = _QUERY_PATTERN.search(prompt)
+    text = match.group(1) if match else next((line for line in prompt.splitlines() if line.strip()), "")
+    return text.strip()[:200]
+
+
+def _load_rules(path: str) -> List[Dict[str, str]]:
+    if not path:
+        return []
+    try:
+        rules = json.loads(Path(path).read_text(encoding="utf-8"))
+        return [
+            {"contains": str(rule["contains"]), "response": str(rule["response"])}
+            for rule in rules
+        ]
+    except Exception as e:
+        logger.error(f"❌ Không đọc được FAKE_LLM_RESPONSES_PATH {path}: {str(e)}")
+        return []
+
+
+class FakeLLM(LLMProvider):
+    """LLMProvider không gọi mạng (FAKE_LLM=true)"""
+
+    is_fake = True
+    model = "fake"
+
+    def __init__(
+        self,
+        responses_path: Optional[str] = None,
+        latency: Optional[LatencyModel] = None,
+        token_latency_ms: Optional[float] = None
+    ):
+        """
+        Args:
+            responses_path: File JSON luật trả lời (mặc định FAKE_LLM_RESPONSES_PATH)
+            latency: Độ trễ tới token đầu tiên (mặc định FAKE_LLM_LATENCY)
+            token_latency_ms: Độ trễ giữa các token (mặc định FAKE_LLM_TOKEN_LATENCY_MS)
+        """
+        path = Settings.FAKE_LLM_RESPONSES_PATH if responses_path is None else responses_path
+        self.rules = _load_rules(path) + BUILTIN_RULES
+        self.latency = latency or LatencyModel(Settings.FAKE_LLM_LATENCY, seed=Settings.FAKE_SEED)
+        self.token_latency_ms = Settings.FAKE_LLM_TOKEN_LATENCY_MS if token_latency_ms is None else token_latency_ms
+        self.calls = 0
+        self.tokens = 0
+        logger.info(
+            f"🧪 Fake LLM: {len(self.rules)} luật, latency={self.latency}, "
+            f"token_latency={self.token_latency_ms}ms"
+        )
+
+    def respond(self, prompt: str, context: Optional[str] = None) -> str:
+        """Câu trả lời cho prompt (không chờ)"""
+        query = _extract_query(prompt)
+        haystack = f"{context or ''}\n{prompt}".casefold()
+        for rule in self.rules:
+            if rule["contains"].casefold() in haystack:
+                return rule["response"].replace("{query}", query)
+        digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=4).hexdigest()
+        return (
+            f"Dựa trên thông tin hiện có, đây là câu trả lời cho câu hỏi \"{query}\". "
+            f"Các sản phẩm và số liệu liên quan đã được tổng hợp từ context. [fake:{digest}]"
+        )
+
+    async def generate_stream(self, prompt: str, context: Optional[str] = None) -> AsyncIterator[str]:
+        self.calls += 1
+        await self.latency.asleep()
+        for index, token in enumerate(_TOKEN_PATTERN.findall(self.respond(prompt, context))):
+            if index and self.token_latency_ms > 0:
+                await asyncio.sleep(self.token_latency_ms / 1000)
+            self.tokens += 1
+            yield token
+
+    @traced("llm.fake")
+    async def generate(self, prompt: str, context: Optional[str] = None) -> str:
+        return "".join([token async for token in self.generate_stream(prompt, context)])
@@ -5,6 +5,7 @@ import httpx
 
 from app.infrastructure.llm.openai import LLMProvider
 from app.core.settings import Settings
+from app.core.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,7 @@ class OllamaLLM(LLMProvider):
         self.client = httpx.AsyncClient(timeout=60.0)  # Timeout 60 giây
         logger.info(f"Ollama LLM đã khởi tạo: {self.model} tại {self.base_url}")
     
+    @traced("llm.ollama")
     async def generate(self, prompt: str, context: Optional[str] = None) -> str:
         """
         Tạo phản hồi sử dụng Ollama
@@ -1,8 +1,10 @@
 import os
 import logging
-from typing import Optional
+from typing import AsyncIterator, Optional
 from abc import ABC, abstractmethod
 
+from app.core.tracing import traced
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,6 +22,13 @@ class LLMProvider(ABC):
         """
         pass
 
+    async def generate_stream(self, prompt: str, context: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Stream phản hồi theo từng phần
+        Mặc định: một phần duy nhất là toàn bộ kết quả generate()
+        """
+        yield await self.generate(prompt, context)
+
 
 class OpenAILLM(LLMProvider):
     """
@@ -55,6 +64,7 @@ class OpenAILLM(LLMProvider):
             except Exception as e:
                 logger.warning(f"Không thể khởi tạo Ollama fallback: {str(e)}")
     
+    @traced("llm.openai")
     async def generate(self, prompt: str, context: Optional[str] = None) -> str:
         """
         Tạo phản hồi sử dụng OpenAI, fallback sang Ollama nếu lỗi
@@ -0,0 +1,8 @@
+"""
+Model Server
+Process riêng giữ CLIP/Sentence Transformer, API workers gọi qua Unix socket + shared memory
+"""
+from app.infrastructure.model_server.client import ModelServerClient, close_model_server_client, get_model_server_client
+from app.infrastructure.model_server.protocol import ModelServerError
+
+__all__ = ["ModelServerClient", "ModelServerError", "close_model_server_client", "get_model_server_client"]
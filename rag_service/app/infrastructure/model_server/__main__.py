@@ -0,0 +1,3 @@
+from app.infrastructure.model_server.server import main
+
+main()
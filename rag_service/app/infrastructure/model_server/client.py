@@ -0,0 +1,240 @@
+"""
+Model Server Client - Client mỏng để API workers gọi model server
+
+- Mỗi thread giữ một kết nối Unix socket + một shared memory arena riêng
+  (không cần lock, gọi được từ asyncio.to_thread)
+- Ảnh được preprocess ngay vào arena (không copy qua socket), vectors kết quả đọc lại từ arena
+"""
+import atexit
+import logging
+import socket
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.settings import Settings
+from app.infrastructure.model_server.protocol import (
+    OP_CLIP_IMAGE,
+    OP_CLIP_TEXT,
+    OP_PING,
+    OP_TEXT,
+    ModelServerError,
+    recv_message,
+    send_message,
+)
+from app.services.image.preprocessing import CLIP_IMAGE_SIZE, preprocess_into
+
+logger = logging.getLogger(__name__)
+
+# Căn offset kết quả trong arena theo 64 bytes
+_ALIGN = 64
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class _Connection:
+    """Kết nối của một thread tới model server"""
+
+    def __init__(self, socket_path: str, timeout: float):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+        self.arena: Optional[shared_memory.SharedMemory] = None
+
+    def ensure_arena(self, nbytes: int, min_bytes: int) -> shared_memory.SharedMemory:
+        """Tạo/tăng arena (gấp đôi) khi request cần nhiều bytes hơn"""
+        if self.arena is None or self.arena.size < nbytes:
+            size = max(nbytes, min_bytes, (self.arena.size * 2) if self.arena is not None else 0)
+            self._release_arena()
+            self.arena = shared_memory.SharedMemory(create=True, size=size)
+        return self.arena
+
+    def request(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        if self.arena is not None:
+            message["shm"] = self.arena.name
+        send_message(self.sock, message)
+        reply = recv_message(self.sock)
+        if not reply.get("ok"):
+            raise ModelServerError(reply.get("error", "unknown error"))
+        return reply
+
+    def _release_arena(self) -> None:
+        if self.arena is not None:
+            try:
+                self.arena.close()
+                self.arena.unlink()
+            except Exception:
+                pass
+            self.arena = None
+
+    def close(self) -> None:
+        try:
+            self.sock.close()
+        finally:
+            self._release_arena()
+
+
+class ModelServerClient:
+    """
+    Client gọi model server: encode_clip_text, encode_clip_images, encode_text
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: Optional[float] = None):
+        self.socket_path = socket_path or Settings.MODEL_SERVER_SOCKET
+        self.timeout = timeout if timeout is not None else Settings.MODEL_SERVER_TIMEOUT_SECONDS
+        self.min_arena_bytes = Settings.MODEL_SERVER_ARENA_BYTES
+        self._local = threading.local()
+        self._connections: List[_Connection] = []
+        self._connections_lock = threading.Lock()
+        self._dims: Dict[str, int] = {}
+        atexit.register(self.close)
+
+    # ========== Connection ==========
+
+    def _connect(self) -> _Connection:
+        """Kết nối, chờ server (có thể đang load model) tối đa timeout giây"""
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                connection = _Connection(self.socket_path, self.timeout)
+                break
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if time.time() >= deadline:
+                    raise ModelServerError(f"Không kết nối được model server tại {self.socket_path}: {str(e)}")
+                time.sleep(0.2)
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    def _get_connection(self) -> _Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+        return connection
+
+    def _drop_connection(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            with self._connections_lock:
+                if connection in self._connections:
+                    self._connections.remove(connection)
+            connection.close()
+            self._local.connection = None
+
+    def _call(self, message: Dict[str, Any], input_bytes: int = 0, fill=None, dim_key: Optional[str] = None,
+              count: int = 0) -> Dict[str, Any]:
+        """
+        Gửi request, retry một lần với kết nối mới nếu server restart
+
+        Args:
+            message: Header JSON
+            input_bytes: Số bytes input ghi vào arena
+            fill: Hàm ghi input vào arena (nhận memoryview arena.buf)
+            dim_key: Model của kết quả ("clip"/"text") để tính chỗ cho kết quả
+            count: Số vectors kết quả
+        """
+        for attempt in range(2):
+            connection = self._get_connection()
+            try:
+                if dim_key is not None:
+                    result_offset = _align(input_bytes)
+                    dim = self.dims[dim_key]
+                    arena = connection.ensure_arena(result_offset + count * dim * 4, self.min_arena_bytes)
+                    if fill is not None:
+                        fill(arena.buf)
+                    message["result_offset"] = result_offset
+                reply = connection.request(dict(message))
+                if dim_key is not None:
+                    view = np.ndarray((reply["count"], reply["dim"]), dtype=np.float32,
+                                      buffer=connection.arena.buf, offset=message["result_offset"])
+                    reply["vectors"] = view.copy()  # Copy ra trước khi arena bị dùng lại
+                    del view
+                return reply
+            except (ConnectionError, socket.timeout, OSError) as e:
+                self._drop_connection()
+                if attempt == 1:
+                    raise ModelServerError(f"Model server request failed: {str(e)}")
+                logger.warning(f"⚠️ Mất kết nối model server ({str(e)}), thử kết nối lại...")
+
+    def close(self) -> None:
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+
+    # ========== API ==========
+
+    def ping(self) -> Dict[str, Any]:
+        reply = self._call({"op": OP_PING})
+        self._dims = {k: int(v) for k, v in reply.get("dims", {}).items()}
+        return reply
+
+    @property
+    def dims(self) -> Dict[str, int]:
+        """Dimension của từng model trên server (lấy qua ping lần đầu)"""
+        if not self._dims:
+            self.ping()
+        return self._dims
+
+    def encode_clip_text(self, texts: List[str]) -> np.ndarray:
+        """CLIP text embeddings (đã normalize), shape (N, D)"""
+        return self._call({"op": OP_CLIP_TEXT, "texts": texts}, dim_key="clip", count=len(texts))["vectors"]
+
+    def encode_clip_images(self, images: List[bytes]) -> Tuple[np.ndarray, List[bool]]:
+        """
+        CLIP image embeddings (đã normalize) - ảnh được decode/preprocess song song thẳng vào arena
+
+        Returns:
+            (vectors (N, D), cờ decode thành công của từng ảnh - vector của ảnh lỗi không có ý nghĩa)
+        """
+        size = CLIP_IMAGE_SIZE
+        count = len(images)
+        ok: List[bool] = []
+
+        def fill(buf):
+            pixels = np.ndarray((count, 3, size, size), dtype=np.float32, buffer=buf)
+            ok[:] = preprocess_into(images, pixels)
+            del pixels
+
+        vectors = self._call(
+            {"op": OP_CLIP_IMAGE, "count": count, "size": size},
+            input_bytes=count * 3 * size * size * 4,
+            fill=fill,
+            dim_key="clip",
+            count=count
+        )["vectors"]
+        return vectors, ok
+
+    def encode_text(self, texts: List[str]) -> np.ndarray:
+        """Sentence Transformer embeddings, shape (N, D)"""
+        return self._call({"op": OP_TEXT, "texts": texts}, dim_key="text", count=len(texts))["vectors"]
+
+
+_model_server_client: Optional[ModelServerClient] = None
+
+
+def get_model_server_client() -> ModelServerClient:
+    """
+    Lấy instance của ModelServerClient (singleton cho mỗi worker)
+
+    Returns:
+        ModelServerClient instance
+    """
+    global _model_server_client
+    if _model_server_client is None:
+        _model_server_client = ModelServerClient()
+    return _model_server_client
+
+
+def close_model_server_client() -> None:
+    """Đóng các kết nối của ModelServerClient nếu đã tạo (server shutdown)"""
+    global _model_server_client
+    client, _model_server_client = _model_server_client, None
+    if client is not None:
+        client.close()
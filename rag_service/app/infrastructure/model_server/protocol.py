@@ -0,0 +1,68 @@
+"""
+Model Server Protocol - Giao thức giữa API workers và model server
+
+- Kênh điều khiển: Unix domain socket, mỗi message = 4 bytes độ dài (big-endian) + JSON header
+- Dữ liệu lớn (tensor ảnh, vectors kết quả) đi qua shared memory: mỗi kết nối client
+  sở hữu một vùng shared memory (arena); input ghi từ offset 0, server ghi kết quả
+  tại result_offset do client chỉ định
+"""
+import json
+import socket
+import struct
+from multiprocessing import shared_memory
+from typing import Any, Dict
+
+_HEADER = struct.Struct("!I")
+# Giới hạn kích thước JSON header (texts đi kèm trong header)
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+# Các thao tác model server hỗ trợ
+OP_PING = "ping"
+OP_CLIP_TEXT = "clip_text"
+OP_CLIP_IMAGE = "clip_image"
+OP_TEXT = "text"
+
+
+class ModelServerError(Exception):
+    """Lỗi khi gọi model server (mất kết nối, timeout, server báo lỗi)"""
+
+
+def send_message(sock: socket.socket, message: Dict[str, Any]) -> None:
+    payload = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("Model server connection closed")
+        received += n
+    return bytes(buffer)
+
+
+def recv_message(sock: socket.socket) -> Dict[str, Any]:
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    if size > MAX_MESSAGE_BYTES:
+        raise ConnectionError(f"Message quá lớn: {size} bytes")
+    return json.loads(_recv_exact(sock, size).decode("utf-8"))
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach vào shared memory do process khác tạo mà KHÔNG đăng ký với resource_tracker
+    (nếu không, resource_tracker của server sẽ unlink arena của client khi server thoát)
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
@@ -0,0 +1,84 @@
+"""
+Remote Embedding Services - Cùng interface với ImageEmbeddingService/EmbeddingService
+nhưng gọi model server thay vì load model trong worker
+"""
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.settings import Settings
+from app.infrastructure.model_server.client import ModelServerClient, get_model_server_client
+from app.services.embedding import EmbeddingService
+from app.services.image import ImageEmbeddingService
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteImageEmbeddingService(ImageEmbeddingService):
+    """
+    ImageEmbeddingService chạy CLIP trên model server
+    create_embedding / create_embeddings / create_query_embedding giữ nguyên từ class cha
+    """
+
+    def __init__(self, client: Optional[ModelServerClient] = None):
+        # Không load CLIP trong worker
+        self._init_state(embedding_model="ViT-B/32", clip_device="model-server")
+        self.client = client or get_model_server_client()
+        logger.info(f"✅ Image embeddings qua model server: {self.client.socket_path}")
+
+    def create_text_embedding(self, text: str) -> Optional[np.ndarray]:
+        """Tạo CLIP text embedding qua model server"""
+        if not text or not text.strip():
+            return None
+        try:
+            return self.client.encode_clip_text([text])[0]
+        except Exception as e:
+            logger.error(f"Error creating CLIP text embedding (model server): {str(e)}")
+            return None
+
+    def _create_clip_text_embeddings_batch(self, texts: List[str], batch_size: int = 256) -> List[Optional[np.ndarray]]:
+        valid_indices = [i for i, text in enumerate(texts) if text and text.strip()]
+        result: List[Optional[np.ndarray]] = [None] * len(texts)
+        for start in range(0, len(valid_indices), batch_size):
+            batch_indices = valid_indices[start:start + batch_size]
+            embeddings = self.client.encode_clip_text([texts[i] for i in batch_indices])
+            for row, i in enumerate(batch_indices):
+                result[i] = embeddings[row]
+        return result
+
+    def _create_clip_embedding(self, image_bytes: bytes) -> np.ndarray:
+        vectors, ok = self.client.encode_clip_images([image_bytes])
+        if not ok[0]:
+            raise ValueError("Không decode được ảnh")
+        return vectors[0]
+
+    def _create_clip_embeddings_batch(self, images: List[bytes]) -> List[Optional[np.ndarray]]:
+        try:
+            vectors, ok = self.client.encode_clip_images(images)
+        except Exception as e:
+            logger.error(f"Lỗi khi tạo CLIP embeddings batch (model server): {str(e)}")
+            return [None] * len(images)
+        return [vectors[i] if ok[i] else None for i in range(len(images))]
+
+
+class _RemoteSentenceEncoder:
+    """Giả lập SentenceTransformer.encode() để EmbeddingService dùng lại nguyên logic"""
+
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+
+    def encode(self, sentences, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            return self.client.encode_text([sentences])[0]
+        return self.client.encode_text(list(sentences))
+
+
+class RemoteEmbeddingService(EmbeddingService):
+    """EmbeddingService dùng Sentence Transformer trên model server"""
+
+    def __init__(self, client: Optional[ModelServerClient] = None):
+        # Không load Sentence Transformer trong worker
+        self.client = client or get_model_server_client()
+        self._init_state(embedding_model=_RemoteSentenceEncoder(self.client))
+        logger.info(f"✅ Text embeddings ({Settings.EMBEDDING_MODEL}) qua model server: {self.client.socket_path}")
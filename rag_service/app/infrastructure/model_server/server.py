@@ -0,0 +1,214 @@
+"""
+Model Server - Process riêng giữ CLIP và Sentence Transformer cho tất cả uvicorn workers
+
+Chạy (từ thư mục rag_service):
+    python -m app.infrastructure.model_server --socket /tmp/rag_model_server.sock
+
+Các API workers bật MODEL_SERVER_ENABLED=true sẽ gọi server này qua Unix domain socket
+thay vì tự load model → RAM cho models không tăng theo số workers.
+"""
+import argparse
+import logging
+import os
+import signal
+import socketserver
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.settings import Settings
+from app.infrastructure.model_server.protocol import (
+    OP_CLIP_IMAGE,
+    OP_CLIP_TEXT,
+    OP_PING,
+    OP_TEXT,
+    attach_shared_memory,
+    recv_message,
+    send_message,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ModelServer:
+    """
+    Giữ models và xử lý các request encode
+    - "clip": CLIP ViT-B/32 (text + image encoder)
+    - "text": Sentence Transformer (Settings.EMBEDDING_MODEL)
+    """
+
+    def __init__(self, models: List[str]):
+        self.models = models
+        self.dims: Dict[str, int] = {}
+        self._clip_model = None
+        self._clip_device = None
+        self._clip_onnx = None
+        self._text_model = None
+        # Mỗi model chạy một request tại một thời điểm (torch tự dùng nhiều threads bên trong)
+        self._locks = {"clip": threading.Lock(), "text": threading.Lock()}
+        self.started_at = time.time()
+
+    def load_models(self) -> None:
+        if "clip" in self.models:
+            # Tái sử dụng logic load CLIP của ImageEmbeddingService
+            from app.services.image import ImageEmbeddingService
+            image_embedding_service = ImageEmbeddingService()
+            self._clip_model = image_embedding_service.clip_model
+            self._clip_device = image_embedding_service.clip_device
+            self._clip_onnx = image_embedding_service.clip_onnx
+            self.dims["clip"] = int(self.encode_clip_text(["warmup"]).shape[1])
+            logger.info(f"✅ Model server: CLIP ready (dim={self.dims['clip']}, device={self._clip_device})")
+        if "text" in self.models:
+            from sentence_transformers import SentenceTransformer
+            self._text_model = SentenceTransformer(Settings.EMBEDDING_MODEL)
+            self.dims["text"] = int(self.encode_text(["warmup"]).shape[1])
+            logger.info(f"✅ Model server: Sentence Transformer ready ({Settings.EMBEDDING_MODEL}, dim={self.dims['text']})")
+
+    # ========== Encoders ==========
+
+    def encode_clip_text(self, texts: List[str]) -> np.ndarray:
+        import clip
+        import torch
+        if self._clip_model is None:
+            raise RuntimeError("CLIP không được load trên model server")
+        if self._clip_onnx is not None:
+            with self._locks["clip"]:
+                return self._clip_onnx.encode_text(clip.tokenize(texts, truncate=True).numpy())
+        with self._locks["clip"], torch.no_grad():
+            tokens = clip.tokenize(texts, truncate=True).to(self._clip_device)
+            features = self._clip_model.encode_text(tokens)
+            features = features / features.norm(dim=-1, keepdim=True)
+            return features.cpu().numpy().astype(np.float32)
+
+    def encode_clip_images(self, pixels: np.ndarray) -> np.ndarray:
+        import torch
+        if self._clip_model is None:
+            raise RuntimeError("CLIP không được load trên model server")
+        if self._clip_onnx is not None:
+            with self._locks["clip"]:
+                return self._clip_onnx.encode_image(pixels)
+        with self._locks["clip"], torch.no_grad():
+            # Copy khỏi shared memory để buffer có thể được client ghi đè ngay sau khi trả lời
+            batch = torch.from_numpy(pixels.copy()).to(self._clip_device)
+            features = self._clip_model.encode_image(batch)
+            features = features / features.norm(dim=-1, keepdim=True)
+            return features.cpu().numpy().astype(np.float32)
+
+    def encode_text(self, texts: List[str]) -> np.ndarray:
+        if self._text_model is None:
+            raise RuntimeError("Sentence Transformer không được load trên model server")
+        with self._locks["text"]:
+            embeddings = self._text_model.encode(texts, convert_to_numpy=True, batch_size=32, show_progress_bar=False)
+            return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+
+    # ========== Dispatch ==========
+
+    def handle(self, message: Dict[str, Any], arena) -> Dict[str, Any]:
+        op = message.get("op")
+        if op == OP_PING:
+            return {"ok": True, "pid": os.getpid(), "models": self.models, "dims": self.dims,
+                    "uptime": round(time.time() - self.started_at, 1)}
+
+        if arena is None:
+            raise RuntimeError("Request thiếu shared memory arena")
+        if op == OP_CLIP_TEXT:
+            result = self.encode_clip_text(message["texts"])
+        elif op == OP_TEXT:
+            result = self.encode_text(message["texts"])
+        elif op == OP_CLIP_IMAGE:
+            count, size = int(message["count"]), int(message["size"])
+            pixels = np.ndarray((count, 3, size, size), dtype=np.float32, buffer=arena.buf)
+            try:
+                result = self.encode_clip_images(pixels)
+            finally:
+                del pixels  # Giải phóng export trên arena.buf
+        else:
+            raise ValueError(f"Unknown op: {op}")
+
+        result_offset = int(message["result_offset"])
+        if result_offset + result.nbytes > arena.size:
+            raise RuntimeError(f"Arena quá nhỏ: cần {result_offset + result.nbytes} bytes, có {arena.size}")
+        out = np.ndarray(result.shape, dtype=np.float32, buffer=arena.buf, offset=result_offset)
+        out[:] = result
+        del out
+        return {"ok": True, "count": int(result.shape[0]), "dim": int(result.shape[1])}
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """Một thread cho mỗi kết nối client (mỗi thread của API worker giữ một kết nối)"""
+
+    def handle(self):
+        model_server: ModelServer = self.server.model_server
+        arena = None
+        try:
+            while True:
+                try:
+                    message = recv_message(self.request)
+                except (ConnectionError, OSError):
+                    break
+
+                # Client đổi arena (tăng kích thước) → attach lại
+                shm_name = message.get("shm")
+                if shm_name and (arena is None or arena.name.lstrip("/") != shm_name.lstrip("/")):
+                    if arena is not None:
+                        arena.close()
+                    arena = attach_shared_memory(shm_name)
+
+                try:
+                    reply = model_server.handle(message, arena)
+                except Exception as e:
+                    logger.error(f"❌ Model server error ({message.get('op')}): {str(e)}")
+                    reply = {"ok": False, "error": str(e)}
+                send_message(self.request, reply)
+        finally:
+            if arena is not None:
+                arena.close()
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path: str, models: List[str]) -> None:
+    """Load models rồi lắng nghe trên Unix socket (client kết nối được = server đã sẵn sàng)"""
+    model_server = ModelServer(models)
+    model_server.load_models()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # Socket cũ từ lần chạy trước
+    server = _UnixServer(socket_path, _RequestHandler)
+    server.model_server = model_server
+    os.chmod(socket_path, 0o600)
+
+    def _shutdown(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    logger.info(f"🚀 Model server listening on {socket_path} (models: {', '.join(models)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        logger.info("Model server stopped")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Local model server cho CLIP và Sentence Transformer")
+    parser.add_argument("--socket", default=Settings.MODEL_SERVER_SOCKET, help="Đường dẫn Unix socket")
+    parser.add_argument("--models", default=",".join(Settings.MODEL_SERVER_MODELS),
+                        help="Các model cần load, phân tách bằng dấu phẩy (clip,text)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    serve(args.socket, models)
+
+
+if __name__ == "__main__":
+    main()
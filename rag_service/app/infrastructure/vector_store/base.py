@@ -16,7 +16,9 @@ class VectorStore(ABC):
         chunks: List[DocumentChunk], 
         embeddings: List[np.ndarray],
         file_type: str = "",
-        upload_date: str = ""
+        upload_date: str = "",
+        byte_size: int = 0,
+        content_hash: str = ""
     ) -> None:
         """Save chunks with embeddings to vector store"""
         pass
@@ -31,18 +33,31 @@ class VectorStore(ABC):
         """Search for similar chunks"""
         pass
     
+    async def search_similar_batch(
+        self,
+        query_embeddings: List[np.ndarray],
+        top_k: int = 5,
+        file_id: Optional[str] = None
+    ) -> List[List[Dict]]:
+        """Search for similar chunks for many queries (cùng filter file_id)"""
+        return [await self.search_similar(embedding, top_k=top_k, file_id=file_id) for embedding in query_embeddings]
+    
     @abstractmethod
     async def delete_document(self, file_id: str) -> None:
         """Delete document and all its chunks"""
         pass
     
     @abstractmethod
-    async def get_all_documents(self) -> List[Dict]:
-        """Get list of all documents"""
+    async def get_all_documents(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Get list of documents (paginated)"""
         pass
     
     @abstractmethod
     async def get_document_info(self, file_id: str) -> Optional[Dict]:
         """Get document information"""
         pass
+    
+    async def count_documents(self) -> int:
+        """Count documents"""
+        return len(await self.get_all_documents())
 
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 from typing import List, Optional, Dict
 import numpy as np
@@ -6,7 +7,10 @@ from pathlib import Path
 from datetime import datetime
 
 from app.infrastructure.vector_store.base import VectorStore
+from app.infrastructure.vector_store.document_registry import DocumentRegistry
 from app.domain.document import DocumentChunk
+from app.core.settings import Settings
+from app.core.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -20,23 +24,23 @@ class ChromaVectorStore(VectorStore):
         """Khởi tạo Chroma vector store"""
         self.store_type = "chroma"
         self.collection = None
+        self.registry: Optional[DocumentRegistry] = None
         self._init_chroma()
     
     def _init_chroma(self):
         """Khởi tạo Chroma database và collection"""
         try:
             import chromadb
-            from chromadb.config import Settings
+            from chromadb.config import Settings as ChromaSettings
             
-            # Sử dụng data/vector_store/ làm thư mục lưu trữ
-            db_dir = Path(__file__).parent.parent.parent.parent / "data" / "vector_store"
-            db_dir.mkdir(parents=True, exist_ok=True)
-            persist_directory = str(db_dir / "chroma_db")
+            # Thư mục lưu trữ: CHROMA_PERSIST_DIR (mặc định data/vector_store/chroma_db)
+            persist_directory = Settings.CHROMA_PERSIST_DIR
+            Path(persist_directory).mkdir(parents=True, exist_ok=True)
             
             # Tạo Chroma client với persistent storage
             self.chroma_client = chromadb.PersistentClient(
                 path=persist_directory,
-                settings=Settings(anonymized_telemetry=False)  # Tắt telemetry
+                settings=ChromaSettings(anonymized_telemetry=False)  # Tắt telemetry
             )
             
             # Tạo hoặc lấy collection
@@ -46,6 +50,10 @@ class ChromaVectorStore(VectorStore):
                 metadata={"hnsw:space": "cosine"}  # Sử dụng cosine similarity
             )
             
+            # Manifest documents: listing/info không cần quét toàn bộ collection
+            self.registry = DocumentRegistry(Settings.DOCUMENT_REGISTRY_PATH, collection_name)
+            self.registry.ensure_bootstrapped(self.collection)
+            
             logger.info(f"Chroma vector store đã khởi tạo: {collection_name}")
         except ImportError:
             logger.error("Chroma chưa được cài đặt. Vui lòng cài: pip install chromadb")
@@ -59,9 +67,15 @@ class ChromaVectorStore(VectorStore):
         chunks: List[DocumentChunk], 
         embeddings: List[np.ndarray],
         file_type: str = "",
-        upload_date: str = ""
+        upload_date: str = "",
+        byte_size: int = 0,
+        content_hash: str = ""
     ) -> None:
-        """Save chunks with embeddings to Chroma"""
+        """
+        Save chunks with embeddings to Chroma
+        
+        Manifest chỉ được cập nhật sau khi Chroma ghi thành công (Chroma lỗi → manifest không đổi)
+        """
         if not chunks or not embeddings:
             return
         
@@ -86,22 +100,43 @@ class ChromaVectorStore(VectorStore):
         
         embeddings_list = [emb.tolist() for emb in embeddings if emb is not None]
         
-        # Delete existing chunks for this file
-        if chunks:
-            file_id = chunks[0].file_id
-            existing = self.collection.get(where={"file_id": file_id})
+        records = self.registry.records_from_chunks(
+            chunks, file_type, upload_date,
+            byte_size=byte_size, content_hash=content_hash
+        )
+        
+        # Chroma (blocking) chạy trong thread; manifest chỉ ghi sau khi Chroma thành công
+        await asyncio.to_thread(
+            self._replace_chunks,
+            [record["file_id"] for record in records], ids, embeddings_list, texts, metadatas
+        )
+        await asyncio.to_thread(self.registry.upsert, records)
+        
+        logger.info(f"Saved {len(chunks)} chunks to Chroma")
+    
+    def _replace_chunks(
+        self,
+        file_ids: List[str],
+        ids: List[str],
+        embeddings: List[List[float]],
+        texts: List[str],
+        metadatas: List[Dict]
+    ) -> None:
+        """Xóa chunks cũ của các files rồi thêm chunks mới (blocking)"""
+        # Delete existing chunks for these files (chỉ lấy ids, không tải documents/embeddings)
+        for file_id in file_ids:
+            existing = self.collection.get(where={"file_id": file_id}, include=[])
             if existing['ids']:
                 self.collection.delete(ids=existing['ids'])
         
         self.collection.add(
             ids=ids,
-            embeddings=embeddings_list,
+            embeddings=embeddings,
             documents=texts,
             metadatas=metadatas
         )
-        
-        logger.info(f"Saved {len(chunks)} chunks to Chroma")
     
+    @traced("vector.search")
     async def search_similar(
         self, 
         query_embedding: np.ndarray, 
@@ -123,119 +158,114 @@ class ChromaVectorStore(VectorStore):
             search_time = time.time() - start_time
             logger.debug(f"Chroma search completed in {search_time:.3f}s (top_k={top_k}, file_id={file_id})")
             
-            chunks = []
-            if results.get('ids') and len(results['ids'][0]) > 0:
-                for i in range(len(results['ids'][0])):
-                    distance = results['distances'][0][i] if 'distances' in results and results['distances'] else 1.0
-                    similarity = 1 - distance
-                    
-                    chunk = {
-                        'chunk_id': results['ids'][0][i],
-                        'file_id': results['metadatas'][0][i].get('file_id'),
-                        'file_name': results['metadatas'][0][i].get('file_name'),
-                        'chunk_index': int(results['metadatas'][0][i].get('chunk_index', 0)),
-                        'text': results['documents'][0][i],
-                        'similarity': similarity
-                    }
-                    chunks.append(chunk)
-            
-            return chunks
+            return self._parse_query_row(results, 0)
         except Exception as e:
             logger.error(f"Error searching Chroma: {str(e)}", exc_info=True)
             return []
     
+    @traced("vector.search_batch")
+    async def search_similar_batch(
+        self,
+        query_embeddings: List[np.ndarray],
+        top_k: int = 5,
+        file_id: Optional[str] = None
+    ) -> List[List[Dict]]:
+        """
+        Search nhiều queries trong một lần gọi collection.query (multi-vector)
+        
+        Returns:
+            Danh sách chunks cho từng query, cùng thứ tự với query_embeddings
+        """
+        if not query_embeddings:
+            return []
+        import time
+        start_time = time.time()
+        
+        try:
+            where = {"file_id": file_id} if file_id else None
+            results = await asyncio.to_thread(
+                self.collection.query,
+                query_embeddings=[embedding.tolist() for embedding in query_embeddings],
+                n_results=top_k,
+                where=where
+            )
+            
+            search_time = time.time() - start_time
+            logger.debug(f"Chroma batch search completed in {search_time:.3f}s ({len(query_embeddings)} queries, top_k={top_k}, file_id={file_id})")
+            
+            return [self._parse_query_row(results, row) for row in range(len(query_embeddings))]
+        except Exception as e:
+            logger.error(f"Error batch searching Chroma: {str(e)}", exc_info=True)
+            return [[] for _ in query_embeddings]
+    
+    @staticmethod
+    def _parse_query_row(results: Dict, row: int) -> List[Dict]:
+        """Chuyển kết quả collection.query của query thứ row thành danh sách chunk dicts"""
+        chunks = []
+        if not results.get('ids') or len(results['ids']) <= row:
+            return chunks
+        for i in range(len(results['ids'][row])):
+            distance = results['distances'][row][i] if 'distances' in results and results['distances'] else 1.0
+            similarity = 1 - distance
+            
+            chunk = {
+                'chunk_id': results['ids'][row][i],
+                'file_id': results['metadatas'][row][i].get('file_id'),
+                'file_name': results['metadatas'][row][i].get('file_name'),
+                'chunk_index': int(results['metadatas'][row][i].get('chunk_index', 0)),
+                'text': results['documents'][row][i],
+                'similarity': similarity
+            }
+            chunks.append(chunk)
+        return chunks
+    
     async def delete_document(self, file_id: str) -> None:
         """Delete document and all its chunks"""
         try:
-            existing = self.collection.get(where={"file_id": file_id})
-            if existing['ids']:
-                self.collection.delete(ids=existing['ids'])
+            await asyncio.to_thread(self._delete_chunks, file_id)
+            await asyncio.to_thread(self.registry.delete, file_id)
             logger.info(f"Deleted document {file_id}")
         except Exception as e:
             logger.error(f"Error deleting document: {str(e)}")
             raise
     
-    async def get_all_documents(self) -> List[Dict]:
+    def _delete_chunks(self, file_id: str) -> None:
+        existing = self.collection.get(where={"file_id": file_id}, include=[])
+        if existing['ids']:
+            self.collection.delete(ids=existing['ids'])
+    
+    def reconcile_registry(self) -> Dict[str, int]:
+        """Sửa chênh lệch giữa manifest và collection (blocking - gọi qua asyncio.to_thread)"""
+        return self.registry.reconcile([self.collection])
+    
+    async def get_all_documents(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
         """
-        Lấy danh sách tất cả documents
+        Lấy danh sách documents (phân trang) từ document registry
+        
+        Args:
+            offset: Số documents bỏ qua
+            limit: Số documents tối đa trả về (None = tất cả)
         
         Returns:
-            Danh sách documents với thông tin: file_id, file_name, file_type, upload_date, total_chunks
+            Danh sách documents với thông tin: file_id, file_name, file_type, upload_date,
+            total_chunks, byte_size, content_hash
         """
         try:
-            # Lấy tất cả dữ liệu từ collection
-            results = self.collection.get()
-            
-            # Log để debug
-            logger.info(f"Chroma collection.get() returned: ids={len(results.get('ids', [])) if results else 0}")
-            
-            if not results or 'ids' not in results or len(results['ids']) == 0:
-                logger.info("Chroma collection is empty - no documents found")
-                return []
-            
-            # Group chunks theo file_id
-            file_dict = {}
-            metadatas = results.get('metadatas', [])
-            
-            logger.info(f"Processing {len(results['ids'])} chunks to group by file_id")
-            
-            for i in range(len(results['ids'])):
-                metadata = metadatas[i] if i < len(metadatas) else {}
-                file_id = metadata.get('file_id', '')
-                
-                if file_id:
-                    if file_id not in file_dict:
-                        file_name = metadata.get('file_name', '')
-                        file_type = metadata.get('file_type', '')
-                        if not file_type and file_name:
-                            file_type = file_name.split('.')[-1] if '.' in file_name else ''
-                        
-                        upload_date = metadata.get('upload_date', '')
-                        if not upload_date:
-                            upload_date = datetime.now().isoformat()
-                        
-                        file_dict[file_id] = {
-                            'file_id': file_id,
-                            'file_name': file_name,
-                            'file_type': file_type,
-                            'upload_date': upload_date,
-                            'total_chunks': 0
-                        }
-                    file_dict[file_id]['total_chunks'] += 1
-            
-            documents = list(file_dict.values())
-            logger.info(f"Found {len(documents)} unique documents from {len(results['ids'])} chunks")
-            
+            documents = self.registry.list_documents(offset=offset, limit=limit)
+            logger.info(f"Found {len(documents)} documents (offset={offset}, limit={limit})")
             return documents
         except Exception as e:
             logger.error(f"Lỗi khi lấy danh sách documents: {str(e)}", exc_info=True)
             return []
     
+    async def count_documents(self) -> int:
+        """Đếm số documents trong registry"""
+        return self.registry.count()
+    
     async def get_document_info(self, file_id: str) -> Optional[Dict]:
-        """Get document information"""
+        """Get document information (lookup theo primary key trong registry)"""
         try:
-            results = self.collection.get(where={"file_id": file_id})
-            if results['ids'] and len(results['ids']) > 0:
-                metadatas = results.get('metadatas', [])
-                metadata = metadatas[0] if metadatas else {}
-                
-                file_name = metadata.get('file_name', '')
-                file_type = metadata.get('file_type', '')
-                if not file_type and file_name:
-                    file_type = file_name.split('.')[-1] if '.' in file_name else ''
-                
-                upload_date = metadata.get('upload_date', '')
-                if not upload_date:
-                    upload_date = datetime.now().isoformat()
-                
-                return {
-                    'file_id': file_id,
-                    'file_name': file_name,
-                    'file_type': file_type,
-                    'upload_date': upload_date,
-                    'total_chunks': len(results['ids'])
-                }
+            return self.registry.get(file_id)
         except Exception as e:
             logger.error(f"Error getting document info: {str(e)}")
         return None
-
@@ -0,0 +1,393 @@
+"""
+Document Registry - Manifest bền vững cho documents trong vector store
+
+Lưu một dòng cho mỗi file_id (tên, loại, ngày upload, số chunks, kích thước, hash nội dung)
+trong SQLite nằm cạnh chroma_db. Nhờ vậy việc liệt kê documents và lấy thông tin document
+không cần quét toàn bộ collection của Chroma.
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    namespace     TEXT    NOT NULL,
+    file_id       TEXT    NOT NULL,
+    file_name     TEXT    NOT NULL DEFAULT '',
+    file_type     TEXT    NOT NULL DEFAULT '',
+    content_type  TEXT    NOT NULL DEFAULT '',
+    upload_date   TEXT    NOT NULL DEFAULT '',
+    total_chunks  INTEGER NOT NULL DEFAULT 0,
+    byte_size     INTEGER NOT NULL DEFAULT 0,
+    content_hash  TEXT    NOT NULL DEFAULT '',
+    PRIMARY KEY (namespace, file_id)
+);
+CREATE INDEX IF NOT EXISTS idx_documents_listing
+    ON documents (namespace, content_type, upload_date DESC);
+CREATE TABLE IF NOT EXISTS registry_meta (
+    namespace     TEXT PRIMARY KEY,
+    bootstrapped  INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_COLUMNS = (
+    "file_id", "file_name", "file_type", "content_type",
+    "upload_date", "total_chunks", "byte_size", "content_hash"
+)
+
+
+def compute_content_hash(texts: Iterable[str]) -> str:
+    """Tính sha256 trên nội dung các chunks (dùng khi không có bytes gốc của file)"""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update((text or "").encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class DocumentRegistry:
+    """
+    Manifest documents dùng SQLite
+
+    - Mỗi vector store dùng một namespace riêng (tên collection)
+    - Lookup theo file_id là O(1) qua primary key
+    - Listing phân trang bằng LIMIT/OFFSET, bộ nhớ không phụ thuộc số lượng chunks
+    - Vector store ghi Chroma trước rồi mới gọi upsert()/delete_many() (transaction ngắn, chỉ ghi SQLite):
+      nếu Chroma lỗi thì manifest không đổi; nếu manifest lỗi sau khi Chroma đã ghi,
+      reconcile() chạy định kỳ sẽ sửa lại chênh lệch
+    """
+
+    def __init__(self, db_path: str, namespace: str):
+        """
+        Args:
+            db_path: Đường dẫn file SQLite
+            namespace: Tên collection mà registry này quản lý
+        """
+        self.db_path = db_path
+        self.namespace = namespace
+        self._lock = threading.RLock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # isolation_level=None: tự quản lý BEGIN/COMMIT để bao quanh thao tác Chroma
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    # ========== Transactions ==========
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def upsert(self, records: List[Dict]) -> None:
+        """Ghi (INSERT OR REPLACE) các records vào manifest trong một transaction"""
+        if not records:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO documents (namespace, {', '.join(_COLUMNS)}) "
+                f"VALUES (?, {', '.join('?' for _ in _COLUMNS)})",
+                [self._to_row(record) for record in records]
+            )
+
+    def delete(self, file_id: str) -> None:
+        """Xóa document khỏi manifest"""
+        self.delete_many([file_id])
+
+    def delete_many(self, file_ids: List[str]) -> None:
+        """Xóa nhiều documents khỏi manifest trong một transaction"""
+        if not file_ids:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "DELETE FROM documents WHERE namespace = ? AND file_id = ?",
+                [(self.namespace, file_id) for file_id in file_ids]
+            )
+
+    # ========== Queries ==========
+
+    def get(self, file_id: str) -> Optional[Dict]:
+        """Lấy thông tin document theo file_id"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM documents WHERE namespace = ? AND file_id = ?",
+                (self.namespace, file_id)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list_documents(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        content_type: Optional[str] = None
+    ) -> List[Dict]:
+        """Liệt kê documents theo upload_date mới nhất trước, có phân trang"""
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM documents WHERE namespace = ?"
+        params: list = [self.namespace]
+        if content_type:
+            sql += " AND content_type = ?"
+            params.append(content_type)
+        sql += " ORDER BY upload_date DESC, file_id LIMIT ? OFFSET ?"
+        params.extend([limit if limit is not None else -1, max(offset, 0)])
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_content_types(self, file_ids: List[str]) -> Dict[str, str]:
+        """Map file_id → content_type của các file_ids đã có trong manifest"""
+        result: Dict[str, str] = {}
+        with self._lock:
+            for start in range(0, len(file_ids), 500):
+                batch = file_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT file_id, content_type FROM documents WHERE namespace = ? "
+                    f"AND file_id IN ({', '.join('?' for _ in batch)})",
+                    [self.namespace] + list(batch)
+                )
+                result.update((row[0], row[1]) for row in rows)
+        return result
+
+    def get_content_hashes(self, content_type: Optional[str] = None) -> Dict[str, str]:
+        """Map file_id → content_hash (dùng để phát hiện thay đổi khi đồng bộ hàng loạt)"""
+        sql = "SELECT file_id, content_hash FROM documents WHERE namespace = ?"
+        params: list = [self.namespace]
+        if content_type:
+            sql += " AND content_type = ?"
+            params.append(content_type)
+        with self._lock:
+            return {row[0]: row[1] for row in self._conn.execute(sql, params)}
+
+    def count(self, content_type: Optional[str] = None) -> int:
+        """Đếm số documents"""
+        sql = "SELECT COUNT(*) FROM documents WHERE namespace = ?"
+        params: list = [self.namespace]
+        if content_type:
+            sql += " AND content_type = ?"
+            params.append(content_type)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    # ========== Bootstrap ==========
+
+    def is_bootstrapped(self) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT bootstrapped FROM registry_meta WHERE namespace = ?",
+                (self.namespace,)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def _scan_collections(self, collections: List, page_size: int) -> Dict[str, Dict]:
+        """Đọc metadatas theo trang từ các collections, gom thành records theo file_id"""
+        file_dict: Dict[str, Dict] = {}
+        for collection in collections:
+            offset = 0
+            while True:
+                page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                metadatas = page.get("metadatas") or []
+                if not metadatas:
+                    break
+                for metadata in metadatas:
+                    metadata = metadata or {}
+                    file_id = metadata.get("file_id", "")
+                    if not file_id:
+                        continue
+                    record = file_dict.get(file_id)
+                    if record is None:
+                        record = file_dict[file_id] = self.build_record(
+                            file_id=file_id,
+                            file_name=metadata.get("file_name", ""),
+                            file_type=metadata.get("file_type", ""),
+                            content_type=metadata.get("content_type", ""),
+                            upload_date=metadata.get("upload_date", ""),
+                            total_chunks=0
+                        )
+                    record["total_chunks"] += 1
+                if len(metadatas) < page_size:
+                    break
+                offset += page_size
+        return file_dict
+
+    def bootstrap_from_collection(self, collection, page_size: int = 1000) -> int:
+        """
+        Dựng lại manifest từ collection Chroma hiện có (chạy một lần cho dữ liệu cũ).
+        Đọc theo trang và chỉ lấy metadatas nên bộ nhớ bị giới hạn bởi page_size.
+
+        Returns:
+            Số documents đã ghi vào manifest
+        """
+        file_dict = self._scan_collections([collection], page_size)
+
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM documents WHERE namespace = ?", (self.namespace,))
+            conn.executemany(
+                f"INSERT INTO documents (namespace, {', '.join(_COLUMNS)}) "
+                f"VALUES (?, {', '.join('?' for _ in _COLUMNS)})",
+                [self._to_row(record) for record in file_dict.values()]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO registry_meta (namespace, bootstrapped) VALUES (?, 1)",
+                (self.namespace,)
+            )
+
+        logger.info(f"✅ Document registry '{self.namespace}': bootstrap {len(file_dict)} documents từ Chroma")
+        return len(file_dict)
+
+    def reconcile(self, collections: List, page_size: int = 1000) -> Dict[str, int]:
+        """
+        So manifest với các collections Chroma và sửa chênh lệch (blocking - gọi qua asyncio.to_thread)
+
+        - file_id có trong Chroma nhưng thiếu trong manifest → thêm (thông tin lấy từ metadata chunks)
+        - file_id trong manifest nhưng không còn chunk nào → xóa, sau khi kiểm tra lại từng file_id
+          (tránh xóa nhầm document vừa được ghi trong lúc đang quét)
+        - total_chunks lệch → cập nhật, giữ nguyên byte_size/content_hash
+
+        Returns:
+            Số documents đã thêm / xóa / cập nhật
+        """
+        file_dict = self._scan_collections(collections, page_size)
+        with self._lock:
+            existing = {
+                row[0]: row[1] for row in self._conn.execute(
+                    "SELECT file_id, total_chunks FROM documents WHERE namespace = ?",
+                    (self.namespace,)
+                )
+            }
+
+        missing = [record for file_id, record in file_dict.items() if file_id not in existing]
+        changed = [
+            (record["total_chunks"], self.namespace, file_id)
+            for file_id, record in file_dict.items()
+            if file_id in existing and existing[file_id] != record["total_chunks"]
+        ]
+        stale = [
+            file_id for file_id in existing
+            if file_id not in file_dict and not any(
+                collection.get(where={"file_id": file_id}, limit=1, include=[])["ids"]
+                for collection in collections
+            )
+        ]
+
+        if missing or changed or stale:
+            with self._transaction() as conn:
+                # OR IGNORE: record ghi bởi save_chunks trong lúc quét có thông tin đầy đủ hơn
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO documents (namespace, {', '.join(_COLUMNS)}) "
+                    f"VALUES (?, {', '.join('?' for _ in _COLUMNS)})",
+                    [self._to_row(record) for record in missing]
+                )
+                conn.executemany(
+                    "UPDATE documents SET total_chunks = ? WHERE namespace = ? AND file_id = ?",
+                    changed
+                )
+                conn.executemany(
+                    "DELETE FROM documents WHERE namespace = ? AND file_id = ?",
+                    [(self.namespace, file_id) for file_id in stale]
+                )
+            logger.info(
+                f"✅ Document registry '{self.namespace}': reconcile +{len(missing)} "
+                f"-{len(stale)} ~{len(changed)} documents"
+            )
+        return {"added": len(missing), "removed": len(stale), "updated": len(changed)}
+
+    def ensure_bootstrapped(self, collection) -> None:
+        """Bootstrap manifest nếu chưa từng làm cho namespace này"""
+        if self.is_bootstrapped():
+            return
+        try:
+            self.bootstrap_from_collection(collection)
+        except Exception as e:
+            logger.warning(f"⚠️ Không thể bootstrap document registry '{self.namespace}': {str(e)}")
+
+    # ========== Helpers ==========
+
+    @staticmethod
+    def build_record(
+        file_id: str,
+        file_name: str = "",
+        file_type: str = "",
+        content_type: str = "",
+        upload_date: str = "",
+        total_chunks: int = 0,
+        byte_size: int = 0,
+        content_hash: str = ""
+    ) -> Dict:
+        """Chuẩn hóa record giống format trả về trước đây của get_all_documents"""
+        if not file_type and file_name:
+            file_type = file_name.split('.')[-1] if '.' in file_name else ''
+        if not upload_date:
+            upload_date = datetime.now().isoformat()
+        return {
+            "file_id": file_id,
+            "file_name": file_name or "",
+            "file_type": file_type or "",
+            "content_type": content_type or "",
+            "upload_date": upload_date,
+            "total_chunks": int(total_chunks),
+            "byte_size": int(byte_size or 0),
+            "content_hash": content_hash or "",
+        }
+
+    def records_from_chunks(
+        self,
+        chunks: List,
+        file_type: str,
+        upload_date: str,
+        content_types: Optional[List[str]] = None,
+        byte_size: int = 0,
+        content_hash: str = "",
+        content_hashes: Optional[Dict[str, str]] = None
+    ) -> List[Dict]:
+        """
+        Gom các chunks theo file_id thành records cho manifest.
+        byte_size/content_hash của file gốc chỉ áp dụng khi batch chứa một file duy nhất;
+        ngược lại tính từ nội dung chunks (hoặc lấy từ content_hashes theo file_id nếu có).
+        """
+        grouped: Dict[str, List[int]] = {}
+        for i, chunk in enumerate(chunks):
+            grouped.setdefault(chunk.file_id, []).append(i)
+
+        use_file_stats = len(grouped) == 1 and (byte_size or content_hash)
+        records = []
+        for file_id, indices in grouped.items():
+            texts = [chunks[i].text for i in indices]
+            first = indices[0]
+            records.append(self.build_record(
+                file_id=file_id,
+                file_name=chunks[first].file_name,
+                file_type=file_type,
+                content_type=content_types[first] if content_types and first < len(content_types) else "",
+                upload_date=upload_date,
+                total_chunks=len(indices),
+                byte_size=byte_size if use_file_stats and byte_size else sum(len(t.encode("utf-8")) for t in texts),
+                content_hash=(
+                    content_hashes[file_id] if content_hashes and file_id in content_hashes
+                    else content_hash if use_file_stats and content_hash
+                    else compute_content_hash(texts)
+                )
+            ))
+        return records
+
+    def _to_row(self, record: Dict) -> tuple:
+        return (self.namespace,) + tuple(record.get(column, "") for column in _COLUMNS)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
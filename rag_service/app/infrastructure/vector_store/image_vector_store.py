@@ -1,26 +1,88 @@
 import os
+import re
+import asyncio
+import hashlib
 import logging
-from typing import List, Optional, Dict
+import threading
+import unicodedata
+from typing import Any, List, Optional, Dict
 import numpy as np
 from pathlib import Path
 from datetime import datetime
 
 from app.infrastructure.vector_store.base import VectorStore
+from app.infrastructure.vector_store.document_registry import DocumentRegistry
+from app.infrastructure.vector_store.perceptual_hash_index import PerceptualHashIndex
 from app.domain.document import DocumentChunk
 from app.core.settings import Settings
+from app.core.tracing import traced
 
 logger = logging.getLogger(__name__)
 
+# Tên collection của partition products: <CHROMA_IMAGE_COLLECTION>-product-<category>
+PRODUCT_PARTITION_INFIX = "-product-"
+# Số vectors mỗi trang khi chuyển products từ collection chung sang partitions
+_MIGRATION_PAGE_SIZE = 1000
+_SAFE_COLLECTION_SUFFIX = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9_-]{0,38}[A-Za-z0-9])?$")
+
+
+def product_partition_name(base_collection: str, category_id: str) -> str:
+    """Tên collection (hợp lệ với Chroma) cho products của một category"""
+    category_id = str(category_id or "")
+    if _SAFE_COLLECTION_SUFFIX.match(category_id):
+        suffix = category_id
+    else:
+        # Category rỗng / có ký tự đặc biệt: phần đọc được + hash để không trùng nhau
+        ascii_id = unicodedata.normalize("NFKD", category_id.replace("đ", "d").replace("Đ", "D"))
+        readable = re.sub(r"[^A-Za-z0-9]+", "_", ascii_id.encode("ascii", "ignore").decode()).strip("_")[:24]
+        digest = hashlib.sha1(category_id.encode("utf-8")).hexdigest()[:8]
+        suffix = f"{readable}-{digest}" if readable else f"none-{digest}"
+    return f"{base_collection}{PRODUCT_PARTITION_INFIX}{suffix}"
+
+
+def _empty_query_result() -> Dict:
+    return {"ids": [[]], "distances": [[]], "metadatas": [[]], "documents": [[]]}
+
+
+def _merge_query_results(results: List[Dict], n_results: int) -> Dict:
+    """Gộp kết quả query của nhiều partitions theo distance tăng dần (format giống collection.query)"""
+    rows = []
+    for result in results:
+        if not result.get("ids") or not result["ids"][0]:
+            continue
+        distances = (result.get("distances") or [[1.0] * len(result["ids"][0])])[0]
+        metadatas = (result.get("metadatas") or [[{}] * len(result["ids"][0])])[0]
+        documents = (result.get("documents") or [[""] * len(result["ids"][0])])[0]
+        rows.extend(zip(distances, result["ids"][0], metadatas, documents))
+    rows.sort(key=lambda row: row[0])
+    rows = rows[:n_results]
+    return {
+        "ids": [[row[1] for row in rows]],
+        "distances": [[row[0] for row in rows]],
+        "metadatas": [[row[2] for row in rows]],
+        "documents": [[row[3] for row in rows]],
+    }
+
 
 class ImageVectorStore(VectorStore):
     """
     Vector store riêng cho images
+    
+    Khi IMAGE_STORE_PARTITIONING = "category": collection chính chỉ giữ ảnh upload,
+    products nằm trong một collection (HNSW index) riêng cho mỗi category.
+    Search theo category chỉ query partition đó (không cần metadata filter),
+    search không có category query song song mọi partition rồi gộp top_k.
     """
     
     def __init__(self):
         """Khởi tạo Image Vector Store với collection riêng"""
         self.store_type = "chroma"
         self.collection = None
+        self.registry: Optional[DocumentRegistry] = None
+        self.hash_index: Optional[PerceptualHashIndex] = None
+        self.partitioning = Settings.IMAGE_STORE_PARTITIONING == "category"
+        self._partitions: Dict[str, Any] = {}  # category_id → collection
+        self._partitions_lock = threading.Lock()
         self._init_chroma()
 
     def _init_chroma(self):
@@ -29,10 +91,9 @@ class ImageVectorStore(VectorStore):
             import chromadb
             from chromadb.config import Settings as ChromaSettings
             
-            # Sử dụng data/vector_store/ làm thư mục lưu trữ
-            db_dir = Path(__file__).parent.parent.parent.parent / "data" / "vector_store"
-            db_dir.mkdir(parents=True, exist_ok=True)
-            persist_directory = str(db_dir / "chroma_db")
+            # Thư mục lưu trữ: CHROMA_PERSIST_DIR (mặc định data/vector_store/chroma_db)
+            persist_directory = Settings.CHROMA_PERSIST_DIR
+            Path(persist_directory).mkdir(parents=True, exist_ok=True)
             
             # Tạo Chroma client với persistent storage
             self.chroma_client = chromadb.PersistentClient(
@@ -56,6 +117,20 @@ class ImageVectorStore(VectorStore):
                 metadata={"hnsw:space": "cosine"}
             )
             
+            # Manifest documents: listing/info không cần quét toàn bộ collection
+            self.registry = DocumentRegistry(Settings.DOCUMENT_REGISTRY_PATH, collection_name)
+            self.registry.ensure_bootstrapped(self.collection)
+            # pHash/dHash của ảnh đã encode: ảnh gần trùng dùng lại embedding thay vì chạy CLIP
+            self.hash_index = PerceptualHashIndex(Settings.DOCUMENT_REGISTRY_PATH, collection_name)
+            
+            if self.partitioning:
+                self._load_partitions()
+                if self.collection.get(where={"content_type": "product"}, limit=1, include=[])["ids"]:
+                    logger.warning(
+                        "⚠️ Collection chung còn products chưa chuyển sang partitions (không được search theo "
+                        "category): chạy POST /api/admin/image-store/migrate-partitions"
+                    )
+            
             logger.info(f"Image vector store đã khởi tạo: {collection_name} (dimension: 512)")
         except ImportError:
             logger.error("Chroma chưa được cài đặt. Vui lòng cài: pip install chromadb")
@@ -64,16 +139,204 @@ class ImageVectorStore(VectorStore):
             logger.error(f"Lỗi khi khởi tạo Image Vector Store: {str(e)}")
             raise
     
+    # ========== Partitions ==========
+    
+    def _load_partitions(self) -> None:
+        """Nạp các partition products đã có"""
+        prefix = f"{self.collection.name}{PRODUCT_PARTITION_INFIX}"
+        for item in self.chroma_client.list_collections():
+            name = item if isinstance(item, str) else item.name  # Chroma >= 0.6 trả về tên
+            if not name.startswith(prefix):
+                continue
+            collection = self.chroma_client.get_collection(name=name)
+            category_id = (collection.metadata or {}).get("category_id", "")
+            self._partitions[category_id] = collection
+        if self._partitions:
+            logger.info(f"Image vector store: {len(self._partitions)} partitions products theo category")
+    
+    def _get_partition(self, category_id: str, create: bool = False):
+        """Collection của category (tạo mới nếu create=True)"""
+        category_id = str(category_id or "")
+        partition = self._partitions.get(category_id)
+        if partition is None and create:
+            with self._partitions_lock:
+                partition = self._partitions.get(category_id)
+                if partition is None:
+                    partition = self.chroma_client.get_or_create_collection(
+                        name=product_partition_name(self.collection.name, category_id),
+                        metadata={"hnsw:space": "cosine", "content_type": "product", "category_id": category_id}
+                    )
+                    self._partitions[category_id] = partition
+                    logger.info(f"Tạo partition products cho category '{category_id}': {partition.name}")
+        return partition
+    
+    def _collection_for(self, metadata: Dict):
+        """Collection chứa một vector theo metadata (product → partition category của nó)"""
+        if self.partitioning and metadata.get("content_type") == "product":
+            return self._get_partition(metadata.get("category_id", ""), create=True)
+        return self.collection
+    
+    def _all_collections(self) -> List:
+        return [self.collection] + list(self._partitions.values())
+    
+    def migrate_products_to_partitions(self) -> Dict[str, int]:
+        """
+        Chuyển products đang nằm trong collection chung sang partitions theo category (blocking - gọi qua
+        asyncio.to_thread). Mỗi trang chỉ bị xóa khỏi collection chung sau khi đã đọc lại đủ ids ở partitions.
+
+        Returns:
+            {"moved", "partitions"}
+        """
+        if not self.partitioning:
+            raise RuntimeError("IMAGE_STORE_PARTITIONING không phải 'category'")
+        moved = 0
+        while True:
+            page = self.collection.get(
+                where={"content_type": "product"},
+                limit=_MIGRATION_PAGE_SIZE,
+                include=["embeddings", "metadatas", "documents"]
+            )
+            if not page["ids"]:
+                break
+            groups: Dict[str, List[int]] = {}
+            for i, metadata in enumerate(page["metadatas"]):
+                groups.setdefault(str((metadata or {}).get("category_id", "")), []).append(i)
+            for category_id, indices in groups.items():
+                partition = self._get_partition(category_id, create=True)
+                page_ids = [page["ids"][i] for i in indices]
+                partition.upsert(
+                    ids=page_ids,
+                    embeddings=[page["embeddings"][i] for i in indices],
+                    metadatas=[page["metadatas"][i] for i in indices],
+                    documents=[page["documents"][i] for i in indices]
+                )
+                copied = set(partition.get(ids=page_ids, include=[])["ids"])
+                if len(copied) != len(page_ids):
+                    raise RuntimeError(
+                        f"Partition '{partition.name}' chỉ có {len(copied)}/{len(page_ids)} vectors sau khi copy, "
+                        f"dừng chuyển (đã chuyển {moved} products)"
+                    )
+            self.collection.delete(ids=page["ids"])
+            moved += len(page["ids"])
+        logger.info(f"✅ Đã chuyển {moved} products sang {len(self._partitions)} partitions theo category")
+        return {"moved": moved, "partitions": len(self._partitions)}
+    
+    def count_vectors(self) -> int:
+        """Tổng số vectors (collection chính + mọi partition), đồng thời buộc Chroma load các index"""
+        return sum(collection.count() for collection in self._all_collections())
+    
+    @staticmethod
+    def _query_collection(collection, query_embeddings: List[List[float]], n_results: int, where: Optional[Dict] = None) -> List[Dict]:
+        """Một lần collection.query cho nhiều query vectors, tách kết quả theo từng query"""
+        try:
+            kwargs = {"query_embeddings": query_embeddings, "n_results": n_results}
+            if where:
+                kwargs["where"] = where
+            results = collection.query(**kwargs)
+        except Exception as e:
+            # Partition rỗng hoặc bị xóa giữa chừng không làm hỏng cả truy vấn
+            logger.warning(f"Query collection {getattr(collection, 'name', '')} lỗi: {str(e)}")
+            return [_empty_query_result() for _ in query_embeddings]
+        rows = []
+        for row in range(len(query_embeddings)):
+            rows.append({
+                key: [results[key][row]] if results.get(key) and len(results[key]) > row else [[]]
+                for key in ("ids", "distances", "metadatas", "documents")
+            })
+        return rows
+    
+    async def query_products(
+        self,
+        query_embedding,
+        n_results: int,
+        category_id: Optional[str] = None
+    ) -> Dict:
+        """
+        Vector search products (router theo partition)
+        
+        Args:
+            query_embedding: Embedding query (512 dim)
+            n_results: Số kết quả
+            category_id: Chỉ tìm trong category này (None = mọi category)
+        
+        Returns:
+            Dict cùng format với collection.query (ids/distances/metadatas/documents lồng 1 cấp)
+        """
+        return (await self.query_products_batch([query_embedding], n_results, category_id=category_id))[0]
+    
+    @traced("vector.query_products")
+    async def query_products_batch(
+        self,
+        query_embeddings: List,
+        n_results: int,
+        category_id: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Vector search products cho nhiều queries: mỗi collection chỉ một lần query (multi-vector)
+        
+        Returns:
+            Danh sách kết quả (format như query_products) cùng thứ tự với query_embeddings
+        """
+        if not query_embeddings:
+            return []
+        embeddings = [
+            embedding.tolist() if isinstance(embedding, np.ndarray) else list(embedding)
+            for embedding in query_embeddings
+        ]
+        
+        if not self.partitioning:
+            where = {"content_type": "product"}
+            if category_id:
+                where["category_id"] = category_id
+            return await asyncio.to_thread(self._query_collection, self.collection, embeddings, n_results, where)
+        
+        if category_id:
+            partition = self._get_partition(category_id)
+            if partition is None:
+                return [_empty_query_result() for _ in embeddings]
+            return await asyncio.to_thread(self._query_collection, partition, embeddings, n_results)
+        
+        # Không có category: fan-out song song rồi gộp top n_results cho từng query
+        partitions = list(self._partitions.values())
+        if not partitions:
+            return [_empty_query_result() for _ in embeddings]
+        per_partition = await asyncio.gather(*(
+            asyncio.to_thread(self._query_collection, partition, embeddings, n_results)
+            for partition in partitions
+        ))
+        return [
+            _merge_query_results([rows[row] for rows in per_partition], n_results)
+            for row in range(len(embeddings))
+        ]
+    
+    async def get_products(self, category_id: str) -> Dict:
+        """Tất cả products của một category (format giống collection.get)"""
+        if not self.partitioning:
+            return await asyncio.to_thread(
+                self.collection.get,
+                where={"content_type": "product", "category_id": category_id}
+            )
+        partition = self._get_partition(category_id)
+        if partition is None:
+            return {"ids": [], "metadatas": [], "documents": []}
+        return await asyncio.to_thread(partition.get)
+    
     async def save_chunks(
         self, 
         chunks: List[DocumentChunk], 
         embeddings: List[np.ndarray],
         file_type: str = "",
         upload_date: str = "",
-        extra_metadata: Optional[List[Dict]] = None
+        extra_metadata: Optional[List[Dict]] = None,
+        byte_size: int = 0,
+        content_hash: str = "",
+        content_hashes: Optional[Dict[str, str]] = None
     ) -> None:
         """
         Save image chunks with embeddings to Chroma
+        
+        Manifest chỉ được cập nhật sau khi Chroma ghi thành công (Chroma lỗi → manifest không đổi)
+        content_hashes: fingerprint theo file_id (đồng bộ catalog nhiều products một lần)
         """
         if not chunks or not embeddings:
             return
@@ -110,23 +373,19 @@ class ImageVectorStore(VectorStore):
             if emb is not None and len(emb) != 512:
                 logger.warning(f"Embedding {i} có dimension {len(emb)}, expected 512")
         
-        # Delete existing chunks for this file
-        if chunks:
-            file_id = chunks[0].file_id
-            try:
-                existing = self.collection.get(where={"file_id": file_id})
-                if existing['ids']:
-                    self.collection.delete(ids=existing['ids'])
-            except Exception as e:
-                logger.warning(f"Không thể xóa existing chunks: {str(e)}")
+        records = self.registry.records_from_chunks(
+            chunks, file_type, upload_date,
+            content_types=[m.get("content_type", "image") for m in metadatas],
+            byte_size=byte_size, content_hash=content_hash, content_hashes=content_hashes
+        )
         
         try:
-            self.collection.add(
-                ids=ids,
-                embeddings=embeddings_list,
-                documents=texts,
-                metadatas=metadatas
+            # Chroma (blocking) chạy trong thread; manifest chỉ ghi sau khi Chroma thành công
+            await asyncio.to_thread(
+                self._replace_chunks,
+                [record["file_id"] for record in records], ids, embeddings_list, texts, metadatas
             )
+            await asyncio.to_thread(self.registry.upsert, records)
             logger.info(f"Saved {len(chunks)} image chunks to Chroma")
         except Exception as e:
             # Nếu lỗi về dimension, có thể collection đã tồn tại với dimension khác
@@ -136,6 +395,50 @@ class ImageVectorStore(VectorStore):
                 raise ValueError(f"Collection dimension mismatch: {str(e)}")
             raise
     
+    def _replace_chunks(
+        self,
+        file_ids: List[str],
+        ids: List[str],
+        embeddings: List[List[float]],
+        texts: List[str],
+        metadatas: List[Dict]
+    ) -> None:
+        """Xóa chunks cũ của các files rồi thêm chunks mới vào collection đích (blocking)"""
+        # Gom chunks theo collection đích (ảnh → collection chính, product → partition category)
+        groups: Dict[str, List[int]] = {}
+        targets: Dict[str, Any] = {}
+        for i, metadata in enumerate(metadatas):
+            target = self._collection_for(metadata)
+            targets[target.name] = target
+            groups.setdefault(target.name, []).append(i)
+        
+        # Delete existing chunks for these files (chỉ lấy ids, một query mỗi collection cho cả batch).
+        # Luôn quét collection đích; collection chung/mọi partition chỉ khi manifest đã có file đó
+        # (ảnh → collection chung, product có thể đã đổi category → bản cũ nằm ở partition khác)
+        known_types = set(self.registry.get_content_types(file_ids).values())
+        if known_types - {"product"}:
+            targets.setdefault(self.collection.name, self.collection)
+        scan = list(targets.values())
+        if self.partitioning and "product" in known_types:
+            scan = self._all_collections()
+        where = {"file_id": file_ids[0]} if len(file_ids) == 1 else {"file_id": {"$in": file_ids}}
+        for collection in scan:
+            try:
+                existing = collection.get(where=where, include=[])
+                if existing['ids']:
+                    collection.delete(ids=existing['ids'])
+            except Exception as e:
+                logger.warning(f"Không thể xóa existing chunks: {str(e)}")
+        
+        for name, indices in groups.items():
+            targets[name].add(
+                ids=[ids[i] for i in indices],
+                embeddings=[embeddings[i] for i in indices],
+                documents=[texts[i] for i in indices],
+                metadatas=[metadatas[i] for i in indices]
+            )
+    
+    @traced("vector.image_search")
     async def search_similar(
         self, 
         query_embedding: np.ndarray, 
@@ -151,13 +454,15 @@ class ImageVectorStore(VectorStore):
             if len(query_embedding) != 512:
                 logger.warning(f"Query embedding có dimension {len(query_embedding)}, expected 512")
             
-            where = {"file_id": file_id} if file_id else {"content_type": "image"}
-            
-            results = self.collection.query(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=top_k,
-                where=where
-            )
+            if file_id:
+                results = await asyncio.to_thread(self._search_file, query_embedding.tolist(), top_k, file_id)
+            else:
+                results = await asyncio.to_thread(
+                    self.collection.query,
+                    query_embeddings=[query_embedding.tolist()],
+                    n_results=top_k,
+                    where={"content_type": "image"}
+                )
             
             search_time = time.time() - start_time
             logger.debug(f"Image search completed in {search_time:.3f}s (top_k={top_k}, file_id={file_id})")
@@ -183,84 +488,64 @@ class ImageVectorStore(VectorStore):
             logger.error(f"Error searching images: {str(e)}", exc_info=True)
             return []
     
+    def _search_file(self, query_embedding: List[float], top_k: int, file_id: str) -> Dict:
+        """Query chunks của một file (blocking): product có partition thì mới quét các partitions"""
+        collections = [self.collection]
+        if self.partitioning and (self.registry.get(file_id) or {}).get("content_type", "product") == "product":
+            collections = self._all_collections()
+        return _merge_query_results([
+            self._query_collection(collection, [query_embedding], top_k, {"file_id": file_id})[0]
+            for collection in collections
+        ], top_k)
+    
     async def delete_document(self, file_id: str) -> None:
         """Delete image and all its chunks"""
         try:
-            existing = self.collection.get(where={"file_id": file_id})
-            if existing['ids']:
-                self.collection.delete(ids=existing['ids'])
+            await asyncio.to_thread(self._delete_chunks, [file_id])
+            await asyncio.to_thread(self.registry.delete, file_id)
+            await asyncio.to_thread(self.hash_index.remove, [file_id])
             logger.info(f"Deleted image {file_id}")
         except Exception as e:
             logger.error(f"Error deleting image: {str(e)}")
             raise
     
-    async def get_all_documents(self) -> List[Dict]:
-        """Get list of all images"""
+    async def delete_documents(self, file_ids: List[str]) -> None:
+        """Delete nhiều images/products cùng lúc (một query Chroma cho cả batch)"""
+        if not file_ids:
+            return
+        await asyncio.to_thread(self._delete_chunks, list(file_ids))
+        await asyncio.to_thread(self.registry.delete_many, list(file_ids))
+        await asyncio.to_thread(self.hash_index.remove, list(file_ids))
+        logger.info(f"Deleted {len(file_ids)} images/products")
+    
+    def _delete_chunks(self, file_ids: List[str]) -> None:
+        """Xóa chunks của các files khỏi collection chính và mọi partition (blocking)"""
+        where = {"file_id": file_ids[0]} if len(file_ids) == 1 else {"file_id": {"$in": file_ids}}
+        for collection in self._all_collections():
+            existing = collection.get(where=where, include=[])
+            if existing['ids']:
+                collection.delete(ids=existing['ids'])
+    
+    def reconcile_registry(self) -> Dict[str, int]:
+        """Sửa chênh lệch giữa manifest và collection chính + partitions (blocking - gọi qua asyncio.to_thread)"""
+        return self.registry.reconcile(self._all_collections())
+    
+    async def get_all_documents(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Get list of images (content_type = "image", phân trang từ registry)"""
         try:
-            # Lấy tất cả images (có content_type = "image")
-            results = self.collection.get(where={"content_type": "image"})
-            
-            if not results or 'ids' not in results or len(results['ids']) == 0:
-                return []
-            
-            # Group chunks theo file_id
-            file_dict = {}
-            metadatas = results.get('metadatas', [])
-            
-            for i in range(len(results['ids'])):
-                metadata = metadatas[i] if i < len(metadatas) else {}
-                file_id = metadata.get('file_id', '')
-                
-                if file_id:
-                    if file_id not in file_dict:
-                        file_name = metadata.get('file_name', '')
-                        file_type = metadata.get('file_type', '')
-                        if not file_type and file_name:
-                            file_type = file_name.split('.')[-1] if '.' in file_name else ''
-                        
-                        upload_date = metadata.get('upload_date', '')
-                        if not upload_date:
-                            upload_date = datetime.now().isoformat()
-                        
-                        file_dict[file_id] = {
-                            'file_id': file_id,
-                            'file_name': file_name,
-                            'file_type': file_type,
-                            'upload_date': upload_date,
-                            'total_chunks': 0
-                        }
-                    file_dict[file_id]['total_chunks'] += 1
-            
-            return list(file_dict.values())
+            return self.registry.list_documents(offset=offset, limit=limit, content_type="image")
         except Exception as e:
             logger.error(f"Lỗi khi lấy danh sách images: {str(e)}", exc_info=True)
             return []
     
+    async def count_documents(self) -> int:
+        """Đếm số images trong registry"""
+        return self.registry.count(content_type="image")
+    
     async def get_document_info(self, file_id: str) -> Optional[Dict]:
-        """Get image information"""
+        """Get image information (lookup theo primary key trong registry)"""
         try:
-            results = self.collection.get(where={"file_id": file_id})
-            if results['ids'] and len(results['ids']) > 0:
-                metadatas = results.get('metadatas', [])
-                metadata = metadatas[0] if metadatas else {}
-                
-                file_name = metadata.get('file_name', '')
-                file_type = metadata.get('file_type', '')
-                if not file_type and file_name:
-                    file_type = file_name.split('.')[-1] if '.' in file_name else ''
-                
-                upload_date = metadata.get('upload_date', '')
-                if not upload_date:
-                    upload_date = datetime.now().isoformat()
-                
-                return {
-                    'file_id': file_id,
-                    'file_name': file_name,
-                    'file_type': file_type,
-                    'upload_date': upload_date,
-                    'total_chunks': len(results['ids'])
-                }
+            return self.registry.get(file_id)
         except Exception as e:
             logger.error(f"Error getting image info: {str(e)}")
         return None
-
@@ -0,0 +1,242 @@
+"""
+Perceptual Hash Index - Index pHash/dHash của các ảnh đã encode, nằm cạnh ImageVectorStore
+
+Mỗi file_id (ảnh hoặc product có ảnh) lưu pHash, dHash và CLIP image embedding gốc
+trong SQLite (cùng file với document registry). Hashes được giữ thêm trong bộ nhớ dưới dạng
+numpy uint64 để lookup gần trùng bằng khoảng cách Hamming vector hóa.
+"""
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.image.perceptual_hash import hamming_distances, pairwise_hamming
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS image_hashes (
+    namespace     TEXT NOT NULL,
+    file_id       TEXT NOT NULL,
+    content_type  TEXT NOT NULL DEFAULT '',
+    phash         TEXT NOT NULL,
+    dhash         TEXT NOT NULL,
+    embedding     BLOB NOT NULL,
+    PRIMARY KEY (namespace, file_id)
+);
+"""
+
+# Số hàng mỗi block khi tính ma trận khoảng cách cho báo cáo clusters
+_CLUSTER_BLOCK = 512
+
+
+class PerceptualHashIndex:
+    """
+    Index ảnh gần trùng theo perceptual hash
+
+    - find(): ảnh đã biết gần nhất trong ngưỡng Hamming (cả pHash và dHash) + embedding của nó
+    - add()/remove(): đồng bộ theo file_id với vector store
+    - clusters(): các nhóm ảnh gần trùng (báo cáo admin)
+    """
+
+    def __init__(self, db_path: str, namespace: str):
+        """
+        Args:
+            db_path: Đường dẫn file SQLite
+            namespace: Tên collection mà index này đi kèm
+        """
+        self.namespace = namespace
+        self._lock = threading.RLock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+        self._file_ids: List[str] = []
+        self._content_types: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._phashes = np.empty(0, dtype=np.uint64)
+        self._dhashes = np.empty(0, dtype=np.uint64)
+        self._load()
+
+    def _load(self) -> None:
+        rows = self._conn.execute(
+            "SELECT file_id, content_type, phash, dhash FROM image_hashes WHERE namespace = ?",
+            (self.namespace,)
+        ).fetchall()
+        self._file_ids = [row[0] for row in rows]
+        self._content_types = [row[1] for row in rows]
+        self._positions = {file_id: i for i, file_id in enumerate(self._file_ids)}
+        self._phashes = np.array([int(row[2], 16) for row in rows], dtype=np.uint64)
+        self._dhashes = np.array([int(row[3], 16) for row in rows], dtype=np.uint64)
+        if rows:
+            logger.info(f"Perceptual hash index '{self.namespace}': {len(rows)} ảnh")
+
+    def __len__(self) -> int:
+        return len(self._file_ids)
+
+    # ========== Lookup ==========
+
+    def find(
+        self,
+        hashes: Tuple[int, int],
+        phash_threshold: int,
+        dhash_threshold: int
+    ) -> Optional[Tuple[str, str, int]]:
+        """
+        Tìm ảnh gần trùng nhất
+
+        Returns:
+            (file_id, content_type, khoảng cách pHash) hoặc None
+        """
+        with self._lock:
+            if not self._file_ids:
+                return None
+            phash_distances = hamming_distances(hashes[0], self._phashes)
+            dhash_distances = hamming_distances(hashes[1], self._dhashes)
+            matches = np.flatnonzero((phash_distances <= phash_threshold) & (dhash_distances <= dhash_threshold))
+            if matches.size == 0:
+                return None
+            best = int(matches[np.argmin(phash_distances[matches])])
+            return self._file_ids[best], self._content_types[best], int(phash_distances[best])
+
+    def get_embedding(self, file_id: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT embedding FROM image_hashes WHERE namespace = ? AND file_id = ?",
+                (self.namespace, file_id)
+            ).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32).copy() if row else None
+
+    # ========== Cập nhật ==========
+
+    def add(self, entries: List[Tuple[str, str, Tuple[int, int], np.ndarray]]) -> None:
+        """
+        Thêm/cập nhật ảnh
+
+        Args:
+            entries: [(file_id, content_type, (phash, dhash), image_embedding)]
+        """
+        if not entries:
+            return
+        rows = [
+            (self.namespace, file_id, content_type, f"{hashes[0]:016x}", f"{hashes[1]:016x}",
+             np.asarray(embedding, dtype=np.float32).tobytes())
+            for file_id, content_type, hashes, embedding in entries
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO image_hashes (namespace, file_id, content_type, phash, dhash, embedding) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            new_phashes, new_dhashes = [], []
+            for file_id, content_type, hashes, _ in entries:
+                position = self._positions.get(file_id)
+                if position is not None:
+                    self._content_types[position] = content_type
+                    self._phashes[position] = np.uint64(hashes[0])
+                    self._dhashes[position] = np.uint64(hashes[1])
+                    continue
+                self._positions[file_id] = len(self._file_ids)
+                self._file_ids.append(file_id)
+                self._content_types.append(content_type)
+                new_phashes.append(hashes[0])
+                new_dhashes.append(hashes[1])
+            if new_phashes:
+                self._phashes = np.concatenate([self._phashes, np.array(new_phashes, dtype=np.uint64)])
+                self._dhashes = np.concatenate([self._dhashes, np.array(new_dhashes, dtype=np.uint64)])
+
+    def remove(self, file_ids: List[str]) -> None:
+        """Xóa ảnh theo file_id (khi document bị xóa khỏi vector store)"""
+        with self._lock:
+            present = [file_id for file_id in file_ids if file_id in self._positions]
+            if not present:
+                return
+            with self._conn:
+                self._conn.executemany(
+                    "DELETE FROM image_hashes WHERE namespace = ? AND file_id = ?",
+                    [(self.namespace, file_id) for file_id in present]
+                )
+            removed = {self._positions[file_id] for file_id in present}
+            keep = [i for i in range(len(self._file_ids)) if i not in removed]
+            self._file_ids = [self._file_ids[i] for i in keep]
+            self._content_types = [self._content_types[i] for i in keep]
+            self._phashes = self._phashes[keep]
+            self._dhashes = self._dhashes[keep]
+            self._positions = {file_id: i for i, file_id in enumerate(self._file_ids)}
+
+    # ========== Báo cáo ==========
+
+    def clusters(self, phash_threshold: int, dhash_threshold: int) -> List[List[Dict]]:
+        """
+        Nhóm các ảnh gần trùng (union-find trên các cặp trong ngưỡng), chỉ trả nhóm >= 2 ảnh
+
+        Returns:
+            [[{"file_id", "content_type", "distance"}]] - distance: pHash tới ảnh đầu nhóm
+        """
+        with self._lock:
+            file_ids = list(self._file_ids)
+            content_types = list(self._content_types)
+            phashes = self._phashes.copy()
+            dhashes = self._dhashes.copy()
+
+        parent = list(range(len(file_ids)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union_close(members: np.ndarray) -> None:
+            """So từng block của members với toàn bộ members, gộp các cặp trong ngưỡng"""
+            for start in range(0, len(members), _CLUSTER_BLOCK):
+                block = members[start:start + _CLUSTER_BLOCK]
+                close = (pairwise_hamming(phashes[block], phashes[members]) <= phash_threshold) & \
+                        (pairwise_hamming(dhashes[block], dhashes[members]) <= dhash_threshold)
+                for row, column in zip(*np.nonzero(close)):
+                    i, j = int(block[row]), int(members[column])
+                    if i < j:
+                        root_i, root_j = find(i), find(j)
+                        if root_i != root_j:
+                            parent[root_j] = root_i
+
+        if phash_threshold < 8:
+            # Pigeonhole: pHash lệch <= 7 bits thì trùng ít nhất 1 trong 8 bytes
+            # → chỉ so các ảnh chung giá trị byte ở cùng vị trí thay vì mọi cặp
+            hash_bytes = phashes.view(np.uint8).reshape(-1, 8)
+            for band in range(8):
+                order = np.argsort(hash_bytes[:, band], kind="stable")
+                boundaries = np.flatnonzero(np.diff(hash_bytes[order, band])) + 1
+                for members in np.split(order, boundaries):
+                    if len(members) > 1:
+                        union_close(members)
+        else:
+            union_close(np.arange(len(file_ids)))
+
+        groups: Dict[int, List[int]] = {}
+        for i in range(len(file_ids)):
+            groups.setdefault(find(i), []).append(i)
+
+        result = []
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            distances = hamming_distances(int(phashes[members[0]]), phashes[members])
+            result.append([
+                {"file_id": file_ids[i], "content_type": content_types[i], "distance": int(distance)}
+                for i, distance in zip(members, distances)
+            ])
+        result.sort(key=len, reverse=True)
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
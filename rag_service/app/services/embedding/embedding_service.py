@@ -5,6 +5,8 @@ import numpy as np
 import asyncio
 
 from app.core.settings import Settings
+from app.core.tracing import traced
+from app.services.inference import MODEL_TEXT_EMBEDDER, run_inference
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +18,7 @@ class EmbeddingService:
     
     def __init__(self):
         """Khởi tạo Embedding Service"""
-        self.embedding_model = None
+        self._init_state()
         self.use_openai = Settings.USE_OPENAI_EMBEDDINGS
         self.openai_api_key = Settings.OPENAI_API_KEY
         
@@ -32,6 +34,15 @@ class EmbeddingService:
             logger.info("🔄 Chuyển sang Sentence Transformer (chậm hơn nhưng miễn phí)")
             self._init_sentence_transformer()
     
+    def _init_state(self, embedding_model=None) -> None:
+        """
+        Attributes của instance, không load model
+        Subclass không chạy model trong process (model server, fake) gọi hàm này thay cho __init__
+        """
+        self.embedding_model = embedding_model
+        self.use_openai = False
+        self.openai_api_key = None
+    
     def _init_openai(self):
         """Khởi tạo OpenAI embeddings - Khuyến nghị: text-embedding-3-large"""
         try:
@@ -66,6 +77,7 @@ class EmbeddingService:
             logger.error(f"Lỗi khi tải Sentence Transformer: {str(e)}")
             raise
     
+    @traced("embedding.text")
     async def create_embedding(self, text: str) -> Optional[np.ndarray]:
         """Create embedding vector from text"""
         if not text or not text.strip():
@@ -75,7 +87,7 @@ class EmbeddingService:
             if self.use_openai:
                 return await self._create_openai_embedding(text)
             else:
-                return self._create_sentence_transformer_embedding(text)
+                return await run_inference(MODEL_TEXT_EMBEDDER, self._create_sentence_transformer_embedding, text)
         except Exception as e:
             logger.error(f"Error creating embedding: {str(e)}")
             return None
@@ -104,6 +116,7 @@ class EmbeddingService:
         embedding = self.embedding_model.encode(text, convert_to_numpy=True)
         return embedding.astype(np.float32)
     
+    @traced("embedding.text_batch")
     async def create_embeddings(self, texts: List[str]) -> List[Optional[np.ndarray]]:
         """
         Tạo embeddings cho nhiều texts
@@ -154,8 +167,10 @@ class EmbeddingService:
             else:
                 # Sentence Transformer: Encode tất cả cùng lúc (nhanh hơn)
                 logger.info(f"Đang tạo embeddings cho {len(texts)} chunks bằng Sentence Transformer")
-                embeddings = self.embedding_model.encode(
-                    texts, 
+                embeddings = await run_inference(
+                    MODEL_TEXT_EMBEDDER,
+                    self.embedding_model.encode,
+                    texts,
                     convert_to_numpy=True,
                     show_progress_bar=True,  # Hiển thị progress bar
                     batch_size=32  # Batch size cho Sentence Transformer
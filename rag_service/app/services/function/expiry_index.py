@@ -0,0 +1,183 @@
+"""
+Expiry Index - Index hạn sử dụng sản phẩm trong bộ nhớ
+
+SanPham (MaSanPham, TenSanPham, NgaySanXuat, NgayHetHan) được nạp thành snapshot bất biến:
+- Sản phẩm có NgayHetHan sắp xếp theo ngày → "hết hạn trong N ngày" / "đã hết hạn" bằng bisect
+- Tra cứu theo mã sản phẩm (dict) hoặc theo tên (bisect trên tên đã casefold)
+
+Snapshot được nạp lại theo chu kỳ (background) hoặc ngay lần truy cập sau khi invalidate()
+(khi catalog/tồn kho thay đổi). FunctionHandler fallback về SQL khi index chưa sẵn sàng.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+PRODUCTS_QUERY = """
+    SELECT MaSanPham, TenSanPham, NgaySanXuat, NgayHetHan
+    FROM SanPham
+    WHERE IsDeleted = 0 OR IsDeleted IS NULL
+"""
+
+# (MaSanPham, TenSanPham, NgaySanXuat, NgayHetHan) - cùng dạng với row SQL mà FunctionHandler đang format
+ExpiryRow = Tuple[Any, Any, Optional[datetime], Optional[datetime]]
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+class ExpirySnapshot:
+    """Snapshot bất biến: sản phẩm sắp theo ngày hết hạn + chỉ mục theo mã và tên"""
+
+    def __init__(self, rows: List[ExpiryRow], loaded_at: float):
+        self.loaded_at = loaded_at
+        rows = [(row[0], row[1], _as_datetime(row[2]), _as_datetime(row[3])) for row in rows]
+
+        # Theo ngày hết hạn (như ORDER BY NgayHetHan ASC), _ordinals song song để bisect theo ngày
+        dated = sorted((row for row in rows if row[3] is not None), key=lambda row: (row[3], str(row[1] or "")))
+        self._dated: List[ExpiryRow] = dated
+        self._ordinals: List[int] = [row[3].toordinal() for row in dated]
+
+        self._by_id: Dict[str, ExpiryRow] = {str(row[0]).strip(): row for row in rows}
+
+        # Theo tên (như ORDER BY TenSanPham), _names song song để bisect theo tên
+        named = sorted(rows, key=lambda row: str(row[1] or "").casefold())
+        self._named: List[ExpiryRow] = named
+        self._names: List[str] = [str(row[1] or "").casefold() for row in named]
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return {"products": len(self._by_id), "with_expiry": len(self._dated)}
+
+    def expiring_within(self, days: int, today: Optional[date] = None) -> List[ExpiryRow]:
+        """Sản phẩm có ngày hết hạn trong (hôm nay, hôm nay + days] - hết hạn hôm nay thuộc expired()"""
+        today = today or date.today()
+        start = bisect_right(self._ordinals, today.toordinal())
+        end = bisect_right(self._ordinals, today.toordinal() + days)
+        return self._dated[start:end]
+
+    def expired(self, today: Optional[date] = None) -> List[ExpiryRow]:
+        """Sản phẩm đã hết hạn (ngày hết hạn <= hôm nay, như trạng thái "Đã hết hạn" của getProductExpiry)"""
+        today = today or date.today()
+        return self._dated[:bisect_right(self._ordinals, today.toordinal())]
+
+    def by_id(self, product_id: Any) -> Optional[ExpiryRow]:
+        return self._by_id.get(str(product_id).strip())
+
+    def by_name(self, name: str) -> Optional[ExpiryRow]:
+        """
+        Tìm sản phẩm theo tên: trùng tên → tên bắt đầu bằng name (bisect) → tên chứa name (như LIKE '%name%')
+        """
+        query = str(name).strip().casefold()
+        if not query:
+            return None
+        position = bisect_left(self._names, query)
+        if position < len(self._names) and self._names[position].startswith(query):
+            return self._named[position]
+        for i, product_name in enumerate(self._names):
+            if query in product_name:
+                return self._named[i]
+        return None
+
+
+class ExpiryIndex:
+    """
+    Giữ ExpirySnapshot mới nhất
+
+    - snapshot(): lần đầu (hoặc sau invalidate()) nạp đồng bộ, quá REFRESH_SECONDS thì refresh ở background
+    - invalidate(): gọi khi catalog/tồn kho thay đổi
+    """
+
+    def __init__(self, connection_factory: Callable, refresh_seconds: Optional[float] = None):
+        """
+        Args:
+            connection_factory: Hàm trả về connection (context manager) tới database
+            refresh_seconds: Tuổi tối đa của snapshot (mặc định EXPIRY_INDEX_REFRESH_SECONDS)
+        """
+        self.connection_factory = connection_factory
+        self.refresh_seconds = Settings.EXPIRY_INDEX_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._snapshot: Optional[ExpirySnapshot] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._last_failure = 0.0
+        self._invalidations = 0
+
+    def snapshot(self) -> Optional[ExpirySnapshot]:
+        """Snapshot hiện tại (None nếu chưa nạp được dữ liệu)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            if time.time() - self._last_failure < self.refresh_seconds:
+                return None
+            try:
+                return self.refresh()
+            except Exception as e:
+                self._last_failure = time.time()
+                logger.warning(f"⚠️ Không nạp được expiry index, dùng SQL: {str(e)}")
+                return None
+        if time.time() - snapshot.loaded_at > self.refresh_seconds:
+            self._refresh_in_background()
+        return snapshot
+
+    def invalidate(self) -> None:
+        """Bỏ snapshot hiện tại - lần truy cập tiếp theo nạp lại từ database"""
+        self._snapshot = None
+        self._last_failure = 0.0
+        self._invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "loaded": snapshot is not None,
+            "age_seconds": round(time.time() - snapshot.loaded_at, 1) if snapshot else None,
+            "invalidations": self._invalidations,
+            **(snapshot.counts if snapshot else {}),
+        }
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"⚠️ Refresh expiry index lỗi, giữ snapshot cũ: {str(e)}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="expiry-index-refresh", daemon=True).start()
+
+    def refresh(self) -> ExpirySnapshot:
+        """Nạp lại toàn bộ sản phẩm từ database và đổi sang snapshot mới"""
+        start = time.time()
+        generation = self._invalidations
+        with self.connection_factory() as conn:
+            cursor = conn.cursor()
+            cursor.execute(PRODUCTS_QUERY)
+            rows = cursor.fetchall()
+            cursor.close()
+        snapshot = ExpirySnapshot([tuple(row) for row in rows], loaded_at=time.time())
+        # Bị invalidate trong lúc đang đọc: không giữ snapshot có thể đã cũ
+        if generation == self._invalidations:
+            self._snapshot = snapshot
+        logger.info(f"📅 Expiry index refresh: {snapshot.counts} in {time.time() - start:.2f}s")
+        return snapshot
@@ -1,146 +1,106 @@
+import asyncio
+import contextvars
 import json
 import logging
 import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
-from contextlib import contextmanager
 from functools import lru_cache
-import pyodbc
 import hashlib
 
+from app.core.cache import get_cache
+from app.core.settings import Settings
+from app.core.tracing import span
+from app.infrastructure.database import Database, SqlServerDatabase
+from app.services.function.expiry_index import ExpiryIndex, ExpirySnapshot
+from app.services.function.order_analytics import OrderAnalytics, OrderSnapshot
+from app.services.function.query_builder import (
+    DISTINCT_STATUSES_QUERY,
+    OrderStatusCatalog,
+    QueryStats,
+    day_range,
+    in_predicate,
+    range_predicate,
+    year_range,
+)
+
 logger = logging.getLogger(__name__)
 
-# ⚡ Cache cho function results (TTL: 5 phút)
-_function_cache: Dict[str, tuple] = {}  # key: (result, expiry_time)
-CACHE_TTL_SECONDS = 300  # 5 phút
+# ⚡ Cache cho function results - nằm trong cache registry để có giới hạn và stats
+# Change events (/api/events) invalidate theo function name nên TTL có thể đặt dài
+CACHE_TTL_SECONDS = Settings.FUNCTION_CACHE_TTL_SECONDS
+_function_cache = get_cache("function_results", ttl_seconds=CACHE_TTL_SECONDS)
+
+# Deadline (giây) cho các query của function call đang chạy (đặt bởi execute_function_threaded)
+_query_timeout: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("function_query_timeout", default=None)
+# Event loop riêng, tồn tại suốt đời worker thread của executor
+_worker_loop = threading.local()
+
+
+def _init_worker_loop() -> None:
+    _worker_loop.loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop.loop)
 
 
 class FunctionHandler:
     """Handler để xử lý các function calls từ AI"""
     
-    def __init__(self, connection_string: str):
+    def __init__(self, connection_string: str = "", database: Optional[Database] = None):
         """
-        Khởi tạo Function Handler với connection string
+        Khởi tạo Function Handler
+        
+        Args:
+            connection_string: Connection string SQL Server (.NET hoặc ODBC format)
+            database: Database backend (ví dụ SqliteDatabase offline) - ưu tiên hơn connection_string
         """
-        if not connection_string:
-            raise ValueError("Connection string không được để trống")
-        # Convert connection string sang ODBC format nếu cần
-        self.connection_string = self._convert_to_odbc_connection_string(connection_string)
-        logger.info("FunctionHandler initialized successfully")
+        if database is None:
+            if not connection_string:
+                raise ValueError("Connection string không được để trống")
+            database = SqlServerDatabase(connection_string)
+        self.database = database
+        # Cú pháp SQL (MONTH(), TOP/LIMIT, ...) theo database đang kết nối
+        self.dialect = database.dialect
+        # Thời gian từng query theo tên (/api/functions/query-stats)
+        self.query_stats = QueryStats()
+        # Giá trị TrangThai thực tế đã phân loại → predicates IN (...) thay vì LIKE '%...%'
+        self.order_statuses = OrderStatusCatalog(self._load_order_statuses)
+        # Thread pool chạy function calls song song (tạo khi cần)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # Doanh thu/top sản phẩm/tồn kho trả lời từ snapshot cột trong bộ nhớ thay vì aggregate SQL
+        # (nạp snapshot dùng database.connect trực tiếp: không bị deadline của function call đang chạy)
+        self.analytics: Optional[OrderAnalytics] = (
+            OrderAnalytics(self.database.connect) if Settings.ORDER_ANALYTICS_ENABLED else None
+        )
+        # Hạn sử dụng sản phẩm trả lời từ index sắp theo ngày (bisect) thay vì query SanPham mỗi lần
+        self.expiry_index: Optional[ExpiryIndex] = (
+            ExpiryIndex(self.database.connect) if Settings.EXPIRY_INDEX_ENABLED else None
+        )
+        logger.info(f"FunctionHandler initialized successfully ({database.name})")
     
-    def _convert_to_odbc_connection_string(self, conn_str: str) -> str:
-        """
-        Convert connection string từ .NET format sang ODBC format
+    def _get_connection(self):
+        """Context manager để quản lý database connection (áp deadline của function call, nếu có)"""
+        return self.database.connect(query_timeout=_query_timeout.get())
+    
+    def ping(self) -> str:
         """
-        if "DRIVER=" in conn_str.upper():
-            return conn_str
+        Mở một kết nối và chạy SELECT 1 (dùng cho warm-up/readiness)
         
-        # Parse .NET format connection string
-        params = {}
-        
-        # Split theo dấu ; và parse từng phần
-        parts = [p.strip() for p in conn_str.split(';') if p.strip()]
-        for part in parts:
-            if '=' in part:
-                key, value = part.split('=', 1)
-                key = key.strip().lower()
-                value = value.strip()
-                params[key] = value
-        
-        # Map .NET parameters sang ODBC parameters
-        server = params.get('server', '')
-        database = params.get('database', '')
-        user_id = params.get('user id', params.get('uid', ''))
-        password = params.get('password', params.get('pwd', ''))
-        trust_cert = params.get('trustservercertificate', 'True').lower() == 'true'
-        
-        # Thử các driver theo thứ tự ưu tiên
-        drivers_to_try = [
-            "ODBC Driver 18 for SQL Server",
-            "ODBC Driver 17 for SQL Server",
-            "SQL Server Native Client 11.0",
-            "SQL Server"
-        ]
-        
-        # Tạo connection string với driver đầu tiên
-        # Nếu không kết nối được, sẽ thử các driver khác trong _get_connection
-        driver = drivers_to_try[0]
-        
-        odbc_conn_str = f"DRIVER={{{driver}}};SERVER={server};DATABASE={database};"
-        if user_id:
-            odbc_conn_str += f"UID={user_id};PWD={password};"
-        if trust_cert:
-            odbc_conn_str += "TrustServerCertificate=yes;"
-        
-        return odbc_conn_str
+        Returns:
+            Tên ODBC driver đã kết nối được (SQL Server) hoặc tên backend
+        """
+        return self.database.ping()
     
-    @contextmanager
-    def _get_connection(self):
-        """Context manager để quản lý database connection"""
-        conn = None
-        
-        # Danh sách các driver để thử
-        drivers_to_try = [
-            "ODBC Driver 18 for SQL Server",
-            "ODBC Driver 17 for SQL Server",
-            "SQL Server Native Client 11.0",
-            "SQL Server"
-        ]
-        
-        # Parse connection string để lấy các tham số
-        params = {}
-        # Split theo dấu ; và parse từng phần
-        parts = [p.strip() for p in self.connection_string.split(';') if p.strip()]
-        for part in parts:
-            if '=' in part:
-                key, value = part.split('=', 1)
-                key = key.strip().lower()
-                value = value.strip()
-                params[key] = value
-        
-        server = params.get('server', '')
-        database = params.get('database', '')
-        user_id = params.get('uid', '')
-        password = params.get('pwd', '')
-        trust_cert = params.get('trustservercertificate', 'yes')
-        
-        # Thử kết nối với các driver khác nhau
-        last_error = None
-        for driver in drivers_to_try:
-            try:
-                # Tạo connection string với driver hiện tại
-                conn_str = f"DRIVER={{{driver}}};SERVER={server};DATABASE={database};"
-                if user_id:
-                    conn_str += f"UID={user_id};PWD={password};"
-                if trust_cert:
-                    conn_str += "TrustServerCertificate=yes;"
-                
-                logger.info(f"Đang thử kết nối với driver: {driver}")
-                conn = pyodbc.connect(conn_str, timeout=10)
-                logger.info(f"Kết nối thành công với driver: {driver}")
-                break
-            except pyodbc.Error as e:
-                last_error = e
-                logger.warning(f"Không thể kết nối với driver {driver}: {str(e)}")
-                if conn:
-                    conn.close()
-                    conn = None
-                continue
-        
-        if conn is None:
-            error_msg = f"Không thể kết nối database với bất kỳ driver nào. Lỗi cuối cùng: {str(last_error)}"
-            logger.error(error_msg)
-            raise pyodbc.Error(error_msg)
-        
-        try:
-            yield conn
-        except pyodbc.Error as e:
-            logger.error(f"Database connection error: {str(e)}", exc_info=True)
-            raise
-        finally:
-            if conn:
-                conn.close()
+    def shutdown(self) -> None:
+        """Dừng thread pool chạy function calls (server shutdown)"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
     
     async def execute_function(self, function_name: str, arguments: Dict[str, Any]) -> str:
         """
@@ -153,6 +113,7 @@ class FunctionHandler:
             function_map = {
                 "getProductExpiry": self._get_product_expiry,
                 "getProductsExpiringSoon": self._get_products_expiring_soon,
+                "getExpiredProducts": self._get_expired_products,
                 "getMonthlyRevenue": self._get_monthly_revenue,
                 "getRevenueStatistics": self._get_revenue_statistics,
                 "getProductMonthlyRevenue": self._get_product_monthly_revenue,  # Doanh thu theo product_id
@@ -173,7 +134,8 @@ class FunctionHandler:
                     "availableFunctions": list(function_map.keys())
                 }, ensure_ascii=False)
             
-            result = await handler(arguments)
+            with span(f"sql.{function_name}"):
+                result = await handler(arguments)
             return result
             
         except Exception as ex:
@@ -182,6 +144,86 @@ class FunctionHandler:
                 "error": f"Lỗi khi thực thi function {function_name}: {str(ex)}"
             }, ensure_ascii=False)
     
+    def _execute(self, cursor, name: str, query: str, *params) -> None:
+        """
+        cursor.execute có đo thời gian (QueryStats theo name)
+        params: một list/tuple hoặc các giá trị riêng lẻ như pyodbc
+        """
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = tuple(params[0])
+        start = time.perf_counter()
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        self.query_stats.record(name, (time.perf_counter() - start) * 1000)
+    
+    def _load_order_statuses(self) -> List[str]:
+        """Các giá trị TrangThai distinct trong DonHang"""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            self._execute(cursor, "orderStatuses", DISTINCT_STATUSES_QUERY)
+            rows = cursor.fetchall()
+            cursor.close()
+        return [row[0] for row in rows]
+    
+    def _analytics_snapshot(self) -> Optional[OrderSnapshot]:
+        """Snapshot order analytics (None = tắt hoặc chưa nạp được → dùng SQL)"""
+        if self.analytics is None:
+            return None
+        return self.analytics.snapshot()
+    
+    def _expiry_snapshot(self) -> Optional[ExpirySnapshot]:
+        """Snapshot expiry index (None = tắt hoặc chưa nạp được → dùng SQL)"""
+        if self.expiry_index is None:
+            return None
+        return self.expiry_index.snapshot()
+    
+    def invalidate_catalog(self) -> None:
+        """Gọi khi sản phẩm/tồn kho thay đổi: expiry index nạp lại, order analytics refresh ở lần truy cập sau"""
+        if self.expiry_index is not None:
+            self.expiry_index.invalidate()
+        if self.analytics is not None:
+            self.analytics.invalidate()
+    
+    async def execute_function_threaded(
+        self,
+        function_name: str,
+        arguments: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> str:
+        """
+        execute_function trong thread pool riêng
+        
+        Các handler dùng pyodbc đồng bộ nên nhiều calls trong cùng event loop vẫn chạy tuần tự;
+        mỗi call ở đây chạy trên event loop tồn tại suốt đời của một worker thread (state gắn với loop
+        như cache single-flight, asyncio locks vẫn hợp lệ giữa các calls) → các queries SQL chạy song song
+        
+        Args:
+            timeout: Deadline (giây) cho các query của call (mặc định TOOL_CALL_TIMEOUT_SECONDS, 0 = không giới hạn).
+                     Call bị hủy trước khi bắt đầu thì không chạy; query quá hạn bị driver hủy nên
+                     call đã timeout không giữ worker thread
+        """
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=Settings.TOOL_EXECUTOR_WORKERS,
+                        thread_name_prefix="function-call",
+                        initializer=_init_worker_loop
+                    )
+        if timeout is None:
+            timeout = Settings.TOOL_CALL_TIMEOUT_SECONDS
+        loop = asyncio.get_running_loop()
+        # Copy context để span SQL trong worker thread vẫn thuộc trace của request
+        context = contextvars.copy_context()
+        context.run(_query_timeout.set, timeout if timeout > 0 else None)
+        
+        def run() -> str:
+            return context.run(_worker_loop.loop.run_until_complete, self.execute_function(function_name, arguments))
+        
+        return await loop.run_in_executor(self._executor, run)
+    
     async def _get_product_expiry(self, args: Dict[str, Any]) -> str:
         """Lấy thông tin hạn sử dụng của sản phẩm"""
         try:
@@ -193,27 +235,31 @@ class FunctionHandler:
                     "error": "Cần cung cấp productName hoặc productId"
                 }, ensure_ascii=False)
             
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                
-                if product_id:
-                    query = """
-                        SELECT MaSanPham, TenSanPham, NgaySanXuat, NgayHetHan
-                        FROM SanPham
-                        WHERE MaSanPham = ? AND (IsDeleted = 0 OR IsDeleted IS NULL)
-                    """
-                    cursor.execute(query, product_id)
-                else:
-                    query = """
-                        SELECT MaSanPham, TenSanPham, NgaySanXuat, NgayHetHan
-                        FROM SanPham
-                        WHERE TenSanPham LIKE ? AND (IsDeleted = 0 OR IsDeleted IS NULL)
-                        ORDER BY TenSanPham
-                    """
-                    cursor.execute(query, f"%{product_name}%")
-                
-                row = cursor.fetchone()
-                cursor.close()
+            snapshot = self._expiry_snapshot()
+            if snapshot is not None:
+                row = snapshot.by_id(product_id) if product_id else snapshot.by_name(product_name)
+            else:
+                with self._get_connection() as conn:
+                    cursor = conn.cursor()
+                    
+                    if product_id:
+                        query = """
+                            SELECT MaSanPham, TenSanPham, NgaySanXuat, NgayHetHan
+                            FROM SanPham
+                            WHERE MaSanPham = ? AND (IsDeleted = 0 OR IsDeleted IS NULL)
+                        """
+                        self._execute(cursor, "getProductExpiry.byId", query, product_id)
+                    else:
+                        query = """
+                            SELECT MaSanPham, TenSanPham, NgaySanXuat, NgayHetHan
+                            FROM SanPham
+                            WHERE TenSanPham LIKE ? AND (IsDeleted = 0 OR IsDeleted IS NULL)
+                            ORDER BY TenSanPham
+                        """
+                        self._execute(cursor, "getProductExpiry.byName", query, f"%{product_name}%")
+                    
+                    row = cursor.fetchone()
+                    cursor.close()
             
             if not row:
                 return json.dumps({
@@ -260,24 +306,31 @@ class FunctionHandler:
             if not isinstance(days, int) or days < 1:
                 days = 7
             
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                
-                cutoff_date = datetime.now().date() + timedelta(days=days)
-                
-                query = """
-                    SELECT MaSanPham, TenSanPham, NgaySanXuat, NgayHetHan
-                    FROM SanPham
-                    WHERE NgayHetHan IS NOT NULL
-                        AND CAST(NgayHetHan AS DATE) <= ?
-                        AND CAST(NgayHetHan AS DATE) >= CAST(GETDATE() AS DATE)
-                        AND (IsDeleted = 0 OR IsDeleted IS NULL)
-                    ORDER BY NgayHetHan ASC
-                """
-                
-                cursor.execute(query, cutoff_date)
-                rows = cursor.fetchall()
-                cursor.close()
+            snapshot = self._expiry_snapshot()
+            if snapshot is not None:
+                rows = snapshot.expiring_within(days)
+            else:
+                with self._get_connection() as conn:
+                    cursor = conn.cursor()
+                    
+                    # [ngày mai, hôm nay + days + 1 ngày) - seek được index trên NgayHetHan
+                    # (hết hạn hôm nay đã tính là "Đã hết hạn", như getProductExpiry/getExpiredProducts)
+                    today = datetime.now().date()
+                    expiry_condition, params = range_predicate(
+                        "NgayHetHan", *day_range(today + timedelta(days=1), today + timedelta(days=days))
+                    )
+                    
+                    query = f"""
+                        SELECT MaSanPham, TenSanPham, NgaySanXuat, NgayHetHan
+                        FROM SanPham
+                        WHERE {expiry_condition}
+                            AND (IsDeleted = 0 OR IsDeleted IS NULL)
+                        ORDER BY NgayHetHan ASC
+                    """
+                    
+                    self._execute(cursor, "getProductsExpiringSoon", query, params)
+                    rows = cursor.fetchall()
+                    cursor.close()
             
             products = []
             now = datetime.now().date()
@@ -309,6 +362,61 @@ class FunctionHandler:
                 "error": f"Lỗi khi lấy danh sách sản phẩm sắp hết hạn: {str(ex)}"
             }, ensure_ascii=False)
     
+    async def _get_expired_products(self, args: Dict[str, Any]) -> str:
+        """Lấy danh sách sản phẩm đã hết hạn"""
+        try:
+            limit = args.get("limit", 50)
+            if not isinstance(limit, int) or limit < 1:
+                limit = 50
+            
+            snapshot = self._expiry_snapshot()
+            if snapshot is not None:
+                rows = snapshot.expired()
+            else:
+                with self._get_connection() as conn:
+                    cursor = conn.cursor()
+                    
+                    # Hết hạn trước ngày mai
+                    expiry_condition, params = range_predicate("NgayHetHan", *day_range(None, datetime.now().date()))
+                    
+                    query = f"""
+                        SELECT MaSanPham, TenSanPham, NgaySanXuat, NgayHetHan
+                        FROM SanPham
+                        WHERE {expiry_condition}
+                            AND (IsDeleted = 0 OR IsDeleted IS NULL)
+                        ORDER BY NgayHetHan ASC
+                    """
+                    
+                    self._execute(cursor, "getExpiredProducts", query, params)
+                    rows = cursor.fetchall()
+                    cursor.close()
+            
+            now = datetime.now().date()
+            products = [
+                {
+                    "maSanPham": ma_san_pham,
+                    "tenSanPham": ten_san_pham,
+                    "ngaySanXuat": ngay_san_xuat.strftime("%d/%m/%Y") if ngay_san_xuat else None,
+                    "ngayHetHan": ngay_het_han.strftime("%d/%m/%Y"),
+                    "daysRemaining": (ngay_het_han.date() - now).days,
+                    "status": "Đã hết hạn"
+                }
+                for ma_san_pham, ten_san_pham, ngay_san_xuat, ngay_het_han in rows[-limit:]
+            ]
+            
+            result = {
+                "totalProducts": len(rows),
+                "products": products
+            }
+            
+            return json.dumps(result, ensure_ascii=False)
+            
+        except Exception as ex:
+            logger.error(f"Error in _get_expired_products: {str(ex)}", exc_info=True)
+            return json.dumps({
+                "error": f"Lỗi khi lấy danh sách sản phẩm đã hết hạn: {str(ex)}"
+            }, ensure_ascii=False)
+    
     async def _get_monthly_revenue(self, args: Dict[str, Any]) -> str:
         """Lấy doanh thu theo tháng trong năm"""
         try:
@@ -318,26 +426,31 @@ class FunctionHandler:
             elif not isinstance(year, int) or year < 2000 or year > 2100:
                 year = datetime.now().year
             
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                
-                query = """
-                    SELECT 
-                        MONTH(dh.NgayDat) as Thang,
-                        ISNULL(SUM(od.GiaBan * od.SoLuong), 0) as DoanhThu
-                    FROM DonHang dh
-                    LEFT JOIN ChiTietDonHang od ON dh.MaDonHang = od.MaDonHang
-                    WHERE YEAR(dh.NgayDat) = ?
-                        AND (dh.TrangThai IN (N'Hoàn thành', N'Đã giao hàng', 'completed', 'completed')
-                             OR dh.TrangThai LIKE '%complete%'
-                             OR dh.TrangThai LIKE '%Complete%')
-                    GROUP BY MONTH(dh.NgayDat)
-                    ORDER BY MONTH(dh.NgayDat)
-                """
-                
-                cursor.execute(query, year)
-                rows = cursor.fetchall()
-                cursor.close()
+            snapshot = self._analytics_snapshot()
+            if snapshot is not None:
+                rows = snapshot.monthly_revenue(year)
+            else:
+                date_condition, date_params = range_predicate("dh.NgayDat", *year_range(year))
+                status_condition, status_params = in_predicate("dh.TrangThai", self.order_statuses.completed)
+                month = self.dialect.month("dh.NgayDat")
+                with self._get_connection() as conn:
+                    cursor = conn.cursor()
+                    
+                    query = f"""
+                        SELECT 
+                            {month} as Thang,
+                            COALESCE(SUM(od.GiaBan * od.SoLuong), 0) as DoanhThu
+                        FROM DonHang dh
+                        LEFT JOIN ChiTietDonHang od ON dh.MaDonHang = od.MaDonHang
+                        WHERE {date_condition}
+                            AND {status_condition}
+                        GROUP BY {month}
+                        ORDER BY {month}
+                    """
+                    
+                    self._execute(cursor, "getMonthlyRevenue", query, date_params + status_params)
+                    rows = cursor.fetchall()
+                    cursor.close()
             
             monthly_revenue = {}
             for row in rows:
@@ -382,65 +495,60 @@ class FunctionHandler:
             start_date = args.get("startDate")
             end_date = args.get("endDate")
             
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Xây dựng query với điều kiện lọc theo ngày
-                base_condition = ""
-                params = []
-                
-                if start_date:
-                    base_condition += " AND CAST(dh.NgayDat AS DATE) >= ?"
-                    params.append(start_date)
-                
-                if end_date:
-                    base_condition += " AND CAST(dh.NgayDat AS DATE) <= ?"
-                    params.append(end_date)
-                
-                # Query cho doanh thu
-                revenue_query = f"""
-                    SELECT 
-                        ISNULL(SUM(od.GiaBan * od.SoLuong), 0) as TongDoanhThu,
-                        COUNT(DISTINCT dh.MaDonHang) as TongDonHang,
-                        COUNT(DISTINCT dh.MaTaiKhoan) as TongKhachHang
-                    FROM DonHang dh
-                    LEFT JOIN ChiTietDonHang od ON dh.MaDonHang = od.MaDonHang
-                    WHERE (dh.TrangThai IN (N'Hoàn thành', N'Đã giao hàng')
-                           OR dh.TrangThai LIKE '%complete%'
-                           OR dh.TrangThai LIKE '%Complete%')
-                        {base_condition}
-                """
-                
-                cursor.execute(revenue_query, params)
-                row = cursor.fetchone()
-                
-                tong_doanh_thu = float(row[0]) if row else 0
-                tong_don_hang = row[1] if row else 0
-                tong_khach_hang = row[2] if row else 0
-                
-                # Query cho số đơn thành công và bị hủy
-                status_query = f"""
-                    SELECT 
-                        SUM(CASE WHEN (dh.TrangThai IN (N'Hoàn thành', N'Đã giao hàng')
-                                          OR dh.TrangThai LIKE '%complete%'
-                                          OR dh.TrangThai LIKE '%Complete%') THEN 1 ELSE 0 END) as DonThanhCong,
-                        SUM(CASE WHEN (dh.TrangThai LIKE N'%hủy%' 
-                                          OR dh.TrangThai LIKE N'%Hủy%'
-                                          OR dh.TrangThai LIKE '%cancel%'
-                                          OR dh.TrangThai LIKE '%Cancel%'
-                                          OR dh.TrangThai LIKE '%cancelled%'
-                                          OR dh.TrangThai LIKE '%Cancelled%') THEN 1 ELSE 0 END) as DonBiHuy
-                    FROM DonHang dh
-                    WHERE 1=1 {base_condition}
-                """
-                
-                cursor.execute(status_query, params)
-                row = cursor.fetchone()
-                
-                don_thanh_cong = row[0] if row and row[0] else 0
-                don_bi_huy = row[1] if row and row[1] else 0
-                
-                cursor.close()
+            snapshot = self._analytics_snapshot()
+            if snapshot is not None:
+                (tong_doanh_thu, tong_don_hang, tong_khach_hang), (don_thanh_cong, don_bi_huy) = \
+                    snapshot.revenue_statistics(start_date, end_date)
+            else:
+                # Khoảng ngày nửa mở [startDate, endDate + 1 ngày) - seek được index trên NgayDat
+                date_condition, date_params = range_predicate("dh.NgayDat", *day_range(start_date, end_date))
+                completed = self.order_statuses.completed
+                cancelled = self.order_statuses.cancelled
+                completed_condition, completed_params = in_predicate("dh.TrangThai", completed)
+                cancelled_condition, cancelled_params = in_predicate("dh.TrangThai", cancelled)
+                counted_condition, counted_params = in_predicate("dh.TrangThai", sorted(set(completed) | set(cancelled)))
+                with self._get_connection() as conn:
+                    cursor = conn.cursor()
+                    
+                    # Query cho doanh thu
+                    revenue_query = f"""
+                        SELECT 
+                            COALESCE(SUM(od.GiaBan * od.SoLuong), 0) as TongDoanhThu,
+                            COUNT(DISTINCT dh.MaDonHang) as TongDonHang,
+                            COUNT(DISTINCT dh.MaTaiKhoan) as TongKhachHang
+                        FROM DonHang dh
+                        LEFT JOIN ChiTietDonHang od ON dh.MaDonHang = od.MaDonHang
+                        WHERE {completed_condition}
+                            AND {date_condition}
+                    """
+                    
+                    self._execute(cursor, "getRevenueStatistics.revenue", revenue_query, completed_params + date_params)
+                    row = cursor.fetchone()
+                    
+                    tong_doanh_thu = float(row[0]) if row else 0
+                    tong_don_hang = row[1] if row else 0
+                    tong_khach_hang = row[2] if row else 0
+                    
+                    # Query cho số đơn thành công và bị hủy
+                    status_query = f"""
+                        SELECT 
+                            SUM(CASE WHEN {completed_condition} THEN 1 ELSE 0 END) as DonThanhCong,
+                            SUM(CASE WHEN {cancelled_condition} THEN 1 ELSE 0 END) as DonBiHuy
+                        FROM DonHang dh
+                        WHERE {counted_condition}
+                            AND {date_condition}
+                    """
+                    
+                    self._execute(
+                        cursor, "getRevenueStatistics.status", status_query,
+                        completed_params + cancelled_params + counted_params + date_params
+                    )
+                    row = cursor.fetchone()
+                    
+                    don_thanh_cong = row[0] if row and row[0] else 0
+                    don_bi_huy = row[1] if row and row[1] else 0
+                    
+                    cursor.close()
             
             result = {
                 "tongDoanhThu": tong_doanh_thu,
@@ -464,28 +572,25 @@ class FunctionHandler:
         # Sort args để đảm bảo cùng arguments tạo cùng key
         sorted_args = json.dumps(args, sort_keys=True, ensure_ascii=False)
         cache_str = f"{function_name}:{sorted_args}"
-        return hashlib.md5(cache_str.encode()).hexdigest()
+        # Giữ function name ở đầu key để invalidate theo function
+        return f"{function_name}:{hashlib.md5(cache_str.encode()).hexdigest()}"
     
     def _get_cached_result(self, cache_key: str) -> Optional[str]:
         """Lấy kết quả từ cache nếu còn hiệu lực"""
-        global _function_cache
-        if cache_key in _function_cache:
-            result, expiry_time = _function_cache[cache_key]
-            if datetime.now() < expiry_time:
-                logger.debug(f"✅ Cache hit for key: {cache_key[:8]}...")
-                return result
-            else:
-                # Cache expired
-                del _function_cache[cache_key]
-                logger.debug(f"⏰ Cache expired for key: {cache_key[:8]}...")
-        return None
+        result = _function_cache.get(cache_key)
+        if result is not None:
+            logger.debug(f"✅ Cache hit for key: {cache_key}")
+        return result
     
     def _set_cached_result(self, cache_key: str, result: str, ttl_seconds: int = CACHE_TTL_SECONDS):
         """Lưu kết quả vào cache"""
-        global _function_cache
-        expiry_time = datetime.now() + timedelta(seconds=ttl_seconds)
-        _function_cache[cache_key] = (result, expiry_time)
-        logger.debug(f"💾 Cached result for key: {cache_key[:8]}... (TTL: {ttl_seconds}s)")
+        _function_cache.set(cache_key, result, ttl_seconds=ttl_seconds)
+        logger.debug(f"💾 Cached result for key: {cache_key} (TTL: {ttl_seconds}s)")
+    
+    def invalidate_function_results(self, function_names) -> int:
+        """Xóa kết quả đã cache của các functions, trả về số entries đã xóa"""
+        names = set(function_names)
+        return _function_cache.invalidate_where(lambda key: str(key).split(":", 1)[0] in names)
     
     async def _get_product_monthly_revenue(self, args: Dict[str, Any]) -> str:
         """Lấy doanh thu theo tháng của một sản phẩm cụ thể (⚡ CACHED)"""
@@ -509,40 +614,49 @@ class FunctionHandler:
             if cached_result:
                 return cached_result
             
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Query doanh thu theo tháng của sản phẩm
-                query = """
-                    SELECT 
-                        MONTH(dh.NgayDat) as Thang,
-                        ISNULL(SUM(od.GiaBan * od.SoLuong), 0) as DoanhThu,
-                        ISNULL(SUM(od.SoLuong), 0) as SoLuongBan
-                    FROM DonHang dh
-                    INNER JOIN ChiTietDonHang od ON dh.MaDonHang = od.MaDonHang
-                    WHERE YEAR(dh.NgayDat) = ?
-                        AND od.MaSanPham = ?
-                        AND (dh.TrangThai IN (N'Hoàn thành', N'Đã giao hàng', 'completed', 'completed')
-                             OR dh.TrangThai LIKE '%complete%'
-                             OR dh.TrangThai LIKE '%Complete%')
-                    GROUP BY MONTH(dh.NgayDat)
-                    ORDER BY MONTH(dh.NgayDat)
-                """
-                
-                cursor.execute(query, (year, product_id))
-                rows = cursor.fetchall()
-                
-                # Lấy tên sản phẩm
-                product_query = """
-                    SELECT TenSanPham
-                    FROM SanPham
-                    WHERE MaSanPham = ? AND (IsDeleted = 0 OR IsDeleted IS NULL)
-                """
-                cursor.execute(product_query, product_id)
-                product_row = cursor.fetchone()
-                product_name = product_row[0] if product_row else "N/A"
-                
-                cursor.close()
+            snapshot = self._analytics_snapshot()
+            if snapshot is not None:
+                rows, product_name = snapshot.product_monthly_revenue(product_id, year)
+                product_name = product_name or "N/A"
+            else:
+                date_condition, date_params = range_predicate("dh.NgayDat", *year_range(year))
+                status_condition, status_params = in_predicate("dh.TrangThai", self.order_statuses.completed)
+                month = self.dialect.month("dh.NgayDat")
+                with self._get_connection() as conn:
+                    cursor = conn.cursor()
+                    
+                    # Query doanh thu theo tháng của sản phẩm
+                    query = f"""
+                        SELECT 
+                            {month} as Thang,
+                            COALESCE(SUM(od.GiaBan * od.SoLuong), 0) as DoanhThu,
+                            COALESCE(SUM(od.SoLuong), 0) as SoLuongBan
+                        FROM DonHang dh
+                        INNER JOIN ChiTietDonHang od ON dh.MaDonHang = od.MaDonHang
+                        WHERE {date_condition}
+                            AND od.MaSanPham = ?
+                            AND {status_condition}
+                        GROUP BY {month}
+                        ORDER BY {month}
+                    """
+                    
+                    self._execute(
+                        cursor, "getProductMonthlyRevenue", query,
+                        date_params + [product_id] + status_params
+                    )
+                    rows = cursor.fetchall()
+                    
+                    # Lấy tên sản phẩm
+                    product_query = """
+                        SELECT TenSanPham
+                        FROM SanPham
+                        WHERE MaSanPham = ? AND (IsDeleted = 0 OR IsDeleted IS NULL)
+                    """
+                    self._execute(cursor, "getProductMonthlyRevenue.productName", product_query, product_id)
+                    product_row = cursor.fetchone()
+                    product_name = product_row[0] if product_row else "N/A"
+                    
+                    cursor.close()
             
             monthly_revenue = {}
             for row in rows:
@@ -613,27 +727,35 @@ class FunctionHandler:
             if not isinstance(limit, int) or limit < 1:
                 limit = 1
             
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                
-                query = f"""
-                    SELECT TOP {limit}
-                        s.MaSanPham,
-                        s.TenSanPham,
-                        s.Anh,
-                        s.GiaBan,
-                        s.SoLuongTon,
-                        ISNULL(SUM(ct.SoLuong), 0) as TongBan
-                    FROM SanPham s
-                    LEFT JOIN ChiTietDonHang ct ON s.MaSanPham = ct.MaSanPham
-                    WHERE (s.IsDeleted = 0 OR s.IsDeleted IS NULL)
-                    GROUP BY s.MaSanPham, s.TenSanPham, s.Anh, s.GiaBan, s.SoLuongTon
-                    ORDER BY TongBan DESC
-                """
-                
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                cursor.close()
+            snapshot = self._analytics_snapshot()
+            if snapshot is not None:
+                rows = [
+                    (p["product_id"], p["product_name"], p["image"], p["price"], p["stock"], p["total_sold"])
+                    for p in snapshot.top_products(limit)
+                ]
+            else:
+                with self._get_connection() as conn:
+                    cursor = conn.cursor()
+                    
+                    query = f"""
+                        SELECT {self.dialect.top(limit)}
+                            s.MaSanPham,
+                            s.TenSanPham,
+                            s.Anh,
+                            s.GiaBan,
+                            s.SoLuongTon,
+                            COALESCE(SUM(ct.SoLuong), 0) as TongBan
+                        FROM SanPham s
+                        LEFT JOIN ChiTietDonHang ct ON s.MaSanPham = ct.MaSanPham
+                        WHERE (s.IsDeleted = 0 OR s.IsDeleted IS NULL)
+                        GROUP BY s.MaSanPham, s.TenSanPham, s.Anh, s.GiaBan, s.SoLuongTon
+                        ORDER BY TongBan DESC
+                        {self.dialect.limit(limit)}
+                    """
+                    
+                    self._execute(cursor, "getBestSellingProductImage", query)
+                    rows = cursor.fetchall()
+                    cursor.close()
             
             if not rows:
                 return json.dumps({
@@ -660,7 +782,8 @@ class FunctionHandler:
                         encoded = urllib.parse.quote(str(anh), safe='')
                         image_url = f"{base_url}/images/products/{encoded}"
                         try:
-                            resp = await client.get(image_url)
+                            with span("image.download"):
+                                resp = await client.get(image_url)
                             if resp.status_code == 200:
                                 image_data = base64.b64encode(resp.content).decode("utf-8")
                                 image_mime_type = resp.headers.get("content-type", "image/jpeg")
@@ -716,13 +839,13 @@ class FunctionHandler:
                         LEFT JOIN DanhMuc dm ON s.MaDanhMuc = dm.MaDanhMuc
                         WHERE s.MaSanPham = ? AND (s.IsDeleted = 0 OR s.IsDeleted IS NULL)
                     """
-                    cursor.execute(query, product_id)
+                    self._execute(cursor, "getProductInfo.byId", query, product_id)
                     rows = cursor.fetchall()
                 else:
                     # Tìm kiếm theo tên sản phẩm - hỗ trợ tìm kiếm linh hoạt hơn
                     # Tìm kiếm không phân biệt hoa thường và hỗ trợ tìm kiếm một phần
-                    query = """
-                        SELECT TOP 5 s.MaSanPham, s.TenSanPham, s.MoTa, s.GiaBan, s.SoLuongTon, 
+                    query = f"""
+                        SELECT {self.dialect.top(5)} s.MaSanPham, s.TenSanPham, s.MoTa, s.GiaBan, s.SoLuongTon, 
                                s.DonViTinh, s.Anh, s.NgaySanXuat, s.NgayHetHan,
                                dm.TenDanhMuc
                         FROM SanPham s
@@ -736,10 +859,11 @@ class FunctionHandler:
                                 ELSE 3  -- Chứa
                             END,
                             s.TenSanPham
+                        {self.dialect.limit(5)}
                     """
                     # Tìm kiếm với nhiều pattern: chính xác, bắt đầu bằng, chứa
                     search_pattern = product_name.strip()
-                    cursor.execute(query, (
+                    self._execute(cursor, "getProductInfo.byName", query, (
                         search_pattern,  # Khớp chính xác
                         f"{search_pattern}%",  # Bắt đầu bằng
                         f"%{search_pattern}%",  # Chứa
@@ -809,7 +933,7 @@ class FunctionHandler:
                     WHERE dh.MaDonHang = ?
                 """
                 
-                cursor.execute(query, order_id)
+                self._execute(cursor, "getOrderStatus", query, order_id)
                 row = cursor.fetchone()
                 cursor.close()
             
@@ -869,23 +993,25 @@ class FunctionHandler:
                         """
                     else:
                         query = f"""
-                            SELECT TOP {limit}
+                            SELECT {self.dialect.top(limit)}
                                 dh.MaDonHang, dh.NgayDat, dh.TrangThai, dh.TongTien
                             FROM DonHang dh
                             WHERE dh.MaTaiKhoan = ?
                             ORDER BY dh.NgayDat DESC
+                            {self.dialect.limit(limit)}
                         """
-                    cursor.execute(query, customer_id)
+                    self._execute(cursor, "getCustomerOrders.byId", query, customer_id)
                 else:
                     query = f"""
-                        SELECT TOP {limit}
+                        SELECT {self.dialect.top(limit)}
                             dh.MaDonHang, dh.NgayDat, dh.TrangThai, dh.TongTien
                         FROM DonHang dh
                         INNER JOIN NguoiDung nd ON dh.MaTaiKhoan = nd.MaTaiKhoan
                         WHERE nd.Email = ?
                         ORDER BY dh.NgayDat DESC
+                        {self.dialect.limit(limit)}
                     """
-                    cursor.execute(query, customer_email)
+                    self._execute(cursor, "getCustomerOrders.byEmail", query, customer_email)
                 
                 rows = cursor.fetchall()
                 cursor.close()
@@ -920,23 +1046,31 @@ class FunctionHandler:
             if not isinstance(limit, int) or limit < 1:
                 limit = 10
             
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                
-                query = f"""
-                    SELECT TOP {limit}
-                        s.MaSanPham, s.TenSanPham, s.GiaBan, s.SoLuongTon,
-                        ISNULL(SUM(ct.SoLuong), 0) as TongBan
-                    FROM SanPham s
-                    LEFT JOIN ChiTietDonHang ct ON s.MaSanPham = ct.MaSanPham
-                    WHERE (s.IsDeleted = 0 OR s.IsDeleted IS NULL)
-                    GROUP BY s.MaSanPham, s.TenSanPham, s.GiaBan, s.SoLuongTon
-                    ORDER BY TongBan DESC
-                """
-                
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                cursor.close()
+            snapshot = self._analytics_snapshot()
+            if snapshot is not None:
+                rows = [
+                    (p["product_id"], p["product_name"], p["price"], p["stock"], p["total_sold"])
+                    for p in snapshot.top_products(limit)
+                ]
+            else:
+                with self._get_connection() as conn:
+                    cursor = conn.cursor()
+                    
+                    query = f"""
+                        SELECT {self.dialect.top(limit)}
+                            s.MaSanPham, s.TenSanPham, s.GiaBan, s.SoLuongTon,
+                            COALESCE(SUM(ct.SoLuong), 0) as TongBan
+                        FROM SanPham s
+                        LEFT JOIN ChiTietDonHang ct ON s.MaSanPham = ct.MaSanPham
+                        WHERE (s.IsDeleted = 0 OR s.IsDeleted IS NULL)
+                        GROUP BY s.MaSanPham, s.TenSanPham, s.GiaBan, s.SoLuongTon
+                        ORDER BY TongBan DESC
+                        {self.dialect.limit(limit)}
+                    """
+                    
+                    self._execute(cursor, "getTopProducts", query)
+                    rows = cursor.fetchall()
+                    cursor.close()
             
             products = []
             for row in rows:
@@ -965,22 +1099,26 @@ class FunctionHandler:
     async def _get_inventory_status(self, args: Dict[str, Any]) -> str:
         """Lấy trạng thái tồn kho"""
         try:
-            with self._get_connection() as conn:
-                cursor = conn.cursor()
-                
-                query = """
-                    SELECT 
-                        COUNT(*) as TongSanPham,
-                        SUM(CASE WHEN SoLuongTon > 0 THEN 1 ELSE 0 END) as ConHang,
-                        SUM(CASE WHEN SoLuongTon = 0 OR SoLuongTon IS NULL THEN 1 ELSE 0 END) as HetHang,
-                        SUM(SoLuongTon) as TongSoLuong
-                    FROM SanPham
-                    WHERE (IsDeleted = 0 OR IsDeleted IS NULL)
-                """
-                
-                cursor.execute(query)
-                row = cursor.fetchone()
-                cursor.close()
+            snapshot = self._analytics_snapshot()
+            if snapshot is not None:
+                row = snapshot.inventory_status()
+            else:
+                with self._get_connection() as conn:
+                    cursor = conn.cursor()
+                    
+                    query = """
+                        SELECT 
+                            COUNT(*) as TongSanPham,
+                            SUM(CASE WHEN SoLuongTon > 0 THEN 1 ELSE 0 END) as ConHang,
+                            SUM(CASE WHEN SoLuongTon = 0 OR SoLuongTon IS NULL THEN 1 ELSE 0 END) as HetHang,
+                            SUM(SoLuongTon) as TongSoLuong
+                        FROM SanPham
+                        WHERE (IsDeleted = 0 OR IsDeleted IS NULL)
+                    """
+                    
+                    self._execute(cursor, "getInventoryStatus", query)
+                    row = cursor.fetchone()
+                    cursor.close()
             
             if not row:
                 return json.dumps({
@@ -1024,23 +1162,25 @@ class FunctionHandler:
                 
                 if category_id:
                     query = f"""
-                        SELECT TOP {limit}
+                        SELECT {self.dialect.top(limit)}
                             s.MaSanPham, s.TenSanPham, s.GiaBan, s.SoLuongTon, s.Anh
                         FROM SanPham s
                         WHERE s.MaDanhMuc = ? AND (s.IsDeleted = 0 OR s.IsDeleted IS NULL)
                         ORDER BY s.TenSanPham
+                        {self.dialect.limit(limit)}
                     """
-                    cursor.execute(query, category_id)
+                    self._execute(cursor, "getCategoryProducts.byId", query, category_id)
                 else:
                     query = f"""
-                        SELECT TOP {limit}
+                        SELECT {self.dialect.top(limit)}
                             s.MaSanPham, s.TenSanPham, s.GiaBan, s.SoLuongTon, s.Anh
                         FROM SanPham s
                         INNER JOIN DanhMuc dm ON s.MaDanhMuc = dm.MaDanhMuc
                         WHERE dm.TenDanhMuc LIKE ? AND (s.IsDeleted = 0 OR s.IsDeleted IS NULL)
                         ORDER BY s.TenSanPham
+                        {self.dialect.limit(limit)}
                     """
-                    cursor.execute(query, f"%{category_name}%")
+                    self._execute(cursor, "getCategoryProducts.byName", query, f"%{category_name}%")
                 
                 rows = cursor.fetchall()
                 cursor.close()
@@ -1086,17 +1226,20 @@ class FunctionHandler:
             if not isinstance(limit, int) or limit < 1:
                 limit = 20
             
+            # Thời điểm hiện tại truyền làm tham số (thay vì GETDATE()) - chạy được trên mọi dialect
+            now = datetime.now()
+            
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
                 # Query lấy khuyến mãi đang hoạt động
                 if product_id:
                     # Lấy khuyến mãi cho sản phẩm cụ thể hoặc khuyến mãi cho tất cả (MaSanPham = 'ALL')
-                    query = """
-                        SELECT TOP (?)
+                    query = f"""
+                        SELECT {self.dialect.top(limit)}
                             km.Id_sale,
                             km.GiaTriKhuyenMai,
-                            ISNULL(km.LoaiGiaTri, 'Amount') as LoaiGiaTri,
+                            COALESCE(km.LoaiGiaTri, 'Amount') as LoaiGiaTri,
                             km.MoTaChuongTrinh,
                             km.NgayBatDau,
                             km.NgayKetThuc,
@@ -1106,19 +1249,20 @@ class FunctionHandler:
                         FROM KhuyenMai km
                         LEFT JOIN SanPham sp ON km.MaSanPham = sp.MaSanPham
                         WHERE km.TrangThai = 'Active'
-                            AND km.NgayBatDau <= GETDATE()
-                            AND km.NgayKetThuc >= GETDATE()
+                            AND km.NgayBatDau <= ?
+                            AND km.NgayKetThuc >= ?
                             AND (km.MaSanPham = ? OR km.MaSanPham = 'ALL')
                         ORDER BY km.NgayBatDau DESC
+                        {self.dialect.limit(limit)}
                     """
-                    cursor.execute(query, limit, product_id)
+                    self._execute(cursor, "getActivePromotions.byProduct", query, now, now, product_id)
                 else:
                     # Lấy tất cả khuyến mãi đang hoạt động
                     query = f"""
-                        SELECT TOP {limit}
+                        SELECT {self.dialect.top(limit)}
                             km.Id_sale,
                             km.GiaTriKhuyenMai,
-                            ISNULL(km.LoaiGiaTri, 'Amount') as LoaiGiaTri,
+                            COALESCE(km.LoaiGiaTri, 'Amount') as LoaiGiaTri,
                             km.MoTaChuongTrinh,
                             km.NgayBatDau,
                             km.NgayKetThuc,
@@ -1128,11 +1272,12 @@ class FunctionHandler:
                         FROM KhuyenMai km
                         LEFT JOIN SanPham sp ON km.MaSanPham = sp.MaSanPham
                         WHERE km.TrangThai = 'Active'
-                            AND km.NgayBatDau <= GETDATE()
-                            AND km.NgayKetThuc >= GETDATE()
+                            AND km.NgayBatDau <= ?
+                            AND km.NgayKetThuc >= ?
                         ORDER BY km.NgayBatDau DESC
+                        {self.dialect.limit(limit)}
                     """
-                    cursor.execute(query)
+                    self._execute(cursor, "getActivePromotions", query, now, now)
                 
                 rows = cursor.fetchall()
                 cursor.close()
@@ -0,0 +1,499 @@
+"""
+Order Analytics - Engine phân tích đơn hàng dạng cột (NumPy) trong bộ nhớ
+
+DonHang / ChiTietDonHang / SanPham được nạp một lần thành các mảng cột, sau đó:
+- Đơn hàng mới được append tăng dần (theo NgayDat), trạng thái các đơn gần đây được cập nhật lại
+- Doanh thu theo kỳ, top sản phẩm, thống kê trạng thái, tồn kho tính bằng group-by vector hóa
+  (np.bincount / mask) trên snapshot bất biến - không chạm SQL Server khi trả lời câu hỏi
+- Trạng thái đơn (hoàn thành / bị hủy) được phân loại một lần lúc nạp dữ liệu
+
+Kết quả trả về cùng dạng với các dòng SQL mà FunctionHandler đang format,
+FunctionHandler fallback về SQL khi engine chưa sẵn sàng.
+"""
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# Trạng thái đơn được tính là hoàn thành / bị hủy (so khớp không phân biệt hoa thường như LIKE của SQL Server)
+COMPLETED_STATUSES = ("hoàn thành", "đã giao hàng", "completed")
+COMPLETED_KEYWORDS = ("complete",)
+CANCELLED_KEYWORDS = ("hủy", "cancel")
+
+PRODUCTS_QUERY = """
+    SELECT MaSanPham, TenSanPham, Anh, GiaBan, SoLuongTon, IsDeleted
+    FROM SanPham
+"""
+
+ORDERS_QUERY = """
+    SELECT MaDonHang, MaTaiKhoan, NgayDat, TrangThai
+    FROM DonHang
+"""
+
+LINES_QUERY = """
+    SELECT ct.MaDonHang, ct.MaSanPham, ct.SoLuong, ct.GiaBan
+    FROM ChiTietDonHang ct
+"""
+
+
+def classify_order_status(status: Optional[str]) -> Tuple[bool, bool]:
+    """
+    Phân loại trạng thái đơn
+
+    Returns:
+        (is_completed, is_cancelled)
+    """
+    if not status:
+        return False, False
+    text = str(status).strip().casefold()
+    completed = text in COMPLETED_STATUSES or any(keyword in text for keyword in COMPLETED_KEYWORDS)
+    cancelled = any(keyword in text for keyword in CANCELLED_KEYWORDS)
+    return completed, cancelled
+
+
+def _to_day(value: Any) -> np.datetime64:
+    if value is None or value == "":
+        return np.datetime64("NaT", "D")
+    if isinstance(value, datetime):
+        return np.datetime64(value.date(), "D")
+    return np.datetime64(str(value)[:10], "D")
+
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    """NgayDat dạng datetime (pyodbc) hoặc text ISO (SQLite lưu dạng chuỗi)"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    if value is None or value == "":
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value) if value is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class OrderSnapshot:
+    """
+    Snapshot bất biến của dữ liệu phân tích (mọi query chỉ đọc)
+
+    Products/orders được đánh chỉ số ổn định (append-only) nên lines chỉ lưu chỉ số int32.
+    """
+
+    def __init__(
+        self,
+        product_ids: List[str],
+        product_names: np.ndarray,
+        product_images: np.ndarray,
+        product_price: np.ndarray,
+        product_stock: np.ndarray,
+        product_active: np.ndarray,
+        order_day: np.ndarray,
+        order_completed: np.ndarray,
+        order_cancelled: np.ndarray,
+        order_customer: np.ndarray,
+        line_order: np.ndarray,
+        line_product: np.ndarray,
+        line_qty: np.ndarray,
+        line_amount: np.ndarray,
+        loaded_at: float
+    ):
+        self.product_ids = product_ids
+        self.product_index = {product_id: i for i, product_id in enumerate(product_ids)}
+        self.product_names = product_names
+        self.product_images = product_images
+        self.product_price = product_price
+        self.product_stock = product_stock
+        self.product_active = product_active
+        self.order_day = order_day
+        self.order_completed = order_completed
+        self.order_cancelled = order_cancelled
+        self.order_customer = order_customer
+        self.line_order = line_order
+        self.line_product = line_product
+        self.line_qty = line_qty
+        self.line_amount = line_amount
+        self.loaded_at = loaded_at
+
+        # Cột dẫn xuất theo line (tính một lần cho mỗi snapshot)
+        self.line_day = order_day[line_order]
+        self.line_completed = order_completed[line_order]
+        self.line_year = self.line_day.astype("datetime64[Y]").astype(np.int64) + 1970
+        self.line_month = self.line_day.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        self.order_year = order_day.astype("datetime64[Y]").astype(np.int64) + 1970
+        self.order_month = order_day.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        # Tổng số lượng bán theo sản phẩm (mọi trạng thái, như query top products gốc)
+        self.product_qty_total = np.bincount(line_product, weights=line_qty, minlength=len(product_ids))
+        active = np.flatnonzero(product_active)
+        self.top_products_order = active[np.argsort(-self.product_qty_total[active], kind="stable")]
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return {"products": len(self.product_ids), "orders": len(self.order_day), "lines": len(self.line_order)}
+
+    # ========== Doanh thu ==========
+
+    def monthly_revenue(self, year: int) -> List[Tuple[int, float]]:
+        """[(tháng, doanh thu)] của các tháng có đơn hoàn thành trong năm"""
+        order_mask = self.order_completed & (self.order_year == year)
+        months = np.unique(self.order_month[order_mask])
+        line_mask = self.line_completed & (self.line_year == year)
+        revenue = np.bincount(self.line_month[line_mask], weights=self.line_amount[line_mask], minlength=13)
+        return [(int(month), float(revenue[month])) for month in months]
+
+    def product_monthly_revenue(self, product_id: str, year: int) -> Tuple[List[Tuple[int, float, int]], Optional[str]]:
+        """
+        Returns:
+            ([(tháng, doanh thu, số lượng)], tên sản phẩm hoặc None nếu không có/đã xóa)
+        """
+        index = self.product_index.get(str(product_id))
+        if index is None:
+            return [], None
+        line_mask = self.line_completed & (self.line_year == year) & (self.line_product == index)
+        months = self.line_month[line_mask]
+        revenue = np.bincount(months, weights=self.line_amount[line_mask], minlength=13)
+        quantity = np.bincount(months, weights=self.line_qty[line_mask], minlength=13)
+        rows = [(int(month), float(revenue[month]), int(round(quantity[month]))) for month in np.unique(months)]
+        name = self.product_names[index] if self.product_active[index] else None
+        return rows, name
+
+    def revenue_statistics(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Tuple[Tuple[float, int, int], Tuple[int, int]]:
+        """
+        Returns:
+            ((tổng doanh thu, số đơn hoàn thành, số khách hàng), (số đơn thành công, số đơn bị hủy))
+        """
+        order_mask = ~np.isnat(self.order_day) if (start_date or end_date) else np.ones(len(self.order_day), dtype=bool)
+        line_mask = np.ones(len(self.line_order), dtype=bool)
+        if start_date:
+            start = np.datetime64(str(start_date)[:10], "D")
+            order_mask &= self.order_day >= start
+            line_mask &= self.line_day >= start
+        if end_date:
+            end = np.datetime64(str(end_date)[:10], "D")
+            order_mask &= self.order_day <= end
+            line_mask &= self.line_day <= end
+
+        completed = order_mask & self.order_completed
+        line_mask &= self.line_completed
+        customers = self.order_customer[completed]
+        total_revenue = float(self.line_amount[line_mask].sum())
+        total_customers = int(np.unique(customers[customers >= 0]).size)
+        return (
+            (total_revenue, int(completed.sum()), total_customers),
+            (int(completed.sum()), int((order_mask & self.order_cancelled).sum()))
+        )
+
+    # ========== Sản phẩm ==========
+
+    def top_products(self, limit: int) -> List[Dict[str, Any]]:
+        """Top sản phẩm (chưa xóa) theo tổng số lượng đã bán"""
+        return [
+            {
+                "product_id": self.product_ids[i],
+                "product_name": self.product_names[i],
+                "image": self.product_images[i],
+                "price": float(self.product_price[i]) if not np.isnan(self.product_price[i]) else None,
+                "stock": int(self.product_stock[i]) if not np.isnan(self.product_stock[i]) else None,
+                "total_sold": int(round(self.product_qty_total[i])),
+            }
+            for i in self.top_products_order[:limit]
+        ]
+
+    def inventory_status(self) -> Tuple[int, int, int, float]:
+        """(tổng sản phẩm, còn hàng, hết hàng, tổng số lượng tồn) trên các sản phẩm chưa xóa"""
+        stock = self.product_stock[self.product_active]
+        in_stock = int((stock > 0).sum())
+        out_of_stock = int(((stock == 0) | np.isnan(stock)).sum())
+        return int(stock.size), in_stock, out_of_stock, float(np.nansum(stock))
+
+
+class OrderAnalytics:
+    """
+    Quản lý snapshot phân tích đơn hàng
+
+    - snapshot(): snapshot hiện tại; lần đầu và sau invalidate() nạp đồng bộ,
+      snapshot quá hạn (refresh_seconds) được refresh ở background
+    - refresh(): nạp tăng dần (SanPham đầy đủ, DonHang/ChiTietDonHang từ mốc NgayDat gần nhất)
+    - append(): thêm đơn hàng mới trực tiếp (không cần chờ refresh)
+    """
+
+    def __init__(
+        self,
+        connection_factory: Callable,
+        refresh_seconds: Optional[float] = None,
+        status_window_days: Optional[int] = None,
+        full_reload_seconds: Optional[float] = None
+    ):
+        """
+        Args:
+            connection_factory: Context manager trả về DB-API connection (FunctionHandler._get_connection)
+            refresh_seconds: Tuổi tối đa của snapshot trước khi refresh tăng dần
+            status_window_days: Số ngày trước mốc NgayDat mới nhất được đọc lại để cập nhật trạng thái đơn
+            full_reload_seconds: Chu kỳ nạp lại toàn bộ (bắt được sửa/xóa đơn cũ)
+        """
+        self.connection_factory = connection_factory
+        self.refresh_seconds = Settings.ORDER_ANALYTICS_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self.status_window_days = Settings.ORDER_ANALYTICS_STATUS_WINDOW_DAYS if status_window_days is None else status_window_days
+        self.full_reload_seconds = Settings.ORDER_ANALYTICS_FULL_RELOAD_SECONDS if full_reload_seconds is None else full_reload_seconds
+
+        self._snapshot: Optional[OrderSnapshot] = None
+        self._lock = threading.Lock()  # Chỉ một refresh tại một thời điểm
+        self._stale_lock = threading.Lock()  # Refresh đồng bộ sau invalidate(): chỉ một thread nạp
+        self._refreshing = False
+        self._stale = False
+        self._last_full_load = 0.0
+        self._last_failure = 0.0
+        self._watermark: Optional[datetime] = None  # NgayDat lớn nhất đã nạp
+
+        # Chỉ số ổn định (append-only)
+        self._product_keys: Dict[str, int] = {}
+        self._order_keys: Dict[str, int] = {}
+        self._customer_keys: Dict[str, int] = {}
+
+    # ========== Truy cập ==========
+
+    def snapshot(self) -> Optional[OrderSnapshot]:
+        """Snapshot hiện tại (None nếu chưa nạp được dữ liệu)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            if time.time() - self._last_failure < self.refresh_seconds:
+                return None
+            try:
+                return self.refresh()
+            except Exception as e:
+                self._last_failure = time.time()
+                logger.warning(f"⚠️ Không nạp được order analytics, dùng SQL: {str(e)}")
+                return None
+        if self._stale:
+            return self._refresh_stale()
+        if time.time() - snapshot.loaded_at > self.refresh_seconds:
+            self._refresh_in_background()
+        return snapshot
+
+    def invalidate(self) -> None:
+        """Đánh dấu snapshot đã cũ - lần truy cập tiếp theo refresh đồng bộ (không trả dữ liệu cũ)"""
+        self._stale = True
+        self._last_failure = 0.0
+
+    def _refresh_stale(self) -> Optional[OrderSnapshot]:
+        """Refresh đồng bộ sau invalidate() (None nếu lỗi → FunctionHandler dùng SQL)"""
+        with self._stale_lock:
+            if not self._stale:
+                return self._snapshot
+            if time.time() - self._last_failure < self.refresh_seconds:
+                return None
+            # Xóa cờ trước khi đọc database: invalidate() trong lúc refresh sẽ đặt lại cờ
+            self._stale = False
+            try:
+                return self.refresh()
+            except Exception as e:
+                self._stale = True
+                self._last_failure = time.time()
+                logger.warning(f"⚠️ Refresh order analytics sau invalidate lỗi, dùng SQL: {str(e)}")
+                return None
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "loaded": snapshot is not None,
+            "age_seconds": round(time.time() - snapshot.loaded_at, 1) if snapshot else None,
+            "watermark": self._watermark.isoformat() if self._watermark else None,
+            **(snapshot.counts if snapshot else {}),
+        }
+
+    # ========== Nạp dữ liệu ==========
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"⚠️ Refresh order analytics lỗi, giữ snapshot cũ: {str(e)}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="order-analytics-refresh", daemon=True).start()
+
+    def refresh(self, full: bool = False) -> OrderSnapshot:
+        """Nạp dữ liệu mới từ database và đổi sang snapshot mới"""
+        start = time.time()
+        full = full or self._snapshot is None or time.time() - self._last_full_load > self.full_reload_seconds
+        since = None
+        if not full and self._watermark is not None:
+            since = self._watermark - timedelta(days=self.status_window_days)
+
+        with self.connection_factory() as conn:
+            cursor = conn.cursor()
+            cursor.execute(PRODUCTS_QUERY)
+            products = cursor.fetchall()
+            if since is None:
+                cursor.execute(ORDERS_QUERY)
+                orders = cursor.fetchall()
+                cursor.execute(LINES_QUERY)
+                lines = cursor.fetchall()
+            else:
+                cursor.execute(ORDERS_QUERY + " WHERE NgayDat >= ?", since)
+                orders = cursor.fetchall()
+                cursor.execute(
+                    LINES_QUERY + " INNER JOIN DonHang dh ON ct.MaDonHang = dh.MaDonHang WHERE dh.NgayDat >= ?",
+                    since
+                )
+                lines = cursor.fetchall()
+            cursor.close()
+
+        snapshot = self._build(products, orders, lines, replace=full)
+        if full:
+            self._last_full_load = time.time()
+        logger.info(
+            f"📊 Order analytics {'full' if full else 'incremental'} refresh: {snapshot.counts} "
+            f"({len(orders)} đơn đọc lại) in {time.time() - start:.2f}s"
+        )
+        return snapshot
+
+    def append(self, orders: List[Dict[str, Any]], lines: List[Dict[str, Any]]) -> Optional[OrderSnapshot]:
+        """
+        Thêm/cập nhật đơn hàng không qua database (ví dụ từ event đơn hàng mới)
+
+        Args:
+            orders: [{"MaDonHang", "MaTaiKhoan", "NgayDat", "TrangThai"}]
+            lines: [{"MaDonHang", "MaSanPham", "SoLuong", "GiaBan"}] - chỉ của đơn mới
+        """
+        if self._snapshot is None:
+            return None
+        order_rows = [(o.get("MaDonHang"), o.get("MaTaiKhoan"), o.get("NgayDat"), o.get("TrangThai")) for o in orders]
+        line_rows = [(l.get("MaDonHang"), l.get("MaSanPham"), l.get("SoLuong"), l.get("GiaBan")) for l in lines]
+        return self._build(None, order_rows, line_rows, replace=False)
+
+    def _index(self, keys: Dict[str, int], value: Any) -> int:
+        key = str(value).strip()
+        index = keys.get(key)
+        if index is None:
+            index = len(keys)
+            keys[key] = index
+        return index
+
+    def _build(self, products, orders, lines, replace: bool) -> OrderSnapshot:
+        """Gộp rows mới vào snapshot hiện tại (replace=True: dựng lại từ đầu) rồi đổi snapshot"""
+        with self._lock:
+            base = None if replace else self._snapshot
+            if replace:
+                self._product_keys, self._order_keys, self._customer_keys = {}, {}, {}
+                self._watermark = None
+
+            # ----- Products: bảng nhỏ, luôn dựng lại đầy đủ khi có -----
+            if products is not None:
+                for row in products:
+                    self._index(self._product_keys, row[0])
+                count = len(self._product_keys)
+                names = np.full(count, "", dtype=object)
+                images = np.full(count, None, dtype=object)
+                price = np.full(count, np.nan)
+                stock = np.full(count, np.nan)
+                active = np.zeros(count, dtype=bool)
+                for product_id, name, image, unit_price, stock_qty, is_deleted in products:
+                    i = self._product_keys[str(product_id).strip()]
+                    names[i], images[i] = name or "", image
+                    price[i], stock[i] = _number(unit_price), _number(stock_qty)
+                    active[i] = not is_deleted
+            else:
+                names, images = base.product_names, base.product_images
+                price, stock, active = base.product_price, base.product_stock, base.product_active
+
+            # ----- Orders: cập nhật đơn đã có, append đơn mới -----
+            known = 0 if base is None else len(base.order_day)
+            order_day = base.order_day.copy() if base is not None else np.empty(0, dtype="datetime64[D]")
+            completed = base.order_completed.copy() if base is not None else np.empty(0, dtype=bool)
+            cancelled = base.order_cancelled.copy() if base is not None else np.empty(0, dtype=bool)
+            customer = base.order_customer.copy() if base is not None else np.empty(0, dtype=np.int32)
+            new_orders = set()
+            new_day, new_completed, new_cancelled, new_customer = [], [], [], []
+            for order_id, customer_id, ordered_at, status in orders:
+                i = self._index(self._order_keys, order_id)
+                is_completed, is_cancelled = classify_order_status(status)
+                customer_index = self._index(self._customer_keys, customer_id) if customer_id is not None else -1
+                if i < known:
+                    completed[i], cancelled[i], customer[i] = is_completed, is_cancelled, customer_index
+                    continue
+                new_orders.add(i)
+                new_day.append(_to_day(ordered_at))
+                new_completed.append(is_completed)
+                new_cancelled.append(is_cancelled)
+                new_customer.append(customer_index)
+                ordered_at = _to_datetime(ordered_at)
+                if ordered_at is not None and (self._watermark is None or ordered_at > self._watermark):
+                    self._watermark = ordered_at
+            if new_day:
+                order_day = np.concatenate([order_day, np.array(new_day, dtype="datetime64[D]")])
+                completed = np.concatenate([completed, np.array(new_completed, dtype=bool)])
+                cancelled = np.concatenate([cancelled, np.array(new_cancelled, dtype=bool)])
+                customer = np.concatenate([customer, np.array(new_customer, dtype=np.int32)])
+
+            # ----- Lines: chỉ của đơn mới (chi tiết đơn cũ không đổi) -----
+            line_order, line_product, line_qty, line_amount = [], [], [], []
+            for order_id, product_id, quantity, unit_price in lines:
+                order_index = self._order_keys.get(str(order_id).strip())
+                if order_index is None or order_index not in new_orders:
+                    continue
+                quantity = _number(quantity)
+                quantity = 0.0 if np.isnan(quantity) else quantity
+                unit_price = _number(unit_price)
+                line_order.append(order_index)
+                line_product.append(self._index(self._product_keys, product_id))
+                line_qty.append(quantity)
+                line_amount.append(0.0 if np.isnan(unit_price) else unit_price * quantity)
+
+            # Sản phẩm chỉ xuất hiện trong chi tiết đơn (đã bị xóa khỏi SanPham)
+            missing = len(self._product_keys) - len(names)
+            if missing > 0:
+                names = np.concatenate([names, np.full(missing, "", dtype=object)])
+                images = np.concatenate([images, np.full(missing, None, dtype=object)])
+                price = np.concatenate([price, np.full(missing, np.nan)])
+                stock = np.concatenate([stock, np.full(missing, np.nan)])
+                active = np.concatenate([active, np.zeros(missing, dtype=bool)])
+
+            def extend(existing: Optional[np.ndarray], values: List, dtype) -> np.ndarray:
+                array = np.array(values, dtype=dtype)
+                return array if existing is None else np.concatenate([existing, array])
+
+            snapshot = OrderSnapshot(
+                product_ids=list(self._product_keys),
+                product_names=names,
+                product_images=images,
+                product_price=price,
+                product_stock=stock,
+                product_active=active,
+                order_day=order_day,
+                order_completed=completed,
+                order_cancelled=cancelled,
+                order_customer=customer,
+                line_order=extend(base.line_order if base is not None else None, line_order, np.int32),
+                line_product=extend(base.line_product if base is not None else None, line_product, np.int32),
+                line_qty=extend(base.line_qty if base is not None else None, line_qty, np.float64),
+                line_amount=extend(base.line_amount if base is not None else None, line_amount, np.float64),
+                loaded_at=time.time()
+            )
+            self._snapshot = snapshot
+            return snapshot
@@ -0,0 +1,214 @@
+"""
+Query Builder - Predicates sargable cho SQL của FunctionHandler
+
+- Khoảng ngày nửa mở: col >= ? AND col < ? (SQL Server seek được index trên cột ngày)
+  thay vì YEAR(col) = ? / CAST(col AS DATE) <= ?
+- Trạng thái đơn: col IN (?, ...) từ tập giá trị chuẩn (SELECT DISTINCT TrangThai, phân loại một lần
+  bằng classify_order_status) thay vì chuỗi LIKE '%complete%' / N'%hủy%'
+- QueryStats: số lần chạy và thời gian từng query theo tên
+"""
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.settings import Settings
+from app.services.function.order_analytics import classify_order_status
+
+logger = logging.getLogger(__name__)
+
+DISTINCT_STATUSES_QUERY = "SELECT DISTINCT TrangThai FROM DonHang WHERE TrangThai IS NOT NULL"
+
+
+# ========== Khoảng ngày ==========
+
+def parse_date(value: Any) -> Optional[date]:
+    """date từ date/datetime/chuỗi ISO ("2024-01-31", "2024-01-31T10:00:00"), None nếu rỗng"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text).date()
+    except ValueError:
+        return datetime.strptime(text[:10], "%Y-%m-%d").date()
+
+
+def _start_of(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+
+def year_range(year: int) -> Tuple[datetime, datetime]:
+    """[01/01/year, 01/01/year+1)"""
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+
+def day_range(start: Any = None, end: Any = None) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Khoảng ngày (cả hai đầu tính theo ngày, như CAST(col AS DATE) BETWEEN start AND end) → [start, end + 1 ngày)
+    """
+    start_day, end_day = parse_date(start), parse_date(end)
+    return (
+        _start_of(start_day) if start_day else None,
+        _start_of(end_day) + timedelta(days=1) if end_day else None
+    )
+
+
+def range_predicate(column: str, lower: Optional[datetime], upper: Optional[datetime]) -> Tuple[str, List[Any]]:
+    """
+    Returns:
+        ("col >= ? AND col < ?", [lower, upper]) - bỏ đầu nào là None, "1 = 1" nếu cả hai None
+    """
+    clauses, params = [], []
+    if lower is not None:
+        clauses.append(f"{column} >= ?")
+        params.append(lower)
+    if upper is not None:
+        clauses.append(f"{column} < ?")
+        params.append(upper)
+    return (" AND ".join(clauses) or "1 = 1"), params
+
+
+def in_predicate(column: str, values: Iterable[Any]) -> Tuple[str, List[Any]]:
+    """("col IN (?, ?)", values) - "1 = 0" nếu không có giá trị nào"""
+    values = list(values)
+    if not values:
+        return "1 = 0", []
+    return f"{column} IN ({', '.join('?' for _ in values)})", values
+
+
+# ========== Trạng thái đơn ==========
+
+class OrderStatusCatalog:
+    """
+    Tập giá trị TrangThai thực tế trong DonHang, đã phân loại hoàn thành / bị hủy
+
+    Nạp lần đầu khi cần, nạp lại sau ORDER_STATUS_REFRESH_SECONDS;
+    observe() thêm trạng thái mới biết từ change events mà không cần query lại
+    """
+
+    def __init__(self, load_statuses: Callable[[], List[str]], refresh_seconds: Optional[float] = None):
+        """
+        Args:
+            load_statuses: Hàm trả về các giá trị TrangThai distinct
+            refresh_seconds: Tuổi tối đa của tập trạng thái (mặc định ORDER_STATUS_REFRESH_SECONDS)
+        """
+        self.load_statuses = load_statuses
+        self.refresh_seconds = Settings.ORDER_STATUS_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._statuses: Optional[set] = None
+        self._completed: Tuple[str, ...] = ()
+        self._cancelled: Tuple[str, ...] = ()
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _classify(self, statuses: set) -> None:
+        completed, cancelled = [], []
+        for status in sorted(statuses):
+            is_completed, is_cancelled = classify_order_status(status)
+            if is_completed:
+                completed.append(status)
+            if is_cancelled:
+                cancelled.append(status)
+        self._statuses = statuses
+        self._completed, self._cancelled = tuple(completed), tuple(cancelled)
+
+    def _ensure_loaded(self) -> None:
+        if self._statuses is not None and time.time() - self._loaded_at <= self.refresh_seconds:
+            return
+        with self._lock:
+            if self._statuses is not None and time.time() - self._loaded_at <= self.refresh_seconds:
+                return
+            statuses = {str(status) for status in self.load_statuses() if status is not None}
+            self._classify(statuses)
+            self._loaded_at = time.time()
+            logger.info(
+                f"📋 Order statuses: {len(statuses)} giá trị, {len(self._completed)} hoàn thành, "
+                f"{len(self._cancelled)} bị hủy"
+            )
+
+    @property
+    def completed(self) -> Tuple[str, ...]:
+        self._ensure_loaded()
+        return self._completed
+
+    @property
+    def cancelled(self) -> Tuple[str, ...]:
+        self._ensure_loaded()
+        return self._cancelled
+
+    def observe(self, statuses: Iterable[Optional[str]]) -> None:
+        """Thêm các trạng thái mới (ví dụ từ order.status_changed) vào tập đã nạp"""
+        with self._lock:
+            if self._statuses is None:
+                return
+            new = {str(status) for status in statuses if status is not None} - self._statuses
+            if new:
+                self._classify(self._statuses | new)
+                logger.info(f"📋 Order statuses: thêm {sorted(new)}")
+
+    def invalidate(self) -> None:
+        self._loaded_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self._statuses is not None,
+            "statuses": sorted(self._statuses) if self._statuses is not None else None,
+            "completed": list(self._completed),
+            "cancelled": list(self._cancelled),
+        }
+
+
+# ========== Thời gian query ==========
+
+class QueryStats:
+    """
+    Số lần chạy, tổng/max/lần cuối thời gian (ms) của từng query theo tên
+
+    reset() chỉ xóa stats(); totals() tăng đơn điệu từ khi khởi động (counters cho /metrics)
+    """
+
+    def __init__(self, slow_query_ms: Optional[float] = None):
+        self.slow_query_ms = Settings.SQL_SLOW_QUERY_MS if slow_query_ms is None else slow_query_ms
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, elapsed_ms: float) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0})
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["last_ms"] = elapsed_ms
+            totals = self._totals.setdefault(name, {"count": 0, "total_ms": 0.0})
+            totals["count"] += 1
+            totals["total_ms"] += elapsed_ms
+        if self.slow_query_ms and elapsed_ms > self.slow_query_ms:
+            logger.warning(f"🐢 Query {name} chậm: {elapsed_ms:.1f}ms")
+        else:
+            logger.debug(f"⏱️ Query {name}: {elapsed_ms:.1f}ms")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {
+                    "count": int(values["count"]),
+                    "avg_ms": round(values["total_ms"] / values["count"], 2),
+                    "max_ms": round(values["max_ms"], 2),
+                    "last_ms": round(values["last_ms"], 2),
+                }
+                for name, values in sorted(self._stats.items())
+            }
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        """Tổng số lần chạy và tổng thời gian (ms) theo tên, không bị reset()"""
+        with self._lock:
+            return {name: dict(values) for name, values in sorted(self._totals.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
@@ -0,0 +1,297 @@
+"""
+CLIP ONNX Runtime - Backend CLIP tối ưu cho CPU
+
+- Export visual encoder và text encoder của CLIP ViT-B/32 sang ONNX (một lần, lưu vào CLIP_ONNX_DIR)
+- Tùy chọn dynamic int8 quantization (onnxruntime.quantization)
+- Chạy bằng onnxruntime CPUExecutionProvider với số threads cấu hình được
+
+Parity check + benchmark so với PyTorch (chạy từ thư mục rag_service):
+    python -m app.services.image.clip_onnx --images path/to/images --iterations 20
+"""
+import argparse
+import logging
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+from app.core.settings import Settings
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+CLIP_MODEL_NAME = "ViT-B/32"
+# Input shape cố định của CLIP ViT-B/32
+IMAGE_SIZE = 224
+CONTEXT_LENGTH = 77
+ONNX_OPSET = 14
+
+
+def _model_dir(onnx_dir: str) -> Path:
+    return Path(onnx_dir) / CLIP_MODEL_NAME.replace("/", "_")
+
+
+def export_clip_onnx(clip_model, onnx_dir: str) -> Dict[str, Path]:
+    """
+    Export CLIP (float32, CPU) sang 2 file ONNX: visual.onnx và text.onnx (batch size động)
+
+    Args:
+        clip_model: Model trả về từ clip.load(..., device="cpu")
+        onnx_dir: Thư mục lưu model ONNX
+
+    Returns:
+        Dict {"visual": path, "text": path}
+    """
+    import torch
+
+    class _ImageEncoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, pixel_values):
+            return self.model.encode_image(pixel_values)
+
+    class _TextEncoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids):
+            return self.model.encode_text(input_ids)
+
+    model_dir = _model_dir(onnx_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    paths = {"visual": model_dir / "visual.onnx", "text": model_dir / "text.onnx"}
+    clip_model = clip_model.float().eval()
+
+    with torch.no_grad():
+        if not paths["visual"].exists():
+            logger.info(f"Đang export CLIP visual encoder sang ONNX → {paths['visual']}")
+            torch.onnx.export(
+                _ImageEncoder(clip_model),
+                torch.randn(1, 3, IMAGE_SIZE, IMAGE_SIZE),
+                str(paths["visual"]),
+                input_names=["pixel_values"],
+                output_names=["image_embeds"],
+                dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+                opset_version=ONNX_OPSET,
+                do_constant_folding=True
+            )
+        if not paths["text"].exists():
+            import clip
+            logger.info(f"Đang export CLIP text encoder sang ONNX → {paths['text']}")
+            torch.onnx.export(
+                _TextEncoder(clip_model),
+                clip.tokenize(["a photo of fresh food"]).long(),
+                str(paths["text"]),
+                input_names=["input_ids"],
+                output_names=["text_embeds"],
+                dynamic_axes={"input_ids": {0: "batch"}, "text_embeds": {0: "batch"}},
+                opset_version=ONNX_OPSET,
+                do_constant_folding=True
+            )
+    return paths
+
+
+def quantize_clip_onnx(paths: Dict[str, Path]) -> Dict[str, Path]:
+    """Dynamic int8 quantization (weights int8, activations quantize lúc chạy)"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized = {}
+    for name, path in paths.items():
+        int8_path = path.with_name(f"{path.stem}_int8.onnx")
+        if not int8_path.exists():
+            logger.info(f"Đang quantize {path.name} sang int8...")
+            quantize_dynamic(str(path), str(int8_path), weight_type=QuantType.QInt8)
+        quantized[name] = int8_path
+    return quantized
+
+
+def _l2_normalize(features: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(features, axis=-1, keepdims=True)
+    return (features / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+class ClipOnnxRuntime:
+    """
+    CLIP visual + text encoder chạy bằng ONNX Runtime
+    Output đã L2-normalize, cùng không gian với embeddings của PyTorch CLIP
+    """
+
+    def __init__(self, paths: Dict[str, Path], threads: int = 0):
+        """
+        Args:
+            paths: {"visual": path, "text": path} tới các file ONNX
+            threads: intra_op_num_threads (0 = để ONNX Runtime tự chọn)
+        """
+        import onnxruntime as ort
+
+        session_options = ort.SessionOptions()
+        if threads > 0:
+            session_options.intra_op_num_threads = threads
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.paths = paths
+        self.visual_session = ort.InferenceSession(str(paths["visual"]), sess_options=session_options,
+                                                   providers=["CPUExecutionProvider"])
+        self.text_session = ort.InferenceSession(str(paths["text"]), sess_options=session_options,
+                                                 providers=["CPUExecutionProvider"])
+
+    @classmethod
+    def from_clip_model(
+        cls,
+        clip_model,
+        onnx_dir: Optional[str] = None,
+        quantize: Optional[bool] = None,
+        threads: Optional[int] = None
+    ) -> "ClipOnnxRuntime":
+        """Export (nếu chưa có), quantize (tùy chọn) rồi tạo sessions"""
+        onnx_dir = onnx_dir or Settings.CLIP_ONNX_DIR
+        quantize = Settings.CLIP_QUANTIZE if quantize is None else quantize
+        threads = Settings.CLIP_ORT_THREADS if threads is None else threads
+
+        paths = export_clip_onnx(clip_model, onnx_dir)
+        if quantize:
+            paths = quantize_clip_onnx(paths)
+        runtime = cls(paths, threads=threads)
+        logger.info(f"✅ CLIP ONNX sessions: {paths['visual'].name}, {paths['text'].name}")
+        return runtime
+
+    def encode_image(self, pixel_values: np.ndarray) -> np.ndarray:
+        """pixel_values (N, 3, 224, 224) float32 đã chuẩn hóa → embeddings (N, D)"""
+        features = self.visual_session.run(None, {"pixel_values": pixel_values.astype(np.float32, copy=False)})[0]
+        return _l2_normalize(features)
+
+    def encode_text(self, input_ids: np.ndarray) -> np.ndarray:
+        """input_ids (N, 77) từ clip.tokenize → embeddings (N, D)"""
+        features = self.text_session.run(None, {"input_ids": input_ids.astype(np.int64, copy=False)})[0]
+        return _l2_normalize(features)
+
+
+# ========== Parity check & benchmark ==========
+
+PARITY_TEXTS = [
+    "cá hồi tươi",
+    "thịt bò Úc nhập khẩu",
+    "rau cải xanh hữu cơ",
+    "trái cây nhiệt đới",
+    "fresh salmon fillet",
+    "organic green vegetables",
+]
+
+
+def _sample_images(image_dir: Optional[str], limit: int = 16) -> List["Image.Image"]:
+    from PIL import Image
+
+    images = []
+    if image_dir:
+        for path in sorted(Path(image_dir).iterdir()):
+            if path.suffix.lower() in {".jpg", ".jpeg", ".png", ".webp", ".bmp"}:
+                images.append(Image.open(path).convert("RGB"))
+            if len(images) >= limit:
+                break
+    if not images:
+        # Ảnh tổng hợp (gradient + nhiễu) khi không có ảnh thật
+        rng = np.random.default_rng(0)
+        for i in range(8):
+            base = np.linspace(0, 255, 320 * 240 * 3).reshape(240, 320, 3)
+            noise = rng.integers(0, 64, size=(240, 320, 3))
+            images.append(Image.fromarray(((base + noise + i * 24) % 256).astype(np.uint8)))
+    return images
+
+
+def _cosine_stats(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    cosine = np.sum(_l2_normalize(reference) * _l2_normalize(candidate), axis=1)
+    return {"mean": round(float(cosine.mean()), 6), "min": round(float(cosine.min()), 6)}
+
+
+def _time_per_call(fn, iterations: int) -> float:
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def parity_and_benchmark(image_dir: Optional[str] = None, iterations: int = 20, threads: Optional[int] = None) -> Dict:
+    """
+    So sánh embeddings ONNX (fp32 và int8) với PyTorch CLIP và đo latency mỗi lần encode
+
+    Returns:
+        Dict {"parity": {...}, "latency_ms": {...}}
+    """
+    import clip
+    import torch
+
+    from app.services.image.preprocessing import clip_preprocess_array
+
+    threads = Settings.CLIP_ORT_THREADS if threads is None else threads
+    if threads > 0:
+        torch.set_num_threads(threads)
+
+    clip_model, clip_preprocess = clip.load(CLIP_MODEL_NAME, device="cpu")
+    clip_model.eval()
+    images = _sample_images(image_dir)
+    tokens = clip.tokenize(PARITY_TEXTS, truncate=True)
+    pixels = np.stack([clip_preprocess_array(image) for image in images])
+
+    def torch_text(t=tokens):
+        with torch.no_grad():
+            return _l2_normalize(clip_model.encode_text(t).numpy())
+
+    def torch_image(batch):
+        with torch.no_grad():
+            tensor = torch.stack([clip_preprocess(image) for image in batch])
+            return _l2_normalize(clip_model.encode_image(tensor).numpy())
+
+    reference_text = torch_text()
+    reference_image = torch_image(images)
+
+    fp32_paths = export_clip_onnx(clip_model, Settings.CLIP_ONNX_DIR)
+    runtimes = {
+        "onnx_fp32": ClipOnnxRuntime(fp32_paths, threads=threads),
+        "onnx_int8": ClipOnnxRuntime(quantize_clip_onnx(fp32_paths), threads=threads),
+    }
+
+    report = {"parity": {}, "latency_ms": {}}
+    single_tokens = tokens[:1]
+    single_pixels = pixels[:1]
+    batch_pixels = pixels[:8]
+    report["latency_ms"]["torch"] = {
+        "text": round(_time_per_call(lambda: torch_text(single_tokens), iterations), 2),
+        "image": round(_time_per_call(lambda: torch_image(images[:1]), iterations), 2),
+        "image_batch8": round(_time_per_call(lambda: torch_image(images[:8]), iterations), 2),
+    }
+    for name, runtime in runtimes.items():
+        report["parity"][name] = {
+            "text_cosine": _cosine_stats(reference_text, runtime.encode_text(tokens.numpy())),
+            "image_cosine": _cosine_stats(reference_image, runtime.encode_image(pixels)),
+        }
+        report["latency_ms"][name] = {
+            "text": round(_time_per_call(lambda: runtime.encode_text(single_tokens.numpy()), iterations), 2),
+            "image": round(_time_per_call(lambda: runtime.encode_image(single_pixels), iterations), 2),
+            "image_batch8": round(_time_per_call(lambda: runtime.encode_image(batch_pixels), iterations), 2),
+        }
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import json
+
+    parser = argparse.ArgumentParser(description="CLIP ONNX parity check + benchmark so với PyTorch")
+    parser.add_argument("--images", default=None, help="Thư mục ảnh mẫu (mặc định: ảnh tổng hợp)")
+    parser.add_argument("--iterations", type=int, default=20, help="Số lần encode khi đo latency")
+    parser.add_argument("--threads", type=int, default=None, help="Số threads cho torch và ONNX Runtime")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    report = parity_and_benchmark(args.images, args.iterations, args.threads)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
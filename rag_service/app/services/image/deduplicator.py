@@ -0,0 +1,145 @@
+"""
+Image Deduplicator - Dùng lại CLIP embedding cho ảnh gần trùng
+
+Ảnh mới được hash (pHash + dHash, decode ở kích thước nhỏ) rồi so với PerceptualHashIndex:
+- Gần trùng một ảnh đã biết → dùng lại embedding đã lưu, không chạy CLIP
+- Gần trùng một ảnh khác trong cùng batch → chỉ encode ảnh đầu tiên
+- Còn lại → encode bằng CLIP theo batch như bình thường
+"""
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.settings import Settings
+from app.services.image.perceptual_hash import compute_image_hashes_batch
+
+logger = logging.getLogger(__name__)
+
+
+def _hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class ImageDeduplicator:
+    """
+    Tạo image embeddings có bỏ qua ảnh gần trùng
+
+    Kết quả embed() cho mỗi ảnh là dict:
+        embedding: CLIP embedding (None nếu lỗi)
+        hashes: (phash, dhash) hoặc None nếu không decode được
+        duplicate_of: file_id của ảnh đã biết được dùng lại (hoặc None)
+        duplicate_content_type: content_type của ảnh đó ("image"/"product")
+        batch_duplicate_of: chỉ số ảnh trong cùng batch được dùng lại (hoặc None)
+        distance: khoảng cách pHash tới ảnh được dùng lại
+    """
+
+    def __init__(
+        self,
+        image_embedding_service,
+        hash_index,
+        phash_threshold: Optional[int] = None,
+        dhash_threshold: Optional[int] = None
+    ):
+        """
+        Args:
+            image_embedding_service: ImageEmbeddingService (CLIP)
+            hash_index: PerceptualHashIndex của ImageVectorStore
+            phash_threshold: Ngưỡng Hamming pHash (mặc định IMAGE_DEDUP_PHASH_THRESHOLD)
+            dhash_threshold: Ngưỡng Hamming dHash (mặc định IMAGE_DEDUP_DHASH_THRESHOLD)
+        """
+        self.image_embedding_service = image_embedding_service
+        self.hash_index = hash_index
+        self.phash_threshold = Settings.IMAGE_DEDUP_PHASH_THRESHOLD if phash_threshold is None else phash_threshold
+        self.dhash_threshold = Settings.IMAGE_DEDUP_DHASH_THRESHOLD if dhash_threshold is None else dhash_threshold
+        self._stats = {"images": 0, "index_hits": 0, "batch_hits": 0, "encoded": 0}
+        self._stats_lock = threading.Lock()
+
+    def _is_close(self, a: Tuple[int, int], b: Tuple[int, int]) -> bool:
+        return _hamming(a[0], b[0]) <= self.phash_threshold and _hamming(a[1], b[1]) <= self.dhash_threshold
+
+    async def embed(self, images: List[bytes]) -> List[Dict]:
+        """Tạo embeddings cho batch ảnh, chỉ chạy CLIP cho ảnh chưa có bản gần trùng"""
+        if not images:
+            return []
+        hashes = await asyncio.to_thread(compute_image_hashes_batch, images)
+        results = [
+            {
+                "embedding": None, "hashes": h, "duplicate_of": None, "duplicate_content_type": None,
+                "batch_duplicate_of": None, "distance": None
+            }
+            for h in hashes
+        ]
+
+        to_encode: List[int] = []
+        for i, image_hashes in enumerate(hashes):
+            if image_hashes is None:
+                to_encode.append(i)  # Không hash được: để CLIP thử decode như bình thường
+                continue
+            match = self.hash_index.find(image_hashes, self.phash_threshold, self.dhash_threshold)
+            if match is not None:
+                # get_embedding đọc SQLite: chạy ngoài event loop
+                embedding = await asyncio.to_thread(self.hash_index.get_embedding, match[0])
+                if embedding is not None:
+                    results[i].update(
+                        embedding=embedding, duplicate_of=match[0], duplicate_content_type=match[1], distance=match[2]
+                    )
+                    continue
+            leader = next(
+                (j for j in to_encode if hashes[j] is not None and self._is_close(hashes[j], image_hashes)),
+                None
+            )
+            if leader is not None:
+                results[i].update(batch_duplicate_of=leader, distance=_hamming(hashes[leader][0], image_hashes[0]))
+            else:
+                to_encode.append(i)
+
+        if to_encode:
+            embeddings = await self.image_embedding_service.create_embeddings([images[i] for i in to_encode])
+            for i, embedding in zip(to_encode, embeddings):
+                results[i]["embedding"] = embedding
+        for result in results:
+            if result["batch_duplicate_of"] is not None:
+                result["embedding"] = results[result["batch_duplicate_of"]]["embedding"]
+
+        index_hits = sum(1 for r in results if r["duplicate_of"] is not None)
+        batch_hits = sum(1 for r in results if r["batch_duplicate_of"] is not None)
+        with self._stats_lock:
+            self._stats["images"] += len(images)
+            self._stats["index_hits"] += index_hits
+            self._stats["batch_hits"] += batch_hits
+            self._stats["encoded"] += len(to_encode)
+        if index_hits or batch_hits:
+            logger.info(f"♻️ Ảnh gần trùng: dùng lại {index_hits + batch_hits}/{len(images)} embeddings, CLIP {len(to_encode)} ảnh")
+        return results
+
+    def remember(self, entries: List[Tuple[str, str, Dict]]) -> None:
+        """
+        Cập nhật index sau khi đã lưu vào vector store
+
+        Args:
+            entries: [(file_id, content_type, kết quả embed())] - kết quả None (product không còn ảnh)
+                     sẽ xóa file_id khỏi index
+        """
+        to_add = []
+        to_remove = []
+        for file_id, content_type, result in entries:
+            if result and result.get("hashes") is not None and result.get("embedding") is not None:
+                to_add.append((file_id, content_type, result["hashes"], np.asarray(result["embedding"])))
+            else:
+                to_remove.append(file_id)
+        try:
+            self.hash_index.add(to_add)
+            self.hash_index.remove(to_remove)
+        except Exception as e:
+            logger.warning(f"⚠️ Không thể cập nhật perceptual hash index: {str(e)}")
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        reused = stats["index_hits"] + stats["batch_hits"]
+        stats["clip_saved_ratio"] = round(reused / stats["images"], 4) if stats["images"] else 0.0
+        stats["indexed"] = len(self.hash_index)
+        return stats
@@ -3,10 +3,12 @@ import logging
 from typing import Optional, List
 import numpy as np
 from PIL import Image
-import io
 import base64
 
 from app.core.settings import Settings
+from app.core.tracing import traced
+from app.services.inference import MODEL_CLIP, run_inference
+from app.services.image.preprocessing import load_rgb_image, preprocess_batch, preprocess_image_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -18,11 +20,12 @@ class ImageEmbeddingService:
     _clip_model = None
     _clip_preprocess = None
     _clip_device = None
+    _clip_onnx = None  # ClipOnnxRuntime khi CLIP_BACKEND = "onnx"
     _clip_initialized = False
     
     def __init__(self):
         """Khởi tạo Image Embedding Service"""
-        self.embedding_model = None
+        self._init_state()
         self.use_openai = Settings.USE_OPENAI_EMBEDDINGS
         self.openai_api_key = Settings.OPENAI_API_KEY
         
@@ -37,6 +40,7 @@ class ImageEmbeddingService:
             self.clip_model = ImageEmbeddingService._clip_model
             self.clip_preprocess = ImageEmbeddingService._clip_preprocess
             self.clip_device = ImageEmbeddingService._clip_device
+            self.clip_onnx = ImageEmbeddingService._clip_onnx
             self.embedding_model = "ViT-B/32"
         
         # Khởi tạo OpenAI client nếu có key (để dùng cho các tính năng khác trong tương lai)
@@ -47,6 +51,19 @@ class ImageEmbeddingService:
             logger.warning("⚠️  OpenAI embeddings được bật nhưng chưa có API Key!")
             logger.warning("   Để cấu hình: Thêm OPENAI_API_KEY vào file .env")
     
+    def _init_state(self, embedding_model: Optional[str] = None, clip_device: Optional[str] = None) -> None:
+        """
+        Attributes của instance, không load model
+        Subclass không chạy CLIP trong process (model server, fake) gọi hàm này thay cho __init__
+        """
+        self.embedding_model = embedding_model
+        self.use_openai = False
+        self.openai_api_key = None
+        self.clip_model = None
+        self.clip_preprocess = None
+        self.clip_device = clip_device
+        self.clip_onnx = None
+    
     def _init_openai(self):
         """Khởi tạo OpenAI vision embeddings"""
         try:
@@ -72,22 +89,29 @@ class ImageEmbeddingService:
             import clip
             import torch
             
-            # Load CLIP model
-            device = "cuda" if torch.cuda.is_available() else "cpu"
+            # Load CLIP model (backend onnx chỉ chạy trên CPU)
+            use_onnx = Settings.CLIP_BACKEND == "onnx"
+            device = "cuda" if torch.cuda.is_available() and not use_onnx else "cpu"
             model_name = "ViT-B/32"  # CLIP ViT-B/32 model
             
-            logger.info(f"Đang tải CLIP model: {model_name} (device: {device})")
+            logger.info(f"Đang tải CLIP model: {model_name} (device: {device}, backend: {Settings.CLIP_BACKEND})")
             clip_model, clip_preprocess = clip.load(model_name, device=device)
             
+            clip_onnx = None
+            if use_onnx:
+                clip_onnx = self._init_clip_onnx(clip_model)
+            
             # 🔥 Lưu vào class variables (singleton)
             ImageEmbeddingService._clip_model = clip_model
             ImageEmbeddingService._clip_preprocess = clip_preprocess
             ImageEmbeddingService._clip_device = device
+            ImageEmbeddingService._clip_onnx = clip_onnx
             
             # Gán vào instance variables
             self.clip_model = clip_model
             self.clip_preprocess = clip_preprocess
             self.clip_device = device
+            self.clip_onnx = clip_onnx
             self.embedding_model = model_name
             
             logger.info(f"✅ Đã tải CLIP model: {model_name} (SINGLETON - sẽ tái sử dụng)")
@@ -98,18 +122,28 @@ class ImageEmbeddingService:
             logger.error(f"Lỗi khi tải CLIP model: {str(e)}")
             raise
     
+    def _init_clip_onnx(self, clip_model):
+        """Export/quantize CLIP sang ONNX và tạo sessions, fallback về PyTorch nếu thiếu onnxruntime"""
+        try:
+            from app.services.image.clip_onnx import ClipOnnxRuntime
+            from app.services.inference import get_inference_executor
+            threads = Settings.CLIP_ORT_THREADS or get_inference_executor().torch_threads
+            return ClipOnnxRuntime.from_clip_model(clip_model, threads=threads)
+        except ImportError as e:
+            logger.warning(f"⚠️ onnx/onnxruntime chưa được cài ({str(e)}). Dùng CLIP PyTorch.")
+        except Exception as e:
+            logger.error(f"❌ Lỗi khi khởi tạo CLIP ONNX, dùng CLIP PyTorch: {str(e)}")
+        return None
+    
     def _preprocess_image(self, image_bytes: bytes) -> Image.Image:
-        """Tiền xử lý ảnh: resize, normalize, etc."""
+        """Decode ảnh sang RGB ở kích thước vừa đủ cho CLIP (JPEG draft mode, giới hạn số pixel)"""
         try:
-            image = Image.open(io.BytesIO(image_bytes))
-            # Convert to RGB nếu cần
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            return image
+            return load_rgb_image(image_bytes)
         except Exception as e:
             logger.error(f"Lỗi khi xử lý ảnh: {str(e)}")
             raise
     
+    @traced("embedding.clip_image")
     async def create_embedding(self, image_bytes: bytes) -> Optional[np.ndarray]:
         """
         Tạo embedding vector từ ảnh
@@ -120,7 +154,8 @@ class ImageEmbeddingService:
         try:
             # Hiện tại chỉ dùng CLIP (OpenAI không có direct image embedding API)
             # Nếu có OpenAI key, có thể dùng để mô tả ảnh rồi embed text, nhưng CLIP tốt hơn cho similarity
-            return self._create_clip_embedding(image_bytes)
+            # Chạy trong inference pool để không block event loop
+            return await run_inference(MODEL_CLIP, self._create_clip_embedding, image_bytes)
         except Exception as e:
             logger.error(f"Error creating image embedding: {str(e)}")
             return None
@@ -149,6 +184,8 @@ class ImageEmbeddingService:
             
             # Tokenize text using CLIP's built-in tokenizer
             import clip
+            if self.clip_onnx is not None:
+                return self.clip_onnx.encode_text(clip.tokenize([text], truncate=True).numpy())[0]
             text_tokens = clip.tokenize([text], truncate=True).to(self.clip_device)
             
             # Generate embedding
@@ -163,6 +200,50 @@ class ImageEmbeddingService:
             logger.error(f"Error creating CLIP text embedding: {str(e)}")
             return None
     
+    @traced("embedding.clip_text")
+    async def create_text_embedding_async(self, text: str) -> Optional[np.ndarray]:
+        """
+        create_text_embedding chạy trong inference pool - dùng trong coroutines
+        """
+        if not text or not text.strip():
+            return None
+        return await run_inference(MODEL_CLIP, self.create_text_embedding, text)
+    
+    @traced("embedding.clip_text_batch")
+    async def create_text_embeddings(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Tạo CLIP text embeddings cho nhiều texts (batch, trong inference pool)
+        Text rỗng hoặc lỗi → None tại vị trí tương ứng
+        """
+        if not texts:
+            return []
+        try:
+            return await run_inference(MODEL_CLIP, self._create_clip_text_embeddings_batch, texts)
+        except Exception as e:
+            logger.error(f"Lỗi khi tạo CLIP text embeddings batch: {str(e)}", exc_info=True)
+            return [None] * len(texts)
+    
+    def _create_clip_text_embeddings_batch(self, texts: List[str], batch_size: int = 256) -> List[Optional[np.ndarray]]:
+        """Tokenize + encode theo batch (một forward pass cho mỗi batch_size texts)"""
+        import clip
+        
+        valid_indices = [i for i, text in enumerate(texts) if text and text.strip()]
+        result: List[Optional[np.ndarray]] = [None] * len(texts)
+        for start in range(0, len(valid_indices), batch_size):
+            batch_indices = valid_indices[start:start + batch_size]
+            tokens = clip.tokenize([texts[i] for i in batch_indices], truncate=True)
+            if self.clip_onnx is not None:
+                embeddings = self.clip_onnx.encode_text(tokens.numpy())
+            else:
+                import torch
+                with torch.no_grad():
+                    text_features = self.clip_model.encode_text(tokens.to(self.clip_device))
+                    text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+                    embeddings = text_features.cpu().numpy().astype(np.float32)
+            for row, i in enumerate(batch_indices):
+                result[i] = embeddings[row]
+        return result
+    
     def create_query_embedding(
         self,
         image_bytes: Optional[bytes] = None,
@@ -198,27 +279,30 @@ class ImageEmbeddingService:
         
         return None
     
+    def _encode_pixels(self, pixels: np.ndarray) -> np.ndarray:
+        """Chạy CLIP image encoder trên batch (N, 3, 224, 224) đã preprocess, trả về embeddings đã normalize"""
+        if self.clip_onnx is not None:
+            return self.clip_onnx.encode_image(pixels)
+        
+        import torch
+        batch_tensor = torch.from_numpy(pixels).to(self.clip_device)
+        with torch.no_grad():
+            image_features = self.clip_model.encode_image(batch_tensor)
+            # Normalize features
+            image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+            return image_features.cpu().numpy().astype(np.float32)
+    
     def _create_clip_embedding(self, image_bytes: bytes) -> np.ndarray:
         """Tạo embedding sử dụng CLIP model"""
         try:
-            import torch
-            
-            # Preprocess image
-            image = self._preprocess_image(image_bytes)
-            image_tensor = self.clip_preprocess(image).unsqueeze(0).to(self.clip_device)
-            
-            # Generate embedding
-            with torch.no_grad():
-                image_features = self.clip_model.encode_image(image_tensor)
-                # Normalize features
-                image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-                embedding = image_features.cpu().numpy()[0]
-            
-            return embedding.astype(np.float32)
+            # Decode ở kích thước giảm + preprocess (numpy)
+            pixels = preprocess_image_bytes(image_bytes)[None]
+            return self._encode_pixels(pixels)[0]
         except Exception as e:
             logger.error(f"Lỗi khi tạo CLIP embedding: {str(e)}")
             raise
     
+    @traced("embedding.clip_image_batch")
     async def create_embeddings(self, images: List[bytes]) -> List[Optional[np.ndarray]]:
         """
         Tạo embeddings cho nhiều ảnh (batch)
@@ -227,8 +311,8 @@ class ImageEmbeddingService:
             return []
         
         try:
-            # Hiện tại chỉ dùng CLIP batch processing
-            return self._create_clip_embeddings_batch(images)
+            # Hiện tại chỉ dùng CLIP batch processing (trong inference pool)
+            return await run_inference(MODEL_CLIP, self._create_clip_embeddings_batch, images)
         except Exception as e:
             logger.error(f"Lỗi khi tạo image embeddings: {str(e)}", exc_info=True)
             return [None] * len(images)
@@ -236,42 +320,20 @@ class ImageEmbeddingService:
     def _create_clip_embeddings_batch(self, images: List[bytes]) -> List[Optional[np.ndarray]]:
         """Tạo embeddings cho nhiều ảnh cùng lúc bằng CLIP"""
         try:
-            import torch
-            
-            # Preprocess tất cả ảnh
-            image_tensors = []
-            for img_bytes in images:
-                try:
-                    image = self._preprocess_image(img_bytes)
-                    image_tensor = self.clip_preprocess(image)
-                    image_tensors.append(image_tensor)
-                except Exception as e:
-                    logger.error(f"Lỗi khi preprocess ảnh: {str(e)}")
-                    image_tensors.append(None)
-            
-            # Filter out None values
-            valid_indices = [i for i, tensor in enumerate(image_tensors) if tensor is not None]
-            valid_tensors = [image_tensors[i] for i in valid_indices]
+            # Decode/resize song song, ghi thẳng vào buffer batch cấp phát sẵn
+            pixels, valid_indices = preprocess_batch(images)
             
-            if not valid_tensors:
+            if not valid_indices:
                 return [None] * len(images)
             
-            # Batch process
-            batch_tensor = torch.stack(valid_tensors).to(self.clip_device)
-            
-            with torch.no_grad():
-                image_features = self.clip_model.encode_image(batch_tensor)
-                # Normalize features
-                image_features = image_features / image_features.norm(dim=-1, keepdim=True)
-                embeddings = image_features.cpu().numpy()
+            embeddings = self._encode_pixels(pixels)
             
             # Map back to original list
             result = [None] * len(images)
             for idx, valid_idx in enumerate(valid_indices):
-                result[valid_idx] = embeddings[idx].astype(np.float32)
+                result[valid_idx] = embeddings[idx]
             
             return result
         except Exception as e:
             logger.error(f"Lỗi khi tạo CLIP embeddings batch: {str(e)}")
             return [None] * len(images)
-
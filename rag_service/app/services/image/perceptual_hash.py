@@ -0,0 +1,94 @@
+"""
+Perceptual Hash - pHash (DCT) và dHash (gradient) 64-bit cho phát hiện ảnh gần trùng
+
+- Ảnh được decode ở kích thước nhỏ (JPEG draft mode) nên hash rẻ hơn nhiều so với CLIP
+- Ảnh re-encode, resize, đổi định dạng cho ra hash giống hoặc chỉ lệch vài bit
+- Khoảng cách Hamming tính vector hóa bằng numpy (bảng popcount theo byte)
+"""
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.services.image.preprocessing import load_rgb_image, parallel_map
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8
+PHASH_IMAGE_SIZE = 32
+# Cạnh ngắn tối thiểu khi decode ảnh để hash
+HASH_DECODE_SIZE = 64
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Ma trận DCT-II trực chuẩn n x n"""
+    k = np.arange(n).reshape(-1, 1)
+    i = np.arange(n).reshape(1, -1)
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_IMAGE_SIZE)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.astype(np.uint8).ravel()).tobytes(), "big")
+
+
+def phash(image: Image.Image) -> int:
+    """pHash: DCT 2D của ảnh xám 32x32, so 8x8 hệ số tần số thấp với median"""
+    gray = np.asarray(image.convert("L").resize((PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ gray @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    median = np.median(low.ravel()[1:])  # Bỏ hệ số DC
+    return _bits_to_int(low > median)
+
+
+def dhash(image: Image.Image) -> int:
+    """dHash: so sánh độ sáng các pixel kề nhau theo chiều ngang trên ảnh xám 9x8"""
+    gray = np.asarray(image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_int(gray[:, 1:] > gray[:, :-1])
+
+
+def compute_image_hashes(image_bytes: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Tính (pHash, dHash) của ảnh
+
+    Returns:
+        (phash, dhash) hoặc None nếu không decode được ảnh
+    """
+    try:
+        image = load_rgb_image(image_bytes, target_size=HASH_DECODE_SIZE)
+        return phash(image), dhash(image)
+    except Exception as e:
+        logger.warning(f"⚠️ Không tính được perceptual hash: {str(e)}")
+        return None
+
+
+def compute_image_hashes_batch(images: List[bytes]) -> List[Optional[Tuple[int, int]]]:
+    """Tính hashes cho nhiều ảnh song song (pool preprocess)"""
+    return parallel_map(lambda i: compute_image_hashes(images[i]), len(images))
+
+
+def hamming_distances(query: int, hashes: np.ndarray) -> np.ndarray:
+    """
+    Khoảng cách Hamming giữa một hash và mảng hashes
+
+    Args:
+        query: Hash 64-bit
+        hashes: numpy array uint64 (N,) hoặc (M, N)
+
+    Returns:
+        numpy array uint8 cùng shape với hashes
+    """
+    xor = np.bitwise_xor(hashes, np.uint64(query))
+    return _POPCOUNT[xor.view(np.uint8)].reshape(xor.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def pairwise_hamming(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Ma trận khoảng cách Hamming (len(left), len(right)) giữa hai mảng hashes uint64"""
+    xor = np.bitwise_xor(left.reshape(-1, 1), right.reshape(1, -1))
+    return _POPCOUNT[xor.view(np.uint8)].reshape(xor.shape + (8,)).sum(axis=-1, dtype=np.uint8)
@@ -0,0 +1,181 @@
+"""
+Image Preprocessing - Tiền xử lý ảnh cho CLIP bằng PIL + numpy (không cần torch)
+
+- Decode ở kích thước giảm: JPEG dùng draft mode (giải mã DCT ở 1/2, 1/4, 1/8),
+  định dạng khác được reduce() về gần kích thước cần → thời gian và bộ nhớ không
+  phụ thuộc độ phân giải camera
+- Ảnh vẫn lớn hơn IMAGE_MAX_PIXELS sau draft (PNG, WebP... không có draft) được thu nhỏ ngay sau decode
+  thay vì bị từ chối; ảnh bất thường vẫn bị PIL chặn (Image.MAX_IMAGE_PIXELS, DecompressionBombError)
+- Batch được decode/resize song song trên thread pool (PIL nhả GIL khi decode)
+  và ghi thẳng vào buffer (N, 3, 224, 224) cấp phát sẵn
+
+Kết quả tương đương clip.load(...)[1]: Resize(bicubic) → CenterCrop → ToTensor → Normalize
+"""
+import io
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+import numpy as np
+from PIL import Image
+
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Kích thước input của CLIP ViT-B/32
+CLIP_IMAGE_SIZE = 224
+# Mean/std chuẩn hóa của CLIP (theo kênh RGB)
+CLIP_MEAN = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32).reshape(3, 1, 1)
+CLIP_STD = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32).reshape(3, 1, 1)
+# Modes Image.reduce() xử lý được mà vẫn convert sang RGB đúng sau đó
+_REDUCE_MODES = ("RGB", "RGBA", "L", "LA")
+
+
+def load_rgb_image(image_bytes: bytes, target_size: Optional[int] = CLIP_IMAGE_SIZE) -> Image.Image:
+    """
+    Decode ảnh và convert sang RGB
+
+    Args:
+        image_bytes: Dữ liệu ảnh
+        target_size: Cạnh ngắn tối thiểu cần giữ lại (None = decode full resolution)
+
+    Returns:
+        Ảnh RGB, tối đa IMAGE_MAX_PIXELS pixels (ảnh lớn hơn được reduce() về dưới giới hạn)
+    """
+    image = Image.open(io.BytesIO(image_bytes))  # Chỉ đọc header
+
+    if target_size:
+        width, height = image.size
+        scale = target_size / min(width, height)
+        if scale < 1 and image.format == "JPEG":
+            # Draft chọn mức giảm lớn nhất mà ảnh vẫn >= kích thước yêu cầu
+            image.draft("RGB", (int(width * scale + 0.999), int(height * scale + 0.999)))
+
+    width, height = image.size
+    factor = 1
+    if target_size:
+        # Định dạng không hỗ trợ draft (PNG, WebP...): reduce() (box filter, nhanh) về khoảng 2x kích thước cần
+        factor = min(width, height) // (target_size * 2)
+    if width * height > Settings.IMAGE_MAX_PIXELS:
+        # Không giảm được lúc decode: thu nhỏ ngay sau decode để không giữ/xử lý ảnh full resolution
+        factor = max(factor, math.ceil(math.sqrt(width * height / Settings.IMAGE_MAX_PIXELS)))
+        logger.debug(f"Ảnh {width}x{height} vượt IMAGE_MAX_PIXELS, reduce({factor})")
+    if factor >= 2:
+        if image.mode not in _REDUCE_MODES:
+            # reduce() không hỗ trợ P, 1, I;16... → convert trước (như decode full resolution rồi convert)
+            image = image.convert("RGB")
+        image = image.reduce(factor)
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image
+
+
+def clip_preprocess_array(
+    image: Image.Image,
+    size: int = CLIP_IMAGE_SIZE,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Preprocess ảnh RGB thành tensor float32 (3, size, size) đã chuẩn hóa
+
+    Args:
+        image: Ảnh PIL (RGB)
+        size: Kích thước cạnh output
+        out: Buffer (3, size, size) float32 để ghi trực tiếp (tránh cấp phát)
+
+    Returns:
+        numpy array (3, size, size) float32
+    """
+    # Như torchvision Resize(size): cạnh ngắn = size, cạnh dài = int(size * dài / ngắn) (cắt phần lẻ)
+    width, height = image.size
+    if width <= height:
+        new_width, new_height = size, int(size * height / width)
+    else:
+        new_width, new_height = int(size * width / height), size
+    image = image.resize((new_width, new_height), Image.BICUBIC)
+
+    left = int(round((new_width - size) / 2.0))
+    top = int(round((new_height - size) / 2.0))
+    image = image.crop((left, top, left + size, top + size))
+
+    pixels = np.asarray(image, dtype=np.float32).transpose(2, 0, 1)
+    if out is None:
+        out = np.empty((3, size, size), dtype=np.float32)
+    np.multiply(pixels, 1.0 / 255.0, out=out)
+    out -= CLIP_MEAN
+    out /= CLIP_STD
+    return out
+
+
+def preprocess_image_bytes(image_bytes: bytes, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Decode (kích thước giảm) + preprocess một ảnh"""
+    return clip_preprocess_array(load_rgb_image(image_bytes), CLIP_IMAGE_SIZE, out=out)
+
+
+# ========== Batch (song song) ==========
+
+_preprocess_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_preprocess_pool() -> ThreadPoolExecutor:
+    global _preprocess_pool
+    if _preprocess_pool is None:
+        with _pool_lock:
+            if _preprocess_pool is None:
+                _preprocess_pool = ThreadPoolExecutor(
+                    max_workers=max(1, Settings.IMAGE_PREPROCESS_WORKERS),
+                    thread_name_prefix="image-preprocess"
+                )
+    return _preprocess_pool
+
+
+def parallel_map(fn: Callable[[int], T], count: int) -> List[T]:
+    """Chạy fn(0..count-1) trên pool preprocess (tuần tự khi chỉ có 1 phần tử)"""
+    if count <= 1:
+        return [fn(i) for i in range(count)]
+    return list(_get_preprocess_pool().map(fn, range(count)))
+
+
+def preprocess_into(images: List[bytes], out: np.ndarray) -> List[bool]:
+    """
+    Decode + preprocess song song, ghi ảnh i vào out[i]
+
+    Args:
+        images: Danh sách bytes ảnh
+        out: Buffer (len(images), 3, 224, 224) float32 (numpy array hoặc view trên shared memory)
+
+    Returns:
+        List cờ thành công theo từng ảnh (ảnh lỗi: hàng tương ứng được ghi 0)
+    """
+    def _fill(index: int) -> bool:
+        try:
+            preprocess_image_bytes(images[index], out=out[index])
+            return True
+        except Exception as e:
+            logger.error(f"Lỗi khi preprocess ảnh: {str(e)}")
+            out[index] = 0.0
+            return False
+
+    return parallel_map(_fill, len(images))
+
+
+def preprocess_batch(images: List[bytes]) -> Tuple[np.ndarray, List[int]]:
+    """
+    Preprocess batch ảnh vào một buffer cấp phát sẵn
+
+    Returns:
+        (pixels (M, 3, 224, 224) float32 chỉ gồm ảnh hợp lệ, chỉ số gốc của M ảnh đó)
+    """
+    pixels = np.empty((len(images), 3, CLIP_IMAGE_SIZE, CLIP_IMAGE_SIZE), dtype=np.float32)
+    ok = preprocess_into(images, pixels)
+    valid_indices = [i for i, success in enumerate(ok) if success]
+    if len(valid_indices) < len(images):
+        pixels = pixels[valid_indices]  # Chỉ copy khi có ảnh lỗi
+    return pixels, valid_indices
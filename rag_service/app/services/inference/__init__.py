@@ -0,0 +1,25 @@
+"""
+Inference Services
+Thread pool riêng cho inference (CLIP, Sentence Transformer, CrossEncoder) ngoài event loop
+"""
+from app.services.inference.executor import (
+    MODEL_CLIP,
+    MODEL_RERANKER,
+    MODEL_TEXT_EMBEDDER,
+    InferenceExecutor,
+    get_inference_executor,
+    monitor_event_loop_lag,
+    run_inference,
+    shutdown_inference_executor,
+)
+
+__all__ = [
+    "MODEL_CLIP",
+    "MODEL_RERANKER",
+    "MODEL_TEXT_EMBEDDER",
+    "InferenceExecutor",
+    "get_inference_executor",
+    "monitor_event_loop_lag",
+    "run_inference",
+    "shutdown_inference_executor",
+]
@@ -0,0 +1,248 @@
+"""
+Inference Executor - Chạy mọi forward pass (CLIP, Sentence Transformer, CrossEncoder) ngoài event loop
+
+- Thread pool riêng có giới hạn (không dùng chung default executor của asyncio.to_thread)
+- Cố định số torch intra-op threads để pool_size × torch_threads ≈ số CPU cores (tránh oversubscription)
+- Giới hạn số request đồng thời cho từng model (asyncio.Semaphore) + metrics queue depth
+- Đo event-loop lag để kiểm tra không có inference nào chạy trên event loop
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+# Tên model dùng làm key cho concurrency limit/metrics
+MODEL_CLIP = "clip"
+MODEL_TEXT_EMBEDDER = "text_embedder"
+MODEL_RERANKER = "reranker"
+
+
+class _ModelStats:
+    """Metrics của một model"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished = self.completed + self.failed
+        return {
+            "limit": self.limit,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "max_queue_depth": self.max_queue_depth,
+            "avg_wait_ms": round(self.total_wait / finished * 1000, 2) if finished else 0.0,
+            "avg_run_ms": round(self.total_run / finished * 1000, 2) if finished else 0.0,
+        }
+
+
+class InferenceExecutor:
+    """
+    Thread pool cho inference với concurrency limit theo model
+    """
+
+    def __init__(
+        self,
+        pool_size: Optional[int] = None,
+        torch_threads: Optional[int] = None,
+        model_limits: Optional[Dict[str, int]] = None
+    ):
+        """
+        Args:
+            pool_size: Số threads của pool (mặc định: Settings.INFERENCE_POOL_SIZE)
+            torch_threads: Số torch intra-op threads (0 = cpu_count // pool_size)
+            model_limits: Số request đồng thời tối đa cho từng model
+        """
+        self.pool_size = max(1, pool_size or Settings.INFERENCE_POOL_SIZE)
+        torch_threads = torch_threads if torch_threads is not None else Settings.INFERENCE_TORCH_THREADS
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.pool_size)
+        self.model_limits = dict(model_limits if model_limits is not None else Settings.INFERENCE_MODEL_CONCURRENCY)
+
+        self._pool = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="inference")
+        # Semaphore gắn với event loop → mỗi loop (vd CLI asyncio.run, worker loop) có bộ semaphores riêng
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._semaphores_lock = threading.Lock()
+        self._stats: Dict[str, _ModelStats] = {}
+        self._stats_lock = threading.Lock()
+        self._pin_torch_threads()
+
+    def _pin_torch_threads(self) -> None:
+        try:
+            import torch
+            torch.set_num_threads(self.torch_threads)
+            logger.info(f"✅ Inference executor: pool={self.pool_size}, torch threads={self.torch_threads}")
+        except ImportError:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ Không set được torch threads: {str(e)}")
+
+    def _limit(self, model: str) -> int:
+        return max(1, self.model_limits.get(model, self.pool_size))
+
+    def _get_semaphore(self, model: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._semaphores_lock:
+            semaphores = self._semaphores.setdefault(loop, {})
+            semaphore = semaphores.get(model)
+            if semaphore is None:
+                semaphore = semaphores[model] = asyncio.Semaphore(self._limit(model))
+        return semaphore
+
+    def _get_stats(self, model: str) -> _ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            with self._stats_lock:
+                stats = self._stats.setdefault(model, _ModelStats(self._limit(model)))
+        return stats
+
+    async def run(self, model: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Chạy fn(*args, **kwargs) trong inference pool, tôn trọng concurrency limit của model
+
+        Args:
+            model: Tên model (clip, text_embedder, reranker, ...)
+            fn: Hàm sync thực hiện inference
+        """
+        stats = self._get_stats(model)
+        semaphore = self._get_semaphore(model)
+        enqueued_at = time.perf_counter()
+        stats.queued += 1
+        stats.max_queue_depth = max(stats.max_queue_depth, stats.queued)
+        try:
+            await semaphore.acquire()
+        finally:
+            stats.queued -= 1
+
+        started_at = time.perf_counter()
+        stats.total_wait += started_at - enqueued_at
+        stats.running += 1
+        loop = asyncio.get_running_loop()
+
+        def finish(future: Future) -> None:
+            # Chạy trên event loop khi thread inference xong (không phải khi task await bị hủy)
+            stats.running -= 1
+            stats.total_run += time.perf_counter() - started_at
+            if future.cancelled() or future.exception() is not None:
+                stats.failed += 1
+            else:
+                stats.completed += 1
+            semaphore.release()
+
+        def on_done(future: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(finish, future)
+            except RuntimeError:
+                pass  # Event loop đã đóng: semaphore của loop đó không còn dùng
+
+        # Copy context để span mở trong lúc chạy model vẫn thuộc trace của request
+        context = contextvars.copy_context()
+        try:
+            future = self._pool.submit(context.run, functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            # Pool đã shutdown
+            stats.running -= 1
+            stats.failed += 1
+            semaphore.release()
+            raise
+        # Giữ permit tới khi thread chạy xong: task await bị hủy (vd timeout) không làm vượt concurrency limit
+        future.add_done_callback(on_done)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pool_size": self.pool_size,
+            "torch_threads": self.torch_threads,
+            "models": {name: stats.to_dict() for name, stats in sorted(self._stats.items())},
+            "event_loop_lag": _loop_lag.to_dict(),
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+# ========== Event-loop lag monitor ==========
+
+class _LoopLag:
+    def __init__(self):
+        self.samples = 0
+        self.last = 0.0
+        self.max = 0.0
+        self.total = 0.0
+
+    def record(self, lag: float) -> None:
+        self.samples += 1
+        self.last = lag
+        self.max = max(self.max, lag)
+        self.total += lag
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "last_ms": round(self.last * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+            "avg_ms": round(self.total / self.samples * 1000, 2) if self.samples else 0.0,
+        }
+
+
+_loop_lag = _LoopLag()
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """Đo độ trễ của event loop: sleep(interval) bị trễ bao lâu so với dự kiến"""
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        _loop_lag.record(max(0.0, time.perf_counter() - expected))
+
+
+_inference_executor: Optional[InferenceExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_inference_executor() -> InferenceExecutor:
+    """
+    Lấy instance của InferenceExecutor (singleton)
+
+    Returns:
+        InferenceExecutor instance
+    """
+    global _inference_executor
+    if _inference_executor is None:
+        with _executor_lock:
+            if _inference_executor is None:
+                _inference_executor = InferenceExecutor()
+    return _inference_executor
+
+
+def shutdown_inference_executor() -> None:
+    """Dừng inference pool nếu đã tạo (server shutdown); lần gọi get_inference_executor() sau tạo pool mới"""
+    global _inference_executor
+    with _executor_lock:
+        executor, _inference_executor = _inference_executor, None
+    if executor is not None:
+        executor.shutdown()
+
+
+async def run_inference(model: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Shortcut cho get_inference_executor().run(...)"""
+    return await get_inference_executor().run(model, fn, *args, **kwargs)
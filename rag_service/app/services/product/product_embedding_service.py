@@ -144,7 +144,7 @@ class ProductEmbeddingService:
         text_clip_emb = None
         if text:
             # 🔥 Dùng CLIP text encoder (từ image_embedding_service) để tương thích với image embedding
-            text_clip_emb = self.image_embedding_service.create_text_embedding(text)
+            text_clip_emb = await self.image_embedding_service.create_text_embedding_async(text)
             results['text_embedding'] = text_clip_emb
         
         primary_embedding = None
@@ -209,13 +209,9 @@ class ProductEmbeddingService:
             else:
                 image_list.append(None)
         
-        # Batch embed texts (CLIP text encoder)
-        text_embeddings = []
-        valid_texts = [(i, t) for i, t in enumerate(texts) if t]
-        if valid_texts:
-            for idx, text in valid_texts:
-                text_emb = self.image_embedding_service.create_text_embedding(text)
-                text_embeddings.append((idx, text_emb))
+        # Batch embed texts (CLIP text encoder) - một lần gọi cho cả batch thay vì từng product
+        batch_text_embs = await self.image_embedding_service.create_text_embeddings(texts)
+        text_embeddings = [(idx, emb) for idx, emb in enumerate(batch_text_embs) if emb is not None]
         
         image_embeddings = []
         valid_images = [(i, img) for i, img in enumerate(image_list) if img]
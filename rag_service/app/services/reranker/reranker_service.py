@@ -1,8 +1,14 @@
 import logging
-from typing import List, Dict
+import threading
+import time
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
 import numpy as np
 
 from app.core.settings import Settings
+from app.core.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -10,79 +16,272 @@ logger = logging.getLogger(__name__)
 class RerankerService:
     """
     Service sắp xếp lại kết quả tìm kiếm
+
+    - Model được tải ở background (start_background_load) thay vì trong request đầu tiên
+    - Backend "torch" (CrossEncoder) hoặc "onnx" (ONNX Runtime, tùy chọn int8 trên CPU)
+    - Các cặp (query, chunk) được chấm điểm theo batch đã gom theo độ dài để giảm padding
+    - Điểm được cache theo (query, chunk_id) với LRU eviction
     """
-    
+
+    # Trạng thái load model
+    STATE_DISABLED = "disabled"
+    STATE_NOT_LOADED = "not_loaded"
+    STATE_LOADING = "loading"
+    STATE_READY = "ready"
+    STATE_FAILED = "failed"
+
     def __init__(self):
         self.use_reranker = Settings.USE_RERANKER
+        self.backend = Settings.RERANKER_BACKEND
+        self.batch_size = max(1, Settings.RERANKER_BATCH_SIZE)
+        self.max_length = Settings.RERANKER_MAX_LENGTH
         self.model = None
         self._model_loaded = False
-    
-    
+
+        # ONNX runtime (chỉ dùng khi backend = "onnx")
+        self._ort_session = None
+        self._tokenizer = None
+        self._ort_input_names: List[str] = []
+
+        self._load_lock = threading.Lock()
+        self._load_thread: Optional[threading.Thread] = None
+        self.state = self.STATE_NOT_LOADED if self.use_reranker else self.STATE_DISABLED
+        self.load_time: Optional[float] = None
+        self.error: Optional[str] = None
+
+        # LRU cache điểm rerank: (query, chunk_key) -> score
+        self._score_cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_size = Settings.RERANKER_CACHE_SIZE
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    @property
+    def is_ready(self) -> bool:
+        """Reranker đã sẵn sàng để chấm điểm chưa"""
+        return self.use_reranker and self.state == self.STATE_READY
+
+    def start_background_load(self) -> None:
+        """Tải model trong background thread (gọi khi server start)"""
+        if not self.use_reranker or self._model_loaded:
+            return
+        with self._load_lock:
+            if self._load_thread is not None and self._load_thread.is_alive():
+                return
+            self._load_thread = threading.Thread(
+                target=self._ensure_model_loaded,
+                name="reranker-loader",
+                daemon=True
+            )
+            self._load_thread.start()
+
+    def get_status(self) -> Dict:
+        """Trạng thái reranker cho health/readiness"""
+        total = self._cache_hits + self._cache_misses
+        return {
+            "enabled": self.use_reranker,
+            "state": self.state,
+            "backend": self.backend,
+            "model": Settings.RERANKER_MODEL,
+            "load_time": round(self.load_time, 3) if self.load_time is not None else None,
+            "error": self.error,
+            "cache_size": len(self._score_cache),
+            "cache_hit_rate": round(self._cache_hits / total, 3) if total else 0.0,
+        }
+
     def _ensure_model_loaded(self):
         if self._model_loaded:
             return
-        
+
         if not self.use_reranker:
             return
-        
-        try:
-            from sentence_transformers import CrossEncoder
-            model_name = Settings.RERANKER_MODEL
-            logger.info(f"Đang tải reranker model: {model_name} (lần đầu tiên, có thể mất vài phút)...")
-            self.model = CrossEncoder(model_name)
-            self._model_loaded = True
-            logger.info(f"✅ Reranker đã tải xong: {model_name}")
-        except ImportError:
-            logger.warning("sentence-transformers chưa được cài đặt. Reranker bị tắt.")
-            self.use_reranker = False
-            self._model_loaded = True  # Đánh dấu đã thử load để không thử lại
-        except Exception as e:
-            logger.error(f"Lỗi khi tải reranker: {str(e)}")
-            self.use_reranker = False
-            self._model_loaded = True
-    
+
+        with self._load_lock:
+            if self._model_loaded:
+                return
+            self.state = self.STATE_LOADING
+            start_time = time.time()
+            try:
+                if self.backend == "onnx":
+                    try:
+                        self._load_onnx_model()
+                    except ImportError as e:
+                        logger.warning(f"⚠️ ONNX Runtime/optimum chưa được cài ({str(e)}). Dùng CrossEncoder (torch).")
+                        self.backend = "torch"
+                if self.backend != "onnx":
+                    self._load_torch_model()
+                self.load_time = time.time() - start_time
+                self.state = self.STATE_READY
+                logger.info(f"✅ Reranker đã tải xong: {Settings.RERANKER_MODEL} ({self.backend}) trong {self.load_time:.2f}s")
+            except ImportError:
+                logger.warning("sentence-transformers chưa được cài đặt. Reranker bị tắt.")
+                self.use_reranker = False
+                self.state = self.STATE_DISABLED
+            except Exception as e:
+                logger.error(f"Lỗi khi tải reranker: {str(e)}")
+                self.use_reranker = False
+                self.state = self.STATE_FAILED
+                self.error = str(e)
+            finally:
+                self._model_loaded = True  # Đánh dấu đã thử load để không thử lại
+
+    def _load_torch_model(self):
+        from sentence_transformers import CrossEncoder
+        model_name = Settings.RERANKER_MODEL
+        logger.info(f"Đang tải reranker model: {model_name} (có thể mất vài phút)...")
+        self.model = CrossEncoder(model_name, max_length=self.max_length)
+
+    def _load_onnx_model(self):
+        """
+        Tải model ONNX (export một lần bằng optimum, lưu vào RERANKER_ONNX_DIR).
+        Nếu RERANKER_QUANTIZE bật, tạo thêm bản int8 bằng dynamic quantization.
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_name = Settings.RERANKER_MODEL
+        onnx_dir = Path(Settings.RERANKER_ONNX_DIR) / model_name.replace("/", "__")
+        fp32_path = onnx_dir / "model.onnx"
+        int8_path = onnx_dir / "model_int8.onnx"
+
+        if not fp32_path.exists():
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+            logger.info(f"Đang export reranker sang ONNX: {model_name} → {onnx_dir}")
+            ORTModelForSequenceClassification.from_pretrained(model_name, export=True).save_pretrained(onnx_dir)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(onnx_dir)
+
+        model_path = fp32_path
+        if Settings.RERANKER_QUANTIZE:
+            if not int8_path.exists():
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                logger.info("Đang quantize reranker ONNX sang int8...")
+                quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+            model_path = int8_path
+
+        session_options = ort.SessionOptions()
+        if Settings.RERANKER_ORT_THREADS > 0:
+            session_options.intra_op_num_threads = Settings.RERANKER_ORT_THREADS
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self._ort_session = ort.InferenceSession(
+            str(model_path),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"]
+        )
+        self._ort_input_names = [i.name for i in self._ort_session.get_inputs()]
+        self._tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+        # Đánh dấu model có sẵn (giữ tương thích với code kiểm tra reranker_service.model)
+        self.model = self._ort_session
+        logger.info(f"✅ Reranker ONNX session: {model_path.name}")
+
+    # ========== Scoring ==========
+
+    @staticmethod
+    def _chunk_key(chunk: Dict) -> str:
+        # Kèm hash nội dung để chunk_id được tái sử dụng sau khi upload lại không trả điểm cũ
+        text_hash = hashlib.md5(chunk.get('text', '').encode("utf-8")).hexdigest()[:12]
+        return f"{chunk.get('chunk_id', '')}:{text_hash}"
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._cache_lock:
+            score = self._score_cache.get(key)
+            if score is None:
+                self._cache_misses += 1
+                return None
+            self._score_cache.move_to_end(key)
+            self._cache_hits += 1
+            return score
+
+    def _cache_set(self, key: Tuple[str, str], score: float) -> None:
+        if self._cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._score_cache[key] = score
+            self._score_cache.move_to_end(key)
+            while len(self._score_cache) > self._cache_size:
+                self._score_cache.popitem(last=False)
+
+    def _predict_batch(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        """Chấm điểm một batch (đã cùng khoảng độ dài)"""
+        if self._ort_session is not None:
+            encoded = self._tokenizer(
+                [p[0] for p in pairs],
+                [p[1] for p in pairs],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self._ort_input_names if name in encoded}
+            logits = self._ort_session.run(None, feeds)[0].reshape(-1)
+            # CrossEncoder 1 label mặc định dùng sigmoid → giữ cùng thang điểm [0, 1]
+            return 1.0 / (1.0 + np.exp(-logits))
+        return np.asarray(self.model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)).reshape(-1)
+
+    def _score_pairs(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """
+        Chấm điểm theo batch gom theo độ dài: sắp xếp theo độ dài chunk rồi chia batch,
+        mỗi batch chỉ pad tới chunk dài nhất trong batch đó
+        """
+        order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][1]))
+        scores = [0.0] * len(pairs)
+        for start in range(0, len(order), self.batch_size):
+            bucket = order[start:start + self.batch_size]
+            batch_scores = self._predict_batch([pairs[i] for i in bucket])
+            for i, score in zip(bucket, batch_scores):
+                scores[i] = float(score)
+        return scores
+
+    @traced("rerank")
     async def rerank(
-        self, 
-        query: str, 
+        self,
+        query: str,
         chunks: List[Dict],
         top_k: int = None
     ) -> List[Dict]:
         """
-        Sắp xếp lại các chunks dựa trên độ liên quan với query   
+        Sắp xếp lại các chunks dựa trên độ liên quan với query
         Returns:
             Danh sách chunks đã được sắp xếp lại theo độ liên quan
         """
         # Nếu reranker không được bật hoặc không có chunks, trả về nguyên bản
         if not self.use_reranker or not chunks:
             return chunks
-        
-        # Lazy load model chỉ khi thực sự cần
-        self._ensure_model_loaded()
-        
-        if not self.model:
+
+        # Model chưa sẵn sàng: kích hoạt load ở background, không block request
+        if not self.is_ready:
+            self.start_background_load()
             return chunks
-        
+
         try:
-            # Chuẩn bị các cặp [query, chunk_text] để đánh giá
-            pairs = [[query, chunk.get('text', '')] for chunk in chunks]
-            
-            # Tính điểm relevance cho từng cặp
-            scores = self.model.predict(pairs)
-            
+            from app.services.inference import MODEL_RERANKER, run_inference
+
+            # Lấy điểm từ cache, chỉ chấm điểm các cặp chưa có
+            keys = [(query, self._chunk_key(chunk)) for chunk in chunks]
+            scores: List[Optional[float]] = [self._cache_get(key) for key in keys]
+            missing = [i for i, score in enumerate(scores) if score is None]
+
+            if missing:
+                pairs = [(query, chunks[i].get('text', '')) for i in missing]
+                # Chạy inference trong inference pool để không block event loop
+                new_scores = await run_inference(MODEL_RERANKER, self._score_pairs, pairs)
+                for i, score in zip(missing, new_scores):
+                    scores[i] = score
+                    self._cache_set(keys[i], score)
+
             # Thêm điểm rerank vào mỗi chunk
             for i, chunk in enumerate(chunks):
                 chunk['rerank_score'] = float(scores[i])
-            
+
             # Sắp xếp theo điểm rerank giảm dần (chunks liên quan nhất ở đầu)
             reranked = sorted(chunks, key=lambda x: x.get('rerank_score', 0), reverse=True)
-            
+
             # Trả về top_k chunks nếu được chỉ định
             if top_k is not None and top_k > 0:
                 return reranked[:top_k]
-            
+
             return reranked
-            
+
         except Exception as e:
             logger.error(f"Lỗi khi sắp xếp lại: {str(e)}")
             return chunks  # Trả về chunks gốc nếu có lỗi
-
@@ -0,0 +1,11 @@
+"""
+Benchmarks - Đo hiệu năng end-to-end và microbenchmarks của rag_service
+
+    python -m benchmarks --suites micro,retrieve --concurrency 1,8,32 --output results/run.json
+    python -m benchmarks compare results/base.json results/run.json
+
+Mặc định chạy với fake embeddings/LLM và SQLite dữ liệu giả trong thư mục riêng (--real để dùng model thật)
+"""
+from benchmarks.harness import BenchmarkContext, load_sweep, microbench, percentile, run_load, summarize
+
+__all__ = ["BenchmarkContext", "load_sweep", "microbench", "percentile", "run_load", "summarize"]
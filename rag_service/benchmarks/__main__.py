@@ -0,0 +1,150 @@
+"""
+CLI benchmark
+
+    python -m benchmarks run [--suites micro,retrieve,multi_agent,products,ingest] [--concurrency 1,8,32]
+                             [--requests 200 | --duration 30] [--real] [--output file.json] [--baseline file.json]
+    python -m benchmarks compare baseline.json current.json [--threshold 0.1]
+
+Biến môi trường phải được đặt trước khi import app (Settings đọc env lúc import):
+mặc định dùng thư mục data/benchmark riêng (Chroma, registry, SQLite dữ liệu giả) và fake embeddings/LLM;
+biến môi trường đã đặt sẵn luôn được giữ nguyên
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_DATA_DIR = ROOT / "data" / "benchmark"
+DEFAULT_RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def _configure_environment(args: argparse.Namespace) -> None:
+    data_dir = Path(args.data_dir or DEFAULT_DATA_DIR).resolve()
+    defaults = {
+        "CHROMA_PERSIST_DIR": str(data_dir / "chroma_db"),
+        "DOCUMENT_REGISTRY_PATH": str(data_dir / "document_registry.sqlite3"),
+        "DATABASE_BACKEND": "sqlite",
+        "SQLITE_DATABASE_PATH": str(data_dir / "fresher_food.sqlite3"),
+        "SQLITE_SYNTHETIC_SCALE": str(args.scale),
+    }
+    if not args.real:
+        defaults.update({
+            "FAKE_EMBEDDINGS": "true",
+            "FAKE_LLM": "true",
+            "MODEL_SERVER_ENABLED": "false",
+            "USE_RERANKER": "false",
+        })
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+
+
+def _parse_list(value: str, cast=str) -> list:
+    return [cast(item.strip()) for item in value.split(",") if item.strip()]
+
+
+async def _run_suites(args: argparse.Namespace) -> dict:
+    from benchmarks.harness import BenchmarkContext
+    from benchmarks.results import environment_info
+    from benchmarks.suites import SUITES
+
+    suites = _parse_list(args.suites) if args.suites else list(SUITES)
+    unknown = [name for name in suites if name not in SUITES]
+    if unknown:
+        raise SystemExit(f"Suite không tồn tại: {', '.join(unknown)} (có: {', '.join(SUITES)})")
+
+    ctx = BenchmarkContext(
+        concurrency=_parse_list(args.concurrency, int),
+        requests=args.requests,
+        duration=args.duration,
+        warmup=args.warmup,
+        min_time=args.min_time,
+        seed=args.seed,
+        quick=args.quick,
+    )
+    logger = logging.getLogger("benchmarks")
+    results = {"meta": {**environment_info(), "context": vars(ctx), "suites": suites}, "suites": {}}
+    for name in suites:
+        logger.info(f"▶ {name}")
+        start = time.perf_counter()
+        try:
+            module = importlib.import_module(f"benchmarks.suites.{name}")
+            suite_result = await module.run(ctx)
+        except Exception as e:
+            logger.error(f"❌ Suite {name} lỗi: {str(e)}", exc_info=True)
+            suite_result = {"error": f"{type(e).__name__}: {str(e)}"}
+        suite_result["seconds"] = round(time.perf_counter() - start, 3)
+        results["suites"][name] = suite_result
+    return results
+
+
+def _command_run(args: argparse.Namespace) -> int:
+    _configure_environment(args)
+    from benchmarks.results import compare_results, format_comparison, load_results, save_results
+
+    results = asyncio.run(_run_suites(args))
+    commit = (results["meta"].get("git_commit") or "nogit")[:8]
+    output = args.output or DEFAULT_RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json"
+    print(f"Kết quả: {save_results(results, str(output))}")
+
+    if args.baseline:
+        rows = compare_results(load_results(args.baseline), results, args.threshold)
+        print(format_comparison(rows))
+        if args.fail_on_regression and any(row["status"] == "regression" for row in rows):
+            return 1
+    return 1 if any("error" in suite for suite in results["suites"].values()) else 0
+
+
+def _command_compare(args: argparse.Namespace) -> int:
+    sys.path.insert(0, str(ROOT))
+    from benchmarks.results import compare_results, format_comparison, load_results
+
+    rows = compare_results(load_results(args.baseline), load_results(args.current), args.threshold)
+    print(format_comparison(rows))
+    return 1 if args.fail_on_regression and any(row["status"] == "regression" for row in rows) else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark rag_service")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Chạy các suites và lưu kết quả JSON")
+    run.add_argument("--suites", default="", help="Danh sách suites (mặc định: tất cả)")
+    run.add_argument("--concurrency", default="1,8,32", help="Các mức concurrency của load generator")
+    run.add_argument("--requests", type=int, default=200, help="Số request mỗi mức concurrency")
+    run.add_argument("--duration", type=float, default=None, help="Chạy mỗi mức concurrency trong N giây (thay cho --requests)")
+    run.add_argument("--warmup", type=int, default=10, help="Số request warm-up (không tính) trước mỗi mức")
+    run.add_argument("--min-time", type=float, default=0.5, help="Thời gian đo tối thiểu (giây) mỗi microbenchmark")
+    run.add_argument("--seed", type=int, default=42)
+    run.add_argument("--scale", type=float, default=1.0, help="Scale factor database SQLite giả")
+    run.add_argument("--quick", action="store_true", help="Corpus nhỏ, bỏ tài liệu lớn (smoke test)")
+    run.add_argument("--real", action="store_true", help="Dùng embeddings/LLM/reranker thật theo cấu hình")
+    run.add_argument("--data-dir", default=None, help=f"Thư mục dữ liệu benchmark (mặc định: {DEFAULT_DATA_DIR})")
+    run.add_argument("--output", default=None, help=f"File JSON kết quả (mặc định: {DEFAULT_RESULTS_DIR}/<thời gian>-<commit>.json)")
+    run.add_argument("--baseline", default=None, help="File kết quả để so sánh sau khi chạy")
+    run.set_defaults(handler=_command_run)
+
+    compare = commands.add_parser("compare", help="So sánh hai file kết quả")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.set_defaults(handler=_command_compare)
+
+    for command in (run, compare):
+        command.add_argument("--threshold", type=float, default=0.10, help="Ngưỡng thay đổi tương đối bị coi là regression")
+        command.add_argument("--fail-on-regression", action="store_true", help="Exit code 1 nếu có regression")
+
+    args = parser.parse_args(argv)
+    # Log của app chỉ hiện lỗi (log từng request làm nhiễu kết quả và output)
+    logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    logging.getLogger("benchmarks").setLevel(logging.INFO)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Corpus - Dữ liệu đầu vào tất định cho benchmark (tài liệu, câu hỏi, ảnh)
+Cùng seed → cùng bytes, để kết quả giữa các commit so sánh được
+"""
+import io
+import random
+from typing import Dict, List
+
+# Câu hỏi cho RAGPipeline.retrieve (tài liệu chính sách/hướng dẫn)
+RETRIEVE_QUESTIONS = [
+    "Chính sách đổi trả hàng tươi sống như thế nào?",
+    "Phí giao hàng nội thành là bao nhiêu?",
+    "Bảo quản cá hồi trong tủ lạnh được mấy ngày?",
+    "Thời gian giao hàng dự kiến cho đơn đặt buổi tối?",
+    "Làm sao để hủy đơn hàng đã đặt?",
+    "Cửa hàng có những hình thức thanh toán nào?",
+    "Điều kiện áp dụng mã khuyến mãi?",
+    "Rau củ hữu cơ có chứng nhận gì?",
+]
+
+# Câu hỏi cho MultiAgentOrchestrator.process (đủ các intent của Router)
+MULTI_AGENT_QUERIES = [
+    "Tìm cá hồi Na Uy",
+    "Giá thịt bò Úc bao nhiêu?",
+    "Doanh thu tháng 3 năm nay",
+    "Top sản phẩm bán chạy nhất",
+    "Sản phẩm nào sắp hết hạn?",
+    "Thông tin sản phẩm sữa tươi và nguồn gốc",
+    "Phí giao hàng và thời gian giao",
+    "Tìm tôm sú và cho xem hình ảnh",
+]
+
+# Query cho /api/products/search/text và /search/chat
+PRODUCT_QUERIES = [
+    "cá hồi", "thịt bò", "rau muống", "táo", "sữa tươi", "tôm sú",
+    "gạo ST25", "nước mắm", "thịt bò và cá hồi", "trái cây nhập khẩu",
+]
+
+_SENTENCES = [
+    "Fresher Food giao thực phẩm tươi sống trong ngày tại nội thành.",
+    "Sản phẩm được bảo quản lạnh từ 0 đến 4 độ C trong suốt quá trình vận chuyển.",
+    "Khách hàng có thể đổi trả trong vòng 24 giờ nếu sản phẩm không đạt chất lượng.",
+    "Phí giao hàng được miễn cho đơn từ 300.000 đồng trở lên.",
+    "Cá hồi Na Uy nên dùng trong 2 ngày khi bảo quản ngăn mát.",
+    "Rau củ hữu cơ có chứng nhận VietGAP và được kiểm tra dư lượng thuốc.",
+    "Đơn hàng đặt sau 20 giờ sẽ được giao vào sáng hôm sau.",
+    "Mã khuyến mãi chỉ áp dụng một lần cho mỗi tài khoản.",
+    "Thanh toán bằng tiền mặt, thẻ ngân hàng hoặc ví điện tử.",
+    "Đơn hàng có thể hủy miễn phí trước khi cửa hàng xác nhận.",
+    "Thịt bò Úc được cắt lát theo yêu cầu và đóng khay hút chân không.",
+    "Trái cây nhập khẩu có tem truy xuất nguồn gốc trên từng hộp.",
+]
+
+
+def make_document(size_bytes: int, seed: int = 0) -> bytes:
+    """Tài liệu .txt (UTF-8) ~size_bytes gồm các đoạn văn tiếng Việt"""
+    rng = random.Random(seed)
+    parts: List[str] = []
+    total = 0
+    while total < size_bytes:
+        paragraph = " ".join(rng.choice(_SENTENCES) for _ in range(rng.randint(3, 8))) + "\n\n"
+        parts.append(paragraph)
+        total += len(paragraph.encode("utf-8"))
+    return "".join(parts).encode("utf-8")[:size_bytes]
+
+
+def make_documents(count: int, size_bytes: int, seed: int = 0) -> Dict[str, bytes]:
+    """count tài liệu {file_name: bytes}"""
+    return {f"bench_doc_{i:03d}.txt": make_document(size_bytes, seed + i) for i in range(count)}
+
+
+def make_image(seed: int = 0, size: int = 224) -> bytes:
+    """Ảnh PNG size×size tất định (gradient + khối màu)"""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    base = np.linspace(0, 255, size, dtype=np.float32)
+    pixels = np.stack([
+        np.add.outer(base, base) / 2,
+        np.tile(base, (size, 1)),
+        np.full((size, size), rng.integers(0, 256), dtype=np.float32),
+    ], axis=-1)
+    x, y = rng.integers(0, size // 2, 2)
+    pixels[y:y + size // 3, x:x + size // 3] = rng.integers(0, 256, 3)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels.astype(np.uint8)).save(buffer, format="PNG")
+    return buffer.getvalue()
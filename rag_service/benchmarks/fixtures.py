@@ -0,0 +1,93 @@
+"""
+Fixtures - Nạp dữ liệu benchmark vào vector stores trước khi đo
+
+- Tài liệu text: IngestPipeline với file_id cố định (BENCH-DOC-xxx), xóa lại sau khi đo
+- Products: CatalogSyncPipeline từ bảng SanPham của database (SQLite giả khi DATABASE_BACKEND=sqlite);
+  sync tăng dần theo fingerprint nên các lần chạy sau gần như không tốn thời gian
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List
+
+from benchmarks.corpus import make_documents
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_ID_PREFIX = "BENCH-DOC-"
+
+
+async def seed_documents(count: int, size_bytes: int, seed: int = 0) -> Dict[str, Any]:
+    """Ingest count tài liệu ~size_bytes; trả về file_ids + thời gian"""
+    from app.api.deps import get_ingest_pipeline
+
+    ingest_pipeline = get_ingest_pipeline()
+    start = time.perf_counter()
+    file_ids: List[str] = []
+    for i, (file_name, content) in enumerate(make_documents(count, size_bytes, seed).items()):
+        file_ids.append(await ingest_pipeline.process_and_store(content, file_name, f"{DOCUMENT_ID_PREFIX}{i:03d}"))
+    return {"file_ids": file_ids, "documents": count, "bytes": size_bytes, "seconds": round(time.perf_counter() - start, 3)}
+
+
+async def remove_documents(file_ids: List[str]) -> None:
+    from app.api.deps import get_vector_store
+
+    vector_store = get_vector_store()
+    for file_id in file_ids:
+        try:
+            await vector_store.delete_document(file_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Không xóa được {file_id}: {str(e)}")
+
+
+def load_product_records(limit: int) -> List[Dict]:
+    """Products (đã normalize) từ database đang cấu hình"""
+    from app.api.deps import get_database
+    from app.core.catalog_sync_pipeline import normalize_product_record
+
+    database = get_database()
+    if database is None:
+        raise RuntimeError("Database chưa cấu hình (DATABASE_BACKEND / DATABASE_CONNECTION_STRING)")
+    dialect = database.dialect
+    query = f"""
+        SELECT {dialect.top(limit)} sp.MaSanPham, sp.TenSanPham, sp.MoTa, sp.MaDanhMuc, dm.TenDanhMuc,
+               sp.GiaBan, sp.DonViTinh, sp.XuatXu, sp.Anh
+        FROM SanPham sp
+        LEFT JOIN DanhMuc dm ON sp.MaDanhMuc = dm.MaDanhMuc
+        WHERE COALESCE(sp.IsDeleted, 0) = 0
+        ORDER BY sp.MaSanPham
+        {dialect.limit(limit)}
+    """
+    with database.connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query)
+        rows = cursor.fetchall()
+    return [
+        normalize_product_record({
+            "product_id": row[0],
+            "product_name": row[1],
+            "description": row[2],
+            "category_id": row[3],
+            "category_name": row[4],
+            "price": float(row[5]) if row[5] is not None else None,
+            "unit": row[6],
+            "origin": row[7],
+            "image_filename": row[8],
+        })
+        for row in rows
+    ]
+
+
+async def seed_products(limit: int) -> Dict[str, Any]:
+    """Đồng bộ tối đa limit products (chỉ text, không ảnh) vào image vector store"""
+    from app.api.deps import get_catalog_sync_pipeline
+
+    start = time.perf_counter()
+    records = await asyncio.to_thread(load_product_records, limit)
+    report = await get_catalog_sync_pipeline().sync(records)
+    return {
+        "products": len(records),
+        "embedded": report.get("embedded", 0),
+        "unchanged": report.get("unchanged", 0),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
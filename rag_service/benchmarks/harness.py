@@ -0,0 +1,209 @@
+"""
+Harness - Đo microbenchmark (sync) và load generator (async) với thống kê percentile
+
+- microbench(): tự chọn số lần lặp mỗi vòng như timeit, báo ns/op theo phân phối các vòng
+- run_load(): N workers đồng thời gọi cùng một coroutine, báo p50/p95/p99 và throughput
+- load_sweep(): run_load ở nhiều mức concurrency
+"""
+import asyncio
+import itertools
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Đánh dấu hết request (inputs có thể chứa None)
+_DONE = object()
+
+
+@dataclass
+class BenchmarkContext:
+    """Tham số chung cho các suites (từ CLI)"""
+    concurrency: List[int] = field(default_factory=lambda: [1, 8, 32])
+    requests: int = 200
+    duration: Optional[float] = None
+    warmup: int = 10
+    min_time: float = 0.5
+    seed: int = 42
+    quick: bool = False
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Percentile q (0-100) nội suy tuyến tính trên danh sách đã sort"""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * q / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(latencies_ms: List[float], wall_seconds: float, errors: int = 0) -> Dict[str, Any]:
+    """Thống kê latency (ms) + throughput (requests thành công / giây)"""
+    values = sorted(latencies_ms)
+    count = len(values)
+    return {
+        "count": count,
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 4),
+        "throughput_rps": round(count / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        "mean_ms": round(sum(values) / count, 3) if count else 0.0,
+        "min_ms": round(values[0], 3) if count else 0.0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3) if count else 0.0,
+    }
+
+
+def microbench(
+    fn: Callable[[], Any],
+    min_time: float = 0.5,
+    rounds: int = 7,
+    **info
+) -> Dict[str, Any]:
+    """
+    Đo một hàm sync không tham số
+
+    Args:
+        fn: Hàm cần đo
+        min_time: Tổng thời gian đo tối thiểu (giây), chia đều cho các vòng
+        rounds: Số vòng đo (thống kê trên thời gian mỗi op của từng vòng)
+        info: Thông tin thêm ghi vào kết quả (kích thước input, ...)
+
+    Returns:
+        ns_per_op (median), ops_per_sec, số lần lặp mỗi vòng, p50/p95/min/max ns mỗi op
+    """
+    fn()  # Warm-up (cache, import lười)
+    # Tăng số lần lặp tới khi một vòng đủ dài
+    number = 1
+    target = min_time / rounds
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= target or number >= 1 << 24:
+            break
+        number = max(number * 2, int(number * target / elapsed) if elapsed > 0 else number * 10)
+
+    per_op_ns = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_op_ns.append((time.perf_counter() - start) * 1e9 / number)
+    per_op_ns.sort()
+    median = percentile(per_op_ns, 50)
+    return {
+        **info,
+        "number": number,
+        "rounds": rounds,
+        "ns_per_op": round(median, 1),
+        "ops_per_sec": round(1e9 / median, 1) if median > 0 else 0.0,
+        "min_ns": round(per_op_ns[0], 1),
+        "p95_ns": round(percentile(per_op_ns, 95), 1),
+        "max_ns": round(per_op_ns[-1], 1),
+    }
+
+
+async def run_load(
+    op: Callable[[Any], Awaitable[Any]],
+    inputs: Sequence[Any],
+    concurrency: int,
+    requests: Optional[int] = None,
+    duration: Optional[float] = None,
+    warmup: int = 0
+) -> Dict[str, Any]:
+    """
+    Load generator closed-loop: concurrency workers, mỗi worker gọi op(input) liên tục
+
+    Args:
+        op: Coroutine function nhận một input
+        inputs: Inputs dùng xoay vòng
+        concurrency: Số request đồng thời
+        requests: Tổng số request (mặc định 100 nếu không có duration)
+        duration: Chạy trong bao nhiêu giây (ưu tiên hơn requests)
+        warmup: Số request chạy trước (không tính)
+
+    Returns:
+        summarize() + concurrency; lỗi đầu tiên (nếu có) trong "first_error"
+    """
+    if not inputs:
+        raise ValueError("inputs rỗng")
+    if duration is None and requests is None:
+        requests = 100
+    cycle = itertools.cycle(inputs)
+
+    for _ in range(warmup):
+        try:
+            await op(next(cycle))
+        except Exception:
+            pass
+
+    latencies: List[float] = []
+    errors = 0
+    first_error: Optional[str] = None
+    issued = 0
+    start = time.perf_counter()
+    deadline = start + duration if duration is not None else None
+
+    def _take() -> Any:
+        nonlocal issued
+        if deadline is not None:
+            if time.perf_counter() >= deadline:
+                return _DONE
+        elif issued >= requests:
+            return _DONE
+        issued += 1
+        return next(cycle)
+
+    async def worker() -> None:
+        nonlocal errors, first_error
+        while True:
+            item = _take()
+            if item is _DONE:
+                return
+            request_start = time.perf_counter()
+            try:
+                await op(item)
+            except Exception as e:
+                errors += 1
+                if first_error is None:
+                    first_error = f"{type(e).__name__}: {str(e)}"
+                continue
+            latencies.append((time.perf_counter() - request_start) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    result = {"concurrency": concurrency, **summarize(latencies, time.perf_counter() - start, errors)}
+    if first_error:
+        result["first_error"] = first_error
+    return result
+
+
+async def load_sweep(
+    name: str,
+    op: Callable[[Any], Awaitable[Any]],
+    inputs: Sequence[Any],
+    ctx: BenchmarkContext
+) -> List[Dict[str, Any]]:
+    """run_load ở từng mức concurrency của ctx"""
+    results = []
+    for concurrency in ctx.concurrency:
+        result = await run_load(
+            op,
+            inputs,
+            concurrency,
+            requests=ctx.requests,
+            duration=ctx.duration,
+            warmup=ctx.warmup
+        )
+        logger.info(
+            f"  {name} c={concurrency}: p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+            f"p99={result['p99_ms']}ms {result['throughput_rps']} req/s errors={result['errors']}"
+        )
+        results.append(result)
+    return results
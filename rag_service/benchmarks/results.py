@@ -0,0 +1,139 @@
+"""
+Results - Lưu kết quả benchmark ra JSON (kèm commit/môi trường) và so sánh hai lần chạy
+
+Cấu trúc file:
+    {"meta": {...}, "suites": {"<suite>": {"setup": {...}, "micro": {name: microbench()},
+                                          "load": {name: [run_load() mỗi concurrency]}}}}
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# (metric, True nếu giá trị lớn hơn là tốt hơn)
+LOAD_METRICS = (("p50_ms", False), ("p95_ms", False), ("p99_ms", False), ("throughput_rps", True))
+MICRO_METRICS = (("ns_per_op", False),)
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", *args],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def environment_info() -> Dict[str, Any]:
+    """Commit, máy, Python và các setting ảnh hưởng kết quả"""
+    from app.core.settings import Settings
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": _git("rev-parse", "HEAD"),
+        "git_dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "FAKE_EMBEDDINGS": Settings.FAKE_EMBEDDINGS,
+            "FAKE_LLM": Settings.FAKE_LLM,
+            "FAKE_EMBEDDING_LATENCY": Settings.FAKE_EMBEDDING_LATENCY,
+            "FAKE_LLM_LATENCY": Settings.FAKE_LLM_LATENCY,
+            "DATABASE_BACKEND": Settings.DATABASE_BACKEND,
+            "USE_RERANKER": Settings.USE_RERANKER,
+            "USE_OPENAI_EMBEDDINGS": Settings.USE_OPENAI_EMBEDDINGS,
+            "MODEL_SERVER_ENABLED": Settings.MODEL_SERVER_ENABLED,
+            "USE_MERGED_REASONING_SYNTHESIS": Settings.USE_MERGED_REASONING_SYNTHESIS,
+            "ENABLE_CRITIC_AGENT": Settings.ENABLE_CRITIC_AGENT,
+            "ENABLE_AGENT_CACHE": Settings.ENABLE_AGENT_CACHE,
+        },
+    }
+
+
+def save_results(results: Dict[str, Any], path: str) -> Path:
+    output = Path(path)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    return output
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def flatten_metrics(results: Dict[str, Any]) -> Dict[Tuple[str, str], Tuple[float, bool]]:
+    """{(benchmark, metric): (giá trị, higher_is_better)}"""
+    metrics = {}
+    for suite_name, suite in results.get("suites", {}).items():
+        for name, bench in (suite.get("micro") or {}).items():
+            for metric, higher in MICRO_METRICS:
+                if metric in bench:
+                    metrics[(f"{suite_name}/{name}", metric)] = (bench[metric], higher)
+        for name, runs in (suite.get("load") or {}).items():
+            for run in runs:
+                for metric, higher in LOAD_METRICS:
+                    if metric in run:
+                        metrics[(f"{suite_name}/{name}@c{run['concurrency']}", metric)] = (run[metric], higher)
+    return metrics
+
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = 0.10
+) -> List[Dict[str, Any]]:
+    """
+    So sánh từng metric có ở cả hai lần chạy
+
+    Args:
+        threshold: Thay đổi tương đối (theo hướng xấu) từ mức này trở lên bị đánh dấu regression
+
+    Returns:
+        Danh sách {benchmark, metric, baseline, current, change, status}
+        change > 0 = tốt hơn (đã đổi dấu cho metrics mà nhỏ hơn là tốt hơn)
+    """
+    before = flatten_metrics(baseline)
+    after = flatten_metrics(current)
+    rows = []
+    for key in sorted(before.keys() & after.keys()):
+        (old, higher), (new, _) = before[key], after[key]
+        if not old:
+            continue
+        change = (new - old) / old
+        if not higher:
+            change = -change
+        status = "regression" if change <= -threshold else "improvement" if change >= threshold else "same"
+        rows.append({
+            "benchmark": key[0],
+            "metric": key[1],
+            "baseline": old,
+            "current": new,
+            "change": round(change, 4),
+            "status": status,
+        })
+    return rows
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    """Bảng text cho compare_results()"""
+    if not rows:
+        return "Không có benchmark chung giữa hai file kết quả"
+    width = max(len(row["benchmark"]) for row in rows)
+    lines = [f"{'benchmark':<{width}}  {'metric':<14} {'baseline':>12} {'current':>12} {'change':>8}  status"]
+    for row in rows:
+        lines.append(
+            f"{row['benchmark']:<{width}}  {row['metric']:<14} {row['baseline']:>12} {row['current']:>12} "
+            f"{row['change'] * 100:>+7.1f}%  {row['status']}"
+        )
+    regressions = sum(1 for row in rows if row["status"] == "regression")
+    lines.append(f"{len(rows)} metrics, {regressions} regressions")
+    return "\n".join(lines)
@@ -0,0 +1,4 @@
+# Benchmark suites: mỗi module có async run(ctx) -> {"setup", "micro", "load", ...}
+SUITES = ("micro", "retrieve", "multi_agent", "products", "ingest")
+
+__all__ = ["SUITES"]
@@ -0,0 +1,52 @@
+"""
+Ingest - IngestPipeline.process_and_store (extract → chunk → embed → lưu) ở nhiều kích thước tài liệu
+Mỗi request một file_id mới; tài liệu được xóa sau khi đo (thời gian xóa không tính)
+"""
+import itertools
+import logging
+from typing import Any, Dict, List
+
+from benchmarks.corpus import make_document
+from benchmarks.fixtures import DOCUMENT_ID_PREFIX, remove_documents
+from benchmarks.harness import BenchmarkContext, run_load
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_SIZES = {"1KB": 1024, "16KB": 16 * 1024, "128KB": 128 * 1024, "1MB": 1024 * 1024}
+# Tài liệu lớn: ít request hơn để tổng thời gian chạy hợp lý
+MAX_BYTES_PER_SIZE = 64 * 1024 * 1024
+
+
+async def run(ctx: BenchmarkContext) -> Dict[str, Any]:
+    from app.api.deps import get_ingest_pipeline
+
+    ingest_pipeline = get_ingest_pipeline()
+    counter = itertools.count()
+    load: Dict[str, List[Dict[str, Any]]] = {}
+
+    for label, size in DOCUMENT_SIZES.items():
+        if ctx.quick and size > 128 * 1024:
+            continue
+        content = make_document(size, ctx.seed)
+        file_ids: List[str] = []
+
+        async def ingest(_: Any) -> None:
+            file_id = f"{DOCUMENT_ID_PREFIX}INGEST-{next(counter):06d}"
+            file_ids.append(file_id)
+            await ingest_pipeline.process_and_store(content, f"bench_{label}.txt", file_id)
+
+        requests = max(1, min(ctx.requests, MAX_BYTES_PER_SIZE // size))
+        runs = []
+        try:
+            for concurrency in ctx.concurrency:
+                result = await run_load(ingest, [None], concurrency, requests=requests, warmup=min(ctx.warmup, 2))
+                result["mb_per_second"] = round(result["throughput_rps"] * size / (1024 * 1024), 3)
+                logger.info(
+                    f"  ingest[{label}] c={concurrency}: p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                    f"{result['mb_per_second']} MB/s errors={result['errors']}"
+                )
+                runs.append(result)
+        finally:
+            await remove_documents(file_ids)
+        load[f"process_and_store[{label}]"] = runs
+    return {"load": load}
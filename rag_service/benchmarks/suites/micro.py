@@ -0,0 +1,130 @@
+"""
+Microbenchmarks - Các bước CPU thuần trên hot path (không I/O, không model)
+
+- chunking: clean_text / chunk_text ở nhiều kích thước tài liệu
+- routing: RouterEngine (memoize và không memoize) trên các câu hỏi mẫu
+- result parsing: kết quả Chroma → chunk dicts / products, context của RAGPipeline, điểm của Critic
+"""
+import logging
+from typing import Any, Dict
+
+from benchmarks.corpus import MULTI_AGENT_QUERIES, PRODUCT_QUERIES, RETRIEVE_QUESTIONS, make_document
+from benchmarks.harness import BenchmarkContext, microbench
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZES = {"4KB": 4 * 1024, "64KB": 64 * 1024, "1MB": 1024 * 1024}
+
+
+def _chroma_results(rows: int, top_k: int) -> Dict[str, Any]:
+    """Kết quả collection.query giả (rows queries × top_k chunks)"""
+    return {
+        "ids": [[f"DOC-{r}_chunk_{i}" for i in range(top_k)] for r in range(rows)],
+        "distances": [[0.1 + i * 0.01 for i in range(top_k)] for _ in range(rows)],
+        "metadatas": [
+            [
+                {
+                    "file_id": f"DOC-{r}", "file_name": f"doc_{r}.txt", "chunk_index": i,
+                    "product_id": f"SP{i:06d}", "product_name": f"Sản phẩm {i}",
+                    "category_id": "DM01", "category_name": "Thủy hải sản", "price": 125000.0 + i,
+                }
+                for i in range(top_k)
+            ]
+            for r in range(rows)
+        ],
+        "documents": [[make_document(500, seed=i).decode("utf-8", "ignore") for i in range(top_k)] for _ in range(rows)],
+    }
+
+
+def _bench_chunking(ctx: BenchmarkContext, results: Dict[str, Any]) -> None:
+    from app.core.settings import Settings
+    from app.utils.text import chunk_text, clean_text
+
+    for label, size in CHUNK_SIZES.items():
+        if ctx.quick and size > 64 * 1024:
+            continue
+        text = make_document(size, seed=ctx.seed).decode("utf-8", "ignore")
+        results[f"clean_text[{label}]"] = microbench(
+            lambda: clean_text(text), ctx.min_time, bytes=size
+        )
+        chunks = chunk_text(text, Settings.CHUNK_SIZE, Settings.CHUNK_OVERLAP)
+        results[f"chunk_text[{label}]"] = microbench(
+            lambda: chunk_text(text, Settings.CHUNK_SIZE, Settings.CHUNK_OVERLAP),
+            ctx.min_time,
+            bytes=size,
+            chunks=len(chunks)
+        )
+
+
+def _bench_routing(ctx: BenchmarkContext, results: Dict[str, Any]) -> None:
+    from app.agents.router_engine import RouterEngine
+
+    engine = RouterEngine(embed_fn=lambda text: None)
+    queries = MULTI_AGENT_QUERIES + PRODUCT_QUERIES + RETRIEVE_QUESTIONS
+    normalized = [engine.normalize(query) for query in queries]
+
+    def classify_uncached():
+        for text in normalized:
+            engine._classify_impl(text)
+
+    def classify_cached():
+        for query in queries:
+            engine.classify(query)
+
+    results["router_classify[uncached]"] = microbench(classify_uncached, ctx.min_time, queries=len(queries))
+    results["router_classify[memoized]"] = microbench(classify_cached, ctx.min_time, queries=len(queries))
+
+
+def _bench_parsing(ctx: BenchmarkContext, results: Dict[str, Any]) -> None:
+    from app.agents.critic_agent import CriticAgent
+    from app.agents.knowledge_agent import KnowledgeAgent
+    from app.core.rag_pipeline import RAGPipeline
+    from app.domain.query import Query
+    from app.infrastructure.fake.llm import CRITIC_RESPONSE
+    from app.infrastructure.vector_store.chroma import ChromaVectorStore
+
+    chroma_results = _chroma_results(rows=8, top_k=20)
+    results["chroma_parse_query_rows[8x20]"] = microbench(
+        lambda: [ChromaVectorStore._parse_query_row(chroma_results, row) for row in range(8)],
+        ctx.min_time
+    )
+
+    product_results = _chroma_results(rows=1, top_k=50)
+    results["knowledge_parse_products[50]"] = microbench(
+        lambda: KnowledgeAgent._parse_product_results(product_results, "text_search"),
+        ctx.min_time
+    )
+
+    # _build_answer không await gì khi không rerank → chạy coroutine tới hết bằng send(None)
+    pipeline = RAGPipeline(embedding_service=None, vector_store=None)
+    query = Query(question=RETRIEVE_QUESTIONS[0], top_k=10)
+    chunk_dicts = ChromaVectorStore._parse_query_row(_chroma_results(rows=1, top_k=10), 0)
+
+    def build_answer():
+        coroutine = pipeline._build_answer(query, chunk_dicts, False)
+        try:
+            coroutine.send(None)
+        except StopIteration:
+            pass
+
+    results["rag_build_answer[10 chunks]"] = microbench(build_answer, ctx.min_time)
+
+    critic = CriticAgent()
+    results["critic_extract_score"] = microbench(
+        lambda: (critic._extract_score(CRITIC_RESPONSE), critic._detect_hallucination(CRITIC_RESPONSE)),
+        ctx.min_time
+    )
+
+
+async def run(ctx: BenchmarkContext) -> Dict[str, Any]:
+    micro: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for group, bench in (("chunking", _bench_chunking), ("routing", _bench_routing), ("parsing", _bench_parsing)):
+        try:
+            bench(ctx, micro)
+        except Exception as e:
+            logger.error(f"❌ Micro {group}: {str(e)}", exc_info=True)
+            errors[group] = str(e)
+    for name, result in micro.items():
+        logger.info(f"  {name}: {result['ns_per_op'] / 1000:.2f}µs/op")
+    return {"micro": micro, "errors": errors}
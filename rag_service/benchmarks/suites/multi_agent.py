@@ -0,0 +1,30 @@
+"""
+Multi-Agent - MultiAgentOrchestrator.process (router → entity resolver → knowledge → tools → synthesis)
+với các câu hỏi phủ đủ intents; cần database (SQLite giả) và products trong vector store
+Inputs xoay vòng nên sau vòng đầu phần lớn là cache hit của agents (ENABLE_AGENT_CACHE=false để đo không cache)
+"""
+from typing import Any, Dict
+
+from benchmarks.corpus import MULTI_AGENT_QUERIES
+from benchmarks.fixtures import seed_products
+from benchmarks.harness import BenchmarkContext, load_sweep
+
+PRODUCTS = 500
+
+
+async def run(ctx: BenchmarkContext) -> Dict[str, Any]:
+    from app.api.deps import get_orchestrator
+
+    setup = await seed_products(100 if ctx.quick else PRODUCTS)
+    orchestrator = get_orchestrator()
+
+    async def process(query: str) -> Dict[str, Any]:
+        state = await orchestrator.process(query)
+        if state.get("error"):
+            raise RuntimeError(state["error"])
+        return state
+
+    return {
+        "setup": setup,
+        "load": {"process": await load_sweep("multi_agent.process", process, MULTI_AGENT_QUERIES, ctx)},
+    }
@@ -0,0 +1,48 @@
+"""
+Products - /api/products/search/text, /search/image, /search/chat qua HTTP (ASGI in-process, không qua mạng)
+Đo cả routing, validation và serialize response của FastAPI như request thật
+"""
+from typing import Any, Dict
+
+from benchmarks.corpus import PRODUCT_QUERIES, make_image
+from benchmarks.fixtures import seed_products
+from benchmarks.harness import BenchmarkContext, load_sweep
+
+PRODUCTS = 500
+IMAGES = 8
+
+
+async def run(ctx: BenchmarkContext) -> Dict[str, Any]:
+    import httpx
+    from main import app
+
+    setup = await seed_products(100 if ctx.quick else PRODUCTS)
+    images = [make_image(ctx.seed + i) for i in range(IMAGES)]
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://benchmark",
+        timeout=120
+    ) as client:
+        async def search_text(query: str) -> None:
+            response = await client.post("/api/products/search/text", json={"query": query, "top_k": 10})
+            response.raise_for_status()
+
+        async def search_image(image: bytes) -> None:
+            response = await client.post(
+                "/api/products/search/image",
+                params={"top_k": 10},
+                files={"image": ("query.png", image, "image/png")}
+            )
+            response.raise_for_status()
+
+        async def search_chat(query: str) -> None:
+            response = await client.post("/api/products/search/chat", json={"query": query})
+            response.raise_for_status()
+
+        load = {
+            "search_text": await load_sweep("products.search_text", search_text, PRODUCT_QUERIES, ctx),
+            "search_image": await load_sweep("products.search_image", search_image, images, ctx),
+            "search_chat": await load_sweep("products.search_chat", search_chat, PRODUCT_QUERIES, ctx),
+        }
+    return {"setup": setup, "load": load}
@@ -0,0 +1,31 @@
+"""
+Retrieve - RAGPipeline.retrieve (embed câu hỏi → vector search → rerank → context)
+trên một corpus tài liệu nạp sẵn, ở nhiều mức concurrency
+"""
+from typing import Any, Dict
+
+from benchmarks.corpus import RETRIEVE_QUESTIONS
+from benchmarks.fixtures import remove_documents, seed_documents
+from benchmarks.harness import BenchmarkContext, load_sweep
+
+DOCUMENTS = 20
+DOCUMENT_BYTES = 32 * 1024
+
+
+async def run(ctx: BenchmarkContext) -> Dict[str, Any]:
+    from app.api.deps import get_rag_pipeline
+    from app.domain.query import Query
+
+    setup = await seed_documents(5 if ctx.quick else DOCUMENTS, DOCUMENT_BYTES, ctx.seed)
+    rag_pipeline = get_rag_pipeline()
+    try:
+        queries = [Query(question=question, top_k=5) for question in RETRIEVE_QUESTIONS]
+        load = {
+            "retrieve": await load_sweep("retrieve", rag_pipeline.retrieve, queries, ctx),
+            "retrieve_batch[8]": await load_sweep(
+                "retrieve_batch[8]", rag_pipeline.retrieve_batch, [queries], ctx
+            ),
+        }
+    finally:
+        await remove_documents(setup.pop("file_ids"))
+    return {"setup": setup, "load": load}
@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
 import os
 import logging
@@ -32,45 +32,125 @@ app.add_middleware(
 # Include API routes
 app.include_router(api_router, prefix="/api", tags=["RAG"])
 
-# ⚡ WARM-UP: Load CLIP model khi server start (giảm ~20s cho request đầu tiên)
+# ⚡ WARM-UP: Dựng agent graph và warm-up Chroma, embedders, reranker, DB, LLM đồng thời khi server start
 @app.on_event("startup")
 async def warmup_models():
-    """Warm-up các models khi server start để tránh delay cho request đầu tiên"""
+    """Warm-up các thành phần khi server start để request đầu tiên nhanh như các request sau"""
+    import asyncio
+    from app.core.settings import Settings
+    from app.core.warmup import reconcile_document_registries, warmup_components
+    
+    from app.core.tracing import register_default_collectors
+    from app.services.inference import get_inference_executor, monitor_event_loop_lag
+    
     logger = logging.getLogger(__name__)
     logger.info("🔥 Starting warm-up process...")
     
-    try:
-        # Warm-up CLIP model (ImageEmbeddingService)
-        from app.api.deps import get_image_embedding_service
-        logger.info("📸 Warming up CLIP model...")
-        start_time = time.time()
-        image_embedding_service = get_image_embedding_service()
-        # Force initialization bằng cách tạo một dummy embedding
-        # CLIP sẽ tự động load model khi được gọi lần đầu
+    # Inference pool (pin torch threads trước khi load models) + đo event-loop lag
+    get_inference_executor()
+    app.state.loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+    # /metrics xuất thêm thống kê inference pool, caches và SQL queries lúc scrape
+    register_default_collectors()
+    # Đối chiếu định kỳ document registry với Chroma (sửa chênh lệch khi ghi manifest lỗi)
+    if Settings.DOCUMENT_REGISTRY_RECONCILE_SECONDS > 0:
+        app.state.registry_reconcile_task = asyncio.create_task(
+            reconcile_document_registries(Settings.DOCUMENT_REGISTRY_RECONCILE_SECONDS)
+        )
+    
+    if Settings.WARMUP_BLOCKING:
         try:
-            # Tạo text embedding để trigger CLIP load (nhanh hơn image)
-            _ = image_embedding_service.create_text_embedding("warmup")
-            elapsed = time.time() - start_time
-            logger.info(f"✅ CLIP model warmed up in {elapsed:.2f}s")
+            await warmup_components()
         except Exception as e:
-            logger.warning(f"⚠️ CLIP warm-up failed (non-critical): {str(e)}")
-        
-        logger.info("✅ Warm-up completed!")
-    except Exception as e:
-        logger.error(f"❌ Error during warm-up: {str(e)}", exc_info=True)
-        # Không crash server nếu warm-up fail
+            logger.error(f"❌ Error during warm-up: {str(e)}", exc_info=True)
+            # Không crash server nếu warm-up fail
+    else:
+        # Warm-up chạy nền, /api/health/ready báo 503 cho tới khi xong
+        app.state.warmup_task = asyncio.create_task(warmup_components())
 
-# Middleware để log request time
+# Dừng background tasks, thread pools và kết nối model server khi server dừng (reload, tests)
+@app.on_event("shutdown")
+async def shutdown_components():
+    """Hủy các tasks tạo lúc startup và giải phóng executors/sockets"""
+    import asyncio
+    from app.api import deps
+    from app.infrastructure.model_server import close_model_server_client
+    from app.services.inference import shutdown_inference_executor
+    
+    tasks = [
+        task for task in (
+            getattr(app.state, name, None) for name in ("warmup_task", "registry_reconcile_task", "loop_lag_task")
+        )
+        if task is not None and not task.done()
+    ]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    
+    # Chỉ dọn các singleton đã tạo, không tạo mới lúc shutdown
+    if deps._function_handler is not None:
+        deps._function_handler.shutdown()
+    close_model_server_client()
+    shutdown_inference_executor()
+
+# Middleware để log request time + trace/metrics theo request
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Log thời gian xử lý request"""
+    """Log thời gian xử lý request, mở trace cho request và ghi metrics HTTP"""
+    from app.core.settings import Settings
+    from app.core.tracing import (
+        current_trace, end_trace, log_slow_request, record_http_request, route_template, start_trace
+    )
+    from app.core.tracing.tracer import HTTP_IN_FLIGHT
+    
     start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
+    # Trace summary vào response metadata khi bật TRACE_RESPONSE_METADATA hoặc client gửi X-Trace: 1
+    expose = Settings.TRACE_RESPONSE_METADATA or request.headers.get("x-trace", "").lower() in ("1", "true")
+    trace_token = start_trace(request.headers.get("x-request-id"), expose=expose)
+    trace = current_trace()
+    HTTP_IN_FLIGHT.inc()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        response.headers["X-Trace-Id"] = trace.trace_id
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        process_time = time.time() - start_time
+        record_http_request(request.method, route_template(request.scope), status_code, process_time)
+        log_slow_request(request.method, request.url.path, trace)
+        end_trace(trace_token)
     logger = logging.getLogger(__name__)
     logger.info(f"{request.method} {request.url.path} - {response.status_code} - {process_time:.2f}s")
     return response
 
+# Middleware cProfile theo request: admin gửi X-Profile: 1 kèm X-Admin-Token
+# (đăng ký sau log_requests nên bọc ngoài cùng, profile gồm cả tracing/metrics)
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    """Profile request bằng cProfile, xem lại qua /api/admin/profile/requests/{X-Profile-Id}"""
+    if request.headers.get("x-profile", "").lower() not in ("1", "true"):
+        return await call_next(request)
+    
+    from app.api.security import is_admin_request
+    from app.core.profiling import get_request_profiler
+    
+    if not is_admin_request(request):
+        return await call_next(request)
+    profiler = get_request_profiler()
+    profile = profiler.start(request.method, request.url.path)
+    if profile is None:
+        response = await call_next(request)
+        response.headers["X-Profile-Status"] = "busy"
+        return response
+    status_code = None
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+    finally:
+        profiler.finish(profile, status_code)
+    response.headers["X-Profile-Id"] = profile.profile_id
+    return response
+
 @app.get("/")
 async def root():
     return {
@@ -83,6 +163,16 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Metrics dạng Prometheus text format: histograms theo stage/route, inference pool, caches, SQL queries"""
+    from app.core.settings import Settings
+    from app.core.tracing import get_metrics_registry
+    
+    if not Settings.METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(get_metrics_registry().render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
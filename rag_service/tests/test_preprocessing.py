@@ -0,0 +1,57 @@
+"""
+Regression tests cho app.services.image.preprocessing.load_rgb_image
+
+Chạy từ thư mục rag_service:
+    python -m pytest -q tests
+"""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.image.perceptual_hash import compute_image_hashes_batch
+from app.services.image.preprocessing import load_rgb_image
+
+
+def _encode(image: Image.Image, format: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def _gradient(size=(2048, 1536)) -> Image.Image:
+    width, height = size
+    x = np.linspace(0, 255, width, dtype=np.uint8)
+    y = np.linspace(0, 255, height, dtype=np.uint8)
+    pixels = np.stack(np.broadcast_arrays(x[None, :], y[:, None], (x[None, :] // 2 + y[:, None] // 2)), axis=-1)
+    return Image.fromarray(pixels.astype(np.uint8), "RGB")
+
+
+@pytest.mark.parametrize("mode, format", [
+    ("P", "PNG"),
+    ("P", "GIF"),
+    ("1", "PNG"),
+    ("I;16", "PNG"),
+])
+def test_load_rgb_image_reduces_modes_without_reduce_support(mode, format):
+    """Ảnh lớn ở mode reduce() không hỗ trợ vẫn được decode (reduce sau khi convert RGB)"""
+    source = _gradient()
+    image = source.convert(mode) if mode != "I;16" else source.convert("L").convert("I;16")
+    data = _encode(image, format)
+
+    result = load_rgb_image(data)
+
+    assert result.mode == "RGB"
+    assert min(result.size) >= 224
+    assert result.size[0] < source.size[0]
+
+
+def test_perceptual_hash_of_large_palette_png():
+    """Hash ảnh PNG-8 lớn (target 64px → reduce) không bị lỗi, khớp với bản RGB của cùng ảnh"""
+    source = _gradient()
+    palette = source.convert("P", palette=Image.ADAPTIVE)
+    hashes = compute_image_hashes_batch([_encode(palette, "PNG"), _encode(palette.convert("RGB"), "PNG")])
+
+    assert hashes[0] is not None
+    assert hashes[0] == hashes[1]